@@ -31,6 +31,7 @@ class AccountingDB(DB):
         self.__oldBucketMethod = False
         self.__doingPendingLockTime = 0
         self.__deadLockRetries = 2
+        self.__maxRowsPerInsert = 1000
         self.__queuedRecordsLock = ThreadSafe.Synchronizer()
         self.__queuedRecordsToInsert = []
         self.dbCatalog = {}
@@ -504,12 +505,7 @@ class AccountingDB(DB):
         """
         Adds a key value to a key table if not existant
         """
-        # Cast to string just in case
-        if not isinstance(keyValue, str):
-            keyValue = str(keyValue)
-        # No more than 64 chars for keys
-        if len(keyValue) > 64:
-            keyValue = keyValue[:64]
+        keyValue = _castKeyValue(keyValue)
 
         # Look into the cache
         if typeName not in self.__keysCache:
@@ -541,6 +537,57 @@ class AccountingDB(DB):
         keyCache[keyValue] = result["Value"]
         return result
 
+    def __getIdsForKeyValues(self, typeName, keyName, keyValues):
+        """
+        Finds the id numbers for several values of a key table, adding the values not yet in there
+
+        :return: S_OK(dict) with the id number of each value
+        """
+        if typeName not in self.__keysCache:
+            self.__keysCache[typeName] = {}
+        typeCache = self.__keysCache[typeName]
+        if keyName not in typeCache:
+            typeCache[keyName] = {}
+        keyCache = typeCache[keyName]
+        missing = sorted(set(keyValues) - set(keyCache))
+        if missing:
+            keyTable = _getTableName("key", typeName, keyName)
+            retVal = self._getConnection()
+            if not retVal["OK"]:
+                return retVal
+            connection = retVal["Value"]
+            for inserted in (False, True):
+                for chunk in List.breakListIntoChunks(missing, self.__maxRowsPerInsert):
+                    retVal = self._query(
+                        "SELECT `id`, `value` FROM `%s` WHERE `value` IN (%s)"
+                        % (keyTable, ", ".join(["%s"] * len(chunk))),
+                        conn=connection,
+                        args=chunk,
+                    )
+                    if not retVal["OK"]:
+                        return retVal
+                    for iD, value in retVal["Value"]:
+                        keyCache[value] = iD
+                missing = [keyValue for keyValue in missing if keyValue not in keyCache]
+                if not missing or inserted:
+                    break
+                self.log.info("Values for key %s didn't exist, inserting" % keyName, "%s values" % len(missing))
+                for chunk in List.breakListIntoChunks(missing, self.__maxRowsPerInsert):
+                    retVal = self._update(
+                        "INSERT IGNORE INTO `%s` ( `value` ) VALUES %s"
+                        % (keyTable, ", ".join(["( %s )"] * len(chunk))),
+                        conn=connection,
+                        args=chunk,
+                    )
+                    if not retVal["OK"]:
+                        return retVal
+            # Values matching an existing one only for the collation of the table (case, trailing spaces)
+            for keyValue in missing:
+                retVal = self.__addKeyValue(typeName, keyName, keyValue)
+                if not retVal["OK"]:
+                    return retVal
+        return S_OK({keyValue: keyCache[keyValue] for keyValue in keyValues})
+
     def calculateBucketLengthForTime(self, typeName, now, when):
         """
         Get the expected bucket time for a moment in time
@@ -586,18 +633,48 @@ class AccountingDB(DB):
             return retVal
         return S_OK(retVal["lastRowId"])
 
+    def __insertBundleInQueueTable(self, typeName, records):
+        """
+        Insert several records of a type in the in table, with one statement per chunk of records
+        """
+        sqlFields = ["taken", "takenSince"] + self.dbCatalog[typeName]["typeFields"]
+        numFields = len(self.dbCatalog[typeName]["typeFields"])
+        valuesGroup = "( 0, UTC_TIMESTAMP(), %s )" % ", ".join(["%s"] * numFields)
+        for chunk in List.breakListIntoChunks(records, self.__maxRowsPerInsert):
+            args = []
+            for startTime, endTime, valuesList in chunk:
+                if len(valuesList) + 2 != numFields:
+                    numRcv = len(valuesList) + 2
+                    return S_ERROR(
+                        "Fields mismatch for record %s. %s fields and %s expected" % (typeName, numRcv, numFields)
+                    )
+                args.extend(valuesList)
+                args.extend([startTime, endTime])
+            cmd = "INSERT INTO `%s` ( %s ) VALUES %s" % (
+                _getTableName("in", typeName),
+                ", ".join(["`%s`" % field for field in sqlFields]),
+                ", ".join([valuesGroup] * len(chunk)),
+            )
+            retVal = self._update(cmd, args=args)
+            if not retVal["OK"]:
+                return retVal
+        return S_OK()
+
     def insertRecordBundleThroughQueue(self, recordsToQueue):
+        """
+        Insert records in the intables to be really inserted afterwards, one statement per type
+        """
         if self.__readOnly:
             return S_ERROR("ReadOnly mode enabled. No modification allowed")
-        recordsToProcess = []
-        now = Time.toEpoch()
-        for record in recordsToQueue:
-            typeName, startTime, endTime, valuesList = record
-            result = self.__insertInQueueTable(typeName, startTime, endTime, valuesList)
+        recordsByType = {}
+        for typeName, startTime, endTime, valuesList in recordsToQueue:
+            if typeName not in self.dbCatalog:
+                return S_ERROR("Type %s has not been defined in the db" % typeName)
+            recordsByType.setdefault(typeName, []).append((startTime, endTime, valuesList))
+        for typeName, records in recordsByType.items():
+            result = self.__insertBundleInQueueTable(typeName, records)
             if not result["OK"]:
                 return result
-            iD = result["Value"]
-            recordsToProcess.append((iD, typeName, startTime, endTime, valuesList, now))
 
         return S_OK()
 
@@ -624,6 +701,27 @@ class AccountingDB(DB):
         Do the real insert and delete from the in buffer table
         """
         self.log.verbose("Received bundle to process", "of %s elements" % len(recordTuples))
+        if self.getCSOption("BundleRecordInsertion", True):
+            recordsByType = {}
+            for record in recordTuples:
+                recordsByType.setdefault(record[1], []).append(record)
+            recordTuples = []
+            for typeName, typeRecords in recordsByType.items():
+                result = self.insertRecordsDirectly(typeName, [record[2:5] for record in typeRecords])
+                if not result["OK"]:
+                    # Nothing has been committed, retry the records one by one so a bad one does not block the others
+                    self.log.warn("Can't insert bundle, inserting the records one by one", result["Message"])
+                    recordTuples.extend(typeRecords)
+                    continue
+                result = self._update(
+                    "DELETE FROM `%s` WHERE id in (%s)"
+                    % (_getTableName("in", typeName), ", ".join([str(record[0]) for record in typeRecords]))
+                )
+                if not result["OK"]:
+                    self.log.error("Can't delete rows from the IN table", result["Message"])
+                now = Time.toEpoch()
+                for record in typeRecords:
+                    gMonitor.addMark("insertiontime", now - record[5])
         for record in recordTuples:
             iD, typeName, startTime, endTime, valuesList, insertionEpoch = record
             result = self.insertRecordDirectly(typeName, startTime, endTime, valuesList)
@@ -683,6 +781,99 @@ class AccountingDB(DB):
         finally:
             connObj.close()
 
+    def insertRecordsDirectly(self, typeName, records):
+        """
+        Add a bundle of entries to the type contents
+
+        The contributions of the records are merged in memory by bucket and keys,
+        so that each bucket is written once for the whole bundle
+
+        :param str typeName: name of the type
+        :param list records: (startTime, endTime, valuesList) tuples
+        :return: S_OK()/S_ERROR()
+        """
+        if self.__readOnly:
+            return S_ERROR("ReadOnly mode enabled. No modification allowed")
+        if typeName not in self.dbCatalog:
+            return S_ERROR("Type %s has not been defined in the db" % typeName)
+        if not records:
+            return S_OK()
+        gMonitor.addMark("registeradded", len(records))
+        gMonitor.addMark("registeradded:%s" % typeName, len(records))
+        self.log.info("Adding records", "for type %s: %s" % (typeName, len(records)))
+        numKeys = len(self.dbCatalog[typeName]["keys"])
+        numValues = len(self.dbCatalog[typeName]["values"])
+        for record in records:
+            if len(record[2]) != numKeys + numValues:
+                return S_ERROR(
+                    "Fields mismatch for record %s. %s fields and %s expected"
+                    % (typeName, len(record[2]), numKeys + numValues)
+                )
+        # Discover key indexes, with one lookup per key for the whole bundle
+        keyIds = []
+        for keyPos, keyName in enumerate(self.dbCatalog[typeName]["keys"]):
+            retVal = self.__getIdsForKeyValues(typeName, keyName, [_castKeyValue(r[2][keyPos]) for r in records])
+            if not retVal["OK"]:
+                return retVal
+            keyIds.append(retVal["Value"])
+        # Raw records and (startTime, bucketLength, key ids) -> [entries, values...]
+        typeRecords = []
+        buckets = {}
+        nowEpoch = int(Time.toEpoch(Time.dateTime()))
+        for startTime, endTime, valuesList in records:
+            keyValues = tuple(keyIds[keyPos][_castKeyValue(valuesList[keyPos])] for keyPos in range(numKeys))
+            values = valuesList[numKeys:]
+            typeRecords.append(list(keyValues) + list(values) + [startTime, endTime])
+            for bStartTime, bProportion, bLength in self.calculateBuckets(typeName, startTime, endTime, nowEpoch):
+                bucketKey = (bStartTime, bLength, keyValues)
+                if bucketKey not in buckets:
+                    buckets[bucketKey] = [0.0] * (numValues + 1)
+                bucketValues = buckets[bucketKey]
+                bucketValues[0] += bProportion
+                for valPos in range(numValues):
+                    bucketValues[valPos + 1] += float(values[valPos]) * bProportion
+        self.log.verbose("Merged bundle", "of %s records in %s buckets" % (len(records), len(buckets)))
+
+        retVal = self._getConnection()
+        if not retVal["OK"]:
+            return retVal
+        connObj = retVal["Value"]
+        try:
+            for _i in range(max(1, self.__deadLockRetries)):
+                retVal = self.__insertBundleInTransaction(typeName, typeRecords, buckets, connObj)
+                # A dead lock rolls back the whole transaction, so restart it
+                if not retVal["OK"] and "try restarting transaction" in retVal["Message"]:
+                    continue
+                return retVal
+            return S_ERROR("Cannot insert bundle: %s" % retVal["Message"])
+        finally:
+            connObj.close()
+
+    def __insertBundleInTransaction(self, typeName, typeRecords, buckets, connObj):
+        """
+        Insert the raw records and write the merged buckets in a single transaction
+        """
+        retVal = self.__startTransaction(connObj)
+        if not retVal["OK"]:
+            return retVal
+        typeFields = self.dbCatalog[typeName]["typeFields"]
+        valuesGroup = "( %s )" % ", ".join(["%s"] * len(typeFields))
+        for chunk in List.breakListIntoChunks(typeRecords, self.__maxRowsPerInsert):
+            cmd = "INSERT INTO `%s` ( %s ) VALUES %s" % (
+                _getTableName("type", typeName),
+                ", ".join(["`%s`" % field for field in typeFields]),
+                ", ".join([valuesGroup] * len(chunk)),
+            )
+            retVal = self._update(cmd, conn=connObj, args=[value for record in chunk for value in record])
+            if not retVal["OK"]:
+                self.__rollbackTransaction(connObj)
+                return retVal
+        retVal = self.__writeMergedBuckets(typeName, buckets, connObj)
+        if not retVal["OK"]:
+            self.__rollbackTransaction(connObj)
+            return retVal
+        return self.__commitTransaction(connObj)
+
     def deleteRecord(self, typeName, startTime, endTime, valuesList):
         """
         Delete an entry
@@ -874,25 +1065,30 @@ class AccountingDB(DB):
             valueField = "`%s`" % self.dbCatalog[typeName]["values"][valPos]
             sqlFields.append(valueField)
             sqlUpData.append("%s=%s+VALUES(%s)" % (valueField, valueField, valueField))
+        numKeys = len(self.dbCatalog[typeName]["keys"])
+        numValues = len(self.dbCatalog[typeName]["values"])
+        # Values are bound as parameters, the proportions are still applied by MySQL
+        valuesGroup = "( %s )" % ",".join(["%s", "%s", "(%s*%s)"] + ["%s"] * numKeys + ["(%s*%s)"] * numValues)
         valuesGroups = []
+        args = []
         for bucketInfo in buckets:
             bStartTime = bucketInfo[0]
             bProportion = bucketInfo[1]
             bLength = bucketInfo[2]
-            sqlValues = [bStartTime, bLength, "(%s*%s)" % (valuesList[-1], bProportion)]
-            for keyPos in range(len(self.dbCatalog[typeName]["keys"])):
-                sqlValues.append(keyValues[keyPos])
-            for valPos in range(len(self.dbCatalog[typeName]["values"])):
+            args.extend([bStartTime, bLength, valuesList[-1], bProportion])
+            for keyPos in range(numKeys):
+                args.append(keyValues[keyPos])
+            for valPos in range(numValues):
                 #         value = valuesList[ valPos ]
-                sqlValues.append("(%s*%s)" % (valuesList[valPos], bProportion))
-            valuesGroups.append("( %s )" % ",".join(str(val) for val in sqlValues))
+                args.extend([valuesList[valPos], bProportion])
+            valuesGroups.append(valuesGroup)
 
         cmd = "INSERT INTO `%s` ( %s ) " % (_getTableName("bucket", typeName), ", ".join(sqlFields))
         cmd += "VALUES %s " % ", ".join(valuesGroups)
         cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join(sqlUpData)
 
         for _i in range(max(1, self.__deadLockRetries)):
-            result = self._update(cmd, conn=connObj)
+            result = self._update(cmd, conn=connObj, args=args)
             if not result["OK"]:
                 # If failed because of dead lock try restarting
                 if result["Message"].find("try restarting transaction"):
@@ -904,6 +1100,37 @@ class AccountingDB(DB):
 
         return S_ERROR("Cannot update bucket: %s" % result["Message"])
 
+    def __writeMergedBuckets(self, typeName, buckets, connObj=False):
+        """
+        Insert or update buckets whose contributions have already been merged
+
+        :param dict buckets: (startTime, bucketLength, key ids) -> [entries, values...]
+        """
+        sqlFields = ["`startTime`", "`bucketLength`", "`entriesInBucket`"]
+        sqlFields.extend(["`%s`" % keyField for keyField in self.dbCatalog[typeName]["keys"]])
+        sqlUpData = ["`entriesInBucket`=`entriesInBucket`+VALUES(`entriesInBucket`)"]
+        for valueField in self.dbCatalog[typeName]["values"]:
+            sqlFields.append("`%s`" % valueField)
+            sqlUpData.append("`%s`=`%s`+VALUES(`%s`)" % (valueField, valueField, valueField))
+        valuesGroup = "( %s )" % ",".join(["%s"] * len(sqlFields))
+        # Always the same order, so that concurrent bundles lock the buckets in the same order
+        bucketKeys = sorted(buckets)
+        for chunk in List.breakListIntoChunks(bucketKeys, self.__maxRowsPerInsert):
+            args = []
+            for bucketKey in chunk:
+                bStartTime, bLength, keyValues = bucketKey
+                bucketValues = buckets[bucketKey]
+                args.extend([bStartTime, bLength, bucketValues[0]])
+                args.extend(keyValues)
+                args.extend(bucketValues[1:])
+            cmd = "INSERT INTO `%s` ( %s ) " % (_getTableName("bucket", typeName), ", ".join(sqlFields))
+            cmd += "VALUES %s " % ", ".join([valuesGroup] * len(chunk))
+            cmd += "ON DUPLICATE KEY UPDATE %s" % ", ".join(sqlUpData)
+            result = self._update(cmd, conn=connObj, args=args)
+            if not result["OK"]:
+                return result
+        return S_OK()
+
     def __checkFieldsExistsInType(self, typeName, fields, tableType):
         """
         Check wether a list of fields exist for a given typeName
@@ -1537,6 +1764,15 @@ def _bucketizeDataField(dataField, bucketLength):
     return "%s - ( %s %% %s )" % (dataField, dataField, bucketLength)
 
 
+def _castKeyValue(keyValue):
+    """
+    Key values are stored as strings of no more than 64 chars
+    """
+    if not isinstance(keyValue, str):
+        keyValue = str(keyValue)
+    return keyValue[:64]
+
+
 def _getTableName(tableType, typeName, keyName=None):
     """
     Generate table name
@@ -421,6 +421,78 @@ ORDER BY startTime"
         self.assertEqual(retVal, expectedQuery)
 
 
+class BundleInsertion(TestCase):
+    """testing the insertion of a bundle of records"""
+
+    def setUp(self):
+        super(BundleInsertion, self).setUp()
+        self.module = self.testClass()
+        self.module.dbCatalog = {
+            "Test_Transfer": {
+                "keys": ["User", "Site"],
+                "values": ["Size", "Files"],
+                "typeFields": ["User", "Site", "Size", "Files", "startTime", "endTime"],
+            }
+        }
+        self.module.dbBucketsLength = {"Test_Transfer": [(86400 * 365, 3600)]}
+        self.keyTables = {"ac_key_Test_Transfer_User": {"alice": 1}, "ac_key_Test_Transfer_Site": {}}
+        self.updates = []
+        self.module._getConnection = MagicMock(return_value={"OK": True, "Value": MagicMock()})
+        self.module._query = self.query
+        self.module._update = self.update
+
+    def query(self, cmd, conn=None, args=None):  # pylint: disable=unused-argument
+        """Key tables lookups, anything else is a transaction statement"""
+        if cmd.startswith("SELECT"):
+            keyTable = self.keyTables[cmd.split("`")[5]]
+            return {"OK": True, "Value": [(keyTable[value], value) for value in args if value in keyTable]}
+        return {"OK": True, "Value": ()}
+
+    def update(self, cmd, conn=None, args=None):  # pylint: disable=unused-argument
+        """Fill the key tables, keep the other statements"""
+        if cmd.startswith("INSERT IGNORE"):
+            keyTable = self.keyTables[cmd.split("`")[1]]
+            for value in args:
+                keyTable.setdefault(value, len(keyTable) + 10)
+        else:
+            self.updates.append((cmd, args))
+        return {"OK": True, "Value": 1}
+
+    def test_mergeBuckets(self):
+        """records in the same bucket with the same keys are written once"""
+        now = 3600 * (int(self.moduleTested.Time.toEpoch()) // 3600)
+        records = [
+            (now - 3600, now - 3600, ["alice", "SiteA", 10, 1]),
+            (now - 3000, now - 3000, ["alice", "SiteA", 20, 2]),
+            (now - 1800, now + 1800, ["bob", "SiteA", 100, 4]),
+        ]
+        result = self.module.insertRecordsDirectly("Test_Transfer", records)
+        self.assertTrue(result["OK"])
+        self.assertEqual(self.keyTables["ac_key_Test_Transfer_Site"], {"SiteA": 10})
+        self.assertEqual(self.keyTables["ac_key_Test_Transfer_User"], {"alice": 1, "bob": 11})
+        # The records are not modified, so they can be inserted one by one afterwards
+        self.assertEqual(records[0][2], ["alice", "SiteA", 10, 1])
+
+        (typeCmd, typeArgs), (bucketCmd, bucketArgs) = self.updates
+        self.assertIn("INSERT INTO `ac_type_Test_Transfer`", typeCmd)
+        self.assertEqual(typeArgs[:6], [1, 10, 10, 1, now - 3600, now - 3600])
+        self.assertEqual(len(typeArgs), 18)
+        self.assertIn("INSERT INTO `ac_bucket_Test_Transfer`", bucketCmd)
+        self.assertIn("ON DUPLICATE KEY UPDATE", bucketCmd)
+        self.assertEqual(
+            bucketArgs,
+            [now - 3600, 3600, 2.0, 1, 10, 30.0, 3.0]
+            + [now - 3600, 3600, 0.5, 11, 10, 50.0, 2.0]
+            + [now, 3600, 0.5, 11, 10, 50.0, 2.0],
+        )
+
+    def test_wrongRecord(self):
+        """nothing is written when a record does not match the type"""
+        result = self.module.insertRecordsDirectly("Test_Transfer", [(0, 0, ["alice", "SiteA", 10])])
+        self.assertFalse(result["OK"])
+        self.assertFalse(self.updates)
+
+
 #############################################################################
 # Test Suite run
 #############################################################################
@@ -429,4 +501,5 @@ ORDER BY startTime"
 if __name__ == "__main__":
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestCase)
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(MakeQuery))
+    suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(BundleInsertion))
     testResult = unittest.TextTestRunner(verbosity=2).run(suite)
@@ -45,6 +45,18 @@ class CSJSONClient(TornadoClient):
             retVal["Value"]["data"] = b64decode(retVal["Value"]["data"])
         return retVal
 
+    def getDeltaIfNewer(self, sClientVersion):
+        """
+        Transmit request to service and decode the configuration data from base64 if
+        it is sent instead of the changes since the client version.
+
+        :returns: Configuration changes or data, if changed
+        """
+        retVal = self.executeRPC("getDeltaIfNewer", sClientVersion)
+        if retVal["OK"] and "data" in retVal["Value"]:
+            retVal["Value"]["data"] = b64decode(retVal["Value"]["data"])
+        return retVal
+
     def commitNewData(self, sData):
         """
         Transmit request to service by encoding data in base64.
@@ -81,7 +81,7 @@ from DIRAC import S_OK, S_ERROR, gConfig
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry, CSGlobals
 from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.Core.Security.ProxyInfo import getVOfromProxyGroup
-from DIRAC.Core.Utilities import LockRing
+from DIRAC.Core.Utilities import LockRing, List
 from DIRAC.Core.Utilities.DErrno import ESECTION
 
 
@@ -91,8 +91,10 @@ class Operations(object):
     The /Operations CFG section is maintained in a cache by an Operations object
     """
 
+    # (vo, setup) -> (merged CFG of the search paths, {option path: (section CFG, option name)})
     __cache = {}
-    __cacheVersion = 0
+    # Merged CFG of the configuration data the cache was built from
+    __cacheStamp = None
     __cacheLock = LockRing.LockRing().getLock()
 
     def __init__(self, vo=False, group=False, setup=False):
@@ -131,25 +133,35 @@ class Operations(object):
             self.__setup = CSGlobals.getSetup()
 
     def __getCache(self):
+        """Get the merged CFG of the search paths and the options already resolved in it
+
+        The cache is emptied when the configuration is refreshed or modified
+        """
+        cacheKey = (self.__vo, self.__setup)
+        # Without lock when already cached. The stamp is set after emptying the cache, so read it first
+        if Operations.__cacheStamp is gConfigurationData.mergedCFG:
+            cache = Operations.__cache
+            if cacheKey in cache:
+                return cache[cacheKey]
+
         Operations.__cacheLock.acquire()
         try:
-            currentVersion = gConfigurationData.getVersion()
-            if currentVersion != Operations.__cacheVersion:
+            currentStamp = gConfigurationData.mergedCFG
+            if currentStamp is not Operations.__cacheStamp:
                 Operations.__cache = {}
-                Operations.__cacheVersion = currentVersion
+                Operations.__cacheStamp = currentStamp
 
-            cacheKey = (self.__vo, self.__setup)
             if cacheKey in Operations.__cache:
                 return Operations.__cache[cacheKey]
 
             mergedCFG = CFG()
 
             for path in self.__getSearchPaths():
-                pathCFG = gConfigurationData.mergedCFG[path]
+                pathCFG = currentStamp[path]
                 if pathCFG:
                     mergedCFG = mergedCFG.mergeWith(pathCFG)
 
-            Operations.__cache[cacheKey] = mergedCFG
+            Operations.__cache[cacheKey] = (mergedCFG, {})
 
             return Operations.__cache[cacheKey]
         finally:
@@ -170,10 +182,33 @@ class Operations(object):
         return paths
 
     def getValue(self, optionPath, defaultValue=None):
-        return self.__getCache().getOption(optionPath, defaultValue)
+        cacheCFG, resolvedOptions = self.__getCache()
+        resolved = resolvedOptions.get(optionPath)
+        if resolved is None:
+            resolved = self.__resolveOption(cacheCFG, optionPath)
+            resolvedOptions[optionPath] = resolved
+        sectionCFG, optionName = resolved
+        if sectionCFG is None:
+            return defaultValue
+        return sectionCFG.getOption(optionName, defaultValue)
+
+    @staticmethod
+    def __resolveOption(cacheCFG, optionPath):
+        """Find the section holding an option, so that reading it again does not walk the whole path
+
+        :return: (section CFG, option name), (None, None) if the section does not exist
+        """
+        levels = List.fromChar(optionPath, "/")
+        if len(levels) > 1:
+            section = cacheCFG.getRecursive("/".join(levels[:-1]))
+            if not section:
+                return (None, None)
+            if isinstance(section["value"], CFG):
+                return (section["value"], levels[-1])
+        return (cacheCFG, optionPath)
 
     def __getCFG(self, sectionPath):
-        cacheCFG = self.__getCache()
+        cacheCFG = self.__getCache()[0]
         section = cacheCFG.getRecursive(sectionPath)
         if not section:
             return S_ERROR(ESECTION, "%s in Operations does not exist" % sectionPath)
@@ -0,0 +1,56 @@
+""" Test of the Operations helper
+"""
+import pytest
+
+from diraccfg import CFG
+
+from DIRAC.ConfigurationSystem.Client.Helpers import Operations as OperationsModule
+from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+CS_DATA = """
+Operations
+{
+  Defaults
+  {
+    JobScheduling
+    {
+      CheckJobLimits = True
+      MaxRescheduling = 3
+      Sites = Site1, Site2
+    }
+  }
+  Production
+  {
+    JobScheduling
+    {
+      MaxRescheduling = 5
+    }
+  }
+}
+"""
+
+
+@pytest.fixture
+def confData(mocker):
+    confData = ConfigurationData(False)
+    confData.loadRemoteCFGFromMem(CS_DATA)
+    mocker.patch.object(OperationsModule, "gConfigurationData", confData)
+    return confData
+
+
+def test_getValue(confData):
+    ops = Operations(vo="vo", setup="Production")
+    assert ops.getValue("JobScheduling/MaxRescheduling", 0) == 5
+    assert ops.getValue("/JobScheduling/CheckJobLimits", False) is True
+    assert ops.getValue("JobScheduling/Sites", []) == ["Site1", "Site2"]
+    assert ops.getValue("JobScheduling/Missing", "default") == "default"
+    assert ops.getValue("Missing/Option") is None
+    assert ops.getValue("JobScheduling", "default") == "default"
+    assert Operations(vo="vo", setup="Certification").getValue("JobScheduling/MaxRescheduling", 0) == 3
+
+    # The resolved options are forgotten when the configuration changes
+    newCFG = CFG().loadFromBuffer("Operations{\nProduction{\nJobScheduling{\nMaxRescheduling = 7\n}\n}\n}\n")
+    confData.mergeWithLocal(newCFG)
+    assert ops.getValue("JobScheduling/MaxRescheduling", 0) == 7
+    assert ops.getValue("JobScheduling/Missing", "default") == "default"
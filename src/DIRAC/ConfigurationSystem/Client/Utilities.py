@@ -391,8 +391,9 @@ def getDBParameters(fullname):
            Not used as the method will fail if it cannot be found
            defaultQueueSize is the QueueSize to return if the option is not found in the CS
 
-    :return: S_OK(dict)/S_ERROR() - dictionary with the keys: 'host', 'port', 'user', 'password',
-                                    'db' and 'queueSize'
+    :return: S_OK(dict)/S_ERROR() - dictionary with the keys: 'Host', 'Port', 'User', 'Password',
+                                    'DBName', and the connection pool tuning parameters
+                                    'PingInterval', 'CleanInterval' and 'MaxConnections'
     """
 
     cs_path = getDatabaseSection(fullname)
@@ -449,6 +450,14 @@ def getDBParameters(fullname):
     dbName = result["Value"]
     parameters["DBName"] = dbName
 
+    # Optional connection pool tuning, 0 keeps the default behaviour
+    for option in ("PingInterval", "CleanInterval", "MaxConnections"):
+        value = gConfig.getValue(cs_path + "/" + option, gConfig.getValue("/Systems/Databases/" + option, 0))
+        try:
+            parameters[option] = int(value)
+        except (TypeError, ValueError):
+            return S_ERROR("Invalid value for the configuration parameter %s: %s" % (option, value))
+
     return S_OK(parameters)
 
 
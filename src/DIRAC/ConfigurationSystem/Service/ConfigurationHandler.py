@@ -57,6 +57,13 @@ class ConfigurationHandler(RequestHandler):
             retDict["data"] = gServiceInterface.getCompressedConfigurationData()
         return S_OK(retDict)
 
+    types_getDeltaIfNewer = [str]
+
+    @classmethod
+    def export_getDeltaIfNewer(cls, sClientVersion):
+        """Get the changes since the client version, or the whole compressed configuration"""
+        return S_OK(gServiceInterface.getDeltaIfNewer(sClientVersion))
+
     types_publishSlaveServer = [str]
 
     @classmethod
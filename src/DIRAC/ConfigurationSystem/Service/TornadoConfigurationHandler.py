@@ -63,6 +63,17 @@ class TornadoConfigurationHandler(TornadoService):
             retDict["data"] = b64encode(self.ServiceInterface.getCompressedConfigurationData()).decode()
         return S_OK(retDict)
 
+    def export_getDeltaIfNewer(self, sClientVersion):
+        """
+        Returns the changes since the client version if they are known, if not like getCompressedDataIfNewer
+
+        :param sClientVersion: Version used by client
+        """
+        retDict = self.ServiceInterface.getDeltaIfNewer(sClientVersion)
+        if "data" in retDict:
+            retDict["data"] = b64encode(retDict["data"]).decode()
+        return S_OK(retDict)
+
     def export_publishSlaveServer(self, sURL):
         """
         Used by slave server to register as a slave server.
@@ -5,6 +5,7 @@ from __future__ import print_function
 from __future__ import absolute_import
 from __future__ import division
 import os.path
+import hashlib
 import zlib
 import zipfile
 import _thread
@@ -33,6 +34,16 @@ class ConfigurationData(object):
             self.runningThreadsNumber = 0
 
         self.__compressedConfigurationData = None
+        self.__checksum = None
+        # Changes between the last versions of the remote CFG, kept by the configuration servers
+        # as a list of (version, newer version, modifications)
+        self.__deltaHistory = []
+        self.__deltaBaseCFG = None
+        self.__deltaBaseVersion = None
+        # Flat {path: value} index of the options of the merged CFG, and the CFG it was built from
+        self.__optionIndex = (None, {})
+        # Version of the remote CFG, and the CFG it was read from
+        self.__remoteVersion = (None, "0")
         self.configurationPath = "/DIRAC/Configuration"
         self.backupsDir = os.path.join(DIRAC.rootPath, "etc", "csbackup")
         self._isService = False
@@ -67,6 +78,10 @@ class ConfigurationData(object):
             self.remoteServerList.extend(List.fromChar(remoteServers, ","))
         self.remoteServerList = List.uniqueElements(self.remoteServerList)
         self.__compressedConfigurationData = None
+        self.__checksum = None
+        self.__remoteVersion = (None, "0")
+        if self._isService:
+            self.__updateDeltaHistory()
 
     def loadFile(self, fileName):
         try:
@@ -95,6 +110,29 @@ class ConfigurationData(object):
         sUncompressedData = zlib.decompress(data).decode()
         self.loadRemoteCFGFromMem(sUncompressedData)
 
+    def applyRemoteModifications(self, deltaList, version, checksum):
+        """Bring the remote CFG to a newer version by applying the changes since the current one
+
+        :param list deltaList: modifications (see CFG.getModifications) from one version to the next
+        :param str version: version expected after applying the modifications
+        :param str checksum: checksum of the remote CFG in that version, see getChecksum
+        :return: S_OK/S_ERROR, in which case the remote CFG is not modified
+        """
+        newCFG = self.remoteCFG.clone()
+        for modList in deltaList:
+            result = newCFG.applyModifications(modList)
+            if not result["OK"]:
+                return result
+        if self.getVersion(newCFG) != version:
+            return S_ERROR("Version %s expected after applying the changes" % version)
+        if hashlib.md5(str(newCFG).encode()).hexdigest() != checksum:
+            return S_ERROR("Checksum mismatch after applying the changes")
+        self.lock()
+        self.remoteCFG = newCFG
+        self.unlock()
+        self.sync()
+        return S_OK()
+
     def loadRemoteCFGFromMem(self, data):
         self.lock()
         self.remoteCFG.loadFromBuffer(data)
@@ -154,9 +192,31 @@ class ConfigurationData(object):
             pass
         return self.dangerZoneEnd(None)
 
+    def __getOptionIndex(self):
+        """Get the flat index of the options of the merged CFG, built once per merged CFG
+
+        The merged CFG is replaced, not modified, at each sync, so the index can be read without locking
+        """
+        mergedCFG, optionIndex = self.__optionIndex
+        if mergedCFG is not self.mergedCFG:
+            mergedCFG = self.mergedCFG
+            optionIndex = {}
+            sectionsToIndex = [("", mergedCFG)]
+            while sectionsToIndex:
+                sectionPath, sectionCFG = sectionsToIndex.pop()
+                for option in sectionCFG.listOptions(False):
+                    optionIndex["%s/%s" % (sectionPath, option)] = sectionCFG[option]
+                for section in sectionCFG.listSections(False):
+                    sectionsToIndex.append(("%s/%s" % (sectionPath, section), sectionCFG[section]))
+            self.__optionIndex = (mergedCFG, optionIndex)
+        return optionIndex
+
     def extractOptionFromCFG(self, path, cfg=False, disableDangerZones=False):
-        if not cfg:
-            cfg = self.mergedCFG
+        if not cfg or cfg is self.mergedCFG:
+            optionIndex = self.__getOptionIndex()
+            if path in optionIndex:
+                return optionIndex[path]
+            return optionIndex.get("/" + "/".join([level.strip() for level in path.split("/") if level.strip()]))
         if not disableDangerZones:
             self.dangerZoneStart()
         try:
@@ -214,7 +274,14 @@ class ConfigurationData(object):
 
     def getVersion(self, cfg=False):
         if not cfg:
-            cfg = self.remoteCFG
+            # The version is read at each gConfig/Operations call, keep it until the next sync
+            remoteCFG, version = self.__remoteVersion
+            if remoteCFG is self.remoteCFG:
+                return version
+            remoteCFG = self.remoteCFG
+            version = self.extractOptionFromCFG("%s/Version" % self.configurationPath, remoteCFG) or "0"
+            self.__remoteVersion = (remoteCFG, version)
+            return version
         value = self.extractOptionFromCFG("%s/Version" % self.configurationPath, cfg)
         if value:
             return value
@@ -290,6 +357,61 @@ class ConfigurationData(object):
             self.__compressedConfigurationData = zlib.compress(str(self.remoteCFG).encode(), 9)
         return self.__compressedConfigurationData
 
+    def getChecksum(self):
+        """Checksum of the remote CFG, used by the clients to check the result of applying changes"""
+        if self.__checksum is None:
+            self.__checksum = hashlib.md5(str(self.remoteCFG).encode()).hexdigest()
+        return self.__checksum
+
+    def getDeltaHistorySize(self):
+        try:
+            return int(
+                self.extractOptionFromCFG(
+                    "%s/DeltaHistorySize" % self.configurationPath, self.mergedCFG, disableDangerZones=True
+                )
+            )
+        except Exception:
+            return 10
+
+    def deltaRefreshEnabled(self):
+        value = self.extractOptionFromCFG("%s/DeltaRefresh" % self.configurationPath, self.localCFG)
+        if value and value.lower() in ("no", "false", "n"):
+            return False
+        return True
+
+    def __updateDeltaHistory(self):
+        """Record the changes done to the remote CFG since the previous version, called when syncing a service"""
+        # sync may be called with the lock held: no danger zone here
+        historySize = self.getDeltaHistorySize()
+        versionPath = "%s/Version" % self.configurationPath
+        version = self.extractOptionFromCFG(versionPath, self.remoteCFG, disableDangerZones=True) or "0"
+        if historySize <= 0:
+            self.__deltaHistory = []
+            self.__deltaBaseCFG = None
+            return
+        if self.__deltaBaseCFG is not None and version == self.__deltaBaseVersion:
+            return
+        remoteCFG = self.remoteCFG.clone()
+        if self.__deltaBaseCFG is not None:
+            modList = self.__deltaBaseCFG.getModifications(remoteCFG)
+            self.__deltaHistory = (self.__deltaHistory + [(self.__deltaBaseVersion, version, modList)])[-historySize:]
+        self.__deltaBaseCFG = remoteCFG
+        self.__deltaBaseVersion = version
+
+    def getDelta(self, fromVersion):
+        """Get the changes to apply to the remote CFG of a given version to get the current one
+
+        :param str fromVersion: version of the CFG to update
+        :return: S_OK(list of modifications from one version to the next)/S_ERROR if they are not known
+        """
+        if self.__deltaBaseVersion != self.getVersion():
+            return S_ERROR("Changes of the current version are not known")
+        deltaHistory = self.__deltaHistory
+        for index, (version, _newVersion, _modList) in enumerate(deltaHistory):
+            if version == fromVersion:
+                return S_OK([modList for _version, _newVersion, modList in deltaHistory[index:]])
+        return S_ERROR("Changes since version %s are not known" % fromVersion)
+
     def isMaster(self):
         value = self.extractOptionFromCFG("%s/Master" % self.configurationPath, self.localCFG)
         if value and value.lower() in ("yes", "true", "y"):
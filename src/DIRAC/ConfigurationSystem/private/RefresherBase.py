@@ -4,6 +4,7 @@ from __future__ import print_function
 
 __RCSID__ = "$Id$"
 
+import errno
 import time
 import random
 
@@ -12,23 +13,50 @@ from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationDat
 from DIRAC.ConfigurationSystem.Client.PathFinder import getGatewayURLs
 from DIRAC.FrameworkSystem.Client.Logger import gLogger
 from DIRAC.Core.Utilities import List
+from DIRAC.Core.Utilities.DErrno import cmpError
 from DIRAC.Core.Utilities.EventDispatcher import gEventDispatcher
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 
 
+# Configuration servers not providing the changes between versions
+_serversWithoutDelta = set()
+
+
 def _updateFromRemoteLocation(serviceClient):
     """
     Refresh the configuration
+
+    The changes since the local version are downloaded and applied if the server knows them,
+    otherwise the whole configuration is downloaded
     """
     gLogger.debug("", "Trying to refresh from %s" % serviceClient.serverURL)
     localVersion = gConfigurationData.getVersion()
-    retVal = serviceClient.getCompressedDataIfNewer(localVersion)
+    if gConfigurationData.deltaRefreshEnabled() and serviceClient.serverURL not in _serversWithoutDelta:
+        retVal = serviceClient.getDeltaIfNewer(localVersion)
+        # DISET servers answer "Unknown method", Tornado servers HTTP NOT_IMPLEMENTED (ENOSYS)
+        if not retVal["OK"] and ("Unknown method" in retVal["Message"] or cmpError(retVal, errno.ENOSYS)):
+            _serversWithoutDelta.add(serviceClient.serverURL)
+    else:
+        retVal = S_ERROR("Delta refresh disabled")
+    if not retVal["OK"]:
+        retVal = serviceClient.getCompressedDataIfNewer(localVersion)
     if retVal["OK"]:
         dataDict = retVal["Value"]
         newestVersion = dataDict["newestVersion"]
         if localVersion < newestVersion:
             gLogger.debug("New version available", "Updating to version %s..." % newestVersion)
-            gConfigurationData.loadRemoteCFGFromCompressedMem(dataDict["data"])
+            if "delta" in dataDict:
+                result = gConfigurationData.applyRemoteModifications(
+                    dataDict["delta"], newestVersion, dataDict["checksum"]
+                )
+                if not result["OK"]:
+                    gLogger.warn("Cannot apply the configuration changes, getting the whole data", result["Message"])
+                    retVal = serviceClient.getCompressedData()
+                    if not retVal["OK"]:
+                        return retVal
+                    gConfigurationData.loadRemoteCFGFromCompressedMem(retVal["Value"])
+            else:
+                gConfigurationData.loadRemoteCFGFromCompressedMem(dataDict["data"])
             gLogger.debug("Updated to version %s" % gConfigurationData.getVersion())
             gEventDispatcher.triggerEvent("CSNewVersion", newestVersion, threaded=True)
         return S_OK()
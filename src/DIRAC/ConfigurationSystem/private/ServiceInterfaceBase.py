@@ -260,6 +260,24 @@ class ServiceInterfaceBase(object):
     def getVersion(self):
         return gConfigurationData.getVersion()
 
+    def getDeltaIfNewer(self, sClientVersion):
+        """Get the changes since the version of a client, or the whole configuration if they are not known
+
+        :param str sClientVersion: version of the client configuration
+        :return: dict with the newestVersion and, if the client version is older, either the
+                 delta (list of modifications) and the checksum of the result, or the compressed data
+        """
+        sVersion = gConfigurationData.getVersion()
+        retDict = {"newestVersion": sVersion}
+        if sClientVersion < sVersion:
+            result = gConfigurationData.getDelta(sClientVersion)
+            if result["OK"]:
+                retDict["delta"] = result["Value"]
+                retDict["checksum"] = gConfigurationData.getChecksum()
+            else:
+                retDict["data"] = gConfigurationData.getCompressedData()
+        return retDict
+
     def getCommitHistory(self):
         files = self.__getCfgBackups(gConfigurationData.getBackupDir())
         backups = [".".join(fileName.split(".")[1:-1]).split("@") for fileName in files]
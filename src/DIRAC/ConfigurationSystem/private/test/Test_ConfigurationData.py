@@ -0,0 +1,154 @@
+""" Test of the configuration data: option index and refresh with the changes between versions
+"""
+import errno
+import zlib
+
+import pytest
+
+from DIRAC import S_OK, S_ERROR
+from DIRAC.ConfigurationSystem.private import RefresherBase
+from DIRAC.ConfigurationSystem.private.ConfigurationData import ConfigurationData
+
+CS_DATA = """
+DIRAC
+{
+  Configuration
+  {
+    Name = Test-Prod
+    Version = 2022-01-01 00:00:00
+  }
+}
+Resources
+{
+  # The sites
+  Sites
+  {
+    Site1
+    {
+      CE = ce1.site1
+    }
+  }
+}
+"""
+
+
+def _newVersion(confData, version, path, value):
+    confData.setOptionInCFG(path, value, confData.remoteCFG)
+    confData.setVersion(version)
+
+
+@pytest.fixture
+def server():
+    confData = ConfigurationData(False)
+    confData.setAsService()
+    confData.loadRemoteCFGFromMem(CS_DATA)
+    return confData
+
+
+def test_delta(server):
+    client = ConfigurationData(False)
+    client.loadRemoteCFGFromCompressedMem(server.getCompressedData())
+    assert not server.getDelta(client.getVersion())["OK"]
+
+    _newVersion(server, "2022-01-02 00:00:00", "/Resources/Sites/Site1/CE", "ce1.site1, ce2.site1")
+    _newVersion(server, "2022-01-03 00:00:00", "/Resources/Sites/Site2/CE", "ce1.site2")
+    result = server.getDelta("2022-01-01 00:00:00")
+    assert result["OK"], result["Message"]
+    assert len(result["Value"]) == 2
+    assert len(server.getDelta("2022-01-02 00:00:00")["Value"]) == 1
+    assert not server.getDelta("2021-12-31 00:00:00")["OK"]
+
+    result = client.applyRemoteModifications(result["Value"], server.getVersion(), server.getChecksum())
+    assert result["OK"], result["Message"]
+    assert str(client.remoteCFG) == str(server.remoteCFG)
+    assert client.extractOptionFromCFG("/Resources/Sites/Site2/CE") == "ce1.site2"
+
+    # A wrong result leaves the configuration untouched
+    _newVersion(server, "2022-01-04 00:00:00", "/Resources/Sites/Site2/SE", "se.site2")
+    delta = server.getDelta(client.getVersion())["Value"]
+    assert not client.applyRemoteModifications(delta, server.getVersion(), "wrong")["OK"]
+    assert client.getVersion() == "2022-01-03 00:00:00"
+
+
+def test_historySize(server):
+    server.setOptionInCFG("/DIRAC/Configuration/DeltaHistorySize", "2", server.remoteCFG)
+    for day in range(2, 6):
+        _newVersion(server, "2022-01-0%s 00:00:00" % day, "/Resources/Sites/Site1/Day", str(day))
+    assert not server.getDelta("2022-01-02 00:00:00")["OK"]
+    assert len(server.getDelta("2022-01-03 00:00:00")["Value"]) == 2
+
+
+class FakeConfigurationClient(object):
+    def __init__(self, server, noDeltaError=None):
+        self.serverURL = "dips://cs.server:9135/Configuration/Server"
+        self.server = server
+        self.noDeltaError = noDeltaError
+        self.calls = []
+
+    def getDeltaIfNewer(self, version):
+        self.calls.append("getDeltaIfNewer")
+        if self.noDeltaError:
+            return self.noDeltaError
+        retDict = {"newestVersion": self.server.getVersion()}
+        if version < retDict["newestVersion"]:
+            result = self.server.getDelta(version)
+            if result["OK"]:
+                retDict.update(delta=result["Value"], checksum=self.server.getChecksum())
+            else:
+                retDict["data"] = self.server.getCompressedData()
+        return S_OK(retDict)
+
+    def getCompressedDataIfNewer(self, version):
+        self.calls.append("getCompressedDataIfNewer")
+        return S_OK({"newestVersion": self.server.getVersion(), "data": self.server.getCompressedData()})
+
+
+@pytest.mark.parametrize(
+    "noDeltaError",
+    [
+        None,
+        # DISET server
+        S_ERROR("Unknown method getDeltaIfNewer"),
+        # Tornado server
+        S_ERROR(errno.ENOSYS, "getDeltaIfNewer is not implemented"),
+    ],
+)
+def test_updateFromRemoteLocation(mocker, server, noDeltaError):
+    withDelta = noDeltaError is None
+    client = ConfigurationData(False)
+    client.loadRemoteCFGFromMem(CS_DATA)
+    mocker.patch.object(RefresherBase, "gConfigurationData", client)
+    mocker.patch.object(RefresherBase, "_serversWithoutDelta", set())
+    mocker.patch.object(RefresherBase.gEventDispatcher, "triggerEvent")
+    loadFull = mocker.spy(client, "loadRemoteCFGFromCompressedMem")
+    serviceClient = FakeConfigurationClient(server, noDeltaError)
+
+    _newVersion(server, "2022-01-02 00:00:00", "/Resources/Sites/Site1/CE", "ce2.site1")
+    assert RefresherBase._updateFromRemoteLocation(serviceClient)["OK"]
+    assert str(client.remoteCFG) == str(server.remoteCFG)
+    assert loadFull.called != withDelta
+
+    # A server without delta support is not asked again
+    _newVersion(server, "2022-01-03 00:00:00", "/Resources/Sites/Site1/CE", "ce3.site1")
+    assert RefresherBase._updateFromRemoteLocation(serviceClient)["OK"]
+    assert client.getVersion() == "2022-01-03 00:00:00"
+    assert serviceClient.calls.count("getDeltaIfNewer") == (2 if withDelta else 1)
+    assert zlib.decompress(server.getCompressedData()).decode() == str(client.remoteCFG)
+
+
+def test_optionIndex(server):
+    assert server.extractOptionFromCFG("/Resources/Sites/Site1/CE") == "ce1.site1"
+    assert server.extractOptionFromCFG(" Resources/Sites/ Site1/CE/") == "ce1.site1"
+    assert server.extractOptionFromCFG("/Resources/Sites/Site1") is None
+    assert server.extractOptionFromCFG("/Resources/Sites/Site1/CE/Other") is None
+    assert server.getVersion() == "2022-01-01 00:00:00"
+
+    # The index and the version follow the changes
+    server.setOptionInCFG("/Resources/Sites/Site1/CE", "ce2.site1")
+    assert server.extractOptionFromCFG("/Resources/Sites/Site1/CE") == "ce2.site1"
+    server.setVersion("2022-01-02 00:00:00")
+    assert server.getVersion() == "2022-01-02 00:00:00"
+    newCFG = server.remoteCFG.clone()
+    newCFG.setOption("/DIRAC/Configuration/Version", "2022-01-03 00:00:00")
+    server.setRemoteCFG(newCFG, disableSync=True)
+    assert server.getVersion() == "2022-01-03 00:00:00"
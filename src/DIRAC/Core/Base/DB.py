@@ -31,6 +31,9 @@ class DB(DIRACDB, MySQL):
             dbName=self.dbName,
             port=self.dbPort,
             debug=debug,
+            pingInterval=dbParameters.get("PingInterval", 0),
+            cleanInterval=dbParameters.get("CleanInterval", 0),
+            maxConnections=dbParameters.get("MaxConnections", 0),
         )
 
         if not self._connected:
@@ -23,7 +23,6 @@ from __future__ import print_function
 
 import time
 import six
-from io import BytesIO
 from hashlib import md5
 
 import selectors
@@ -47,7 +46,8 @@ class BaseTransport(object):
     def __init__(self, stServerAddress, bServerMode=False, **kwargs):
         self.bServerMode = bServerMode
         self.extraArgsDict = kwargs
-        self.byteStream = b""
+        # Received data not processed yet. A bytearray grows and shrinks in place
+        self.byteStream = bytearray()
         self.packetSize = 1048576  # 1MiB
         self.stServerAddress = stServerAddress
         self.peerCredentials = {}
@@ -169,21 +169,28 @@ class BaseTransport(object):
         sCodedData = MixedEncode.encode(uData)
         if isinstance(sCodedData, six.text_type):
             sCodedData = sCodedData.encode()
-        dataToSend = b"".join([prefix, str(len(sCodedData)).encode(), b":", sCodedData])
-        for index in range(0, len(dataToSend), self.packetSize):
-            bytesToSend = min(self.packetSize, len(dataToSend) - index)
-            packSentBytes = 0
-            while packSentBytes < bytesToSend:
-                try:
-                    result = self._write(dataToSend[index + packSentBytes : index + bytesToSend])
-                    if not result["OK"]:
-                        return result
-                    sentBytes = result["Value"]
-                except Exception as e:
-                    return S_ERROR("Exception while sending data: %s" % e)
-                if sentBytes == 0:
-                    return S_ERROR("Connection closed by peer")
-                packSentBytes += sentBytes
+        header = b"".join([prefix, str(len(sCodedData)).encode(), b":"])
+        if len(sCodedData) < self.packetSize:
+            chunks = [header + sCodedData]
+        else:
+            # Do not copy large payloads to put the header in front of them
+            chunks = [header, sCodedData]
+        for chunk in chunks:
+            dataToSend = memoryview(chunk)
+            for index in range(0, len(dataToSend), self.packetSize):
+                bytesToSend = min(self.packetSize, len(dataToSend) - index)
+                packSentBytes = 0
+                while packSentBytes < bytesToSend:
+                    try:
+                        result = self._write(dataToSend[index + packSentBytes : index + bytesToSend])
+                        if not result["OK"]:
+                            return result
+                        sentBytes = result["Value"]
+                    except Exception as e:
+                        return S_ERROR("Exception while sending data: %s" % e)
+                    if sentBytes == 0:
+                        return S_ERROR("Connection closed by peer")
+                    packSentBytes += sentBytes
         del sCodedData
         sCodedData = None
         return S_OK()
@@ -220,21 +227,19 @@ class BaseTransport(object):
             if isKeepAlive:
                 gLogger.debug("Received keep alive header")
                 # Remove the ka magic from the buffer and process the keep alive
-                self.byteStream = self.byteStream[keepAliveMagicLen:]
+                del self.byteStream[:keepAliveMagicLen]
                 return self.__processKeepAlive(maxBufferSize, blockAfterKeepAlive)
             # From here it must be a real message!
             # Process the size and remove the msg length from the bytestream
             pkgSize = int(self.byteStream[:iSeparatorPosition])
-            pkgData = self.byteStream[iSeparatorPosition + 1 :]
-            readSize = len(pkgData)
+            del self.byteStream[: iSeparatorPosition + 1]
+            readSize = len(self.byteStream)
             if readSize >= pkgSize:
                 # If we already have all the data we need
-                data = pkgData[:pkgSize]
-                self.byteStream = pkgData[pkgSize:]
+                data = self.byteStream[:pkgSize]
+                del self.byteStream[:pkgSize]
             else:
-                # If we still need to read stuff
-                pkgMem = BytesIO()
-                pkgMem.write(pkgData)
+                # If we still need to read stuff, grow the buffer in place
                 # Receive while there's still data to be received
                 while readSize < pkgSize:
                     retVal = self._read(pkgSize - readSize, skipReadyCheck=True)
@@ -244,17 +249,17 @@ class BaseTransport(object):
                         return S_ERROR("Peer closed connection")
                     rcvData = retVal["Value"]
                     readSize += len(rcvData)
-                    pkgMem.write(rcvData)
+                    self.byteStream += rcvData
                     if maxBufferSize and readSize > maxBufferSize:
                         return S_ERROR("Read limit exceeded (%s chars)" % maxBufferSize)
                 # Data is here! take it out from the bytestream, dencode and return
                 if readSize == pkgSize:
-                    data = pkgMem.getvalue()
-                    self.byteStream = b""
+                    # The whole buffer is the message: hand it over instead of copying it
+                    data = self.byteStream
+                    self.byteStream = bytearray()
                 else:  # readSize > pkgSize:
-                    pkgMem.seek(0, 0)
-                    data = pkgMem.read(pkgSize)
-                    self.byteStream = pkgMem.read()
+                    data = self.byteStream[:pkgSize]
+                    del self.byteStream[:pkgSize]
             try:
                 data = MixedEncode.decode(data)[0]
             except Exception as e:
@@ -0,0 +1,69 @@
+""" Test the framing of the messages done by the BaseTransport """
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+from pytest import fixture, mark
+
+from DIRAC.Core.DISET.private.Transports.BaseTransport import BaseTransport
+
+
+class MemoryTransport(BaseTransport):
+    """Transport writing to and reading from a bytes buffer, in small pieces"""
+
+    def __init__(self, *args, **kwargs):
+        super(MemoryTransport, self).__init__(*args, **kwargs)
+        self.wire = b""
+        self.writes = []
+        self.maxWrite = 7
+
+    def _write(self, buf):
+        # Writes may be partial, like on a socket
+        data = bytes(buf[: self.maxWrite])
+        self.writes.append(len(data))
+        self.wire += data
+        return {"OK": True, "Value": len(data)}
+
+    def _read(self, bufSize=4096, skipReadyCheck=False):
+        data, self.wire = self.wire[: min(bufSize, 5)], self.wire[min(bufSize, 5) :]
+        return {"OK": True, "Value": data}
+
+
+@fixture
+def transport():
+    return MemoryTransport(("localhost", 0))
+
+
+@mark.parametrize("packetSize", [3, 1048576])
+def test_sendReceive(transport, packetSize):
+    transport.packetSize = packetSize
+    messages = [{"OK": True, "Value": ["/lfn/%s" % i for i in range(20)]}, "x" * 40, None, {"OK": False}]
+    for message in messages:
+        assert transport.sendData(message)["OK"]
+    # The header and the payload are sent whether or not they are in the same write
+    assert transport.wire.startswith(b"209:ds2:OKb1s5:Valuels6:/lfn/0")
+    assert transport.wire.endswith(b"1:n9:ds2:OKb0e")
+    for message in messages:
+        assert transport.receiveData() == message
+    assert not transport.wire
+    assert not transport.byteStream
+
+
+def test_keepAlive(transport):
+    transport.sendKeepAlive(responseId="someId")
+    transport.sendData({"OK": True, "Value": 1})
+    assert transport.wire.startswith(BaseTransport.keepAliveMagic)
+    result = transport.receiveData(blockAfterKeepAlive=False)
+    assert result["OK"] and result["keepAlive"]
+    assert transport.receiveData() == {"OK": True, "Value": 1}
+    # Keep alives are skipped when blocking for a message
+    transport.sendKeepAlive(responseId="someId")
+    transport.sendData({"OK": True, "Value": 2})
+    assert transport.receiveData() == {"OK": True, "Value": 2}
+
+
+def test_readLimit(transport):
+    transport.sendData("x" * 100)
+    result = transport.receiveData(maxBufferSize=50)
+    assert not result["OK"]
+    assert "Read limit exceeded" in result["Message"]
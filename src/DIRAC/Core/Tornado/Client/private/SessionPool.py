@@ -0,0 +1,191 @@
+"""
+    Per-process pool of `requests <http://docs.python-requests.org/>`_ sessions used by the
+    :py:class:`~DIRAC.Core.Tornado.Client.private.TornadoBaseClient`
+
+    A ``requests.Session`` keeps the connections it opened alive, so that the next calls to the
+    same server skip the TCP and TLS handshakes. Sessions are kept per server and credentials,
+    since the client certificate is bound to the TLS connection. A session is used by one thread
+    at a time: it is taken out of the pool for the duration of a call and given back afterwards.
+    Sessions that stay idle for too long are closed.
+
+    The pool is configured with the options of the ``/DIRAC/HTTPSClient`` section:
+
+    - SessionPoolSize: maximum number of idle sessions kept per server and credentials (default 10)
+    - ConnectionPoolSize: maximum number of connections kept by a session per host (default 10)
+    - SessionIdleTimeout: seconds after which an idle session is closed (default 60, 0 disables the reuse)
+"""
+import atexit
+import hashlib
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from DIRAC import gLogger
+from DIRAC.ConfigurationSystem.Client.Config import gConfig
+
+
+class SessionPool(object):
+    """Thread safe pool of requests sessions, keyed by (server, credentials)"""
+
+    def __init__(self, poolSize=10, connectionPoolSize=10, idleTimeout=60):
+        """
+        :param int poolSize: maximum number of idle sessions kept per key
+        :param int connectionPoolSize: maximum number of connections kept by a session per host
+        :param int idleTimeout: seconds after which an idle session is closed (0 disables the reuse)
+        """
+        self.poolSize = poolSize
+        self.connectionPoolSize = connectionPoolSize
+        self.idleTimeout = idleTimeout
+        self.log = gLogger.getSubLogger("SessionPool")
+        self.__lock = threading.Lock()
+        # key -> list of (time of last use, session), the most recently used at the end
+        self.__idleSessions = {}
+        self.__lastClean = time.time()
+        # hash of a proxy string -> file where it was written
+        self.__proxyFiles = {}
+        self.stats = {"Hits": 0, "NewSessions": 0, "ClosedSessions": 0}
+        # The connections must not be shared with forked processes
+        self.pid = os.getpid()
+
+    @staticmethod
+    def getSessionKey(url, verify, auth):
+        """Build the key of the sessions that can be used for a call
+
+        :param str url: URL of the service
+        :param verify: CA location, or False if the server certificate is not checked
+        :param dict auth: authentication arguments of the call (cert or headers)
+
+        :return: hashable key
+        """
+        server = "/".join(url.split("/")[:3])
+        cert = auth.get("cert")
+        if cert:
+            certFile = cert[0] if isinstance(cert, (list, tuple)) else cert
+            try:
+                # A renewed proxy must not reuse the connections opened with the previous one
+                certVersion = os.stat(certFile).st_mtime
+            except OSError:
+                certVersion = None
+            return (server, verify, tuple(cert) if isinstance(cert, (list, tuple)) else cert, certVersion)
+        return (server, verify, None, None)
+
+    @contextmanager
+    def session(self, key):
+        """Context manager giving a session for the key, and putting it back in the pool if the call went well"""
+        session = self.__acquire(key)
+        try:
+            yield session
+        except Exception:
+            # The state of its connections is unknown, do not reuse the session
+            self.__close(session)
+            raise
+        self.__release(key, session)
+
+    def __acquire(self, key):
+        """Get an idle session for the key, or a new one"""
+        with self.__lock:
+            self.__clean()
+            sessions = self.__idleSessions.get(key)
+            if sessions:
+                self.stats["Hits"] += 1
+                return sessions.pop()[1]
+            self.stats["NewSessions"] += 1
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.connectionPoolSize)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def __release(self, key, session):
+        """Put a session back in the pool, or close it if the pool is full or disabled"""
+        if self.idleTimeout > 0:
+            with self.__lock:
+                sessions = self.__idleSessions.setdefault(key, [])
+                if len(sessions) < self.poolSize:
+                    sessions.append((time.time(), session))
+                    return
+        self.__close(session)
+
+    def __clean(self):
+        """Close the sessions idle for too long, must be called with the lock held"""
+        now = time.time()
+        if now - self.__lastClean < 1:
+            return
+        self.__lastClean = now
+        for key in list(self.__idleSessions):
+            sessions = self.__idleSessions[key]
+            while sessions and now - sessions[0][0] > self.idleTimeout:
+                self.__close(sessions.pop(0)[1])
+            if not sessions:
+                del self.__idleSessions[key]
+
+    def __close(self, session):
+        self.stats["ClosedSessions"] += 1
+        try:
+            session.close()
+        except Exception as e:  # pylint: disable=broad-except
+            self.log.debug("Error closing session", repr(e))
+
+    def closeAll(self):
+        """Close all the idle sessions"""
+        with self.__lock:
+            for sessions in self.__idleSessions.values():
+                for _lastUse, session in sessions:
+                    self.__close(session)
+            self.__idleSessions = {}
+
+    def getProxyFile(self, proxyString):
+        """Get a file containing the proxy, written only once per proxy and removed at exit
+
+        :param str proxyString: proxy as a string
+        :return: path of the file
+        """
+        proxyHash = hashlib.sha256(proxyString.encode()).hexdigest()
+        with self.__lock:
+            proxyFile = self.__proxyFiles.get(proxyHash)
+            if proxyFile and os.path.exists(proxyFile):
+                return proxyFile
+            tmpHandle, proxyFile = tempfile.mkstemp()
+            with os.fdopen(tmpHandle, "w") as fp:
+                fp.write(proxyString)
+            self.__proxyFiles[proxyHash] = proxyFile
+        return proxyFile
+
+    def removeProxyFiles(self):
+        """Remove the files written by getProxyFile"""
+        with self.__lock:
+            for proxyFile in self.__proxyFiles.values():
+                try:
+                    os.unlink(proxyFile)
+                except OSError:
+                    pass
+            self.__proxyFiles = {}
+
+
+gSessionPool = None
+gSessionPoolLock = threading.Lock()
+
+
+def getSessionPool():
+    """Get the session pool of the process, created at the first call from the /DIRAC/HTTPSClient options
+
+    :return: :py:class:`SessionPool`
+    """
+    global gSessionPool
+    if gSessionPool is None or gSessionPool.pid != os.getpid():
+        with gSessionPoolLock:
+            if gSessionPool is None or gSessionPool.pid != os.getpid():
+                pool = SessionPool(
+                    poolSize=gConfig.getValue("/DIRAC/HTTPSClient/SessionPoolSize", 10),
+                    connectionPoolSize=gConfig.getValue("/DIRAC/HTTPSClient/ConnectionPoolSize", 10),
+                    idleTimeout=gConfig.getValue("/DIRAC/HTTPSClient/SessionIdleTimeout", 60),
+                )
+                atexit.register(pool.closeAll)
+                atexit.register(pool.removeProxyFiles)
+                gSessionPool = pool
+    return gSessionPool
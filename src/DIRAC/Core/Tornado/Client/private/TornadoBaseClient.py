@@ -6,6 +6,8 @@
     (For each URL requests manage retries himself, if it still fail, we try next url)
     KeepAlive lapse is also removed because managed by request,
     see https://requests.readthedocs.io/en/latest/user/advanced/#keep-alive
+    The requests sessions, and hence their open connections, are shared by all the clients of the process,
+    see :py:mod:`~DIRAC.Core.Tornado.Client.private.SessionPool`
 
     If necessary this class can be modified to define number of retry in requests, documentation does not give
     lot of informations but you can see this simple solution from StackOverflow.
@@ -35,7 +37,6 @@ import errno
 import os
 import requests
 import six
-import tempfile
 from http import HTTPStatus
 
 
@@ -47,6 +48,7 @@ from DIRAC.ConfigurationSystem.Client.Helpers.Registry import findDefaultGroupFo
 from DIRAC.ConfigurationSystem.Client.PathFinder import getServiceURLs, getGatewayURLs
 
 from DIRAC.Core.DISET.ThreadConfig import ThreadConfig
+from DIRAC.Core.Tornado.Client.private.SessionPool import getSessionPool
 from DIRAC.Core.Security import Locations
 from DIRAC.Core.Utilities import Network
 from DIRAC.Core.Utilities.JEncode import decode, encode
@@ -559,10 +561,7 @@ class TornadoBaseClient(object):
 
             auth = {"headers": {"Authorization": "Bearer %s" % token["access_token"]}}
         elif self.kwargs.get(self.KW_PROXY_STRING):
-            tmpHandle, cert = tempfile.mkstemp()
-            fp = os.fdopen(tmpHandle, "w")
-            fp.write(self.kwargs[self.KW_PROXY_STRING])
-            fp.close()
+            auth = {"cert": getSessionPool().getProxyFile(self.kwargs[self.KW_PROXY_STRING])}
 
         # CHRIS 04.02.21
         # TODO: add proxyLocation check ?
@@ -572,6 +571,10 @@ class TornadoBaseClient(object):
                 gLogger.error("No proxy found")
                 return S_ERROR("No proxy found")
 
+        # Reuse the connections already opened to the server with the same credentials
+        sessionPool = getSessionPool()
+        sessionKey = sessionPool.getSessionKey(url, verify, auth)
+
         # We have a try/except for all the exceptions
         # whose default behavior is to try again,
         # maybe to different server
@@ -583,7 +586,8 @@ class TornadoBaseClient(object):
 
                 # Default case, just return the result
                 if not outputFile:
-                    call = requests.post(url, data=kwargs, timeout=self.timeout, verify=verify, **auth)
+                    with sessionPool.session(sessionKey) as session:
+                        call = session.post(url, data=kwargs, timeout=self.timeout, verify=verify, **auth)
                     # raising the exception for status here
                     # means essentialy that we are losing here the information of what is returned by the server
                     # as error message, since it is not passed to the exception
@@ -602,16 +606,19 @@ class TornadoBaseClient(object):
                     rawText = None
                     # Stream download
                     # https://requests.readthedocs.io/en/latest/user/advanced/#body-content-workflow
-                    with requests.post(url, data=kwargs, timeout=self.timeout, verify=verify, stream=True, **auth) as r:
-                        rawText = r.text
-                        r.raise_for_status()
-
-                        with open(outputFile, "wb") as f:
-                            for chunk in r.iter_content(4096):
-                                # if chunk:  # filter out keep-alive new chuncks
-                                f.write(chunk)
-
-                        return S_OK()
+                    with sessionPool.session(sessionKey) as session:
+                        with session.post(
+                            url, data=kwargs, timeout=self.timeout, verify=verify, stream=True, **auth
+                        ) as r:
+                            rawText = r.text
+                            r.raise_for_status()
+
+                            with open(outputFile, "wb") as f:
+                                for chunk in r.iter_content(4096):
+                                    # if chunk:  # filter out keep-alive new chuncks
+                                    f.write(chunk)
+
+                    return S_OK()
 
             # Some HTTPError are not worth retrying
             except requests.exceptions.HTTPError as e:
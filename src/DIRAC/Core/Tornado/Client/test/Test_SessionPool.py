@@ -0,0 +1,74 @@
+""" Test of the pool of requests sessions used by the Tornado clients
+"""
+import os
+import time
+
+import pytest
+
+from DIRAC.Core.Tornado.Client.private.SessionPool import SessionPool
+
+
+@pytest.fixture
+def pool():
+    sessionPool = SessionPool(poolSize=2, idleTimeout=60)
+    yield sessionPool
+    sessionPool.closeAll()
+    sessionPool.removeProxyFiles()
+
+
+def test_reuse(pool):
+    key = pool.getSessionKey("https://server:8443/Framework/Service", False, {})
+    with pool.session(key) as session:
+        pass
+    with pool.session(key) as session2:
+        # A session in use is not given to another caller
+        with pool.session(key) as session3:
+            pass
+    assert session2 is session
+    assert session3 is not session
+    assert pool.stats["Hits"] == 1
+    assert pool.stats["NewSessions"] == 2
+
+    # Same server, other service: same sessions
+    assert pool.getSessionKey("https://server:8443/Framework/Other", False, {}) == key
+    assert pool.getSessionKey("https://other:8443/Framework/Service", False, {}) != key
+
+
+def test_failure(pool):
+    key = pool.getSessionKey("https://server:8443/Framework/Service", False, {})
+    with pytest.raises(RuntimeError):
+        with pool.session(key) as session:
+            raise RuntimeError("Connection broken")
+    # The session of a failed call is not reused
+    with pool.session(key) as session2:
+        pass
+    assert session2 is not session
+    assert pool.stats["ClosedSessions"] == 1
+
+
+def test_idleTimeout(pool):
+    key = pool.getSessionKey("https://server:8443/Framework/Service", False, {})
+    with pool.session(key) as session:
+        pass
+    pool.idleTimeout = 0.1
+    time.sleep(1.1)
+    with pool.session(key) as session2:
+        pass
+    assert session2 is not session
+
+
+def test_credentials(pool, tmp_path):
+    certFile = tmp_path / "proxy"
+    certFile.write_text("proxy")
+    key = pool.getSessionKey("https://server:8443/Framework/Service", False, {"cert": str(certFile)})
+    assert key != pool.getSessionKey("https://server:8443/Framework/Service", False, {})
+    # A renewed proxy uses new connections
+    os.utime(certFile, (0, 0))
+    assert key != pool.getSessionKey("https://server:8443/Framework/Service", False, {"cert": str(certFile)})
+
+    proxyFile = pool.getProxyFile("proxy string")
+    assert pool.getProxyFile("proxy string") == proxyFile
+    with open(proxyFile) as fd:
+        assert fd.read() == "proxy string"
+    pool.removeProxyFiles()
+    assert not os.path.exists(proxyFile)
@@ -516,23 +516,134 @@ g_dEncodeFunctions[types.DictType] = encodeDict
 g_dDecodeFunctions[_ord("d")] = decodeDict
 
 
+# Fast path: the same wire format as the functions above, with the most common types
+# handled inline. This saves a function call and a dictionary lookup per encoded object,
+# which dominates the cost of large replies (long lists of strings, dicts of dicts...).
+# The other types are given to the functions above.
+# It is not used when DIRAC_DEBUG_DENCODE_CALLSTACK is set, since it skips the debug hooks.
+
+
+def _encodeFast(uObject, eList):
+    """Encoding any object, inlining the common types"""
+    append = eList.append
+    oType = type(uObject)
+    if oType is str:
+        sValue = uObject.encode()
+        append(b"s%d:" % len(sValue))
+        append(sValue)
+    elif oType is dict:
+        append(b"d")
+        for key, value in uObject.items():
+            if type(key) is str:
+                sValue = key.encode()
+                append(b"s%d:" % len(sValue))
+                append(sValue)
+            else:
+                _encodeFast(key, eList)
+            _encodeFast(value, eList)
+        append(b"e")
+    elif oType is list or oType is tuple:
+        append(b"l" if oType is list else b"t")
+        for value in uObject:
+            if type(value) is str:
+                sValue = value.encode()
+                append(b"s%d:" % len(sValue))
+                append(sValue)
+            else:
+                _encodeFast(value, eList)
+        append(b"e")
+    elif oType is int:
+        append(b"i%de" % uObject)
+    elif oType is bool:
+        append(b"b1" if uObject else b"b0")
+    elif uObject is None:
+        append(b"n")
+    elif oType is bytes:
+        append(b"s%d:" % len(uObject))
+        append(uObject)
+    else:
+        g_dEncodeFunctions[oType](uObject, eList)
+
+
+def _decodeFast(data, i):
+    """Decoding any object, inlining the common types"""
+    typeId = data[i]
+    if typeId == 115 or typeId == 117:  # s, u
+        colon = data.index(b":", i + 1)
+        end = colon + 1 + int(data[i + 1 : colon])
+        return (data[colon + 1 : end].decode(errors="surrogateescape"), end)
+    if typeId == 100:  # d
+        oD = {}
+        i += 1
+        index = data.index
+        while True:
+            typeId = data[i]
+            if typeId == 101:  # e
+                return (oD, i + 1)
+            if typeId == 115:  # the keys are usually strings
+                colon = index(b":", i + 1)
+                i = colon + 1 + int(data[i + 1 : colon])
+                key = data[colon + 1 : i].decode(errors="surrogateescape")
+            else:
+                key, i = _decodeFast(data, i)
+            if data[i] == 115:
+                colon = index(b":", i + 1)
+                i = colon + 1 + int(data[i + 1 : colon])
+                oD[key] = data[colon + 1 : i].decode(errors="surrogateescape")
+            else:
+                oD[key], i = _decodeFast(data, i)
+    if typeId == 108 or typeId == 116:  # l, t
+        oL = []
+        append = oL.append
+        index = data.index
+        isList = typeId == 108
+        i += 1
+        while True:
+            typeId = data[i]
+            if typeId == 101:  # e
+                return (oL if isList else tuple(oL), i + 1)
+            if typeId == 115:
+                colon = index(b":", i + 1)
+                i = colon + 1 + int(data[i + 1 : colon])
+                append(data[colon + 1 : i].decode(errors="surrogateescape"))
+            else:
+                value, i = _decodeFast(data, i)
+                append(value)
+    if typeId == 105 or typeId == 73:  # i, I
+        end = data.index(b"e", i + 1)
+        return (int(data[i + 1 : end]), end + 1)
+    if typeId == 98:  # b
+        return (data[i + 1] != 48, i + 2)
+    if typeId == 110:  # n
+        return (None, i + 1)
+    return g_dDecodeFunctions[typeId](data, i)
+
+
 # Encode function
 def encode(uObject):
     """Generic encoding function"""
     eList = []
     # print("ENCODE FUNCTION : %s" % g_dEncodeFunctions[ type( uObject ) ])
-    g_dEncodeFunctions[type(uObject)](uObject, eList)
+    if DIRAC_DEBUG_DENCODE_CALLSTACK:
+        g_dEncodeFunctions[type(uObject)](uObject, eList)
+    else:
+        _encodeFast(uObject, eList)
     return b"".join(eList)
 
 
 def decode(data):
-    """Generic decoding function"""
+    """Generic decoding function
+
+    :param data: bytes or bytearray, e.g. the receive buffer of a transport, which avoids a copy
+    """
     if not data:
         return data
     # print("DECODE FUNCTION : %s" % g_dDecodeFunctions[ sStream [ iIndex ] ])
-    if not isinstance(data, bytes):
+    if not isinstance(data, (bytes, bytearray)):
         raise NotImplementedError("This should never happen")
-    return g_dDecodeFunctions[data[0]](data, 0)
+    if DIRAC_DEBUG_DENCODE_CALLSTACK:
+        return g_dDecodeFunctions[data[0]](data, 0)
+    return _decodeFast(data, 0)
 
 
 if __name__ == "__main__":
@@ -29,9 +29,9 @@
     Returns S_OK or S_ERROR.
 
 
-    _query( cmd, [conn] )
+    _query( cmd, [conn], [args] )
 
-    Executes SQL command "cmd".
+    Executes SQL command "cmd", binding "args" to its "%s" placeholders if given.
     Gets a connection from the Queue (or open a new one if none is available),
     the used connection is  back into the Queue.
     If a connection to the the DB is passed as second argument this connection
@@ -39,9 +39,9 @@
     Returns S_OK with fetchall() out in Value or S_ERROR upon failure.
 
 
-    _update( cmd, [conn] )
+    _update( cmd, [conn], [args] )
 
-    Executes SQL command "cmd" and issue a commit
+    Executes SQL command "cmd" and issue a commit, binding "args" to its "%s" placeholders if given.
     Gets a connection from the Queue (or open a new one if none is available),
     the used connection is  back into the Queue.
     If a connection to the the DB is passed as second argument this connection
@@ -49,6 +49,13 @@
     Returns S_OK with number of updated registers in Value or S_ERROR upon failure.
 
 
+    _executemany( cmd, argsList, [conn] )
+
+    Executes SQL command "cmd" once per set of parameters in "argsList", as a single
+    multi-row statement for INSERTs.
+    Returns S_OK with number of updated registers in Value or S_ERROR upon failure.
+
+
     _createTables( tableDict )
 
     Create a new Table in the DB
@@ -81,6 +88,12 @@
       For compatibility with current usage it uses Exceptions to exit in case of
       invalid arguments
 
+    buildConditionWithArgs( same arguments as buildCondition )
+
+      Same as buildCondition, but returns the condition with "%s" placeholders together
+      with the list of values to bind. insertFields, updateFields, getFields and deleteEntries
+      use it, so that the values are escaped by the driver without extra calls.
+
 
     insertFields( self, tableName, inFields = None, inValues = None, conn = None, inDict = None ):
 
@@ -152,6 +165,7 @@ from __future__ import absolute_import
 from __future__ import division
 
 import collections
+import functools
 import time
 import threading
 import MySQLdb
@@ -168,6 +182,13 @@ __RCSID__ = "$Id$"
 MAXCONNECTRETRY = 10
 RETRY_SLEEP_DURATION = 5
 
+# Number of INSERT/UPDATE statement templates kept by the parameterised helpers
+STATEMENT_CACHE_SIZE = 512
+
+
+class PoolExhaustedError(Exception):
+    """No connection of the pool became free in time"""
+
 
 def _checkFields(inFields, inValues):
     """
@@ -206,21 +227,101 @@ def _quotedList(fieldList=None):
     return ", ".join(quotedFields)
 
 
+def _escapePercent(sqlString):
+    """
+    Protect "%" in a statement template before the parameters are bound
+    """
+    return sqlString.replace("%", "%%")
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _insertTemplate(table, fields, fragments):
+    """
+    Build (and cache) an INSERT statement template
+
+    :param str table: quoted table name
+    :param tuple fields: field names
+    :param tuple fragments: placeholder ("%s") or inlined SQL function for each field
+    :return: statement template or None if the fields are invalid
+    """
+    fieldString = _quotedList(fields)
+    if fieldString is None:
+        return None
+    return "INSERT INTO %s (  %s ) VALUES (  %s )" % (
+        _escapePercent(table),
+        _escapePercent(fieldString),
+        ", ".join(fragments),
+    )
+
+
+@functools.lru_cache(maxsize=STATEMENT_CACHE_SIZE)
+def _updateTemplate(table, fields, fragments):
+    """
+    Build (and cache) the UPDATE ... SET part of a statement template
+
+    :param str table: quoted table name
+    :param tuple fields: field names
+    :param tuple fragments: placeholder ("%s") or inlined SQL function for each field
+    :return: statement template or None if the fields are invalid
+    """
+    quotedFields = [_quotedList([field]) for field in fields]
+    if None in quotedFields:
+        return None
+    return "UPDATE %s SET %s" % (
+        _escapePercent(table),
+        ",".join("%s = %s" % (_escapePercent(field), fragment) for field, fragment in zip(quotedFields, fragments)),
+    )
+
+
 class ConnectionPool(object):
     """
     Management of connections per thread
+
+    By default every :py:meth:`get` sweeps the connections assigned to dead or idle threads
+    and pings the connection it hands out. For busy multithreaded services both can be relaxed:
+
+    * ``pingInterval``: only ping a connection that has not been used for more than this
+      many seconds (0 means ping on every call)
+    * ``cleanInterval``: only sweep the assigned connections if the last sweep is older than
+      this many seconds (0 means sweep on every call)
+    * ``maxConnections``: maximum number of connections held by threads at the same time
+      (0 means unlimited). Threads asking for a connection beyond that wait for one to be freed,
+      and get an error without retrying if none is freed within ``maxWaitTime`` seconds.
+
+    With a limit, the connection is given back to the pool by :py:meth:`release` after each query,
+    so that more threads than connections can share the pool. A thread keeps its connection
+    while in a transaction, and until it is swept if it got the connection with ``hold=True``,
+    since it may then use it for several statements.
     """
 
-    def __init__(self, host, user, passwd, port=3306, graceTime=600):
+    def __init__(
+        self,
+        host,
+        user,
+        passwd,
+        port=3306,
+        graceTime=600,
+        pingInterval=0,
+        cleanInterval=0,
+        maxConnections=0,
+        maxWaitTime=30,
+    ):
         self.__host = host
         self.__user = user
         self.__passwd = passwd
         self.__port = port
         self.__graceTime = graceTime
+        self.__pingInterval = pingInterval
+        self.__cleanInterval = cleanInterval
+        self.__maxConnections = maxConnections
+        self.__maxWaitTime = maxWaitTime
         self.__spares = collections.deque()
         self.__maxSpares = 10
         self.__lastClean = 0
+        # thread -> [connection, db name, last use time, held, in transaction]
         self.__assigned = {}
+        self.__lock = threading.Condition()
+        self.__stats = {"Hits": 0, "NewConnections": 0, "Waits": 0, "Pings": 0, "FailedPings": 0, "Cleans": 0}
 
     @property
     def __thid(self):
@@ -230,6 +331,8 @@ class ConnectionPool(object):
         conn = MySQLdb.connect(host=self.__host, port=self.__port, user=self.__user, passwd=self.__passwd)
 
         self.__execute(conn, "SET AUTOCOMMIT=1")
+        with self.__lock:
+            self.__stats["NewConnections"] += 1
         return conn
 
     def __execute(self, conn, cmd):
@@ -239,29 +342,73 @@ class ConnectionPool(object):
         cursor.close()
         return res
 
-    def get(self, dbName, retries=10):
+    def getStats(self):
+        """Get the usage counters of the pool
+
+        :return: dictionary with the number of calls served by an already assigned connection
+                 (Hits), opened connections (NewConnections), calls that had to wait for a free
+                 connection (Waits), pings (Pings, FailedPings), sweeps (Cleans) and the current
+                 number of assigned and spare connections
+        """
+        with self.__lock:
+            stats = dict(self.__stats)
+            stats["Assigned"] = len(self.__assigned)
+            stats["Spares"] = len(self.__spares)
+        return stats
+
+    def get(self, dbName, retries=10, hold=True):
+        """Get the connection of the current thread
+
+        :param str dbName: database to select
+        :param int retries: number of retries if the connection fails
+        :param bool hold: keep the connection assigned to the thread, even after :py:meth:`release`
+        """
         retries = max(0, min(MAXCONNECTRETRY, retries))
-        self.clean()
-        return self.__getWithRetry(dbName, retries, retries)
+        now = time.time()
+        if now - self.__lastClean >= self.__cleanInterval:
+            self.clean(now)
+        return self.__getWithRetry(dbName, retries, retries, hold)
+
+    def release(self, transactionEnd=False):
+        """Give the connection of the current thread back to the pool if the number of
+        connections is limited, and if the connection is neither held nor in a transaction
 
-    def __getWithRetry(self, dbName, totalRetries, retriesLeft):
+        :param bool transactionEnd: the transaction of the current thread is over
+        """
+        with self.__lock:
+            data = self.__assigned.get(self.__thid)
+            if data is None:
+                return
+            if transactionEnd:
+                data[4] = False
+            if self.__maxConnections and not data[3] and not data[4]:
+                self.__pop(self.__thid)
+
+    def __getWithRetry(self, dbName, totalRetries, retriesLeft, hold):
         sleepTime = RETRY_SLEEP_DURATION * (totalRetries - retriesLeft)
         if sleepTime > 0:
             time.sleep(sleepTime)
         try:
-            conn, lastName, thid = self.__innerGet()
+            conn, lastName, thid, idleTime = self.__innerGet(hold)
+        except PoolExhaustedError as excp:
+            # Retrying would only make the thread wait longer for a busy pool
+            return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
         except MySQLdb.MySQLError as excp:
             if retriesLeft > 0:
-                return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+                return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, hold)
             return S_ERROR(DErrno.EMYSQL, "Could not connect: %s" % excp)
 
-        if not self.__ping(conn):
+        if idleTime >= self.__pingInterval and not self.__ping(conn):
+            with self.__lock:
+                self.__assigned.pop(thid, None)
+                self.__lock.notify()
+            # Do not leave the broken socket open until the connection is garbage collected
             try:
-                self.__assigned.pop(thid)
-            except KeyError:
+                conn.close()
+            except Exception:
                 pass
             if retriesLeft > 0:
-                return self.__getWithRetry(dbName, totalRetries, retriesLeft)
+                return self.__getWithRetry(dbName, totalRetries, retriesLeft, hold)
             return S_ERROR(DErrno.EMYSQL, "Could not connect")
 
         if lastName != dbName:
@@ -269,60 +416,112 @@ class ConnectionPool(object):
                 conn.select_db(dbName)
             except MySQLdb.MySQLError as excp:
                 if retriesLeft > 0:
-                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, hold)
                 return S_ERROR(DErrno.EMYSQL, "Could not select db %s: %s" % (dbName, excp))
             try:
                 self.__assigned[thid][1] = dbName
             except KeyError:
                 if retriesLeft > 0:
-                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1)
+                    return self.__getWithRetry(dbName, totalRetries, retriesLeft - 1, hold)
                 return S_ERROR(DErrno.EMYSQL, "Could not connect")
         return S_OK(conn)
 
     def __ping(self, conn):
+        with self.__lock:
+            self.__stats["Pings"] += 1
         try:
             conn.ping(True)
             return True
         except Exception:
+            with self.__lock:
+                self.__stats["FailedPings"] += 1
             return False
 
-    def __innerGet(self):
+    def __innerGet(self, hold):
+        """Get the connection assigned to the current thread, assigning a new one if needed
+
+        :param bool hold: keep the connection assigned to the thread until it is swept
+        :return: tuple (connection, selected db name, thread, seconds since the connection was last used)
+        """
         thid = self.__thid
         now = time.time()
-        if thid in self.__assigned:
-            data = self.__assigned[thid]
-            conn = data[0]
-            data[2] = now
-            return data[0], data[1], thid
-        # Not cached
-        try:
-            conn, dbName = self.__spares.pop()
-        except IndexError:
-            conn = self.__newConn()
+        with self.__lock:
+            if thid in self.__assigned:
+                data = self.__assigned[thid]
+                idleTime = now - data[2]
+                data[2] = now
+                data[3] = data[3] or hold
+                self.__stats["Hits"] += 1
+                return data[0], data[1], thid, idleTime
+            # Not cached
+            if self.__maxConnections and len(self.__assigned) >= self.__maxConnections:
+                self.__stats["Waits"] += 1
+                deadline = now + self.__maxWaitTime
+                while len(self.__assigned) >= self.__maxConnections:
+                    self.__clean(time.time())
+                    if len(self.__assigned) < self.__maxConnections:
+                        break
+                    waitTime = deadline - time.time()
+                    if waitTime <= 0:
+                        raise PoolExhaustedError(
+                            "No free connection after %s seconds (%s in use)"
+                            % (self.__maxWaitTime, len(self.__assigned))
+                        )
+                    self.__lock.wait(min(waitTime, 1))
+            try:
+                conn, dbName, lastUse = self.__spares.pop()
+                idleTime = now - lastUse
+            except IndexError:
+                conn = None
+            if conn is None:
+                # Do not keep the lock while connecting
+                self.__assigned[thid] = [None, "", now, hold, False]
+        if conn is None:
+            try:
+                conn = self.__newConn()
+            except Exception:
+                with self.__lock:
+                    self.__assigned.pop(thid, None)
+                    self.__lock.notify()
+                raise
             dbName = ""
-
-        self.__assigned[thid] = [conn, dbName, now]
-        return conn, dbName, thid
+            # Just opened, no need to ping it
+            idleTime = 0
+        with self.__lock:
+            self.__assigned[thid] = [conn, dbName, now, hold, False]
+        return conn, dbName, thid, idleTime
 
     def __pop(self, thid):
         try:
             data = self.__assigned.pop(thid)
-            if len(self.__spares) < self.__maxSpares:
-                self.__spares.append((data[0], data[1]))
-            else:
-                try:
-                    data[0].close()
-                except MySQLdb.ProgrammingError as exc:
-                    gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
-                except Exception as exc:
-                    gLogger.warn("Exception while closing MySQL connection: %s" % exc)
         except KeyError:
-            pass
+            return
+        self.__lock.notify()
+        if data[0] is None:
+            return
+        # With a limit, the released connections are spares to be reused by the other threads
+        if len(self.__spares) < max(self.__maxSpares, self.__maxConnections):
+            self.__spares.append((data[0], data[1], data[2]))
+        else:
+            try:
+                data[0].close()
+            except MySQLdb.ProgrammingError as exc:
+                gLogger.warn("ProgrammingError exception while closing MySQL connection: %s" % exc)
+            except Exception as exc:
+                gLogger.warn("Exception while closing MySQL connection: %s" % exc)
 
     def clean(self, now=False):
         if not now:
             now = time.time()
+        with self.__lock:
+            self.__clean(now)
+
+    def __clean(self, now):
+        """Release the connections of dead threads and of threads idle for more than the grace time.
+        Must be called with the lock held
+        """
         self.__lastClean = now
+        self.__stats["Cleans"] += 1
         for thid in list(self.__assigned):
             if not thid.is_alive():
                 self.__pop(thid)
@@ -334,17 +533,20 @@ class ConnectionPool(object):
                 self.__pop(thid)
 
     def transactionStart(self, dbName):
-        result = self.get(dbName)
+        result = self.get(dbName, hold=False)
         if not result["OK"]:
             return result
         conn = result["Value"]
+        with self.__lock:
+            self.__assigned[self.__thid][4] = True
         try:
             return S_OK(self.__execute(conn, "START TRANSACTION WITH CONSISTENT SNAPSHOT"))
         except MySQLdb.MySQLError as excp:
+            self.release(transactionEnd=True)
             return S_ERROR(DErrno.EMYSQL, "Could not begin transaction: %s" % excp)
 
     def transactionCommit(self, dbName):
-        result = self.get(dbName)
+        result = self.get(dbName, hold=False)
         if not result["OK"]:
             return result
         conn = result["Value"]
@@ -353,9 +555,11 @@ class ConnectionPool(object):
             return S_OK(result)
         except MySQLdb.MySQLError as excp:
             return S_ERROR(DErrno.EMYSQL, "Could not commit transaction: %s" % excp)
+        finally:
+            self.release(transactionEnd=True)
 
     def transactionRollback(self, dbName):
-        result = self.get(dbName)
+        result = self.get(dbName, hold=False)
         if not result["OK"]:
             return result
         conn = result["Value"]
@@ -364,6 +568,8 @@ class ConnectionPool(object):
             return S_OK(result)
         except MySQLdb.MySQLError as excp:
             return S_ERROR(DErrno.EMYSQL, "Could not rollback transaction: %s" % excp)
+        finally:
+            self.release(transactionEnd=True)
 
 
 class MySQL(object):
@@ -375,11 +581,29 @@ class MySQL(object):
 
     __connectionPools = {}
 
-    def __init__(self, hostName="localhost", userName="dirac", passwd="dirac", dbName="", port=3306, debug=False):
+    def __init__(
+        self,
+        hostName="localhost",
+        userName="dirac",
+        passwd="dirac",
+        dbName="",
+        port=3306,
+        debug=False,
+        pingInterval=0,
+        cleanInterval=0,
+        maxConnections=0,
+    ):
         """
         set MySQL connection parameters and try to connect
 
         :param debug: unused
+        :param int pingInterval: only ping connections idle for longer than this (seconds)
+        :param int cleanInterval: minimum time between two sweeps of the connection pool (seconds)
+        :param int maxConnections: maximum number of connections of the pool (0 for unlimited).
+                                   With a limit, the connection is given back to the pool after each query
+
+        The pool parameters are only taken into account by the first instance connecting
+        to a given server with given credentials, the pool being shared by all of them.
         """
         global gInstancesCount
         gInstancesCount += 1
@@ -401,7 +625,9 @@ class MySQL(object):
         self.__port = port
         cKey = (self.__hostName, self.__userName, self.__passwd, self.__port)
         if cKey not in MySQL.__connectionPools:
-            MySQL.__connectionPools[cKey] = ConnectionPool(*cKey)
+            MySQL.__connectionPools[cKey] = ConnectionPool(
+                *cKey, pingInterval=pingInterval, cleanInterval=cleanInterval, maxConnections=maxConnections
+            )
         self.__connectionPool = MySQL.__connectionPools[cKey]
 
         self.__initialized = True
@@ -444,6 +670,33 @@ class MySQL(object):
         except Exception:
             return False
 
+    def __checkSQLFunction(self, myString):
+        """
+        Check if a string is one of the SQL time functions that can be passed
+        verbatim to the DB instead of being quoted
+
+        :return: None if it is not a function call, True if it is a valid one, False otherwise
+        """
+        myString = myString.strip()
+        if myString == "UTC_TIMESTAMP()":
+            return True
+
+        timeUnits = ["MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR"]
+
+        for func in ["TIMESTAMPDIFF", "TIMESTAMPADD"]:
+            if myString.startswith("%s(" % func) and myString.endswith(")"):
+                args = myString[:-1].replace("%s(" % func, "").strip().split(",")
+                try:
+                    arg1, arg2, arg3 = [x.strip() for x in args]
+                except ValueError:
+                    return False
+                if arg1 in timeUnits:
+                    if self.__isDateTime(arg2) or arg2.isalnum():
+                        if self.__isDateTime(arg3) or arg3.isalnum():
+                            return True
+                return False
+        return None
+
     def __escapeString(self, myString, connection=None):
         """
         To be used for escaping any MySQL string before passing it to the DB
@@ -451,10 +704,13 @@ class MySQL(object):
         It also includes quotation marks " around the given string
         """
         if connection is None:
-            retDict = self._getConnection()
+            retDict = self.__getQueryConnection()
             if not retDict["OK"]:
                 return retDict
-            connection = retDict["Value"]
+            try:
+                return self.__escapeString(myString, connection=retDict["Value"])
+            finally:
+                self.__connectionPool.release()
 
         if isinstance(myString, bytes):
             myString = myString.decode()
@@ -463,23 +719,14 @@ class MySQL(object):
         except ValueError:
             return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
 
-        timeUnits = ["MICROSECOND", "SECOND", "MINUTE", "HOUR", "DAY", "WEEK", "MONTH", "QUARTER", "YEAR"]
-
         try:
             # Check datetime functions first
-            if myString.strip() == "UTC_TIMESTAMP()":
+            isFunction = self.__checkSQLFunction(myString)
+            if isFunction:
                 return S_OK(myString)
-
-            for func in ["TIMESTAMPDIFF", "TIMESTAMPADD"]:
-                if myString.strip().startswith("%s(" % func) and myString.strip().endswith(")"):
-                    args = myString.strip()[:-1].replace("%s(" % func, "").strip().split(",")
-                    arg1, arg2, arg3 = [x.strip() for x in args]
-                    if arg1 in timeUnits:
-                        if self.__isDateTime(arg2) or arg2.isalnum():
-                            if self.__isDateTime(arg3) or arg3.isalnum():
-                                return S_OK(myString)
-                    # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
-                    return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
+            if isFunction is False:
+                # self.log.debug('__escape_string: Could not escape string', '"%s"' % myString)
+                return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
 
             escape_string = connection.escape_string(myString.encode()).decode()
             # self.log.debug('__escape_string: returns', '"%s"' % escape_string)
@@ -487,6 +734,56 @@ class MySQL(object):
         except Exception as x:
             return self._except("__escape_string", x, "Could not escape string", myString)
 
+    def __sqlValue(self, value):
+        """
+        Get the statement fragment and the parameters to bind for a value, following the same
+        rules as _escapeValues: SQL time functions and booleans are inlined, everything else
+        is bound as a string, tuples and lists give a parenthesised list of values.
+        No connection is needed, the values are escaped by the driver when binding.
+
+        :return: S_OK((fragment, list of parameters))/S_ERROR
+        """
+        if isinstance(value, (tuple, list)):
+            fragments = []
+            args = []
+            for val in value:
+                result = self.__sqlValue(val)
+                if not result["OK"]:
+                    return result
+                fragments.append(result["Value"][0])
+                args.extend(result["Value"][1])
+            return S_OK(("(" + ", ".join(fragments) + ")", args))
+        if isinstance(value, bool):
+            return S_OK((str(value), []))
+        if isinstance(value, bytes):
+            value = value.decode()
+        try:
+            value = str(value)
+        except ValueError:
+            return S_ERROR(DErrno.EMYSQL, "Cannot escape value!")
+        isFunction = self.__checkSQLFunction(value)
+        if isFunction:
+            return S_OK((_escapePercent(value), []))
+        if isFunction is False:
+            return S_ERROR(DErrno.EMYSQL, "__escape_string: Could not escape string")
+        return S_OK(("%s", [value]))
+
+    def _sqlValues(self, inValues=None):
+        """
+        Parameterised counterpart of _escapeValues
+
+        :return: S_OK((list of fragments, list of parameters to bind))/S_ERROR
+        """
+        fragments = []
+        args = []
+        for value in inValues or []:
+            result = self.__sqlValue(value)
+            if not result["OK"]:
+                return result
+            fragments.append(result["Value"][0])
+            args.extend(result["Value"][1])
+        return S_OK((fragments, args))
+
     def __checkTable(self, tableName, force=False):
         """Check if a table exists by issuing 'SHOW TABLES'
 
@@ -528,16 +825,22 @@ class MySQL(object):
         Escapes all strings in the list of values provided
         """
         # self.log.debug('_escapeValues:', inValues)
-        retDict = self._getConnection()
+        if not inValues:
+            return S_OK([])
+
+        retDict = self.__getQueryConnection()
         if not retDict["OK"]:
             return retDict
-        connection = retDict["Value"]
+        try:
+            return self.__escapeValues(inValues, retDict["Value"])
+        finally:
+            self.__connectionPool.release()
 
+    def __escapeValues(self, inValues, connection):
+        """
+        Escapes all strings in the list of values provided with the given connection
+        """
         inEscapeValues = []
-
-        if not inValues:
-            return S_OK(inEscapeValues)
-
         for value in inValues:
             if isinstance(value, str):
                 retDict = self.__escapeString(value, connection=connection)
@@ -583,17 +886,20 @@ class MySQL(object):
             return S_OK()
 
         # Test the connection to the DB
-        retDict = self._getConnection()
+        retDict = self.__getQueryConnection()
+        self.__connectionPool.release()
         if not retDict["OK"]:
             return retDict
         self._connected = True
         return S_OK()
 
-    def _query(self, cmd, conn=None, debug=False):
+    def _query(self, cmd, conn=None, debug=False, args=None):
         """
         execute MySQL query command
 
         :param debug: unused
+        :param args: parameters to bind to the "%s" placeholders of cmd. If given,
+                     literal "%" in cmd must be doubled
 
         return S_OK structure with fetchall result as tuple
         it returns an empty tuple if no matching rows are found
@@ -602,14 +908,14 @@ class MySQL(object):
 
         self.log.debug("_query: %s" % self._safeCmd(cmd))
 
-        retDict = self._getConnection()
+        retDict = self.__getQueryConnection()
         if not retDict["OK"]:
             return retDict
         connection = retDict["Value"]
 
         try:
             cursor = connection.cursor()
-            if cursor.execute(cmd):
+            if cursor.execute(cmd, args):
                 res = cursor.fetchall()
             else:
                 res = ()
@@ -630,13 +936,16 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self.__connectionPool.release()
 
         return retDict
 
-    def _update(self, cmd, conn=None, debug=False):
+    def _update(self, cmd, conn=None, debug=False, args=None):
         """execute MySQL update command
 
         :param debug: unused
+        :param args: parameters to bind to the "%s" placeholders of cmd. If given,
+                     literal "%" in cmd must be doubled
 
         return S_OK with number of updated registers upon success
         return S_ERROR upon error
@@ -644,14 +953,14 @@ class MySQL(object):
 
         self.log.debug("_update: %s" % self._safeCmd(cmd))
 
-        retDict = self._getConnection()
+        retDict = self.__getQueryConnection()
         if not retDict["OK"]:
             return retDict
         connection = retDict["Value"]
 
         try:
             cursor = connection.cursor()
-            res = cursor.execute(cmd)
+            res = cursor.execute(cmd, args)
             retDict = S_OK(res)
             if cursor.lastrowid:
                 retDict["lastRowId"] = cursor.lastrowid
@@ -662,6 +971,43 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self.__connectionPool.release()
+
+        return retDict
+
+    def _executemany(self, cmd, argsList, conn=None):
+        """execute the same MySQL update command for several sets of parameters
+
+        For "INSERT ... VALUES (...)" statements the driver sends all the rows in a
+        single multi-row INSERT.
+
+        :param str cmd: statement template with "%s" placeholders
+        :param list argsList: list of tuples of parameters, one per execution
+
+        return S_OK with number of updated registers upon success
+        return S_ERROR upon error
+        """
+        if not argsList:
+            return S_OK(0)
+
+        self.log.debug("_executemany: %s (%d rows)" % (self._safeCmd(cmd), len(argsList)))
+
+        retDict = self.__getQueryConnection()
+        if not retDict["OK"]:
+            return retDict
+        connection = retDict["Value"]
+
+        try:
+            cursor = connection.cursor()
+            retDict = S_OK(cursor.executemany(cmd, argsList))
+        except Exception as x:
+            retDict = self._except("_executemany", x, "Execution failed.", cmd)
+
+        try:
+            cursor.close()
+        except Exception:
+            pass
+        self.__connectionPool.release()
 
         return retDict
 
@@ -680,7 +1026,7 @@ class MySQL(object):
         # # get connection
         connection = conn
         if not connection:
-            retDict = self._getConnection()
+            retDict = self.__getQueryConnection()
             if not retDict["OK"]:
                 return retDict
             connection = retDict["Value"]
@@ -696,9 +1042,13 @@ class MySQL(object):
             self.logger.exception(error)
             # # rollback, put back connection to the pool
             connection.rollback()
+            if not conn:
+                self.__connectionPool.release()
             return S_ERROR(DErrno.EMYSQL, error)
         # # close cursor, put back connection to the pool
         cursor.close()
+        if not conn:
+            self.__connectionPool.release()
         return S_OK(cmdRet)
 
     def _createViews(self, viewsDict, force=False):
@@ -932,6 +1282,24 @@ class MySQL(object):
 
         return self.__connectionPool.get(self.__dbName, retries)
 
+    def __getQueryConnection(self):
+        """Get a connection for the statements of a single method, to be given back to the pool
+        with :py:meth:`ConnectionPool.release` once they are done
+        """
+        if not self.__initialized:
+            error = "DB not properly initialized"
+            gLogger.error(error)
+            return S_ERROR(DErrno.EMYSQL, error)
+
+        return self.__connectionPool.get(self.__dbName, MAXCONNECTRETRY, hold=False)
+
+    def getConnectionPoolStats(self):
+        """Get the usage counters of the connection pool used by this instance
+
+        :return: S_OK(dict) - see :py:meth:`ConnectionPool.getStats`
+        """
+        return S_OK(self.__connectionPool.getStats())
+
     ########################################################################################
     #
     #  Transaction functions
@@ -1072,7 +1440,7 @@ class MySQL(object):
         return S_OK(attr_list)
 
     #############################################################################
-    def buildCondition(
+    def buildConditionWithArgs(
         self,
         condDict=None,
         older=None,
@@ -1085,18 +1453,23 @@ class MySQL(object):
         offset=None,
         useLikeQuery=False,
     ):
-        """Build SQL condition statement from provided condDict and other extra check on
-        a specified time stamp.
-        The conditions dictionary specifies for each attribute one or a List of possible
-        values
-        greater and smaller are dictionaries in which the keys are the names of the fields,
-        that are requested to be >= or < than the corresponding value.
-        For compatibility with current usage it uses Exceptions to exit in case of
-        invalid arguments
-        For performing LIKE queries use the parameter useLikeQuery=True
+        """Same as :py:meth:`buildCondition`, but the values are not escaped into the
+        statement: "%s" placeholders are used instead and the values are returned
+        to be bound by _query/_update (no connection is needed to build the condition).
+
+        :return: tuple (condition template, list of parameters)
         """
         condition = ""
         conjunction = "WHERE"
+        args = []
+
+        def sqlValue(value):
+            retDict = self._sqlValues([value])
+            if not retDict["OK"]:
+                # self.log.debug('buildCondition:', retDict['Message'])
+                raise Exception(retDict["Message"])
+            args.extend(retDict["Value"][1])
+            return retDict["Value"][0][0]
 
         if condDict is not None:
             for aName, attrValue in condDict.items():
@@ -1108,31 +1481,18 @@ class MySQL(object):
                     error = "Invalid condDict argument"
                     # self.log.debug('buildCondition:', error)
                     raise Exception(error)
+                attrName = _escapePercent(attrName)
                 if isinstance(attrValue, list):
-                    retDict = self._escapeValues(attrValue)
-                    if not retDict["OK"]:
-                        # self.log.debug('buildCondition:', retDict['Message'])
-                        raise Exception(retDict["Message"])
-                    else:
-                        escapeInValues = retDict["Value"]
-                        multiValue = ", ".join(escapeInValues)
-                        condition = " %s %s %s IN ( %s )" % (condition, conjunction, attrName, multiValue)
-                        conjunction = "AND"
+                    multiValue = ", ".join(sqlValue(value) for value in attrValue)
+                    condition = " %s %s %s IN ( %s )" % (condition, conjunction, attrName, multiValue)
+                    conjunction = "AND"
                 else:
-                    retDict = self._escapeValues([attrValue])
-                    if not retDict["OK"]:
-                        # self.log.debug('buildCondition:', retDict['Message'])
-                        raise Exception(retDict["Message"])
+                    inValue = sqlValue(attrValue)
+                    if useLikeQuery:
+                        condition = " %s %s %s LIKE %s" % (condition, conjunction, attrName, inValue)
                     else:
-                        escapeInValue = retDict["Value"][0]
-                        if useLikeQuery:
-                            condition = " %s %s %s LIKE %s" % (condition, conjunction, attrName, escapeInValue)
-                        else:
-                            if escapeInValue == "NULL":
-                                condition = " %s %s %s IS NULL" % (condition, conjunction, attrName)
-                            else:
-                                condition = " %s %s %s = %s" % (condition, conjunction, attrName, escapeInValue)
-                        conjunction = "AND"
+                        condition = " %s %s %s = %s" % (condition, conjunction, attrName, inValue)
+                    conjunction = "AND"
 
         if timeStamp:
             timeStamp = _quotedList([timeStamp])
@@ -1140,57 +1500,30 @@ class MySQL(object):
                 error = "Invalid timeStamp argument"
                 # self.log.debug('buildCondition:', error)
                 raise Exception(error)
+            timeStamp = _escapePercent(timeStamp)
             if newer:
-                retDict = self._escapeValues([newer])
-                if not retDict["OK"]:
-                    # self.log.debug('buildCondition:', retDict['Message'])
-                    raise Exception(retDict["Message"])
-                else:
-                    escapeInValue = retDict["Value"][0]
-                    condition = " %s %s %s >= %s" % (condition, conjunction, timeStamp, escapeInValue)
-                    conjunction = "AND"
+                condition = " %s %s %s >= %s" % (condition, conjunction, timeStamp, sqlValue(newer))
+                conjunction = "AND"
             if older:
-                retDict = self._escapeValues([older])
-                if not retDict["OK"]:
-                    # self.log.debug('buildCondition:', retDict['Message'])
-                    raise Exception(retDict["Message"])
-                else:
-                    escapeInValue = retDict["Value"][0]
-                    condition = " %s %s %s < %s" % (condition, conjunction, timeStamp, escapeInValue)
-
-        if isinstance(greater, dict):
-            for attrName, attrValue in greater.items():
-                attrName = _quotedList([attrName])
-                if not attrName:
-                    error = "Invalid greater argument"
-                    # self.log.debug('buildCondition:', error)
-                    raise Exception(error)
-
-                retDict = self._escapeValues([attrValue])
-                if not retDict["OK"]:
-                    # self.log.debug('buildCondition:', retDict['Message'])
-                    raise Exception(retDict["Message"])
-                else:
-                    escapeInValue = retDict["Value"][0]
-                    condition = " %s %s %s >= %s" % (condition, conjunction, attrName, escapeInValue)
-                    conjunction = "AND"
+                condition = " %s %s %s < %s" % (condition, conjunction, timeStamp, sqlValue(older))
 
-        if isinstance(smaller, dict):
-            for attrName, attrValue in smaller.items():
+        for operator, limitDict, argName in ((">=", greater, "greater"), ("<", smaller, "smaller")):
+            if not isinstance(limitDict, dict):
+                continue
+            for attrName, attrValue in limitDict.items():
                 attrName = _quotedList([attrName])
                 if not attrName:
-                    error = "Invalid smaller argument"
+                    error = "Invalid %s argument" % argName
                     # self.log.debug('buildCondition:', error)
                     raise Exception(error)
-
-                retDict = self._escapeValues([attrValue])
-                if not retDict["OK"]:
-                    # self.log.debug('buildCondition:', retDict['Message'])
-                    raise Exception(retDict["Message"])
-                else:
-                    escapeInValue = retDict["Value"][0]
-                    condition = " %s %s %s < %s" % (condition, conjunction, attrName, escapeInValue)
-                    conjunction = "AND"
+                condition = " %s %s %s %s %s" % (
+                    condition,
+                    conjunction,
+                    _escapePercent(attrName),
+                    operator,
+                    sqlValue(attrValue),
+                )
+                conjunction = "AND"
 
         orderList = []
         orderAttrList = orderAttribute
@@ -1213,13 +1546,13 @@ class MySQL(object):
             if len(orderAttr.split(":")) == 2:
                 orderType = orderAttr.split(":")[1].upper()
                 if orderType in ["ASC", "DESC"]:
-                    orderList.append("%s %s" % (orderField, orderType))
+                    orderList.append("%s %s" % (_escapePercent(orderField), orderType))
                 else:
                     error = "Invalid orderAttribute argument"
                     # self.log.debug('buildCondition:', error)
                     raise Exception(error)
             else:
-                orderList.append(orderAttr)
+                orderList.append(_escapePercent(orderAttr))
 
         if orderList:
             condition = "%s ORDER BY %s" % (condition, ", ".join(orderList))
@@ -1230,7 +1563,54 @@ class MySQL(object):
             else:
                 condition = "%s LIMIT %d" % (condition, limit)
 
-        return condition
+        return condition, args
+
+    #############################################################################
+    def buildCondition(
+        self,
+        condDict=None,
+        older=None,
+        newer=None,
+        timeStamp=None,
+        orderAttribute=None,
+        limit=False,
+        greater=None,
+        smaller=None,
+        offset=None,
+        useLikeQuery=False,
+    ):
+        """Build SQL condition statement from provided condDict and other extra check on
+        a specified time stamp.
+        The conditions dictionary specifies for each attribute one or a List of possible
+        values
+        greater and smaller are dictionaries in which the keys are the names of the fields,
+        that are requested to be >= or < than the corresponding value.
+        For compatibility with current usage it uses Exceptions to exit in case of
+        invalid arguments
+        For performing LIKE queries use the parameter useLikeQuery=True
+
+        The values are escaped into the returned statement, use :py:meth:`buildConditionWithArgs`
+        to get them as parameters to bind instead.
+        """
+        condition, args = self.buildConditionWithArgs(
+            condDict=condDict,
+            older=older,
+            newer=newer,
+            timeStamp=timeStamp,
+            orderAttribute=orderAttribute,
+            limit=limit,
+            greater=greater,
+            smaller=smaller,
+            offset=offset,
+            useLikeQuery=useLikeQuery,
+        )
+        if not args:
+            return condition % ()
+        retDict = self._escapeValues(args)
+        if not retDict["OK"]:
+            # self.log.debug('buildCondition:', retDict['Message'])
+            raise Exception(retDict["Message"])
+        return condition % tuple(retDict["Value"])
 
     #############################################################################
     def getFields(
@@ -1283,7 +1663,7 @@ class MySQL(object):
             except TypeError:
                 mylimit = limit
                 myoffset = None
-            condition = self.buildCondition(
+            condition, args = self.buildConditionWithArgs(
                 condDict=condDict,
                 older=older,
                 newer=newer,
@@ -1298,7 +1678,8 @@ class MySQL(object):
         except Exception as x:
             return S_ERROR(DErrno.EMYSQL, x)
 
-        return self._query("SELECT %s FROM %s %s" % (quotedOutFields, table, condition), conn)
+        cmd = "SELECT %s FROM %s %s" % (_escapePercent(quotedOutFields), _escapePercent(table), condition)
+        return self._query(cmd, conn, args=args)
 
     #############################################################################
     def deleteEntries(
@@ -1329,7 +1710,7 @@ class MySQL(object):
         # self.log.debug('deleteEntries:', 'deleting rows from table %s.' % table)
 
         try:
-            condition = self.buildCondition(
+            condition, args = self.buildConditionWithArgs(
                 condDict=condDict,
                 older=older,
                 newer=newer,
@@ -1342,7 +1723,7 @@ class MySQL(object):
         except Exception as x:
             return S_ERROR(DErrno.EMYSQL, x)
 
-        return self._update("DELETE FROM %s %s" % (table, condition), conn)
+        return self._update("DELETE FROM %s %s" % (_escapePercent(table), condition), conn, args=args)
 
     #############################################################################
     def updateFields(
@@ -1402,16 +1783,16 @@ class MySQL(object):
                 # self.log.debug('updateFields:', error)
                 return S_ERROR(DErrno.EMYSQL, error)
 
-        updateValues = self._escapeValues(updateValues)
-        if not updateValues["OK"]:
-            # self.log.debug('updateFields:', updateValues['Message'])
-            return updateValues
-        updateValues = updateValues["Value"]
+        retDict = self._sqlValues(updateValues)
+        if not retDict["OK"]:
+            # self.log.debug('updateFields:', retDict['Message'])
+            return retDict
+        fragments, updateArgs = retDict["Value"]
 
         # self.log.debug('updateFields:', 'updating fields %s from table %s.' % (', '.join(updateFields), table))
 
         try:
-            condition = self.buildCondition(
+            condition, condArgs = self.buildConditionWithArgs(
                 condDict=condDict,
                 older=older,
                 newer=newer,
@@ -1424,11 +1805,13 @@ class MySQL(object):
         except Exception as x:
             return S_ERROR(DErrno.EMYSQL, x)
 
-        updateString = ",".join(
-            ["%s = %s" % (_quotedList([updateFields[k]]), updateValues[k]) for k in range(len(updateFields))]
-        )
+        updateString = _updateTemplate(table, tuple(updateFields), tuple(fragments))
+        if updateString is None:
+            error = "Invalid updateFields arguments"
+            # self.log.debug('updateFields:', error)
+            return S_ERROR(DErrno.EMYSQL, error)
 
-        return self._update("UPDATE %s SET %s %s" % (table, updateString, condition), conn)
+        return self._update("%s %s" % (updateString, condition), conn, args=updateArgs + condArgs)
 
     #############################################################################
     def insertFields(self, tableName, inFields=None, inValues=None, conn=None, inDict=None):
@@ -1465,28 +1848,25 @@ class MySQL(object):
                 # self.log.debug('insertFields:', error)
                 return S_ERROR(DErrno.EMYSQL, error)
 
-        inFieldString = _quotedList(inFields)
-        if inFieldString is None:
-            error = "Invalid inFields arguments"
-            # self.log.debug('insertFields:', error)
-            return S_ERROR(DErrno.EMYSQL, error)
-
-        inFieldString = "(  %s )" % inFieldString
-
-        retDict = self._escapeValues(inValues)
+        retDict = self._sqlValues(inValues)
         if not retDict["OK"]:
             # self.log.debug('insertFields:', retDict['Message'])
             return retDict
-        inValueString = ", ".join(retDict["Value"])
-        inValueString = "(  %s )" % inValueString
+        fragments, args = retDict["Value"]
+
+        cmd = _insertTemplate(table, tuple(inFields), tuple(fragments))
+        if cmd is None:
+            error = "Invalid inFields arguments"
+            # self.log.debug('insertFields:', error)
+            return S_ERROR(DErrno.EMYSQL, error)
 
         # self.log.debug('insertFields:', 'inserting %s into table %s'
         #               % (inFieldString, table))
 
-        return self._update("INSERT INTO %s %s VALUES %s" % (table, inFieldString, inValueString), conn)
+        return self._update(cmd, conn, args=args)
 
     def executeStoredProcedure(self, packageName, parameters, outputIds):
-        conDict = self._getConnection()
+        conDict = self.__getQueryConnection()
         if not conDict["OK"]:
             return conDict
 
@@ -1508,11 +1888,12 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self.__connectionPool.release()
         return retDict
 
     # For the procedures that execute a select without storing the result
     def executeStoredProcedureWithCursor(self, packageName, parameters):
-        conDict = self._getConnection()
+        conDict = self.__getQueryConnection()
         if not conDict["OK"]:
             return conDict
 
@@ -1534,5 +1915,6 @@ class MySQL(object):
             cursor.close()
         except Exception:
             pass
+        self.__connectionPool.release()
 
         return retDict
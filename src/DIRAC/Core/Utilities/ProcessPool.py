@@ -540,6 +540,10 @@ class ProcessTask(object):
                 retDict["Value"] = str(x)
                 retDict["Exc_info"] = sys.exc_info()[1]
                 self.__taskException = retDict
+        finally:
+            # the arguments are not needed anymore, don't send them back with the results
+            self.__taskArgs = []
+            self.__taskKwArgs = {}
 
 
 class ProcessPool(object):
@@ -15,7 +15,12 @@ from string import printable
 import datetime
 import sys
 
-from DIRAC.Core.Utilities.DEncode import encode as disetEncode, decode as disetDecode, g_dEncodeFunctions
+from DIRAC.Core.Utilities.DEncode import (
+    encode as disetEncode,
+    decode as disetDecode,
+    g_dEncodeFunctions,
+    g_dDecodeFunctions,
+)
 from DIRAC.Core.Utilities.JEncode import encode as jsonEncode, decode as jsonDecode, JSerializable
 from DIRAC.Core.Utilities.MixedEncode import encode as mixEncode, decode as mixDecode
 
@@ -276,6 +281,19 @@ def test_nestedStructure(enc_dec_without_json, data):
     agnosticTestFunction(enc_dec_without_json, data)
 
 
+@settings(suppress_health_check=function_scoped)
+@given(data=nestedStrategy | floats(allow_nan=False) | binary())
+def test_fastPathWireFormat(data):
+    """The fast path of DEncode must produce and read exactly the format of the per type functions"""
+    eList = []
+    g_dEncodeFunctions[type(data)](data, eList)
+    encodedData = b"".join(eList)
+    assert disetEncode(data) == encodedData
+    assert disetDecode(encodedData) == g_dDecodeFunctions[encodedData[0]](encodedData, 0)
+    # The receive buffers of the transports are given without copy
+    assert disetDecode(bytearray(encodedData)) == disetDecode(encodedData)
+
+
 # DEncode raises KeyError.....
 # Others raise TypeError
 # @parametrize('enc_dec', enc_dec_imp)
@@ -0,0 +1,99 @@
+""" Test the connection pool of the MySQL utilities, without a MySQL server
+"""
+import threading
+import time
+
+import pytest
+
+from DIRAC.Core.Utilities.MySQL import ConnectionPool, MySQL
+
+
+@pytest.fixture
+def connect(mocker):
+    return mocker.patch("DIRAC.Core.Utilities.MySQL.MySQLdb.connect")
+
+
+def inThread(function):
+    """Run function in another thread and return its result"""
+    results = []
+    thread = threading.Thread(target=lambda: results.append(function()))
+    thread.start()
+    thread.join()
+    return results[0]
+
+
+def test_releasedConnectionIsShared(connect):
+    """With a limit, the connection is given back after each use and reused by the other threads"""
+    pool = ConnectionPool("host", "user", "passwd", maxConnections=1, maxWaitTime=0.1)
+
+    def query():
+        result = pool.get("db", hold=False)
+        pool.release()
+        return result
+
+    for _ in range(3):
+        assert inThread(query)["OK"]
+    assert connect.call_count == 1
+    assert pool.getStats()["Assigned"] == 0
+
+
+def test_heldConnection(connect):
+    """A held connection, or one in a transaction, is not released"""
+    pool = ConnectionPool("host", "user", "passwd", maxConnections=2, maxWaitTime=0.1)
+
+    assert pool.get("db")["OK"]
+    pool.release()
+    assert pool.getStats()["Assigned"] == 1
+
+    def transaction():
+        assert pool.transactionStart("db")["OK"]
+        pool.get("db", hold=False)
+        pool.release()
+        assigned = pool.getStats()["Assigned"]
+        assert pool.transactionCommit("db")["OK"]
+        return assigned, pool.getStats()["Assigned"]
+
+    assert inThread(transaction) == (2, 1)
+
+
+def test_brokenConnectionClosed(connect, mocker):
+    """A connection failing the ping is closed and replaced"""
+    broken = mocker.MagicMock()
+    broken.ping.side_effect = Exception("Gone away")
+    connection = mocker.MagicMock()
+    connect.side_effect = [broken, connection]
+    pool = ConnectionPool("host", "user", "passwd", pingInterval=0)
+
+    result = pool.get("db")
+    assert result["OK"]
+    assert result["Value"] is connection
+    broken.close.assert_called_once()
+    assert pool.getStats()["FailedPings"] == 1
+
+
+def test_poolExhausted(connect):
+    """Without a free connection in time, the error is returned without retrying"""
+    pool = ConnectionPool("host", "user", "passwd", maxConnections=1, maxWaitTime=0.1)
+    assert pool.get("db")["OK"]
+
+    start = time.time()
+    result = inThread(lambda: pool.get("db"))
+    assert not result["OK"]
+    assert "No free connection" in result["Message"]
+    assert time.time() - start < 1
+    assert pool.getStats()["Waits"] == 1
+
+
+def test_escapingReleasesConnection(connect):
+    """Escaping values does not keep the connection of the thread out of the pool"""
+    db = MySQL(hostName="escapeHost", maxConnections=1)
+
+    def escape():
+        assert db._escapeString("value")["OK"]
+        assert db._escapeValues(["value", 1, ("a", "b")])["OK"]
+        return db.getConnectionPoolStats()["Value"]["Assigned"]
+
+    assert inThread(escape) == 0
+    # Another thread gets the only connection of the pool
+    assert inThread(escape) == 0
+    assert connect.call_count == 1
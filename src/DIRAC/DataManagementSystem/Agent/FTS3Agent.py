@@ -18,10 +18,12 @@ from __future__ import print_function
 
 __RCSID__ = "$Id$"
 
+import asyncio
 import errno
 import time
 
 # from threading import current_thread
+from concurrent.futures import ThreadPoolExecutor
 from multiprocessing.pool import ThreadPool
 
 # We use the dummy module because we use the ThreadPool
@@ -95,6 +97,12 @@ class FTS3Agent(AgentModule):
         self.maxKick = self.am_getOption("KickLimitPerCycle", 100)
         self.deleteDelay = self.am_getOption("DeleteGraceDays", 180)
         self.maxDelete = self.am_getOption("DeleteLimitPerCycle", 100)
+        # Monitor the jobs in bulk on an asyncio event loop instead of one by one in the threads
+        self.asyncMonitoring = self.am_getOption("AsyncMonitoring", False)
+        # Number of jobs whose status is queried in a single call in asynchronous mode
+        self.monitoringBulkSize = self.am_getOption("MonitoringBulkSize", 100)
+        # Number of simultaneous calls to an FTS server in asynchronous mode
+        self.maxConnectionsPerServer = self.am_getOption("MaxConnectionsPerServer", 4)
         # lifetime of the proxy we download to delegate to FTS
         self.proxyLifetime = self.am_getOption("ProxyLifetime", PROXY_LIFETIME)
 
@@ -118,6 +126,8 @@ class FTS3Agent(AgentModule):
 
         self.jobsThreadPool = ThreadPool(self.maxNumberOfThreads)
         self.opsThreadPool = ThreadPool(self.maxNumberOfThreads)
+        # Used instead of the jobsThreadPool by the asynchronous monitoring
+        self.monitoringExecutor = ThreadPoolExecutor(self.maxNumberOfThreads)
 
         return res
 
@@ -222,46 +232,160 @@ class FTS3Agent(AgentModule):
 
             res = ftsJob.monitor(context=context)
 
-            if not res["OK"]:
-                log.error("Error monitoring job", res)
+            return ftsJob, self._storeMonitoredJob(ftsJob, res)
 
-                # If the job was not found on the server, update the DB
-                if cmpError(res, errno.ESRCH):
-                    res = self.fts3db.cancelNonExistingJob(ftsJob.operationID, ftsJob.ftsGUID)
+        except Exception as e:
+            log.exception("Exception while monitoring job", repr(e))
+            return ftsJob, S_ERROR(0, "Exception %s" % repr(e))
 
-                return ftsJob, res
+    def _storeMonitoredJob(self, ftsJob, res):
+        """* update the FTSFile status
+        * update the FTSJob status
 
-            # { fileID : { Status, Error } }
-            filesStatus = res["Value"]
+        :param ftsJob: FTS job
+        :param res: result of the monitoring of the job, S_OK({ fileID : { Status, Error } })/S_ERROR()
 
-            # Specify the job ftsGUID to make sure we do not overwrite
-            # status of files already taken by newer jobs
-            res = self.fts3db.updateFileStatus(filesStatus, ftsGUID=ftsJob.ftsGUID)
+        :return: S_OK()/S_ERROR()
+        """
+        log = gLogger.getLocalSubLogger("_monitorJob/%s" % ftsJob.jobID)
 
-            if not res["OK"]:
-                log.error("Error updating file fts status", "%s, %s" % (ftsJob.ftsGUID, res))
-                return ftsJob, res
+        if not res["OK"]:
+            log.error("Error monitoring job", res)
+
+            # If the job was not found on the server, update the DB
+            if cmpError(res, errno.ESRCH):
+                res = self.fts3db.cancelNonExistingJob(ftsJob.operationID, ftsJob.ftsGUID)
+
+            return res
 
-            upDict = {
-                ftsJob.jobID: {
-                    "status": ftsJob.status,
-                    "error": ftsJob.error,
-                    "completeness": ftsJob.completeness,
-                    "operationID": ftsJob.operationID,
-                    "lastMonitor": True,
-                }
+        # { fileID : { Status, Error } }
+        filesStatus = res["Value"]
+
+        # Specify the job ftsGUID to make sure we do not overwrite
+        # status of files already taken by newer jobs
+        res = self.fts3db.updateFileStatus(filesStatus, ftsGUID=ftsJob.ftsGUID)
+
+        if not res["OK"]:
+            log.error("Error updating file fts status", "%s, %s" % (ftsJob.ftsGUID, res))
+            return res
+
+        upDict = {
+            ftsJob.jobID: {
+                "status": ftsJob.status,
+                "error": ftsJob.error,
+                "completeness": ftsJob.completeness,
+                "operationID": ftsJob.operationID,
+                "lastMonitor": True,
             }
-            res = self.fts3db.updateJobStatus(upDict)
+        }
+        res = self.fts3db.updateJobStatus(upDict)
+
+        if ftsJob.status in ftsJob.FINAL_STATES:
+            self.__sendAccounting(ftsJob)
+
+        return res
+
+    def _monitorJobsBulk(self, ftsJobs, slot=0):
+        """* query the FTS server for the status of several jobs at once
 
-            if ftsJob.status in ftsJob.FINAL_STATES:
-                self.__sendAccounting(ftsJob)
+        The jobs must share the same user, group and FTS server.
+        They all use the context of the given connection slot to the server, so two calls
+        with the same slot, jobs owner and server must not be made at the same time.
 
-            return ftsJob, res
+        :param ftsJobs: FTS jobs
+        :param int slot: connection slot to the FTS server, from 0 to self.maxConnectionsPerServer - 1
+
+        :return: S_OK({ftsGUID: S_OK({ fileID : { Status, Error } })/S_ERROR()})/S_ERROR()
+        """
+        ftsJob = ftsJobs[0]
+        log = gLogger.getLocalSubLogger("_monitorJobsBulk/%s" % ftsJob.ftsServer)
+
+        # General try catch to avoid that the tread dies
+        try:
+            res = self.getFTS3Context(
+                ftsJob.username, ftsJob.userGroup, ftsJob.ftsServer, threadID="AsyncMonitoring-%d" % slot
+            )
+            if not res["OK"]:
+                log.error("Error getting context", res)
+                return res
+            context = res["Value"]
+
+            res = FTS3Job.monitorJobs(context, ftsJobs)
+            if not res["OK"]:
+                log.error("Error monitoring jobs", res)
+            return res
 
         except Exception as e:
-            log.exception("Exception while monitoring job", repr(e))
+            log.exception("Exception while monitoring jobs", repr(e))
+            return S_ERROR(0, "Exception %s" % repr(e))
+
+    def _storeMonitoredJobSafe(self, ftsJob, res):
+        """Same as _storeMonitoredJob, but never raises
+
+        :return: ftsJob, S_OK()/S_ERROR()
+        """
+        try:
+            return ftsJob, self._storeMonitoredJob(ftsJob, res)
+        except Exception as e:
+            gLogger.exception("Exception while storing the job status", "%s: %r" % (ftsJob.jobID, e))
             return ftsJob, S_ERROR(0, "Exception %s" % repr(e))
 
+    def _monitorJobsAsync(self, activeJobs):
+        """Monitor the jobs on an asyncio event loop, querying the status of several jobs at once
+
+        The jobs are grouped by user, group and FTS server, and the status of up to
+        self.monitoringBulkSize jobs is obtained with a single REST call.
+        At most self.maxConnectionsPerServer calls are made at the same time to a server, each of them
+        in its own connection slot, which has its own context per user and group.
+        The statuses of the jobs of a call are then stored concurrently.
+        The blocking calls (FTS client and DB) are executed in self.monitoringExecutor.
+
+        :param activeJobs: FTS jobs to monitor
+
+        :return: S_OK()
+        """
+        ftsJobsByContext = {}
+        for ftsJob in activeJobs:
+            ftsJobsByContext.setdefault((ftsJob.username, ftsJob.userGroup, ftsJob.ftsServer), []).append(ftsJob)
+
+        async def monitorAll():
+            loop = asyncio.get_running_loop()
+            # Free connection slots of each server
+            serverSlots = {}
+            for _username, _userGroup, ftsServer in ftsJobsByContext:
+                if ftsServer not in serverSlots:
+                    serverSlots[ftsServer] = asyncio.Queue()
+                    for slot in range(max(1, self.maxConnectionsPerServer)):
+                        serverSlots[ftsServer].put_nowait(slot)
+
+            async def storeJob(ftsJob, res):
+                returnedValue = await loop.run_in_executor(
+                    self.monitoringExecutor, self._storeMonitoredJobSafe, ftsJob, res
+                )
+                self._monitorJobCallback(returnedValue)
+
+            async def monitorBulk(idTuple, ftsJobs):
+                slots = serverSlots[idTuple[2]]
+                slot = await slots.get()
+                try:
+                    res = await loop.run_in_executor(self.monitoringExecutor, self._monitorJobsBulk, ftsJobs, slot)
+                finally:
+                    slots.put_nowait(slot)
+                if not res["OK"]:
+                    return
+                await asyncio.gather(*[storeJob(ftsJob, res["Value"][ftsJob.ftsGUID]) for ftsJob in ftsJobs])
+
+            await asyncio.gather(
+                *[
+                    monitorBulk(idTuple, ftsJobs[i : i + self.monitoringBulkSize])
+                    for idTuple, ftsJobs in ftsJobsByContext.items()
+                    for i in range(0, len(ftsJobs), self.monitoringBulkSize)
+                ]
+            )
+
+        asyncio.run(monitorAll())
+        return S_OK()
+
     @staticmethod
     def _monitorJobCallback(returnedValue):
         """Callback when a job has been monitored
@@ -297,6 +421,9 @@ class FTS3Agent(AgentModule):
         activeJobs = res["Value"]
         log.info("%s jobs to queue for monitoring" % len(activeJobs))
 
+        if self.asyncMonitoring:
+            return self._monitorJobsAsync(activeJobs)
+
         # We store here the AsyncResult object on which we are going to wait
         applyAsyncResults = []
 
@@ -589,6 +716,8 @@ class FTS3Agent(AgentModule):
 
         log.debug("opsThreadPool joined")
 
+        self.monitoringExecutor.shutdown()
+
         return S_OK()
 
     def execute(self):
@@ -47,13 +47,19 @@ class ArchiveFiles(OperationHandlerBase):
         gMonitor.registerActivity(
             "ArchiveFilesFail", "Requests failed", "RequestExecutingAgent", "Files/min", gMonitor.OP_SUM
         )
-        self.cacheFolder = os.environ.get("AGENT_WORKDIRECTORY")
+        self.workDirectory = os.environ.get("AGENT_WORKDIRECTORY")
+        self.cacheFolder = None
         self.parameterDict = {}
         self.waitingFiles = []
         self.lfns = []
 
     def __call__(self):
         """Process the ArchiveFiles operation."""
+        # The handler is reused for the next requests, forget about the previous one
+        self.cacheFolder = None
+        self.parameterDict = {}
+        self.waitingFiles = []
+        self.lfns = []
         try:
             gMonitor.addMark("ArchiveFilesAtt", 1)
             self._run()
@@ -73,7 +79,7 @@ class ArchiveFiles(OperationHandlerBase):
     def _run(self):
         """Execute the download and tarring."""
         self.parameterDict = DEncode.decode(self.operation.Arguments)[0]  # tuple: dict, number of characters
-        self.cacheFolder = os.path.join(self.cacheFolder, self.request.RequestName)
+        self.cacheFolder = os.path.join(self.workDirectory, self.request.RequestName)
         self._checkArchiveLFN()
         for parameter, value in self.parameterDict.items():
             self.log.info("Parameters: %s = %s" % (parameter, value))
@@ -236,6 +242,8 @@ class ArchiveFiles(OperationHandlerBase):
                 os.remove(os.path.basename(self.parameterDict["ArchiveLFN"]))
         except OSError as e:
             self.log.debug("Error when removing tarball: %s" % str(e))
+        if not self.cacheFolder:
+            return
         try:
             shutil.rmtree(self.cacheFolder, ignore_errors=True)
         except OSError as e:
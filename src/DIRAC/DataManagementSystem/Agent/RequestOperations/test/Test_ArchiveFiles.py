@@ -133,7 +133,8 @@ def test_constructor(archiveFiles):
     assert archiveFiles.parameterDict == {}
     assert archiveFiles.lfns == []
     assert archiveFiles.waitingFiles == []
-    assert archiveFiles.cacheFolder == "/Some/Local/Folder"
+    assert archiveFiles.workDirectory == "/Some/Local/Folder"
+    assert archiveFiles.cacheFolder is None
 
 
 def test_run_OK(archiveFiles, _myMocker, listOfLFNs):
@@ -234,10 +235,30 @@ def test_call_withUnexpectedError(archiveFiles, _myMocker):
     assert not res["OK"]
 
 
+def test_call_reused(archiveFiles, _myMocker, mocker):
+    """The handler is reused for the next requests without keeping the state of the previous ones"""
+    removeMock = mocker.patch(MODULE + ".os.remove")
+    rmTreeMock = mocker.patch(MODULE + ".shutil.rmtree")
+    archiveFiles()
+    archiveFiles.request.RequestName = "MyOtherRequest"
+    archiveFiles()
+    assert archiveFiles.cacheFolder == os.path.join(DEST_DIR, "MyOtherRequest")
+    rmTreeMock.assert_called_with(os.path.join(DEST_DIR, "MyOtherRequest"), ignore_errors=True)
+
+    # Nothing of the previous request is removed if the arguments can't be decoded
+    removeMock.reset_mock()
+    rmTreeMock.reset_mock()
+    archiveFiles.operation.Arguments = ""
+    assert not archiveFiles()["OK"]
+    removeMock.assert_not_called()
+    rmTreeMock.assert_not_called()
+
+
 def test_cleanup(archiveFiles, mocker):
     osMocker = mocker.patch(MODULE + ".os.remove", side_effect=OSError("No such file or directory"))
     rmTreeMock = mocker.patch(MODULE + ".shutil.rmtree", side_effect=OSError("No such file or directory"))
     archiveFiles.parameterDict = {"ArchiveLFN": "/vo.lfn/nofile.tar"}
+    archiveFiles.cacheFolder = os.path.join(DEST_DIR, "MyRequest")
     archiveFiles._cleanup()
     osMocker.assert_called_with("nofile.tar")
     rmTreeMock.assert_called_with(archiveFiles.cacheFolder, ignore_errors=True)
@@ -0,0 +1,185 @@
+""" Test the asynchronous monitoring of the FTS3Agent against a mock FTS3 server
+"""
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+from mock import MagicMock
+
+from fts3.rest.client.exceptions import NotFound
+
+from DIRAC import gLogger, S_OK
+from DIRAC.DataManagementSystem.Agent.FTS3Agent import FTS3Agent
+from DIRAC.DataManagementSystem.Client.FTS3Job import FTS3Job
+
+gLogger.setLevel("DEBUG")
+
+# Jobs known by the mock server: {ftsGUID: job_state}
+SERVER_JOBS = dict(("guid-%d" % i, "ACTIVE") for i in range(5))
+SERVER_JOBS["guid-other"] = "ACTIVE"
+
+
+class MockFTS3Handler(BaseHTTPRequestHandler):
+    """Answers GET /jobs/<guid1>,<guid2>?files=... like the FTS3 REST server"""
+
+    def do_GET(self):
+        path, _, _query = self.path.partition("?")
+        self.server.requestedPaths.append(self.path)
+        guids = path[len("/jobs/") :].split(",")
+
+        jobs = []
+        for guid in guids:
+            if guid not in SERVER_JOBS:
+                jobs.append({"job_id": guid, "http_status": "404 Not Found"})
+                continue
+            # The fileIDs start at 1
+            fileID = int(guid.split("-")[1]) + 1 if guid[-1].isdigit() else 100
+            jobs.append(
+                {
+                    "job_id": guid,
+                    "job_state": SERVER_JOBS[guid],
+                    "reason": "",
+                    "files": [
+                        {"file_state": "FINISHED", "file_metadata": {"fileID": fileID}, "reason": ""},
+                        {"file_state": "ACTIVE", "file_metadata": {"fileID": fileID + 1000}, "reason": ""},
+                    ],
+                }
+            )
+
+        # A single unknown job is a 404, a single job is not returned in a list
+        if len(guids) == 1 and "job_state" not in jobs[0]:
+            self.send_error(404)
+            return
+        body = json.dumps(jobs if len(jobs) > 1 else jobs[0]).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class MockContext(object):
+    """Minimal fts3 context, only able to GET from the mock server
+
+    It records the contexts used at the same time
+    """
+
+    lock = threading.Lock()
+    inUse = []
+    maxInUse = []
+
+    def __init__(self, endpoint, threadID):
+        self.endpoint = endpoint
+        self.threadID = threadID
+
+    def get(self, path):
+        with self.lock:
+            assert self.threadID not in self.inUse, "Context used by two calls at the same time"
+            self.inUse.append(self.threadID)
+            self.maxInUse.append(len(self.inUse))
+        try:
+            # Let the other calls overlap this one
+            time.sleep(0.05)
+            return urlopen(self.endpoint + path).read().decode()
+        except HTTPError as e:
+            if e.code == 404:
+                raise NotFound(path)
+            raise
+        finally:
+            with self.lock:
+                self.inUse.remove(self.threadID)
+
+
+@pytest.fixture
+def ftsServer():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockFTS3Handler)
+    server.requestedPaths = []
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def agent(mocker, ftsServer):
+    mocker.patch("DIRAC.DataManagementSystem.Agent.FTS3Agent.AgentModule.__init__", return_value=None)
+    endpoint = "http://127.0.0.1:%s" % ftsServer.server_address[1]
+
+    fts3Agent = FTS3Agent()
+    fts3Agent.monitoringBulkSize = 2
+    fts3Agent.maxConnectionsPerServer = 2
+    fts3Agent.monitoringExecutor = ThreadPoolExecutor(4)
+    fts3Agent.fts3db = MagicMock()
+    fts3Agent.fts3db.updateFileStatus.return_value = S_OK()
+    fts3Agent.fts3db.updateJobStatus.return_value = S_OK()
+    fts3Agent.fts3db.cancelNonExistingJob.return_value = S_OK()
+    fts3Agent.getFTS3Context = MagicMock(
+        side_effect=lambda *args, **kwargs: S_OK(MockContext(endpoint, kwargs["threadID"]))
+    )
+    yield fts3Agent
+    fts3Agent.monitoringExecutor.shutdown()
+
+
+def makeJob(jobID, ftsGUID, username="user"):
+    ftsJob = FTS3Job()
+    ftsJob.jobID = jobID
+    ftsJob.operationID = 1
+    ftsJob.ftsGUID = ftsGUID
+    ftsJob.ftsServer = "https://fts3.example.org:8446"
+    ftsJob.username = username
+    ftsJob.userGroup = "group"
+    ftsJob.status = "Submitted"
+    return ftsJob
+
+
+def test_monitorJobsAsync(agent, ftsServer):
+    """The jobs are monitored in bulk, and the DB is updated for each of them"""
+    ftsJobs = [makeJob(i, "guid-%d" % i) for i in range(5)]
+    # Not known by the server
+    ftsJobs.append(makeJob(5, "guid-unknown"))
+    # Another user: another context, and a single job with a 404
+    ftsJobs.append(makeJob(6, "guid-other", username="other"))
+    ftsJobs.append(makeJob(7, "guid-gone", username="gone"))
+
+    res = agent._monitorJobsAsync(ftsJobs)
+    assert res["OK"], res
+
+    # One call per chunk of monitoringBulkSize jobs of the same user, group and server
+    requestedJobs = sorted(path.partition("?")[0] for path in ftsServer.requestedPaths)
+    assert requestedJobs == [
+        "/jobs/guid-0,guid-1",
+        "/jobs/guid-2,guid-3",
+        "/jobs/guid-4,guid-unknown",
+        "/jobs/guid-gone",
+        "/jobs/guid-other",
+    ]
+    assert agent.getFTS3Context.call_count == 5
+    # Each of the maxConnectionsPerServer calls made at the same time has its own context
+    threadIDs = set(call[1]["threadID"] for call in agent.getFTS3Context.call_args_list)
+    assert threadIDs == {"AsyncMonitoring-0", "AsyncMonitoring-1"}
+    assert max(MockContext.maxInUse) == 2
+
+    # The jobs found were updated
+    assert agent.fts3db.updateFileStatus.call_count == 6
+    agent.fts3db.updateFileStatus.assert_any_call(
+        {3: {"status": "Finished", "error": "", "ftsGUID": None}, 1003: {"status": "Active", "error": ""}},
+        ftsGUID="guid-2",
+    )
+    updatedJobs = {}
+    for call in agent.fts3db.updateJobStatus.call_args_list:
+        updatedJobs.update(call[0][0])
+    assert sorted(updatedJobs) == [0, 1, 2, 3, 4, 6]
+    assert all(upDict["status"] == "Active" and upDict["completeness"] == 50 for upDict in updatedJobs.values())
+
+    # The jobs not found on the server were canceled
+    canceled = sorted(call[0] for call in agent.fts3db.cancelNonExistingJob.call_args_list)
+    assert canceled == [(1, "guid-gone"), (1, "guid-unknown")]
@@ -262,12 +262,18 @@ class DataManager(object):
         allFiles = {}
         while len(activeDirs) > 0:
             currentDir = activeDirs[0]
-            res = returnSingleResult(self.fileCatalog.listDirectory(currentDir, verbose=True))
             activeDirs.remove(currentDir)
-
-            if not res["OK"]:
-                log.debug("Problem getting the %s directory content" % currentDir, res["Message"])
-            else:
+            # Large directories are listed by batches
+            listed = False
+            for res in self.fileCatalog.listDirectoryIterator(currentDir, verbose=True):
+                if not res["OK"]:
+                    if listed:
+                        # Do not return a listing with some of the files missing
+                        log.error("Failed to list the whole directory", "%s: %s" % (currentDir, res["Message"]))
+                        return res
+                    log.debug("Problem getting the %s directory content" % currentDir, res["Message"])
+                    break
+                listed = True
                 dirContents = res["Value"]
                 activeDirs.extend(dirContents["SubDirs"])
                 allFiles.update(dirContents["Files"])
@@ -312,12 +318,18 @@ class DataManager(object):
         allFiles = []
         while len(activeDirs) > 0:
             currentDir = activeDirs[0]
-            # We only need the metadata (verbose) if a limit date is given
-            res = returnSingleResult(self.fileCatalog.listDirectory(currentDir, verbose=(days != 0)))
             activeDirs.remove(currentDir)
-            if not res["OK"]:
-                log.debug("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
-            else:
+            # We only need the metadata (verbose) if a limit date is given
+            listed = False
+            for res in self.fileCatalog.listDirectoryIterator(currentDir, verbose=(days != 0)):
+                if not res["OK"]:
+                    if listed:
+                        # Do not return a listing with some of the files missing
+                        log.error("Failed to list the whole directory", "%s: %s" % (currentDir, res["Message"]))
+                        return res
+                    log.debug("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
+                    break
+                listed = True
                 dirContents = res["Value"]
                 subdirs = dirContents["SubDirs"]
                 files = dirContents["Files"]
@@ -7,6 +7,7 @@ __RCSID__ = "$Id $"
 
 import datetime
 import errno
+import json
 
 # Requires at least version 3.3.3
 import fts3.rest.client.easy as fts3
@@ -29,6 +30,9 @@ from DIRAC.DataManagementSystem.Client.FTS3File import FTS3File
 # 3 days in seconds
 BRING_ONLINE_TIMEOUT = 259200
 
+# Fields of the files needed to monitor a job and to fill its accounting
+MONITORING_FILE_FIELDS = ("file_state", "file_metadata", "reason", "filesize", "tx_duration")
+
 
 class FTS3Job(JSerializable):
     """Abstract class to represent a job to be executed by FTS. It belongs
@@ -150,6 +154,63 @@ class FTS3Job(JSerializable):
         except FTS3ClientException as e:
             return S_ERROR("Error getting the job status %s" % e)
 
+        return self._updateFromJobStatus(jobStatusDict)
+
+    @staticmethod
+    def monitorJobs(context, ftsJobs):
+        """Queries the fts server to monitor several jobs at once, with a single REST call.
+        The internal state of each job is updated like in :py:meth:`monitor`.
+
+        All the jobs must be on the server of the context, and have their ftsGUID set.
+
+        :param context: fts3 context
+        :param ftsJobs: list of FTS3Job
+
+        :returns: S_OK({ftsGUID: result of :py:meth:`monitor` for this job})
+                  or S_ERROR if the query failed
+        """
+        ftsGUIDs = [ftsJob.ftsGUID for ftsJob in ftsJobs]
+        try:
+            jobsStatusList = json.loads(
+                context.get("/jobs/%s?files=%s" % (",".join(ftsGUIDs), ",".join(MONITORING_FILE_FIELDS)))
+            )
+        # The server only answers NotFound if a single job is asked
+        except NotFound:
+            if len(ftsJobs) != 1:
+                return S_ERROR("Error getting the jobs status: not found")
+            jobsStatusList = [{"job_id": ftsGUIDs[0], "http_status": "404 Not Found"}]
+        except (FTS3ClientException, ValueError) as e:
+            return S_ERROR("Error getting the jobs status %s" % e)
+
+        # The status of a single job is not returned in a list
+        if isinstance(jobsStatusList, dict):
+            jobsStatusList = [jobsStatusList]
+        jobsStatus = dict((jobStatusDict.get("job_id"), jobStatusDict) for jobStatusDict in jobsStatusList)
+
+        result = {}
+        for ftsJob in ftsJobs:
+            jobStatusDict = jobsStatus.get(ftsJob.ftsGUID)
+            # The jobs that could not be retrieved come with an http_status instead of their state
+            if jobStatusDict is None or "job_state" not in jobStatusDict:
+                httpStatus = str((jobStatusDict or {}).get("http_status", "Not returned"))
+                if httpStatus.startswith("404"):
+                    ftsJob.status = "Failed"
+                    result[ftsJob.ftsGUID] = S_ERROR(
+                        errno.ESRCH, "FTSGUID %s not found on %s" % (ftsJob.ftsGUID, ftsJob.ftsServer)
+                    )
+                else:
+                    result[ftsJob.ftsGUID] = S_ERROR("Error getting the job status %s" % httpStatus)
+                continue
+            result[ftsJob.ftsGUID] = ftsJob._updateFromJobStatus(jobStatusDict)
+        return S_OK(result)
+
+    def _updateFromJobStatus(self, jobStatusDict):
+        """Update the internal state of the job from its status on the server
+
+        :param jobStatusDict: status of the job, as returned by fts3.get_job_status with list_files=True
+
+        :returns: {FileID: { status, error } }, see :py:meth:`monitor`
+        """
         now = datetime.datetime.utcnow().replace(microsecond=0)
         self.lastMonitor = now
 
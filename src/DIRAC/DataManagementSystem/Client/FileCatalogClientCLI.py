@@ -2239,7 +2239,7 @@ class FileCatalogClientCLI(CLI):
         printTable(fields, records)
 
     def do_rebuild(self, _args):
-        """Rebuild auxiliary tables keeping the directory usage data
+        """Reconcile the directory usage data with the files of the catalog
 
         Usage:
            rebuild
@@ -2252,7 +2252,10 @@ class FileCatalogClientCLI(CLI):
             return
 
         total = time.time() - start
-        print("Directory storage info rebuilt in %.2f sec", total)
+        print(
+            "Directory storage info reconciled in %.2f sec: %d directories checked, %d corrected"
+            % (total, result["Value"]["Directories"], result["Value"]["Corrected"])
+        )
 
     def do_repair(self, args):
         """Repair catalog inconsistencies
@@ -13,7 +13,7 @@ import datetime
 import errno
 
 from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.exc import SQLAlchemyError, OperationalError
 from sqlalchemy.sql.expression import and_
 from sqlalchemy.orm import relationship, sessionmaker, mapper
 from sqlalchemy.sql import update, delete
@@ -43,6 +43,19 @@ from DIRAC.ConfigurationSystem.Client.Utilities import getDBParameters
 
 __RCSID__ = "$Id$"
 
+# MySQL error raised when a transaction is rolled back to resolve a deadlock
+ER_LOCK_DEADLOCK = 1213
+# Number of attempts of the transactions that can be deadlock victims
+DEADLOCK_RETRIES = 3
+
+
+def isDeadlock(error):
+    """Whether an SQLAlchemy exception is caused by a MySQL deadlock
+
+    :param SQLAlchemyError error: the exception
+    """
+    return isinstance(error, OperationalError) and tuple(getattr(error.orig, "args", ()))[:1] == (ER_LOCK_DEADLOCK,)
+
 
 metadata = MetaData()
 
@@ -347,9 +360,9 @@ class FTS3DB(object):
          The update is only done if the file is not in a final state
          (To avoid bringing back to life a file by consuming MQ a posteriori)
 
-
-
-         TODO: maybe it should query first the status and filter the rows I want to update !
+         The current values of the files are read first, and the files that did not change are not updated.
+         The others are grouped by new values, and each group is updated with a single UPDATE,
+         all in one transaction that is retried if MySQL chooses it as a deadlock victim.
 
         :param fileStatusDict: { fileID : { status , error, ftsGUID } }
         :param ftsGUID: If specified, only update the rows where the ftsGUID matches this value.
@@ -357,65 +370,72 @@ class FTS3DB(object):
                         Note that for the moment it is an optional parameter, but it may turn mandatory soon.
 
         """
+        if not fileStatusDict:
+            return S_OK()
 
-        # This here is inneficient as we update every files, even if it did not change, and we commit every time.
-        # It would probably be best to update only the files that changed.
-        # However, commiting every time is the recommendation of MySQL
-        # (https://dev.mysql.com/doc/refman/5.7/en/innodb-deadlocks-handling.html)
-
+        # { fileID : { column name : new value } }
+        newValues = {}
         for fileID, valueDict in fileStatusDict.items():
-
+            fileValues = {"status": valueDict["status"]}
+            # We only update error and ftsGUID if they are specified, replacing empty strings with None
+            for attribute in ("error", "ftsGUID"):
+                if attribute in valueDict:
+                    fileValues[attribute] = valueDict[attribute] or None
+            newValues[int(fileID)] = fileValues
+
+        for attempt in range(1, DEADLOCK_RETRIES + 1):
             session = self.dbSession()
             try:
-
-                updateDict = {FTS3File.status: valueDict["status"]}
-
-                # We only update error if it is specified
-                if "error" in valueDict:
-                    newError = valueDict["error"]
-                    # Replace empty string with None
-                    if not newError:
-                        newError = None
-                    updateDict[FTS3File.error] = newError
-
-                # We only update ftsGUID if it is specified
-                if "ftsGUID" in valueDict:
-                    newFtsGUID = valueDict["ftsGUID"]
-                    # Replace empty string with None
-                    if not newFtsGUID:
-                        newFtsGUID = None
-                    updateDict[FTS3File.ftsGUID] = newFtsGUID
-
-                # We only update the lines matching:
-                # * the good fileID
-                # * the status is not Final
-
-                whereConditions = [FTS3File.fileID == fileID, ~FTS3File.status.in_(FTS3File.FINAL_STATES)]
-
-                # If an ftsGUID is specified, add it to the `where` condition
-                if ftsGUID:
-                    whereConditions.append(FTS3File.ftsGUID == ftsGUID)
-
-                updateQuery = (
-                    update(FTS3File)
-                    .where(and_(*whereConditions))
-                    .values(updateDict)
-                    .execution_options(synchronize_session=False)
-                )  # see comment about synchronize_session
-
-                session.execute(updateQuery)
+                # Only keep the files that are not final and for which something changes
+                # { (( column name, new value ), ...) : [fileIDs] }
+                updateGroups = {}
+                currentValues = session.query(
+                    FTS3File.fileID, FTS3File.status, FTS3File.error, FTS3File.ftsGUID
+                ).filter(FTS3File.fileID.in_(list(newValues)))
+                for fileID, status, error, fileFtsGUID in currentValues:
+                    if status in FTS3File.FINAL_STATES or (ftsGUID and fileFtsGUID != ftsGUID):
+                        continue
+                    current = {"status": status, "error": error, "ftsGUID": fileFtsGUID}
+                    fileValues = newValues[fileID]
+                    if all(current[attribute] == value for attribute, value in fileValues.items()):
+                        continue
+                    updateGroups.setdefault(tuple(sorted(fileValues.items())), []).append(fileID)
+
+                for groupValues, fileIDs in updateGroups.items():
+                    # We only update the lines matching:
+                    # * the good fileIDs
+                    # * the status is not Final
+                    # The files were checked above, but they may have changed in the meantime
+                    whereConditions = [FTS3File.fileID.in_(fileIDs), ~FTS3File.status.in_(FTS3File.FINAL_STATES)]
+
+                    # If an ftsGUID is specified, add it to the `where` condition
+                    if ftsGUID:
+                        whereConditions.append(FTS3File.ftsGUID == ftsGUID)
+
+                    updateQuery = (
+                        update(FTS3File)
+                        .where(and_(*whereConditions))
+                        .values(dict((getattr(FTS3File, attribute), value) for attribute, value in groupValues))
+                        .execution_options(synchronize_session=False)
+                    )  # see comment about synchronize_session
+
+                    session.execute(updateQuery)
 
                 session.commit()
+                return S_OK()
 
             except SQLAlchemyError as e:
                 session.rollback()
+                # MySQL recommends to retry the transactions rolled back because of a deadlock
+                # (https://dev.mysql.com/doc/refman/5.7/en/innodb-deadlocks-handling.html)
+                if isDeadlock(e) and attempt < DEADLOCK_RETRIES:
+                    self.log.warn("updateFileFtsStatus: deadlock, retrying", "(attempt %d)" % attempt)
+                    continue
                 self.log.exception("updateFileFtsStatus: unexpected exception", lException=e)
                 return S_ERROR("updateFileFtsStatus: unexpected exception %s" % e)
             finally:
                 session.close()
 
-        return S_OK()
-
     def updateJobStatus(self, jobStatusDict):
         """Update the job Status and error
          The update is only done if the job is not in a final state
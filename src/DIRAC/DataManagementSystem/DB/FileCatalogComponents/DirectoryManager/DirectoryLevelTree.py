@@ -34,7 +34,14 @@ class DirectoryLevelTree(DirectoryTreeBase):
     def findDir(self, path, connection=False):
         """Find directory ID for the given path"""
 
-        dpath = self.db._escapeString(os.path.normpath(path))
+        normPath = os.path.normpath(path)
+        cached = self.dirCache.getDirID(normPath)
+        if cached:
+            res = S_OK(cached[0])
+            res["Level"] = cached[1]
+            return res
+
+        dpath = self.db._escapeString(normPath)
         if not dpath["OK"]:
             return dpath
         dpath = dpath["Value"]
@@ -46,26 +53,35 @@ class DirectoryLevelTree(DirectoryTreeBase):
         if not result["Value"]:
             return S_OK("")
 
+        self.dirCache.add(normPath, result["Value"][0][0], result["Value"][0][1])
         res = S_OK(result["Value"][0][0])
         res["Level"] = result["Value"][0][1]
         return res
 
     def findDirs(self, paths, connection=False):
         """Find DirIDs for the given path list"""
+        dirDict = {}
         dpathList = []
         for path in paths:
-            dpath = self.db._escapeString(os.path.normpath(path))
+            normPath = os.path.normpath(path)
+            cached = self.dirCache.getDirID(normPath)
+            if cached:
+                dirDict[normPath] = cached[0]
+                continue
+            dpath = self.db._escapeString(normPath)
             if not dpath["OK"]:
                 return dpath
             dpathList.append(dpath["Value"])
+        if not dpathList:
+            return S_OK(dirDict)
         dpaths = ",".join(dpathList)
-        req = "SELECT DirName,DirID from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
+        req = "SELECT DirName,DirID,Level from FC_DirectoryLevelTree WHERE DirName in (%s)" % dpaths
         result = self.db._query(req, connection)
         if not result["OK"]:
             return result
-        dirDict = {}
-        for dirName, dirID in result["Value"]:
+        for dirName, dirID, level in result["Value"]:
             dirDict[dirName] = dirID
+            self.dirCache.add(dirName, dirID, level)
 
         return S_OK(dirDict)
 
@@ -83,6 +99,9 @@ class DirectoryLevelTree(DirectoryTreeBase):
         dirID = result["Value"]
         req = "DELETE FROM FC_DirectoryLevelTree WHERE DirID=%d" % dirID
         result = self.db._update(req)
+        if result["OK"]:
+            # Forgotten once deleted, so that a concurrent lookup can not cache the directory again
+            self.dirCache.remove(os.path.normpath(path), dirID)
         result["DirID"] = dirID
         return result
 
@@ -148,6 +167,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
                 names.append("LPATH%d" % i)
                 values.append(epathList[i - 1])
 
+        self.dirCache.remove(os.path.normpath(path))
         result = self.db._getConnection()
         conn = result["Value"]
         # result = self.db._query("LOCK TABLES FC_DirectoryLevelTree WRITE; ",conn)
@@ -234,13 +254,17 @@ class DirectoryLevelTree(DirectoryTreeBase):
 
     def getDirectoryPath(self, dirID):
         """Get directory name by directory ID"""
-        req = "SELECT DirName FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
+        dirPath = self.dirCache.getPath(int(dirID))
+        if dirPath is not None:
+            return S_OK(dirPath)
+        req = "SELECT DirName,Level FROM FC_DirectoryLevelTree WHERE DirID=%d" % int(dirID)
         result = self.db._query(req)
         if not result["OK"]:
             return result
         if not result["Value"]:
             return S_ERROR("Directory with id %d not found" % int(dirID))
 
+        self.dirCache.add(result["Value"][0][0], int(dirID), result["Value"][0][1])
         return S_OK(result["Value"][0][0])
 
     def getDirectoryPaths(self, dirIDList):
@@ -280,6 +304,10 @@ class DirectoryLevelTree(DirectoryTreeBase):
         specified by its path
         """
 
+        pathIDs = self.dirCache.getValue(os.path.normpath(path), "PathIDs")
+        if pathIDs is not None:
+            return S_OK(list(pathIDs))
+
         elements = path.split("/")
         pelements = []
         dPath = ""
@@ -296,7 +324,9 @@ class DirectoryLevelTree(DirectoryTreeBase):
         if not result["Value"]:
             return S_ERROR("Directory %s not found" % path)
 
-        return S_OK([x[0] for x in result["Value"]])
+        pathIDs = [x[0] for x in result["Value"]]
+        self.dirCache.setValue(os.path.normpath(path), "PathIDs", pathIDs)
+        return S_OK(list(pathIDs))
 
     def getPathIDsByID_old(self, dirID):
         """Get IDs of all the directories in the parent hierarchy for a directory
@@ -315,6 +345,12 @@ class DirectoryLevelTree(DirectoryTreeBase):
         """Get IDs of all the directories in the parent hierarchy for a directory
         specified by its ID
         """
+        dirPath = self.dirCache.getPath(dirID)
+        if dirPath is not None:
+            pathIDs = self.dirCache.getValue(dirPath, "PathIDsByID")
+            if pathIDs is not None:
+                return S_OK(list(pathIDs))
+
         result = self.__getNumericPath(dirID)
         if not result["OK"]:
             return result
@@ -335,7 +371,15 @@ class DirectoryLevelTree(DirectoryTreeBase):
         if not result["Value"]:
             return S_ERROR("No result for the path of Directory with ID %d" % dirID)
 
-        return S_OK([x[1] for x in result["Value"]] + [dirID])
+        pathIDs = [x[1] for x in result["Value"]] + [dirID]
+        if dirPath is None:
+            # Also caches the directory, so that the IDs can be kept with it
+            result = self.getDirectoryPath(dirID)
+            if result["OK"]:
+                dirPath = result["Value"]
+        if dirPath is not None:
+            self.dirCache.setValue(dirPath, "PathIDsByID", pathIDs)
+        return S_OK(list(pathIDs))
 
     def getChildren(self, path, connection=False):
         """Get child directory IDs for the given directory"""
@@ -451,6 +495,8 @@ class DirectoryLevelTree(DirectoryTreeBase):
 
     def recoverOrphanDirectories(self, credDict):
         """Recover orphan directories"""
+        # Directory IDs and parents are changed below
+        self.dirCache.clear()
         # Find out orphan directories
         treeTable = "FC_DirectoryLevelTree"
         req = "SELECT DirID,Parent,Level FROM %s WHERE Parent NOT IN ( SELECT DirID from %s )" % (treeTable, treeTable)
@@ -521,6 +567,7 @@ class DirectoryLevelTree(DirectoryTreeBase):
             result = self.__rebuildLevelIndexes(parentID, connection)
             resUnlock = self.db._query("UNLOCK TABLES", connection)
 
+        self.dirCache.clear()
         return S_OK()
 
     def _getConnection(self, connection=False):
@@ -10,8 +10,10 @@ import time
 import threading
 import os
 import stat
+from collections import OrderedDict
 
 from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Utilities.List import intListToString
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.Utilities import getIDSelectString
 
 DEBUG = 0
@@ -19,11 +21,131 @@ DEBUG = 0
 #############################################################################
 
 
+class DirectoryCache(object):
+    """Bounded LRU cache of the directory path <-> DirID correspondence
+
+    Each entry also keeps the Level of the directory and data derived from the tree,
+    e.g. the IDs of the parent directories. Entries expire after a lifetime, so that
+    changes done by other catalog services are seen eventually.
+    """
+
+    def __init__(self, maxSize=10000, lifetime=300):
+        self.maxSize = maxSize
+        self.lifetime = lifetime
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        # path -> [dirID, level, expiration time, {derived data}]
+        self.__entries = OrderedDict()
+        self.__paths = {}
+
+    def __getEntry(self, path):
+        """Get the entry of a path, refreshing its position, must be called with the lock"""
+        entry = self.__entries.get(path)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            self.__removeEntry(path)
+            return None
+        self.__entries.move_to_end(path)
+        return entry
+
+    def __removeEntry(self, path):
+        """Must be called with the lock"""
+        entry = self.__entries.pop(path, None)
+        if entry is not None and self.__paths.get(entry[0]) == path:
+            del self.__paths[entry[0]]
+
+    def getDirID(self, path):
+        """Get the (DirID, Level) of a normalized path, None if not cached"""
+        if not self.maxSize:
+            return None
+        with self.__lock:
+            entry = self.__getEntry(path)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[0], entry[1]
+
+    def getPath(self, dirID):
+        """Get the path of a DirID, None if not cached"""
+        if not self.maxSize:
+            return None
+        with self.__lock:
+            path = self.__paths.get(dirID)
+            if path is None or self.__getEntry(path) is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return path
+
+    def add(self, path, dirID, level=None):
+        """Add the DirID of a normalized path"""
+        if not self.maxSize:
+            return
+        with self.__lock:
+            self.__removeEntry(path)
+            if dirID in self.__paths:
+                self.__removeEntry(self.__paths[dirID])
+            self.__entries[path] = [dirID, level, time.time() + self.lifetime, {}]
+            self.__paths[dirID] = path
+            while len(self.__entries) > self.maxSize:
+                self.__removeEntry(next(iter(self.__entries)))
+
+    def getValue(self, path, name):
+        """Get data derived from the tree for a cached path, None if not cached"""
+        if not self.maxSize:
+            return None
+        with self.__lock:
+            entry = self.__getEntry(path)
+            if entry is None or name not in entry[3]:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[3][name]
+
+    def setValue(self, path, name, value):
+        """Keep data derived from the tree for a cached path, it goes away with the path"""
+        with self.__lock:
+            entry = self.__entries.get(path)
+            if entry is not None:
+                entry[3][name] = value
+
+    def remove(self, path=None, dirID=None):
+        """Forget a directory given by its path or DirID"""
+        with self.__lock:
+            if path is not None:
+                self.__removeEntry(path)
+            if dirID is not None and dirID in self.__paths:
+                self.__removeEntry(self.__paths[dirID])
+
+    def clear(self):
+        """Forget all the directories, e.g. after the tree has been restructured"""
+        with self.__lock:
+            self.__entries.clear()
+            self.__paths.clear()
+
+    def getCounters(self):
+        """Get the usage counters of the cache"""
+        return {
+            "Directory cache size": len(self.__entries),
+            "Directory cache hits": self.hits,
+            "Directory cache misses": self.misses,
+        }
+
+
 class DirectoryTreeBase(object):
+    # Seconds before checking again a directory whose usage differs from its files
+    reconcileConfirmDelay = 1
+
     def __init__(self, database=None):
         self.db = database
         self.lock = threading.Lock()
         self.treeTable = ""
+        self.dirCache = DirectoryCache(
+            getattr(database, "directoryCacheSize", 10000), getattr(database, "directoryCacheLifetime", 300)
+        )
 
     ############################################################################
     #
@@ -124,6 +246,13 @@ class DirectoryTreeBase(object):
         if not dirDict:
             self.removeDir(path)
             return S_ERROR("Failed to create directory %s" % path)
+
+        # The new directory inherits the metadata of its parent
+        dmeta = getattr(self.db, "dmeta", None)
+        if dmeta is not None and path != "/":
+            result = self.findDir(os.path.dirname(path))
+            if result["OK"] and result["Value"]:
+                dmeta.queryIndex.addDirectory(result["Value"], dirID)
         return S_OK(dirID)
 
     #####################################################################
@@ -636,15 +765,31 @@ class DirectoryTreeBase(object):
         if not result["OK"]:
             return result
         directoryID = result["Value"]
-        directories = {}
-        files = {}
         links = {}
         result = self.getChildren(path)
         if not result["OK"]:
             return result
 
         # Get subdirectories
-        dirIDList = result["Value"]
+        result = self.__getSubdirectories(result["Value"], details)
+        if not result["OK"]:
+            return result
+        directories = result["Value"]
+        result = self.db.fileManager.getFilesInDirectory(directoryID, verbose=details)
+        if not result["OK"]:
+            return result
+        files = result["Value"]
+        result = self.db.datasetManager.getDatasetsInDirectory(directoryID, verbose=details)
+        if not result["OK"]:
+            return result
+        datasets = result["Value"]
+        pathDict = {"Files": files, "SubDirs": directories, "Links": links, "Datasets": datasets}
+
+        return S_OK(pathDict)
+
+    def __getSubdirectories(self, dirIDList, details=False):
+        """Get the paths, and the parameters if details, of the given directories"""
+        directories = {}
         for dirID in dirIDList:
             result = self.getDirectoryPath(dirID)
             if not result["OK"]:
@@ -658,16 +803,66 @@ class DirectoryTreeBase(object):
                     directories[dirName] = result["Value"]
             else:
                 directories[dirName] = True
-        result = self.db.fileManager.getFilesInDirectory(directoryID, verbose=details)
+        return S_OK(directories)
+
+    def listDirectoryBatch(self, path, batchSize, token=None, verbose=False):
+        """Get a batch of the contents of a directory
+
+        The subdirectories come first, in the order of their IDs, then the files in the order of their names.
+        The token returned with a batch tells where the next one starts
+
+        :param str path: directory path
+        :param int batchSize: maximum number of subdirectories and files in the batch
+        :param token: token returned with the previous batch, None for the first one
+        :param bool verbose: if True, get the parameters of the subdirectories and the replicas of the files
+
+        :return: S_OK(dict) indexed "Files", "SubDirs", "Links", "Datasets" and "Token",
+                 the token being None once the directory has been fully listed
+        """
+        if batchSize < 1:
+            return S_ERROR("Invalid batch size: %s" % batchSize)
+        section, last = token if token else ("SubDirs", None)
+        if section not in ("SubDirs", "Files"):
+            return S_ERROR("Invalid listing token: %s" % str(token))
+        result = self.findDir(path)
         if not result["OK"]:
             return result
-        files = result["Value"]
-        result = self.db.datasetManager.getDatasetsInDirectory(directoryID, verbose=details)
+        directoryID = result["Value"]
+        if not directoryID:
+            return S_ERROR("Directory does not exist: %s" % path)
+        pathDict = {"Files": {}, "SubDirs": {}, "Links": {}, "Datasets": {}, "Token": None}
+
+        if not token:
+            result = self.db.datasetManager.getDatasetsInDirectory(directoryID, verbose=verbose)
+            if not result["OK"]:
+                return result
+            pathDict["Datasets"] = result["Value"]
+
+        if section == "SubDirs":
+            result = self.getChildren(path)
+            if not result["OK"]:
+                return result
+            dirIDList = sorted(dirID for dirID in result["Value"] if last is None or dirID > last)
+            result = self.__getSubdirectories(dirIDList[:batchSize], verbose)
+            if not result["OK"]:
+                return result
+            pathDict["SubDirs"] = result["Value"]
+            # The files come with the next batches if this one is full
+            if len(dirIDList) > batchSize:
+                pathDict["Token"] = ["SubDirs", dirIDList[batchSize - 1]]
+                return S_OK(pathDict)
+            if len(dirIDList) == batchSize:
+                pathDict["Token"] = ["Files", None]
+                return S_OK(pathDict)
+            batchSize -= len(dirIDList)
+            last = None
+
+        result = self.db.fileManager.getFilesInDirectoryBatch(directoryID, batchSize, last, verbose=verbose)
         if not result["OK"]:
             return result
-        datasets = result["Value"]
-        pathDict = {"Files": files, "SubDirs": directories, "Links": links, "Datasets": datasets}
-
+        pathDict["Files"], lastFileName = result["Value"]
+        if lastFileName is not None:
+            pathDict["Token"] = ["Files", lastFileName]
         return S_OK(pathDict)
 
     def listDirectory(self, lfns, verbose=False):
@@ -1020,147 +1215,146 @@ class DirectoryTreeBase(object):
 
         return S_OK({"Successful": successful, "Failed": failed})
 
-    def _rebuildDirectoryUsage(self):
-        """Recreate and replenish the Storage Usage tables"""
+    def _reconcileDirectoryUsage(self, path="/"):
+        """Check the recursive usage of the directories below the given path against their files
 
-        req = "DROP TABLE IF EXISTS FC_DirectoryUsage_backup"
-        result = self.db._update(req)
-        req = "RENAME TABLE FC_DirectoryUsage TO FC_DirectoryUsage_backup"
-        result = self.db._update(req)
-        req = "CREATE TABLE `FC_DirectoryUsage` LIKE `FC_DirectoryUsage_backup`"
-        result = self.db._update(req)
-        if not result["OK"]:
-            return result
+        The usage of a directory must be the usage of its own files plus the usage of its
+        subdirectories, which is checked bottom-up. Each directory is checked in a transaction
+        locking its usage rows and files. A difference can come from a file operation in progress,
+        which updates the usage after the files: it is only corrected if the same difference is found
+        again reconcileConfirmDelay seconds later. The correction is applied in the transaction of
+        the second check, as a change propagated to the parent directories.
 
-        result = self.__rebuildDirectoryUsageLeaves()
-        if not result["OK"]:
-            return result
+        :param str path: top directory of the check
 
-        result = self.db.dtree.findDir("/")
+        :return: S_OK/S_ERROR, Value dictionary with the numbers of checked and corrected directories
+        """
+        counters = {"Directories": 0, "Corrected": 0}
+        if self.db.fileManager.directoryUsageTriggers:
+            gLogger.info("The directory usage is kept up to date by the database triggers, nothing to reconcile")
+            return S_OK(counters)
+        result = self.findDir(path)
         if not result["OK"]:
             return result
         if not result["Value"]:
-            return S_ERROR("Directory / not found")
-        dirID = result["Value"]
-        result = self.__rebuildDirectoryUsage(dirID)
-        gLogger.verbose("Finished rebuilding Directory Usage")
-        return result
-
-    def __rebuildDirectoryUsageLeaves(self):
-        """Rebuild DirectoryUsage entries for directories having files"""
-        req = "SELECT DISTINCT(DirID) FROM FC_Files"
-        result = self.db._query(req)
+            return S_ERROR("Directory %s not found" % path)
+        result = self.__reconcileDirectoryUsage(result["Value"], counters)
         if not result["OK"]:
             return result
+        gLogger.info(
+            "Finished reconciling the directory usage",
+            "of %s: %d directories, %d corrected" % (path, counters["Directories"], counters["Corrected"]),
+        )
+        return S_OK(counters)
 
-        dirIDs = [x[0] for x in result["Value"]]
-        gLogger.verbose("Starting rebuilding Directory Usage, number of visible directories %d" % len(dirIDs))
-
-        insertFields = ["DirID", "SEID", "SESize", "SEFiles", "LastUpdate"]
-        insertCount = 0
-        insertValues = []
-
-        count = 0
-        empty = 0
-
-        for dirID in dirIDs:
-
-            count += 1
-
-            # Get the physical size
-            req = "SELECT SUM(F.Size),COUNT(F.Size),R.SEID from FC_Files as F, FC_Replicas as R "
-            req += "WHERE F.FileID=R.FileID AND F.DirID=%d GROUP BY R.SEID" % int(dirID)
-            result = self.db._query(req)
+    def __reconcileDirectoryUsage(self, directoryID, counters):
+        """Reconcile the usage of the subdirectories, then the usage of the directory itself"""
+        result = self.getChildren(directoryID)
+        if not result["OK"]:
+            return result
+        children = result["Value"]
+        for dirID in children:
+            result = self.__reconcileDirectoryUsage(dirID, counters)
             if not result["OK"]:
                 return result
-            if not result["Value"]:
-                empty += 1
+        counters["Directories"] += 1
 
-            for seSize, seFiles, seID in result["Value"]:
-                insertValues = [dirID, seID, seSize, seFiles, "UTC_TIMESTAMP()"]
-                result = self.db.insertFields("FC_DirectoryUsage", insertFields, insertValues)
-                if not result["OK"]:
-                    if "Duplicate" in result["Message"]:
-                        req = "UPDATE FC_DirectoryUsage SET SESize=%d, SEFiles=%d, LastUpdate=UTC_TIMESTAMP()" % (
-                            seSize,
-                            seFiles,
-                        )
-                        req += " WHERE DirID=%s AND SEID=%s" % (dirID, seID)
-                        result = self.db._update(req)
-                        if not result["OK"]:
-                            return result
-                    return result
+        result = self.__checkDirectoryUsage(directoryID, children)
+        if not result["OK"] or not result["Value"]:
+            return result
+        time.sleep(self.reconcileConfirmDelay)
+        result = self.__checkDirectoryUsage(directoryID, children, correction=result["Value"])
+        if not result["OK"]:
+            return result
+        if result["Value"]:
+            counters["Corrected"] += 1
+        return S_OK()
 
-            # Get the logical size
-            req = "SELECT SUM(Size),COUNT(Size) from FC_Files WHERE DirID=%d " % int(dirID)
-            result = self.db._query(req)
-            if not result["OK"]:
-                return result
-            if not result["Value"]:
-                return S_ERROR("Empty directory")
-            seSize, seFiles = result["Value"][0]
-            insertValues = [dirID, 0, seSize, seFiles, "UTC_TIMESTAMP()"]
-            result = self.db.insertFields("FC_DirectoryUsage", insertFields, insertValues)
-            if not result["OK"]:
-                if "Duplicate" in result["Message"]:
-                    req = "UPDATE FC_DirectoryUsage SET SESize=%d, SEFiles=%d, LastUpdate=UTC_TIMESTAMP()" % (
-                        seSize,
-                        seFiles,
-                    )
-                    req += " WHERE DirID=%s AND SEID=0" % dirID
-                    result = self.db._update(req)
-                    if not result["OK"]:
-                        return result
-                else:
-                    return result
+    def __checkDirectoryUsage(self, directoryID, children, correction=None):
+        """Compare the recorded usage of a directory with the usage of its files and subdirectories
 
-        gLogger.verbose("Processed %d directories, %d empty " % (count, empty))
+        The usage rows of the directory and of its subdirectories, and the files of the directory,
+        are locked while they are read, so the file operations cannot change them in the meantime.
 
-        return S_OK()
+        :param int directoryID: directory to check
+        :param list children: IDs of its subdirectories
+        :param dict correction: differences found by a previous check, applied in the same transaction
+                                if exactly the same differences are found
 
-    def __rebuildDirectoryUsage(self, directoryID):
-        """Rebuild DirectoryUsage entries recursively for the given path"""
-        result = self.getChildren(directoryID)
+        :return: S_OK/S_ERROR, Value the differences {seID: {"Size": size, "Files": files}}, SEID 0 being
+                 the logical usage. If correction is given, the applied differences, empty if none.
+        """
+        result = self.db._getConnection()
         if not result["OK"]:
             return result
-        dirIDs = result["Value"]
-        resultDict = {}
-        for dirID in dirIDs:
-            result = self.__rebuildDirectoryUsage(dirID)
-            if not result["OK"]:
-                return result
-            dirDict = result["Value"]
-            for seID in dirDict:
-                resultDict.setdefault(seID, {"Size": 0, "Files": 0})
-                resultDict[seID]["Size"] += dirDict[seID]["Size"]
-                resultDict[seID]["Files"] += dirDict[seID]["Files"]
-
-        insertFields = ["DirID", "SEID", "SESize", "SEFiles", "LastUpdate"]
-        insertValues = []
-        for seID in resultDict:
-            size = resultDict[seID]["Size"]
-            files = resultDict[seID]["Files"]
-            req = "UPDATE FC_DirectoryUsage SET SESize=SESize+%d, SEFiles=SEFiles+%d WHERE DirID=%d AND SEID=%d"
-            req = req % (size, files, directoryID, seID)
-            result = self.db._update(req)
+        connection = result["Value"]
+        cursor = connection.cursor()
+        try:
+            cursor.execute("START TRANSACTION")
+            req = "SELECT DirID,SEID,SESize,SEFiles FROM FC_DirectoryUsage WHERE DirID IN (%s) FOR UPDATE"
+            cursor.execute(req % intListToString([directoryID] + children))
+            usageRows = cursor.fetchall()
+            req = "SELECT R.SEID,SUM(F.Size),COUNT(F.Size) FROM FC_Files as F, FC_Replicas as R "
+            req += "WHERE F.FileID=R.FileID AND F.DirID=%d GROUP BY R.SEID LOCK IN SHARE MODE" % directoryID
+            cursor.execute(req)
+            replicaRows = cursor.fetchall()
+            cursor.execute("SELECT SUM(Size),COUNT(Size) FROM FC_Files WHERE DirID=%d LOCK IN SHARE MODE" % directoryID)
+            fileRows = cursor.fetchall()
+
+            seDeltas = self.__getUsageDeltas(directoryID, usageRows, replicaRows, fileRows)
+            if correction is None or not seDeltas or seDeltas != correction:
+                connection.rollback()
+                if correction is not None:
+                    gLogger.verbose("The usage of directory changed during the check", "%d" % directoryID)
+                    return S_OK({})
+                return S_OK(seDeltas)
+
+            gLogger.verbose("Correcting the usage of directory", "%d: %s" % (directoryID, seDeltas))
+            result = self.db.fileManager._updateDirectoryUsage({directoryID: seDeltas}, "+", connection=connection)
             if not result["OK"]:
+                connection.rollback()
                 return result
-            if not result["Value"]:
-                insertValues = [directoryID, seID, size, files, "UTC_TIMESTAMP()"]
-                result = self.db.insertFields("FC_DirectoryUsage", insertFields, insertValues)
-                if not result["OK"]:
-                    return result
-
-        req = "SELECT SEID,SESize,SEFiles from FC_DirectoryUsage WHERE DirID=%d" % directoryID
-        result = self.db._query(req)
-        if not result["OK"]:
-            return result
-
-        resultDict = {}
-        for seid, size, files in result["Value"]:
-            resultDict[seid] = {"Size": size, "Files": files}
-
-        return S_OK(resultDict)
+            connection.commit()
+            return S_OK(seDeltas)
+        except Exception as e:
+            connection.rollback()
+            return S_ERROR("Failed to check the usage of directory %d: %s" % (directoryID, repr(e)))
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def __getUsageDeltas(directoryID, usageRows, replicaRows, fileRows):
+        """Differences between the expected and the recorded usage of a directory
+
+        :param usageRows: (DirID, SEID, SESize, SEFiles) of the directory and of its subdirectories
+        :param replicaRows: (SEID, size, files) of the replicas of the files of the directory
+        :param fileRows: ((size, files),) of the files of the directory
+
+        :return: {seID: {"Size": size, "Files": files}} for the storage elements that differ
+        """
+        # Usage of the files of the directory, SEID 0 being the logical usage
+        expected = {}
+        for seID, seSize, seFiles in replicaRows:
+            expected[seID] = [int(seSize), int(seFiles)]
+        if fileRows and fileRows[0][1]:
+            expected[0] = [int(fileRows[0][0]), int(fileRows[0][1])]
+
+        recorded = {}
+        for dirID, seID, seSize, seFiles in usageRows:
+            if dirID == directoryID:
+                recorded[seID] = [seSize, seFiles]
+            else:
+                usage = expected.setdefault(seID, [0, 0])
+                usage[0] += seSize
+                usage[1] += seFiles
+
+        seDeltas = {}
+        for seID in set(expected) | set(recorded):
+            size, files = expected.get(seID, [0, 0])
+            recordedSize, recordedFiles = recorded.get(seID, [0, 0])
+            if size != recordedSize or files != recordedFiles:
+                seDeltas[seID] = {"Size": size - recordedSize, "Files": files - recordedFiles}
+        return seDeltas
 
     def getDirectoryCounters(self, connection=False):
         """Get the total number of directories"""
@@ -1200,4 +1394,6 @@ class DirectoryTreeBase(object):
             return res
         resultDict["DirInfo w/o DirTree"] = res["Value"][0][0]
 
+        resultDict.update(self.dirCache.getCounters())
+
         return S_OK(resultDict)
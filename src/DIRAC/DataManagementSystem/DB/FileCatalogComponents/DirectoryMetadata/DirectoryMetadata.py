@@ -10,14 +10,121 @@ __RCSID__ = "$Id$"
 
 import six
 import os
+import json
+import threading
+import time
+from collections import OrderedDict
+
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Time import queryTime
 
 
+class MetaQueryIndex(object):
+    """Bounded LRU index of the results of the directory metadata queries
+
+    Each entry maps a metadata query and a starting path to the list of the selected DirIDs.
+    The entries are maintained incrementally: a new directory inherits the metadata of its parent
+    and is added to the results containing the parent, removed directories are dropped from all
+    the results and the entries using a metadata field are invalidated when the field values change.
+    Entries expire after a lifetime, so that changes done by other catalog services are seen eventually.
+    """
+
+    def __init__(self, maxSize=1000, lifetime=300):
+        self.maxSize = maxSize
+        self.lifetime = lifetime
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        # key -> [set of metadata names, ordered list of DirIDs, set of the same DirIDs, Selection, expiration time]
+        self.__entries = OrderedDict()
+
+    @staticmethod
+    def getKey(metaDict, path):
+        """Get the index key of a query given by the expanded metadata dictionary and the starting path"""
+        return os.path.normpath(path), json.dumps(metaDict, sort_keys=True, default=str)
+
+    def get(self, key):
+        """Get the (DirID list, Selection) of a query, None if not indexed"""
+        if not self.maxSize:
+            return None
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if entry is not None and entry[4] < time.time():
+                del self.__entries[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.hits += 1
+            return list(entry[1]), entry[3]
+
+    def add(self, key, metaNames, dirIDs, selection):
+        """Index the result of a query"""
+        if not self.maxSize:
+            return
+        with self.__lock:
+            self.__entries.pop(key, None)
+            dirIDs = list(dirIDs)
+            self.__entries[key] = [set(metaNames), dirIDs, set(dirIDs), selection, time.time() + self.lifetime]
+            while len(self.__entries) > self.maxSize:
+                self.__entries.popitem(last=False)
+
+    def addDirectory(self, parentID, dirID):
+        """Add a new directory to all the results containing its parent"""
+        with self.__lock:
+            for entry in self.__entries.values():
+                if parentID in entry[2] and dirID not in entry[2]:
+                    entry[1].append(dirID)
+                    entry[2].add(dirID)
+
+    def removeDirectories(self, dirIDs):
+        """Drop removed directories from all the results"""
+        dirIDs = set(dirIDs)
+        with self.__lock:
+            for key in list(self.__entries):
+                entry = self.__entries[key]
+                removed = entry[2] & dirIDs
+                if removed:
+                    entry[2] -= removed
+                    entry[1] = [dirID for dirID in entry[1] if dirID not in removed]
+                    if not entry[2]:
+                        # The result becomes an empty selection, let the query be done again
+                        del self.__entries[key]
+
+    def invalidate(self, metaNames):
+        """Forget the results of the queries using any of the given metadata fields
+
+        To be called both before and after changing the field values in the database: a query
+        running concurrently with the change may index its result in between.
+        """
+        metaNames = set(metaNames)
+        with self.__lock:
+            for key in list(self.__entries):
+                if self.__entries[key][0] & metaNames:
+                    del self.__entries[key]
+
+    def clear(self):
+        """Forget all the results"""
+        with self.__lock:
+            self.__entries.clear()
+
+    def getCounters(self):
+        """Get the usage counters of the index"""
+        return {
+            "Metadata query index size": len(self.__entries),
+            "Metadata query index hits": self.hits,
+            "Metadata query index misses": self.misses,
+        }
+
+
 class DirectoryMetadata(object):
     def __init__(self, database=None):
 
         self.db = database
+        self.queryIndex = MetaQueryIndex(
+            getattr(database, "metaQueryIndexSize", 1000), getattr(database, "metaQueryIndexLifetime", 300)
+        )
 
     def setDatabase(self, database):
         self.db = database
@@ -77,7 +184,9 @@ class DirectoryMetadata(object):
             return result
 
         metadataID = result["lastRowId"]
+        self.queryIndex.invalidate([pName])
         result = self.__transformMetaParameterToData(pName)
+        self.queryIndex.invalidate([pName])
         if not result["OK"]:
             return result
 
@@ -92,6 +201,7 @@ class DirectoryMetadata(object):
         :return: S_OK/S_ERROR
         """
 
+        self.queryIndex.invalidate([pName])
         req = "DROP TABLE FC_Meta_%s" % pName
         result = self.db._update(req)
         error = ""
@@ -99,6 +209,7 @@ class DirectoryMetadata(object):
             error = result["Message"]
         req = "DELETE FROM FC_MetaFields WHERE MetaName='%s'" % pName
         result = self.db._update(req)
+        self.queryIndex.invalidate([pName])
         if not result["OK"]:
             if error:
                 result["Message"] = error + "; " + result["Message"]
@@ -233,6 +344,14 @@ class DirectoryMetadata(object):
         if not dirmeta["OK"]:
             return dirmeta
 
+        self.queryIndex.invalidate(metaDict)
+        try:
+            return self.__setMetadata(dPath, dirID, metaDict, metaFields, dirmeta["Value"], credDict)
+        finally:
+            self.queryIndex.invalidate(metaDict)
+
+    def __setMetadata(self, dPath, dirID, metaDict, metaFields, parentMeta, credDict):
+        """Set the metadata values of the directory given by its path and its ID"""
         for metaName, metaValue in metaDict.items():
             if metaName not in metaFields:
                 result = self.setMetaParameter(dPath, metaName, metaValue, credDict)
@@ -240,7 +359,7 @@ class DirectoryMetadata(object):
                     return result
                 continue
             # Check that the metadata is not defined for the parent directories
-            if metaName in dirmeta["Value"]:
+            if metaName in parentMeta:
                 return S_ERROR("Metadata conflict detected for %s for directory %s" % (metaName, dPath))
             result = self.db.insertFields("FC_Meta_%s" % metaName, ["DirID", "Value"], [dirID, metaValue])
             if not result["OK"]:
@@ -275,6 +394,7 @@ class DirectoryMetadata(object):
             return S_ERROR("Path not found: %s" % dPath)
         dirID = result["Value"]
 
+        self.queryIndex.invalidate(metaData)
         failedMeta = {}
         for meta in metaData:
             if meta in metaFields:
@@ -289,13 +409,14 @@ class DirectoryMetadata(object):
                 result = self.db._update(req)
                 if not result["OK"]:
                     failedMeta[meta] = result["Value"]
+        self.queryIndex.invalidate(metaData)
 
         if failedMeta:
             metaExample = list(failedMeta)[0]
             result = S_ERROR("Failed to remove %d metadata, e.g. %s" % (len(failedMeta), failedMeta[metaExample]))
             result["FailedMetadata"] = failedMeta
-        else:
-            return S_OK()
+            return result
+        return S_OK()
 
     def setMetaParameter(self, dPath, metaName, metaValue, credDict):
         """Set an meta parameter - metadata which is not used in the the data
@@ -696,6 +817,13 @@ class DirectoryMetadata(object):
             return result
         metaDict = result["Value"]
 
+        indexKey = self.queryIndex.getKey(metaDict, path)
+        indexed = self.queryIndex.get(indexKey)
+        if indexed is not None:
+            result = S_OK(indexed[0])
+            result["Selection"] = indexed[1]
+            return result
+
         # Now check the meta data for the requested directory and its parents
         finalMetaDict = dict(metaDict)
         for meta in metaDict:
@@ -746,7 +874,8 @@ class DirectoryMetadata(object):
             dirSelect = True
             finalList = dirList
             if pathDirList:
-                finalList = list(set(dirList) & set(pathDirList))
+                pathDirSet = set(pathDirList)
+                finalList = [dirID for dirID in dirList if dirID in pathDirSet]
         else:
             if pathDirList:
                 dirSelect = True
@@ -760,6 +889,7 @@ class DirectoryMetadata(object):
         else:
             result["Selection"] = "All"
 
+        self.queryIndex.add(indexKey, metaDict, finalList, result["Selection"])
         return result
 
     @queryTime
@@ -1008,6 +1138,7 @@ class DirectoryMetadata(object):
             return result
         metaFields = result["Value"]
 
+        self.queryIndex.removeDirectories(dirs)
         for meta in metaFields:
             req = "DELETE FROM FC_Meta_%s WHERE DirID in ( %s )" % (meta, dirListString)
             result = self.db._query(req)
@@ -26,44 +26,41 @@ class FileManager(FileManagerBase):
     #
 
     def _findFiles(self, lfns, metadata=["FileID"], allStatus=False, connection=False):
-        """Find file ID if it exists for the given list of LFNs"""
+        """Find file ID if it exists for the given list of LFNs
+
+        The files of all the directories are looked up together, see _getFilesInDirectories
+        """
 
         connection = self._getConnection(connection)
         dirDict = self._getFileDirectories(lfns)
-        failed = {}
         result = self.db.dtree.findDirs(list(dirDict))
         if not result["OK"]:
             return result
         directoryIDs = result["Value"]
+        directoryPaths = dict((dirID, dirPath) for dirPath, dirID in directoryIDs.items())
 
-        for dirPath in dirDict:
-            if dirPath not in directoryIDs:
-                for fileName in dirDict[dirPath]:
-                    fname = "%s/%s" % (dirPath, fileName)
-                    fname = fname.replace("//", "/")
-                    failed[fname] = "No such file or directory"
+        result = self._getFilesInDirectories(
+            dict((directoryIDs[dirPath], dirDict[dirPath]) for dirPath in directoryIDs),
+            allStatus=allStatus,
+            connection=connection,
+        )
+        if not result["OK"]:
+            return result
+        result = self._getFilesMetadata(result["Value"], metadata, connection=connection)
+        if not result["OK"]:
+            return result
 
         successful = {}
-        for dirPath in directoryIDs:
-            fileNames = dirDict[dirPath]
-            res = self._getDirectoryFiles(
-                directoryIDs[dirPath], fileNames, metadata, allStatus=allStatus, connection=connection
-            )
-            if (not res["OK"]) or (not res["Value"]):
-                error = res.get("Message", "No such file or directory")
-                for fileName in fileNames:
-                    fname = "%s/%s" % (dirPath, fileName)
-                    fname = fname.replace("//", "/")
-                    failed[fname] = error
-            else:
-                for fileName, fileDict in res["Value"].items():
-                    fname = "%s/%s" % (dirPath, fileName)
-                    fname = fname.replace("//", "/")
-                    successful[fname] = fileDict
-            for fileName in fileNames:
-                if fileName not in res["Value"]:
-                    fname = "%s/%s" % (dirPath, fileName)
-                    fname = fname.replace("//", "/")
+        for (dirID, fileName), fileDict in result["Value"].items():
+            fname = "%s/%s" % (directoryPaths[dirID], fileName)
+            fname = fname.replace("//", "/")
+            successful[fname] = fileDict
+        failed = {}
+        for dirPath in dirDict:
+            for fileName in dirDict[dirPath]:
+                fname = "%s/%s" % (dirPath, fileName)
+                fname = fname.replace("//", "/")
+                if fname not in successful:
                     failed[fname] = "No such file or directory"
         return S_OK({"Successful": successful, "Failed": failed})
 
@@ -77,32 +74,19 @@ class FileManager(FileManagerBase):
         if not result["OK"]:
             return result
         directoryIDs = result["Value"]
-        directoryPaths = {}
+        directoryPaths = dict((dirID, dirPath) for dirPath, dirID in directoryIDs.items())
 
-        for dirPath in dirDict:
-            if dirPath not in directoryIDs:
-                for fileName in dirDict[dirPath]:
-                    fname = "%s/%s" % (dirPath, fileName)
-                    fname = fname.replace("//", "/")
-                    failed[fname] = "No such file or directory"
-            else:
-                directoryPaths[directoryIDs[dirPath]] = dirPath
-
-        for dirIDs in breakListIntoChunks(list(directoryIDs), 1000):
-            wheres = []
-            for dirPath in dirIDs:
-                fileNames = dirDict[dirPath]
-                dirID = directoryIDs[dirPath]
-                wheres.append("( DirID=%d AND FileName IN (%s) )" % (dirID, stringListToString(fileNames)))
-
-            req = "SELECT FileName,DirID,FileID FROM FC_Files WHERE %s" % " OR ".join(wheres)
-            result = self.db._query(req, connection)
-            if not result["OK"]:
-                return result
-            for fileName, dirID, fileID in result["Value"]:
-                fname = "%s/%s" % (directoryPaths[dirID], fileName)
-                fname = fname.replace("//", "/")
-                successful[fname] = fileID
+        result = self._getFilesInDirectories(
+            dict((directoryIDs[dirPath], dirDict[dirPath]) for dirPath in directoryIDs),
+            allStatus=True,
+            connection=connection,
+        )
+        if not result["OK"]:
+            return result
+        for fileName, dirID, fileID, _size, _uid, _gid, _status in result["Value"]:
+            fname = "%s/%s" % (directoryPaths[dirID], fileName)
+            fname = fname.replace("//", "/")
+            successful[fname] = fileID
 
         for lfn in lfns:
             if lfn not in successful:
@@ -110,20 +94,53 @@ class FileManager(FileManagerBase):
 
         return S_OK({"Successful": successful, "Failed": failed})
 
+    def _getVisibleStatusIDs(self, connection=False):
+        """Get the IDs of the file statuses returned when not asking for all of them"""
+        statusIDs = []
+        for status in self.db.visibleFileStatus:
+            res = self._getStatusInt(status, connection=connection)
+            if res["OK"]:
+                statusIDs.append(res["Value"])
+        return statusIDs
+
+    def _getFilesInDirectories(self, dirFiles, allStatus=False, connection=False):
+        """Get the FC_Files rows of files given by directory ID and file name
+
+        All the (DirID, FileName) pairs are sent together, by chunks of db.findFilesChunkSize,
+        instead of one query per directory
+
+        :param dict dirFiles: { dirID: list of file names }
+        :param bool allStatus: if False, only the files whose status is in db.visibleFileStatus
+
+        :returns: S_OK(list of (FileName, DirID, FileID, Size, UID, GID, Status) tuples)
+        """
+        connection = self._getConnection(connection)
+        pairs = [(dirID, fileName) for dirID, fileNames in dirFiles.items() for fileName in set(fileNames)]
+        statusReq = ""
+        if pairs and not allStatus:
+            statusIDs = self._getVisibleStatusIDs(connection=connection)
+            if statusIDs:
+                statusReq = " AND Status IN (%s)" % intListToString(statusIDs)
+        rows = []
+        for chunk in breakListIntoChunks(pairs, self.db.findFilesChunkSize):
+            req = "SELECT FileName,DirID,FileID,Size,UID,GID,Status FROM FC_Files WHERE (DirID,FileName) IN (%s)%s" % (
+                ",".join(["(%s,%s)"] * len(chunk)),
+                statusReq,
+            )
+            res = self.db._query(req, connection, args=[value for pair in chunk for value in pair])
+            if not res["OK"]:
+                return res
+            rows.extend(res["Value"])
+        return S_OK(rows)
+
     def _getDirectoryFiles(self, dirID, fileNames, metadata_input, allStatus=False, connection=False):
         """Get the metadata for files in the same directory"""
-        metadata = list(metadata_input)
-
         connection = self._getConnection(connection)
         # metadata can be any of ['FileID','Size','UID','GID','Status','Checksum','ChecksumType',
         # 'Type','CreationDate','ModificationDate','Mode']
         req = "SELECT FileName,DirID,FileID,Size,UID,GID,Status FROM FC_Files WHERE DirID=%d" % (dirID)
         if not allStatus:
-            statusIDs = []
-            for status in self.db.visibleFileStatus:
-                res = self._getStatusInt(status, connection=connection)
-                if res["OK"]:
-                    statusIDs.append(res["Value"])
+            statusIDs = self._getVisibleStatusIDs(connection=connection)
             if statusIDs:
                 req = "%s AND Status IN (%s)" % (req, intListToString(statusIDs))
         if fileNames:
@@ -131,28 +148,73 @@ class FileManager(FileManagerBase):
         res = self.db._query(req, connection)
         if not res["OK"]:
             return res
-        fileNameIDs = res["Value"]
-        if not fileNameIDs:
-            return S_OK({})
+        res = self._getFilesMetadata(res["Value"], metadata_input, connection=connection)
+        if not res["OK"]:
+            return res
+        return S_OK(dict((fileName, fileDict) for (_dirID, fileName), fileDict in res["Value"].items()))
+
+    def _getDirectoryFilesBatch(self, dirID, batchSize, lastFileName, metadata_input, connection=False):
+        """Get the metadata for the next files of a directory, in the order of their names
+
+        :param int dirID: directory ID
+        :param int batchSize: maximum number of files
+        :param lastFileName: name of the last file of the previous batch, None to start from the beginning
+        :param metadata_input: list of desired metadata
+
+        :returns: S_OK((list of (file name, metadata dictionary) tuples, True if there are no more files))
+        """
+        connection = self._getConnection(connection)
+        req = "SELECT FileName,DirID,FileID,Size,UID,GID,Status FROM FC_Files WHERE DirID=%s"
+        args = [dirID]
+        statusIDs = self._getVisibleStatusIDs(connection=connection)
+        if statusIDs:
+            req = "%s AND Status IN (%s)" % (req, intListToString(statusIDs))
+        if lastFileName is not None:
+            req += " AND FileName>%s"
+            args.append(lastFileName)
+        req += " ORDER BY FileName LIMIT %s"
+        args.append(int(batchSize))
+        res = self.db._query(req, connection, args=args)
+        if not res["OK"]:
+            return res
+        fileRows = res["Value"]
+        res = self._getFilesMetadata(fileRows, metadata_input, connection=connection)
+        if not res["OK"]:
+            return res
+        files = [(fileName, res["Value"][(dirID, fileName)]) for fileName, dirID, _fileID, _s, _u, _g, _st in fileRows]
+        return S_OK((files, len(fileRows) < int(batchSize)))
+
+    def _getFilesMetadata(self, fileRows, metadata_input, connection=False):
+        """Get the requested metadata of files
+
+        :param fileRows: (FileName, DirID, FileID, Size, UID, GID, Status) tuples of FC_Files
+        :param metadata_input: list of desired metadata
+
+        :returns: S_OK(dict) of metadata dictionaries indexed by (DirID, FileName)
+        """
+        metadata = list(metadata_input)
         filesDict = {}
+        if not fileRows:
+            return S_OK(filesDict)
         # If we only requested the FileIDs then there is no need to do anything else
         if metadata == ["FileID"]:
-            for fileName, dirID, fileID, size, uid, gid, status in fileNameIDs:
-                filesDict[fileName] = {"FileID": fileID}
+            for fileName, dirID, fileID, size, uid, gid, status in fileRows:
+                filesDict[(dirID, fileName)] = {"FileID": fileID}
             return S_OK(filesDict)
         # Otherwise get the additionally requested metadata from the FC_FileInfo table
         files = {}
         userDict = {}
         groupDict = {}
-        for fileName, dirID, fileID, size, uid, gid, status in fileNameIDs:
-            filesDict[fileID] = fileName
-            files[fileName] = {}
+        for fileName, dirID, fileID, size, uid, gid, status in fileRows:
+            fileKey = (dirID, fileName)
+            filesDict[fileID] = fileKey
+            files[fileKey] = {}
             if "Size" in metadata:
-                files[fileName]["Size"] = size
+                files[fileKey]["Size"] = size
             if "DirID" in metadata:
-                files[fileName]["DirID"] = dirID
+                files[fileKey]["DirID"] = dirID
             if "UID" in metadata:
-                files[fileName]["UID"] = uid
+                files[fileKey]["UID"] = uid
                 if uid in userDict:
                     owner = userDict[uid]
                 else:
@@ -161,9 +223,9 @@ class FileManager(FileManagerBase):
                     if result["OK"]:
                         owner = result["Value"]
                     userDict[uid] = owner
-                files[fileName]["Owner"] = owner
+                files[fileKey]["Owner"] = owner
             if "GID" in metadata:
-                files[fileName]["GID"] = gid
+                files[fileKey]["GID"] = gid
                 if gid in groupDict:
                     group = groupDict[gid]
                 else:
@@ -172,25 +234,26 @@ class FileManager(FileManagerBase):
                     if result["OK"]:
                         group = result["Value"]
                     groupDict[gid] = group
-                files[fileName]["OwnerGroup"] = group
+                files[fileKey]["OwnerGroup"] = group
             if "Status" in metadata:
-                files[fileName]["Status"] = self._getIntStatus(status).get("Value", status)
+                files[fileKey]["Status"] = self._getIntStatus(status).get("Value", status)
         for element in ["FileID", "Size", "DirID", "UID", "GID", "Status"]:
             if element in metadata:
                 metadata.remove(element)
         metadata.append("FileID")
         metadata.reverse()
-        req = "SELECT %s FROM FC_FileInfo WHERE FileID IN (%s)" % (
-            intListToString(metadata),
-            intListToString(filesDict.keys()),
-        )
-        res = self.db._query(req, connection)
-        if not res["OK"]:
-            return res
-        for tuple_ in res["Value"]:
-            fileID = tuple_[0]
-            rowDict = dict(zip(metadata, tuple_))
-            files[filesDict[fileID]].update(rowDict)
+        for fileIDs in breakListIntoChunks(list(filesDict), self.db.findFilesChunkSize):
+            req = "SELECT %s FROM FC_FileInfo WHERE FileID IN (%s)" % (
+                intListToString(metadata),
+                intListToString(fileIDs),
+            )
+            res = self.db._query(req, connection)
+            if not res["OK"]:
+                return res
+            for tuple_ in res["Value"]:
+                fileID = tuple_[0]
+                rowDict = dict(zip(metadata, tuple_))
+                files[filesDict[fileID]].update(rowDict)
         return S_OK(files)
 
     def _getDirectoryFileIDs(self, dirID, requestString=False):
@@ -16,10 +16,29 @@ from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities.List import intListToString
 from DIRAC.Core.Utilities.Pfn import pfnunparse
 
+# Metadata of the files returned in the directory listings
+LISTING_METADATA = [
+    "FileID",
+    "Size",
+    "GUID",
+    "Checksum",
+    "ChecksumType",
+    "Type",
+    "UID",
+    "GID",
+    "CreationDate",
+    "ModificationDate",
+    "Mode",
+    "Status",
+]
+
 
 class FileManagerBase(object):
     """Base class for all the specific File Managers"""
 
+    # True if the FC_DirectoryUsage table is kept up to date by triggers of the database
+    directoryUsageTriggers = False
+
     def __init__(self, database=None):
         self.db = database
         self.statusDict = {}
@@ -145,6 +164,10 @@ class FileManagerBase(object):
         """To be implemented on derived class"""
         return S_ERROR("To be implemented on derived class")
 
+    def _getDirectoryFilesBatch(self, dirID, batchSize, lastFileName, metadata, connection=False):
+        """To be implemented on derived class"""
+        return S_ERROR("To be implemented on derived class")
+
     def _getDirectoryFileIDs(self, dirID, requestString=False):
         """To be implemented on derived class"""
         return S_ERROR("To be implemented on derived class")
@@ -373,30 +396,42 @@ class FileManagerBase(object):
         return S_OK({"Successful": successful, "Failed": failed})
 
     def _updateDirectoryUsage(self, directorySEDict, change, connection=False):
+        """Apply the usage changes of directories to them and to all their parents
+
+        The changes of all the directories are summed per parent directory and storage element
+        and written with a single statement, so that the recursive usage stays consistent.
+
+        :param dict directorySEDict: {dirID: {seID: {"Size": size, "Files": files}}}, SEID 0 is the logical usage
+        :param str change: "+" or "-"
+        """
         connection = self._getConnection(connection)
-        for directoryID in directorySEDict.keys():
+        sign = -1 if change == "-" else 1
+        usageDeltas = {}
+        for directoryID, dirDict in directorySEDict.items():
             result = self.db.dtree.getPathIDsByID(directoryID)
             if not result["OK"]:
                 return result
-            parentIDs = result["Value"]
-            dirDict = directorySEDict[directoryID]
-            for seID in dirDict.keys():
-                seDict = dirDict[seID]
-                files = seDict["Files"]
-                size = seDict["Size"]
-                insertTuples = []
-                for dirID in parentIDs:
-                    insertTuples.append("(%d,%d,%d,%d,UTC_TIMESTAMP())" % (dirID, seID, size, files))
-
-                req = "INSERT INTO FC_DirectoryUsage (DirID,SEID,SESize,SEFiles,LastUpdate) "
-                req += "VALUES %s" % ",".join(insertTuples)
-                req += (
-                    " ON DUPLICATE KEY UPDATE SESize=SESize%s%d, SEFiles=SEFiles%s%d, LastUpdate=UTC_TIMESTAMP() "
-                    % (change, size, change, files)
-                )
-                res = self.db._update(req)
-                if not res["OK"]:
-                    gLogger.warn("Failed to update FC_DirectoryUsage", res["Message"])
+            for dirID in result["Value"]:
+                for seID, seDict in dirDict.items():
+                    delta = usageDeltas.setdefault((dirID, seID), [0, 0])
+                    delta[0] += sign * seDict["Size"]
+                    delta[1] += sign * seDict["Files"]
+
+        # Sorted to always lock the rows in the same order
+        insertTuples = [
+            "(%d,%d,%d,%d,UTC_TIMESTAMP())" % (dirID, seID, size, files)
+            for (dirID, seID), (size, files) in sorted(usageDeltas.items())
+            if size or files
+        ]
+        if not insertTuples:
+            return S_OK()
+        req = "INSERT INTO FC_DirectoryUsage (DirID,SEID,SESize,SEFiles,LastUpdate) VALUES %s" % ",".join(insertTuples)
+        req += " ON DUPLICATE KEY UPDATE SESize=SESize+VALUES(SESize), SEFiles=SEFiles+VALUES(SEFiles),"
+        req += " LastUpdate=UTC_TIMESTAMP()"
+        res = self.db._update(req, connection)
+        if not res["OK"]:
+            gLogger.warn("Failed to update FC_DirectoryUsage", res["Message"])
+            return res
         return S_OK()
 
     def _populateFileAncestors(self, lfns, connection=False):
@@ -1104,32 +1139,37 @@ class FileManagerBase(object):
 
     def getFilesInDirectory(self, dirID, verbose=False, connection=False):
         connection = self._getConnection(connection)
-        files = {}
-        res = self._getDirectoryFiles(
-            dirID,
-            [],
-            [
-                "FileID",
-                "Size",
-                "GUID",
-                "Checksum",
-                "ChecksumType",
-                "Type",
-                "UID",
-                "GID",
-                "CreationDate",
-                "ModificationDate",
-                "Mode",
-                "Status",
-            ],
-            connection=connection,
-        )
+        res = self._getDirectoryFiles(dirID, [], LISTING_METADATA, connection=connection)
+        if not res["OK"]:
+            return res
+        return self.__getListedFiles(dirID, res["Value"].items(), verbose, connection)
+
+    def getFilesInDirectoryBatch(self, dirID, batchSize, lastFileName=None, verbose=False, connection=False):
+        """Get the next files of a directory listing, in the order of their names
+
+        :param int dirID: directory ID
+        :param int batchSize: maximum number of files
+        :param lastFileName: name of the last file of the previous batch, None to start from the beginning
+        :param bool verbose: if True, add the replicas of the files
+
+        :returns: S_OK((files dictionary as for getFilesInDirectory, name of the last file or None if
+                  there are no more files))
+        """
+        connection = self._getConnection(connection)
+        res = self._getDirectoryFilesBatch(dirID, batchSize, lastFileName, LISTING_METADATA, connection)
         if not res["OK"]:
             return res
-        if not res["Value"]:
-            return S_OK(files)
+        fileList, complete = res["Value"]
+        result = self.__getListedFiles(dirID, fileList, verbose, connection)
+        if not result["OK"]:
+            return result
+        return S_OK((result["Value"], None if complete else fileList[-1][0]))
+
+    def __getListedFiles(self, dirID, fileList, verbose, connection):
+        """Build the files dictionary of a directory listing from (file name, metadata) pairs"""
+        files = {}
         fileIDNames = {}
-        for fileName, fileDict in res["Value"].items():
+        for fileName, fileDict in fileList:
             try:
                 files[fileName] = {}
                 files[fileName]["MetaData"] = fileDict
@@ -1142,7 +1182,7 @@ class FileManagerBase(object):
                     % (fileName, dirID)
                 )
 
-        if verbose:
+        if verbose and fileIDNames:
             result = self._getFileReplicas(list(fileIDNames), connection=connection)
             if not result["OK"]:
                 return result
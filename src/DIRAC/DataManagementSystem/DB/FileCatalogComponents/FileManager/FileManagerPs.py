@@ -19,6 +19,8 @@ from DIRAC.Core.Utilities.List import stringListToString, intListToString, break
 
 
 class FileManagerPs(FileManagerBase):
+    directoryUsageTriggers = True
+
     def __init__(self, database=None):
         super(FileManagerPs, self).__init__(database)
 
@@ -135,14 +137,6 @@ class FileManagerPs(FileManagerBase):
 
         connection = self._getConnection(connection)
 
-        metadata = list(metadata_input)
-        if "UID" in metadata:
-            metadata.append("Owner")
-        if "GID" in metadata:
-            metadata.append("OwnerGroup")
-        if "FileID" not in metadata:
-            metadata.append("FileID")
-
         # Format the filenames and status to be used in a IN clause in the sotred procedure
         formatedFileNames = stringListToString(fileNames)
         fStatus = stringListToString(self.db.visibleFileStatus)
@@ -155,6 +149,44 @@ class FileManagerPs(FileManagerBase):
         if not result["OK"]:
             return result
 
+        return S_OK(dict(self.__getFilesFromInfoRows(result["Value"], metadata_input)))
+
+    def _getDirectoryFilesBatch(self, dirID, batchSize, lastFileName, metadata_input, connection=False):
+        """Get the metadata for the next visible files of a directory, in the order of their names
+
+        :param int dirID: directory ID
+        :param int batchSize: maximum number of files
+        :param lastFileName: name of the last file of the previous batch, None to start from the beginning
+        :param metadata_input: list of desired metadata, as for _getDirectoryFiles
+
+        :returns: S_OK((list of (file name, metadata dictionary) tuples, True if there are no more files))
+        """
+        # All the file names are greater than the empty string.
+        # The string parameters are given within double quotes to the stored procedure
+        lastFileName = (lastFileName or "").replace("\\", "\\\\").replace('"', '\\"')
+        fStatus = stringListToString(self.db.visibleFileStatus)
+        result = self.db.executeStoredProcedureWithCursor(
+            "ps_get_all_info_for_files_in_dir_batch", (dirID, lastFileName, int(batchSize), fStatus)
+        )
+        if not result["OK"]:
+            return result
+        rows = result["Value"]
+        return S_OK((self.__getFilesFromInfoRows(rows, metadata_input), len(rows) < int(batchSize)))
+
+    @staticmethod
+    def __getFilesFromInfoRows(rows, metadata_input):
+        """Get the desired metadata of files from the rows of ps_get_all_info_for_files_in_dir
+
+        :returns: list of (file name, metadata dictionary) tuples, in the order of the rows
+        """
+        metadata = list(metadata_input)
+        if "UID" in metadata:
+            metadata.append("Owner")
+        if "GID" in metadata:
+            metadata.append("OwnerGroup")
+        if "FileID" not in metadata:
+            metadata.append("FileID")
+
         fieldNames = [
             "FileName",
             "DirID",
@@ -174,17 +206,13 @@ class FileManagerPs(FileManagerBase):
             "Mode",
         ]
 
-        rows = result["Value"]
-        files = {}
-
+        files = []
         for row in rows:
-
             rowDict = dict(zip(fieldNames, row))
-            fileName = rowDict["FileName"]
             # Returns only the required metadata
-            files[fileName] = dict((key, rowDict.get(key, "Unknown metadata field")) for key in metadata)
-
-        return S_OK(files)
+            fileDict = dict((key, rowDict.get(key, "Unknown metadata field")) for key in metadata)
+            files.append((rowDict["FileName"], fileDict))
+        return files
 
     def _getFileMetadataByID(self, fileIDs, connection=False):
         """Get standard file metadata for a list of files specified by FileID
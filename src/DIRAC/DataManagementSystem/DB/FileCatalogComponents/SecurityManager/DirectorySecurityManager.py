@@ -19,13 +19,24 @@ class DirectorySecurityManager(SecurityManagerBase):
         toGet = dict(zip(paths, [[path] for path in paths]))
         permissions = {}
         failed = {}
+        cacheKey = (credDict.get("username"), credDict.get("group"))
         while toGet:
+            # Directories already checked in this request do not need to be checked again
+            for path, resolvedPaths in list(toGet.items()):
+                mode = self.permissionCache.get((path,) + cacheKey)
+                if mode is not None:
+                    for resolvedPath in resolvedPaths:
+                        permissions[resolvedPath] = dict(mode)
+                    toGet.pop(path)
+            if not toGet:
+                break
             res = self.db.dtree.getPathPermissions(list(toGet), credDict)
             if not res["OK"]:
                 return res
             for path, mode in list(res["Value"]["Successful"].items()):
+                self.permissionCache.set((path,) + cacheKey, mode)
                 for resolvedPath in toGet[path]:
-                    permissions[resolvedPath] = mode
+                    permissions[resolvedPath] = dict(mode)
                 toGet.pop(path)
             for path, error in list(res["Value"]["Failed"].items()):
                 if error != "No such file or directory":
@@ -35,7 +46,9 @@ class DirectorySecurityManager(SecurityManagerBase):
             for path, resolvedPaths in list(toGet.items()):
                 if path == "/":
                     for resolvedPath in resolvedPaths:
-                        permissions[path] = {"Read": True, "Write": True, "Execute": True}
+                        permissions[resolvedPath] = {"Read": True, "Write": True, "Execute": True}
+                    toGet.pop(path)
+                    continue
                 if os.path.dirname(path) not in toGet:
                     toGet[os.path.dirname(path)] = []
                 toGet[os.path.dirname(path)] += resolvedPaths
@@ -6,6 +6,10 @@ from __future__ import print_function
 
 __RCSID__ = "$Id$"
 
+import threading
+import time
+from contextlib import contextmanager
+
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Security.Properties import FC_MANAGEMENT
 
@@ -44,9 +48,82 @@ _writeMethods = [
 ]
 
 
+class PermissionCache(object):
+    """Memoization of the permissions on directories, keyed by (directory, user, group)
+
+    The permissions are kept for the request being served by the thread (see request()),
+    and for a short lifetime across requests if one is configured
+    """
+
+    def __init__(self, lifetime=0, maxSize=10000):
+        self.lifetime = lifetime
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self.__lock = threading.Lock()
+        # key -> (expiration time, permissions)
+        self.__shared = {}
+        self.__local = threading.local()
+
+    @contextmanager
+    def request(self):
+        """Memoize the permissions computed until the end of the request"""
+        if getattr(self.__local, "permissions", None) is not None:
+            # Nested call, the outer one owns the request
+            yield
+            return
+        self.__local.permissions = {}
+        try:
+            yield
+        finally:
+            self.__local.permissions = None
+
+    def get(self, key):
+        """Get the permissions for a key, None if not known"""
+        requestPermissions = getattr(self.__local, "permissions", None)
+        permissions = requestPermissions.get(key) if requestPermissions is not None else None
+        if permissions is None and self.lifetime:
+            with self.__lock:
+                entry = self.__shared.get(key)
+            if entry and entry[0] > time.time():
+                permissions = entry[1]
+                if requestPermissions is not None:
+                    requestPermissions[key] = permissions
+        if permissions is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return dict(permissions)
+
+    def set(self, key, permissions):
+        """Keep the permissions for a key"""
+        permissions = dict(permissions)
+        requestPermissions = getattr(self.__local, "permissions", None)
+        if requestPermissions is not None:
+            requestPermissions[key] = permissions
+        if self.lifetime:
+            now = time.time()
+            with self.__lock:
+                if len(self.__shared) >= self.maxSize:
+                    self.__shared = dict((k, entry) for k, entry in self.__shared.items() if entry[0] > now)
+                    if len(self.__shared) >= self.maxSize:
+                        self.__shared = {}
+                self.__shared[key] = (now + self.lifetime, permissions)
+
+    def clear(self):
+        """Forget the permissions shared between the requests"""
+        with self.__lock:
+            self.__shared = {}
+
+    def getCounters(self):
+        """Get the usage counters of the cache"""
+        return {"Permission cache hits": self.hits, "Permission cache misses": self.misses}
+
+
 class SecurityManagerBase(object):
     def __init__(self, database=None):
         self.db = database
+        self.permissionCache = PermissionCache(getattr(database, "permissionCacheLifetime", 0))
 
     def setDatabase(self, database):
         self.db = database
@@ -83,7 +160,8 @@ class SecurityManagerBase(object):
             resDict = {"Successful": successful, "Failed": {}}
             return S_OK(resDict)
 
-        result = self.getPathPermissions(paths, credDict)
+        with self.permissionCache.request():
+            result = self.getPathPermissions(paths, credDict)
         if not result["OK"]:
             return result
 
@@ -103,3 +181,7 @@ class SecurityManagerBase(object):
         if FC_MANAGEMENT in credDict["properties"]:
             return S_OK(True)
         return S_OK(False)
+
+    def getCounters(self):
+        """Get the counters of the permission cache"""
+        return self.permissionCache.getCounters()
@@ -159,12 +159,38 @@ class VOMSSecurityManager(SecurityManagerBase):
         successful = {}
         failed = {}
 
-        for filename in paths:
-            res = self.__getFilePermission(filename, credDict, noExistStrategy=noExistStrategy)
-            if not res["OK"]:
-                failed[filename] = res["Message"]
+        # We check what are the groups stored in the DB for all the files at once
+        res = self.db.fileManager.getFileMetadata(list(paths))
+        if not res["OK"]:
+            res = S_OK({"Successful": {}, "Failed": dict.fromkeys(paths, res["Message"])})
+
+        for filename, error in res["Value"]["Failed"].items():
+            # If the error is not due to the file not existing, or if we have no strategy
+            # regarding non existing files, then just return the error
+            if noExistStrategy is None or not self.__isNotExistError(error):
+                failed[filename] = error
             else:
-                successful[filename] = res["Value"].get(permission, False)
+                successful[filename] = noExistStrategy
+
+        # The files whose owner group shares the same voms role as the user are checked
+        # like if we were the group stored in the DB, the others with the user credentials
+        filesByGroup = {}
+        group = credDict.get("group", "anon")
+        for filename, metadata in res["Value"]["Successful"].items():
+            origGrp = metadata.get("OwnerGroup", "unknown")
+            filesByGroup.setdefault(origGrp if self.__shareVomsRole(group, origGrp) else None, []).append(filename)
+
+        for origGrp, filenames in filesByGroup.items():
+            fileCredDict = credDict
+            if origGrp is not None:
+                fileCredDict = {"username": credDict.get("username", "anon"), "group": origGrp}
+            res = self.db.fileManager.getPathPermissions(filenames, fileCredDict)
+            if not res["OK"]:
+                failed.update(dict.fromkeys(filenames, res["Message"]))
+                continue
+            failed.update(res["Value"]["Failed"])
+            for filename, permissions in res["Value"]["Successful"].items():
+                successful[filename] = permissions.get(permission, False)
 
         return S_OK({"Successful": successful, "Failed": failed})
 
@@ -189,6 +215,12 @@ class VOMSSecurityManager(SecurityManagerBase):
         if not path:
             return S_ERROR("Empty path")
 
+        # Existing directories already checked for this user in the request
+        cacheKey = (path, credDict.get("username", "anon"), credDict.get("group", "anon"))
+        permissions = self.permissionCache.get(cacheKey)
+        if permissions is not None:
+            return S_OK(permissions)
+
         # We check what is the group stored in the DB for the given path
         res = self.db.dtree.getDirectoryParameters(path)
         if not res["OK"]:
@@ -225,7 +257,10 @@ class VOMSSecurityManager(SecurityManagerBase):
         if self.__shareVomsRole(credDict.get("group", "anon"), origGrp):
             credDict = {"username": credDict.get("username", "anon"), "group": origGrp}
 
-        return self.db.dtree.getDirectoryPermissions(path, credDict)
+        res = self.db.dtree.getDirectoryPermissions(path, credDict)
+        if res["OK"]:
+            self.permissionCache.set(cacheKey, res["Value"])
+        return res
 
     def __testPermissionOnDirectory(self, paths, permission, credDict, recursive=True, noExistStrategy=None):
         """Tests a permission on a list of directories
@@ -593,7 +628,8 @@ class VOMSSecurityManager(SecurityManagerBase):
         if not policyToExecute:
             return S_ERROR("No policy matching operation %s" % opType)
 
-        res = policyToExecute(paths, credDict)
+        with self.permissionCache.request():
+            res = policyToExecute(paths, credDict)
 
         return res
 
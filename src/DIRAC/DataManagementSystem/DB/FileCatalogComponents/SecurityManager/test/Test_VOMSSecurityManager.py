@@ -12,6 +12,7 @@ import stat
 import mock
 from DIRAC import S_OK, S_ERROR
 import DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityManager.VOMSSecurityManager
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.SecurityManager.SecurityManagerBase import PermissionCache
 
 # This just defines a few groups with their VOMSRole
 diracGrps = {
@@ -233,6 +234,7 @@ class mock_SecurityManagerBase(object):
 
     def __init__(self, database=False):
         self.db = mock_db()
+        self.permissionCache = PermissionCache()
 
     def hasAdminAccess(self, credDict):
         """Returns true only if the group is grp_admin"""
@@ -1598,6 +1600,53 @@ class TestUserGrpUsr1User(BaseCaseMixin, unittest.TestCase):
         super(TestUserGrpUsr1User, self).test_addReplica()
 
 
+class TestPermissionCache(unittest.TestCase):
+    """Memoization of the directory permissions"""
+
+    setUp = BaseCaseMixin.setUp
+
+    def test_requestMemoization(self):
+        """The permissions of a directory are computed once per request"""
+        self.credDict = {"username": "usr1", "group": "grp_user"}
+        dtree = self.securityManager.db.dtree
+        with mock.patch.object(dtree, "getDirectoryPermissions", wraps=dtree.getDirectoryPermissions) as getPerms:
+            files = ["/users/usr1/file%s.txt" % i for i in range(10)]
+            res = self.securityManager.hasAccess("addFile", files, self.credDict)
+            self.assertTrue(res["OK"], res)
+            self.assertEqual(res["Value"]["Successful"], dict.fromkeys(files, True))
+            self.assertEqual(getPerms.call_count, 1)
+
+            # A new request computes them again
+            res = self.securityManager.hasAccess("addFile", files, self.credDict)
+            self.assertEqual(getPerms.call_count, 2)
+
+            # Another user does not get them
+            res = self.securityManager.hasAccess("addFile", files, {"username": "usr2", "group": "grp_user"})
+            self.assertEqual(res["Value"]["Successful"], dict.fromkeys(files, False))
+
+    def test_lifetime(self):
+        """The permissions are shared between requests only with a lifetime"""
+        cache = PermissionCache(lifetime=0)
+        with cache.request():
+            cache.set(("/a", "usr1", "grp_user"), {"Read": True})
+            with cache.request():
+                self.assertEqual(cache.get(("/a", "usr1", "grp_user")), {"Read": True})
+            self.assertEqual(cache.get(("/a", "usr1", "grp_user")), {"Read": True})
+        self.assertIsNone(cache.get(("/a", "usr1", "grp_user")))
+
+        cache = PermissionCache(lifetime=60)
+        with cache.request():
+            cache.set(("/a", "usr1", "grp_user"), {"Read": True})
+        permissions = cache.get(("/a", "usr1", "grp_user"))
+        self.assertEqual(permissions, {"Read": True})
+        # The cached value can not be modified by the caller
+        permissions["Read"] = False
+        self.assertEqual(cache.get(("/a", "usr1", "grp_user")), {"Read": True})
+        cache.clear()
+        self.assertIsNone(cache.get(("/a", "usr1", "grp_user")))
+        self.assertEqual(cache.getCounters(), {"Permission cache hits": 2, "Permission cache misses": 1})
+
+
 if __name__ == "__main__":
 
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestNonExistingUser)
@@ -1606,5 +1655,6 @@ if __name__ == "__main__":
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestDataGrpDmUser))
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestDataGrpUsr1User))
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestUserGrpUsr1User))
+    suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestPermissionCache))
 
     unittest.TextTestRunner(verbosity=2).run(suite)
@@ -7,16 +7,26 @@ from __future__ import print_function
 # pylint: disable=protected-access
 
 # imports
+import time
 from mock import MagicMock
 
-from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryTreeBase import DirectoryTreeBase
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryTreeBase import (
+    DirectoryTreeBase,
+    DirectoryCache,
+)
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryLevelTree import DirectoryLevelTree
 
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectorySimpleTree import DirectorySimpleTree
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryFlatTree import DirectoryFlatTree
 # from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryNodeTree import DirectoryNodeTree
 
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryMetadata.DirectoryMetadata import (
+    DirectoryMetadata,
+    MetaQueryIndex,
+)
 from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerBase import FileManagerBase
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManager import FileManager
+from DIRAC.DataManagementSystem.DB.FileCatalogComponents.FileManager.FileManagerPs import FileManagerPs
 
 dbMock = MagicMock()
 ugManagerMock = MagicMock()
@@ -48,6 +58,218 @@ def test_Level_makeDirectory():
     assert res["OK"] is True  # this will need to be implemented on a derived class
 
 
+def test_DirectoryCache(mocker):
+    cache = DirectoryCache(maxSize=2, lifetime=10)
+    cache.add("/a", 1, 1)
+    cache.add("/a/b", 2, 2)
+    assert cache.getDirID("/a") == (1, 1)
+    # /a/b is the least recently used
+    cache.add("/a/c", 3, 2)
+    assert cache.getDirID("/a/b") is None
+    assert cache.getPath(2) is None
+    assert cache.getPath(3) == "/a/c"
+    cache.setValue("/a/c", "PathIDs", [1, 3])
+    assert cache.getValue("/a/c", "PathIDs") == [1, 3]
+    cache.remove(dirID=3)
+    assert cache.getDirID("/a/c") is None
+    assert cache.getCounters() == {"Directory cache size": 1, "Directory cache hits": 3, "Directory cache misses": 3}
+
+    mocker.patch(
+        "DIRAC.DataManagementSystem.DB.FileCatalogComponents.DirectoryManager.DirectoryTreeBase.time.time",
+        return_value=time.time() + 20,
+    )
+    assert cache.getDirID("/a") is None
+    assert cache.getCounters()["Directory cache size"] == 0
+
+
+def test_Level_findDirCache():
+    levelDB = MagicMock()
+    levelDB._escapeString.side_effect = lambda path: {"OK": True, "Value": "'%s'" % path}
+    levelDB._query.return_value = {"OK": True, "Value": (("/a/b", 2, 2),)}
+    levelDB._update.return_value = {"OK": True, "Value": 1}
+    tree = DirectoryLevelTree()
+    tree.db = levelDB
+
+    assert tree.findDirs(["/a/b"])["Value"] == {"/a/b": 2}
+    res = tree.findDir("/a/b/")
+    assert res["Value"] == 2 and res["Level"] == 2
+    assert tree.findDirs(["/a/b"])["Value"] == {"/a/b": 2}
+    assert tree.getDirectoryPath(2)["Value"] == "/a/b"
+    assert levelDB._query.call_count == 1
+
+    # A directory which could not be removed is still known
+    levelDB._update.return_value = {"OK": False, "Message": "Lock wait timeout"}
+    assert not tree.removeDir("/a/b")["OK"]
+    assert tree.findDir("/a/b")["Value"] == 2
+    assert levelDB._query.call_count == 1
+
+    # Removing the directory forgets it, after the deletion
+    def update(req):
+        # Concurrent lookup while the directory is deleted
+        assert tree.findDir("/a/b")["Value"] == 2
+        return {"OK": True, "Value": 1}
+
+    levelDB._update.side_effect = update
+    assert tree.removeDir("/a/b")["OK"]
+    levelDB._query.return_value = {"OK": True, "Value": ()}
+    assert tree.findDir("/a/b")["Value"] == ""
+    assert levelDB._query.call_count == 2
+
+
+def test_MetaQueryIndex():
+    index = MetaQueryIndex(maxSize=2, lifetime=10)
+    keyA = index.getKey({"A": 1, "B": "x"}, "/vo/")
+    assert keyA == index.getKey({"B": "x", "A": 1}, "/vo")
+    index.add(keyA, ["A", "B"], [3, 2], "Done")
+    keyC = index.getKey({"C": {">": 2}}, "/")
+    index.add(keyC, ["C"], [4], "Done")
+    # The order of the result is kept
+    assert index.get(keyA)[0] == [3, 2]
+
+    # A new directory is added to the results containing its parent
+    index.addDirectory(3, 5)
+    index.addDirectory(2, 5)
+    assert index.get(keyA)[0] == [3, 2, 5]
+    assert index.get(keyC) == ([4], "Done")
+
+    # Removed directories are dropped, keeping the order of the others
+    index.removeDirectories([2, 8])
+    index.addDirectory(2, 6)
+    assert index.get(keyA)[0] == [3, 5]
+
+    # Removing all the selected directories drops the result
+    index.removeDirectories([4])
+    assert index.get(keyC) is None
+
+    # Changing a metadata field forgets the queries using it
+    index.invalidate(["B"])
+    assert index.get(keyA) is None
+    assert index.getCounters() == {
+        "Metadata query index size": 0,
+        "Metadata query index hits": 4,
+        "Metadata query index misses": 2,
+    }
+
+
+def test_findDirIDsByMetadataIndex():
+    metaDB = MagicMock()
+    metaDB.metaQueryIndexSize = 10
+    metaDB.metaQueryIndexLifetime = 300
+
+    def query(req, *args, **kwargs):
+        if "FC_MetaFields" in req:
+            return {"OK": True, "Value": (("A", "INT"),)}
+        if "IN (0)" in req:
+            return {"OK": True, "Value": ()}
+        return {"OK": True, "Value": ((5,),)}
+
+    metaDB._query.side_effect = query
+    metaDB._update.return_value = {"OK": True, "Value": 1}
+    metaDB.dtree.getAllSubdirectoriesByID.return_value = {"OK": True, "Value": [6]}
+    metaDB.dtree.findDir.return_value = {"OK": True, "Value": 5}
+    dmeta = DirectoryMetadata(metaDB)
+
+    res = dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    assert sorted(res["Value"]) == [5, 6] and res["Selection"] == "Done"
+    queries = metaDB._query.call_count
+    dmeta.queryIndex.addDirectory(6, 7)
+    res = dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    assert sorted(res["Value"]) == [5, 6, 7] and res["Selection"] == "Done"
+    # Only the metadata fields are looked up to expand the query
+    assert metaDB._query.call_count == queries + 1
+
+    # Removing the metadata invalidates the indexed result
+    assert dmeta.removeMetadata("/a", ["A"], {})["OK"]
+    dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    assert metaDB._query.call_count > queries + 3
+
+    # A query indexed while the metadata is being set is invalidated after the update
+    res = dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    dmeta.getDirectoryMetadata = MagicMock(return_value={"OK": True, "Value": {}})
+    metaDB.insertFields.side_effect = lambda *args: dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    assert dmeta.setMetadata("/a", {"A": 2}, {})["OK"]
+    queries = metaDB._query.call_count
+    dmeta.findDirIDsByMetadata({"A": 1}, "/", {})
+    assert metaDB._query.call_count > queries + 1
+
+
+def test_Base_reconcileDirectoryUsage():
+    # Usage recorded for directory 2, which changes if a file operation is in progress
+    recordedUsage = [((2, 0, 300, 3), (2, 7, 200, 2))]
+
+    def execute(req):
+        if "FC_Replicas" in req:
+            cursor.rows = ((7, 300, 3),) if "DirID=2" in req else ()
+        elif "FROM FC_Files" in req:
+            cursor.rows = ((300, 3),) if "DirID=2" in req else ((None, 0),)
+        elif "IN (2)" in req:
+            cursor.rows = recordedUsage[0]
+        elif "FC_DirectoryUsage" in req:
+            # The parent directory is consistent with its corrected subdirectory
+            cursor.rows = ((1, 0, 300, 3), (1, 7, 300, 3), (2, 0, 300, 3), (2, 7, 300, 3))
+        else:
+            cursor.rows = ()
+
+    cursor = MagicMock()
+    cursor.execute.side_effect = execute
+    cursor.fetchall.side_effect = lambda: cursor.rows
+    connection = MagicMock()
+    connection.cursor.return_value = cursor
+    usageDB = MagicMock()
+    usageDB._getConnection.return_value = {"OK": True, "Value": connection}
+    usageDB.fileManager.directoryUsageTriggers = False
+    usageDB.fileManager._updateDirectoryUsage.return_value = {"OK": True, "Value": None}
+    tree = DirectoryTreeBase()
+    tree.db = usageDB
+    tree.reconcileConfirmDelay = 0
+    tree.findDir = MagicMock(return_value={"OK": True, "Value": 1})
+    tree.getChildren = MagicMock(side_effect=lambda dirID: {"OK": True, "Value": {1: [2], 2: []}[dirID]})
+
+    res = tree._reconcileDirectoryUsage("/")
+    assert res["OK"], res
+    assert res["Value"] == {"Directories": 2, "Corrected": 1}
+    # Only the difference is written, as a change propagated to the parents, in the transaction of the check
+    usageDB.fileManager._updateDirectoryUsage.assert_called_once_with(
+        {2: {7: {"Size": 100, "Files": 1}}}, "+", connection=connection
+    )
+    assert connection.commit.call_count == 1
+    # The usage rows and the files are read with locks
+    queries = [call[0][0] for call in cursor.execute.call_args_list]
+    assert all(query.endswith(("FOR UPDATE", "LOCK IN SHARE MODE")) for query in queries if "SELECT" in query)
+
+    # A failed correction is rolled back and not counted
+    usageDB.fileManager._updateDirectoryUsage.return_value = {"OK": False, "Message": "Lock wait timeout"}
+    connection.commit.reset_mock()
+    connection.rollback.reset_mock()
+    res = tree._reconcileDirectoryUsage("/")
+    assert not res["OK"]
+    connection.commit.assert_not_called()
+    assert connection.rollback.called
+    usageDB.fileManager._updateDirectoryUsage.return_value = {"OK": True, "Value": None}
+
+    # A difference that changes between the two checks is not corrected
+    usageDB.fileManager._updateDirectoryUsage.reset_mock()
+    connection.commit.reset_mock()
+    usages = [((2, 0, 300, 3), (2, 7, 200, 2)), ((2, 0, 300, 3), (2, 7, 300, 3))]
+
+    def executeConcurrently(req):
+        if "IN (2)" in req and usages:
+            recordedUsage[0] = usages.pop(0)
+        execute(req)
+
+    cursor.execute.side_effect = executeConcurrently
+    res = tree._reconcileDirectoryUsage("/")
+    assert res["OK"], res
+    assert res["Value"] == {"Directories": 2, "Corrected": 0}
+    usageDB.fileManager._updateDirectoryUsage.assert_not_called()
+    connection.commit.assert_not_called()
+
+    # Nothing to do when the usage is kept by the database triggers
+    usageDB.fileManager.directoryUsageTriggers = True
+    assert tree._reconcileDirectoryUsage("/")["Value"] == {"Directories": 0, "Corrected": 0}
+    usageDB.fileManager._updateDirectoryUsage.assert_not_called()
+
+
 ####################################################################################
 # SimpleTree
 # FIXME: this fails... is it a genuine failure?
@@ -88,6 +310,78 @@ def test_Level_makeDirectory():
 #   assert res['OK'] is True  # this will need to be implemented on a derived class
 
 
+def test_Level_listDirectoryBatch():
+    fileNames = ["f%02d" % i for i in range(7)]
+
+    def getFilesInDirectoryBatch(dirID, batchSize, lastFileName=None, verbose=False):
+        names = [name for name in fileNames if lastFileName is None or name > lastFileName][:batchSize]
+        files = dict((name, {"MetaData": {"FileID": name}}) for name in names)
+        return {"OK": True, "Value": (files, names[-1] if len(names) == batchSize else None)}
+
+    db = MagicMock()
+    db.directoryCacheSize = 0
+    db.fileManager.getFilesInDirectoryBatch.side_effect = getFilesInDirectoryBatch
+    db.datasetManager.getDatasetsInDirectory.return_value = {"OK": True, "Value": {}}
+    tree = DirectoryLevelTree(db)
+    tree.findDir = MagicMock(return_value={"OK": True, "Value": 1})
+    tree.getChildren = MagicMock(return_value={"OK": True, "Value": [5, 3, 4]})
+    tree.getDirectoryPath = MagicMock(side_effect=lambda dirID: {"OK": True, "Value": "/d/sub%s" % dirID})
+
+    subDirs = []
+    files = []
+    token = None
+    calls = 0
+    while True:
+        res = tree.listDirectoryBatch("/d", 2, token=token)
+        assert res["OK"], res
+        assert len(res["Value"]["SubDirs"]) + len(res["Value"]["Files"]) <= 2
+        subDirs += sorted(res["Value"]["SubDirs"])
+        files += sorted(res["Value"]["Files"])
+        token = res["Value"]["Token"]
+        calls += 1
+        if not token:
+            break
+    assert subDirs == ["/d/sub3", "/d/sub4", "/d/sub5"]
+    assert files == fileNames
+    # The last batch of files is full, so one more call finds out there is nothing left
+    assert calls == 6
+    assert db.datasetManager.getDatasetsInDirectory.call_count == 1
+
+    assert not tree.listDirectoryBatch("/d", 2, token=["Replicas", None])["OK"]
+    assert not tree.listDirectoryBatch("/d", 0)["OK"]
+
+
+def test_Ps_getDirectoryFilesBatch():
+    # In the order of the names
+    fileNames = ['f"0', "f1", "f2"]
+
+    def executeStoredProcedureWithCursor(packageName, parameters):
+        assert packageName == "ps_get_all_info_for_files_in_dir_batch"
+        _dirID, lastFileName, batchSize, _status = parameters
+        lastFileName = lastFileName.replace('\\"', '"')
+        names = [name for name in fileNames if name > lastFileName][:batchSize]
+        rows = [(name, 1, i, 10, 2, "user", 3, "group", "AprioriGood") for i, name in enumerate(names)]
+        return {"OK": True, "Value": tuple(rows)}
+
+    psDB = MagicMock()
+    psDB.visibleFileStatus = ["AprioriGood"]
+    psDB.executeStoredProcedureWithCursor.side_effect = executeStoredProcedureWithCursor
+    fileManager = FileManagerPs(psDB)
+
+    res = fileManager._getDirectoryFilesBatch(1, 2, None, ["FileID", "Size", "UID"])
+    assert res["OK"], res
+    files, complete = res["Value"]
+    assert [name for name, _fileDict in files] == ['f"0', "f1"]
+    assert files[0][1] == {"FileID": 0, "Size": 10, "UID": 2, "Owner": "user"}
+    assert not complete
+    res = fileManager._getDirectoryFilesBatch(1, 2, files[-1][0], ["FileID"])
+    assert res["Value"] == ([("f2", {"FileID": 0})], True)
+    # The name is escaped for the stored procedure call
+    res = fileManager._getDirectoryFilesBatch(1, 5, 'f"0', ["FileID"])
+    assert [name for name, _fileDict in res["Value"][0]] == ["f1", "f2"]
+    assert psDB.executeStoredProcedureWithCursor.call_args[0][1][1] == 'f\\"0'
+
+
 ####################################################################################
 ####################################################################################
 # FileManagerBase
@@ -103,3 +397,84 @@ def test_Base_addFile():
     res = fmb.addFile({"aa": "aaa/bbb"}, {})
     assert res["OK"] is True  # this will need to be implemented on a derived class, but it anyway returns S_OK()
     assert "aa" in res["Value"]["Failed"]
+
+
+####################################################################################
+# FileManager
+
+# FileName, DirID, FileID, Size, UID, GID, Status
+fcFiles = [
+    ("f1", 1, 11, 100, 1, 1, 1),
+    ("f2", 1, 12, 200, 1, 1, 1),
+    ("f3", 2, 13, 300, 1, 1, 1),
+    ("f4", 3, 14, 400, 1, 1, 2),
+]
+
+
+def _fileCatalogQuery(req, conn=None, args=None):
+    """Answer the queries of the FileManager from the fcFiles rows"""
+    if "FC_Statuses" in req:
+        return {"OK": True, "Value": ((1,),)}
+    if "FC_FileInfo" in req:
+        fileIDs = [int(fileID) for fileID in req.split("IN (")[1].rstrip(")").split(",")]
+        return {"OK": True, "Value": tuple((fileID, "GUID%s" % fileID) for fileID in fileIDs)}
+    pairs = set(zip(args[::2], args[1::2]))
+    rows = [row for row in fcFiles if (row[1], row[0]) in pairs]
+    if "Status IN (1)" in req:
+        rows = [row for row in rows if row[6] == 1]
+    return {"OK": True, "Value": tuple(rows)}
+
+
+def test_FileManager_findFiles():
+    fmDB = MagicMock()
+    fmDB.findFilesChunkSize = 2
+    fmDB.visibleFileStatus = ["AprioriGood"]
+    dirIDs = {"/d1": 1, "/d2": 2, "/d3": 3}
+    fmDB.dtree.findDirs.side_effect = lambda paths: {"OK": True, "Value": {p: dirIDs[p] for p in paths if p in dirIDs}}
+    fmDB._query.side_effect = _fileCatalogQuery
+    fm = FileManager(fmDB)
+
+    lfns = ["/d1/f1", "/d1/f2", "/d2/f3", "/d2/nofile", "/d3/f4", "/nodir/f5"]
+    res = fm._findFiles(lfns, ["FileID", "Size"])
+    assert res["OK"], res
+    assert res["Value"]["Successful"] == {
+        "/d1/f1": {"FileID": 11, "Size": 100},
+        "/d1/f2": {"FileID": 12, "Size": 200},
+        "/d2/f3": {"FileID": 13, "Size": 300},
+    }
+    assert sorted(res["Value"]["Failed"]) == ["/d2/nofile", "/d3/f4", "/nodir/f5"]
+    # The files of all the directories are looked up together, by chunks
+    filesQueries = [call for call in fmDB._query.call_args_list if "FROM FC_Files" in call[0][0]]
+    assert len(filesQueries) == 3
+
+    res = fm.getFileSize(lfns)
+    assert res["OK"], res
+    assert res["TotalSize"] == 600
+
+    res = fm.exists(lfns)
+    assert res["OK"], res
+    assert res["Value"]["Successful"]["/d3/f4"] == "/d3/f4"
+    assert res["Value"]["Successful"]["/d2/nofile"] is False
+
+    res = fm._findFiles(["/d2/f3"], ["GUID"])
+    assert res["Value"]["Successful"] == {"/d2/f3": {"FileID": 13, "GUID": "GUID13"}}
+
+
+def test_FileManager_updateDirectoryUsage():
+    fmDB = MagicMock()
+    fmDB.dtree.getPathIDsByID.side_effect = lambda dirID: {"OK": True, "Value": {3: [1, 2, 3], 4: [1, 2, 4]}[dirID]}
+    fmDB._update.return_value = {"OK": True, "Value": 1}
+    fm = FileManager(fmDB)
+
+    usage = {3: {0: {"Size": 10, "Files": 1}, 5: {"Size": 10, "Files": 1}}, 4: {0: {"Size": 5, "Files": 2}}}
+    assert fm._updateDirectoryUsage(usage, "-")["OK"]
+    # The changes of the directories are summed on their common parents and written at once
+    assert fmDB._update.call_count == 1
+    req = fmDB._update.call_args[0][0]
+    for values in ["(1,0,-15,-3,", "(2,0,-15,-3,", "(3,0,-10,-1,", "(4,0,-5,-2,", "(1,5,-10,-1,", "(3,5,-10,-1,"]:
+        assert values in req
+    assert "(4,5," not in req
+
+    # The failure to write is returned
+    fmDB._update.return_value = {"OK": False, "Message": "Lock wait timeout"}
+    assert not fm._updateDirectoryUsage(usage, "-")["OK"]
@@ -56,6 +56,20 @@ class FileCatalogDB(DB):
         self.validReplicaStatus = databaseConfig["ValidReplicaStatus"]
         self.visibleFileStatus = databaseConfig["VisibleFileStatus"]
         self.visibleReplicaStatus = databaseConfig["VisibleReplicaStatus"]
+        # Number of files looked up with one query
+        self.findFilesChunkSize = int(databaseConfig.get("FindFilesChunkSize", 1000))
+        # Directories kept in memory by the directory tree and for how long
+        self.directoryCacheSize = int(databaseConfig.get("DirectoryCacheSize", 10000))
+        self.directoryCacheLifetime = int(databaseConfig.get("DirectoryCacheLifetime", 300))
+        # Seconds the directory permissions are kept between requests, 0 to keep them for one request only
+        self.permissionCacheLifetime = int(databaseConfig.get("PermissionCacheLifetime", 0))
+        # Largest number of entries returned by one call of listDirectoryIterator
+        self.listDirectoryMaxBatchSize = int(databaseConfig.get("ListDirectoryMaxBatchSize", 10000))
+        # Directory metadata query results kept in memory and for how long
+        self.metaQueryIndexSize = int(databaseConfig.get("MetaQueryIndexSize", 1000))
+        self.metaQueryIndexLifetime = int(databaseConfig.get("MetaQueryIndexLifetime", 300))
+        # Seconds between two reconciliations of the directory usage with the files, 0 to disable them
+        self.directoryUsageReconcileInterval = int(databaseConfig.get("DirectoryUsageReconcileInterval", 0))
 
         # Load the configured components
         for compAttribute, componentType in [
@@ -390,6 +404,8 @@ class FileCatalogDB(DB):
                 fileArgs[path] = paths[path]
         if dirArgs:
             result = change_function_directory(dirArgs, recursive=recursive)
+            # The permissions kept by the security manager may not be valid anymore
+            self.securityManager.permissionCache.clear()
             if not result["OK"]:
                 return result
             successful.update(result["Value"]["Successful"])
@@ -919,6 +935,31 @@ class FileCatalogDB(DB):
         successful = res["Value"]["Successful"]
         return S_OK({"Successful": successful, "Failed": failed})
 
+    def listDirectoryIterator(self, path, batchSize, token, credDict, verbose=False):
+        """
+        List a directory by batches
+
+        :param str path: directory to list
+        :param int batchSize: maximum number of subdirectories and files returned,
+                              limited by the ListDirectoryMaxBatchSize option
+        :param token: token returned with the previous batch, None for the first one
+        :param creDict: credential
+        :param bool verbose: if True, get the metadata of the subdirectories and the replicas of the files
+
+        :return: S_OK(dict) indexed "Files", "Datasets", "SubDirs", "Links" and "Token",
+                 the token to give to get the next batch being None once the directory is fully listed
+        """
+        res = self._checkPathPermissions("listDirectory", [path], credDict)
+        if not res["OK"]:
+            return res
+        if not res["Value"]["Successful"]:
+            errors = list(res["Value"]["Failed"].values())
+            return S_ERROR(errors[0] if errors else "Permission denied")
+        path = list(res["Value"]["Successful"])[0]
+
+        batchSize = min(batchSize, self.listDirectoryMaxBatchSize)
+        return self.dtree.listDirectoryBatch(path, batchSize, token=token, verbose=verbose)
+
     def isDirectory(self, lfns, credDict):
         """
         Checks whether a list of LFNS are directories or not
@@ -1021,9 +1062,13 @@ class FileCatalogDB(DB):
         return S_OK({"Successful": successful, "Failed": failed})
 
     def rebuildDirectoryUsage(self):
-        """Rebuild DirectoryUsage table from scratch"""
+        """Reconcile the DirectoryUsage table with the files of the catalog
+
+        The recursive directory usage is maintained by the file operations, only the
+        directories whose usage drifted from their files are corrected.
+        """
 
-        result = self.dtree._rebuildDirectoryUsage()
+        result = self.dtree._reconcileDirectoryUsage()
         return result
 
     def repairCatalog(self, credDict={}):
@@ -1144,6 +1189,8 @@ class FileCatalogDB(DB):
         if not res["OK"]:
             return res
         counterDict.update(res["Value"])
+        counterDict.update(self.securityManager.getCounters())
+        counterDict.update(self.dmeta.queryIndex.getCounters())
         return S_OK(counterDict)
 
     ########################################################################
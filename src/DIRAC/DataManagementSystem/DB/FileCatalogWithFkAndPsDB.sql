@@ -738,6 +738,38 @@ END //
 DELIMITER ;
 
 
+-- ps_get_all_info_for_files_in_dir_batch : get all the info about the next visible files of a directory,
+--                                          in the order of their names
+-- dir_id : directory id
+-- last_file_name : name of the last file of the previous batch, empty to start from the beginning
+-- batch_size : maximum number of files
+-- visibleFileStatus : list of status we are interested in
+-- output : same as ps_get_all_info_for_files_in_dir
+
+drop procedure if exists ps_get_all_info_for_files_in_dir_batch;
+DELIMITER //
+CREATE PROCEDURE ps_get_all_info_for_files_in_dir_batch
+(IN dir_id INT, IN last_file_name VARCHAR(128), IN batch_size INT, IN visibleFileStatus VARCHAR(255))
+BEGIN
+
+  set @sql = CONCAT('SELECT SQL_NO_CACHE FileName, DirID, f.FileID, Size, f.uid, UserName, f.gid, GroupName, s.Status,
+                     GUID, Checksum, ChecksumType, Type, CreationDate,ModificationDate, Mode
+                    FROM FC_Files f
+                    JOIN FC_Users u ON f.UID = u.UID
+                    JOIN FC_Groups g ON f.GID = g.GID
+                    JOIN FC_Statuses s ON f.Status = s.StatusID
+                    WHERE DirID = ', dir_id, ' and s.Status  in (',visibleFileStatus,') and f.FileName > ?
+                    ORDER BY f.FileName LIMIT ', batch_size);
+
+  SET @lastFileName = last_file_name;
+  PREPARE stmt FROM @sql;
+  EXECUTE stmt USING @lastFileName;
+  DEALLOCATE PREPARE stmt;
+
+END //
+DELIMITER ;
+
+
 
 -- ps_get_all_info_for_file_ids : get all the info for given file ids
 -- file_ids : list of file ids
@@ -15,6 +15,7 @@ from io import StringIO
 
 from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC import S_OK, S_ERROR
+from DIRAC.Core.Utilities.ThreadScheduler import gThreadScheduler
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.DataManagementSystem.DB.FileCatalogDB import FileCatalogDB
 
@@ -62,6 +63,14 @@ class FileCatalogHandlerMixin(object):
             "ValidReplicaStatus": ["AprioriGood", "Trash", "Removing", "Probing"],
             "VisibleFileStatus": ["AprioriGood"],
             "VisibleReplicaStatus": ["AprioriGood"],
+            "FindFilesChunkSize": 1000,
+            "DirectoryCacheSize": 10000,
+            "DirectoryCacheLifetime": 300,
+            "PermissionCacheLifetime": 0,
+            "ListDirectoryMaxBatchSize": 10000,
+            "MetaQueryIndexSize": 1000,
+            "MetaQueryIndexLifetime": 300,
+            "DirectoryUsageReconcileInterval": 0,
         }
         for configKey in sorted(defaultConfig.keys()):
             defaultValue = defaultConfig[configKey]
@@ -69,6 +78,11 @@ class FileCatalogHandlerMixin(object):
             cls.log.info("%-20s : %-20s" % (str(configKey), str(configValue)))
             databaseConfig[configKey] = configValue
         res = cls.fileCatalogDB.setConfig(databaseConfig)
+        if res["OK"] and cls.fileCatalogDB.directoryUsageReconcileInterval > 0:
+            # The directory usage is kept up to date by the file operations, this only corrects drifts
+            gThreadScheduler.addPeriodicTask(
+                cls.fileCatalogDB.directoryUsageReconcileInterval, cls.fileCatalogDB.rebuildDirectoryUsage
+            )
 
         gMonitor.registerActivity(
             "AddFile", "Amount of addFile calls", "FileCatalogHandler", "calls/min", gMonitor.OP_SUM
@@ -406,6 +420,15 @@ class FileCatalogHandlerMixin(object):
         gMonitor.addMark("ListDirectory", 1)
         return self.fileCatalogDB.listDirectory(lfns, self.getRemoteCredentials(), verbose=verbose)
 
+    types_listDirectoryIterator = [str, int]
+
+    def export_listDirectoryIterator(self, path, batchSize, token=None, verbose=False):
+        """List the contents of a directory by batches, starting from the one given by the token"""
+        gMonitor.addMark("ListDirectory", 1)
+        return self.fileCatalogDB.listDirectoryIterator(
+            path, batchSize, token, self.getRemoteCredentials(), verbose=verbose
+        )
+
     types_isDirectory = [[list, dict, str]]
 
     def export_isDirectory(self, lfns):
@@ -444,7 +467,7 @@ class FileCatalogHandlerMixin(object):
     types_rebuildDirectoryUsage = []
 
     def export_rebuildDirectoryUsage(self):
-        """Rebuild DirectoryUsage table from scratch"""
+        """Reconcile the DirectoryUsage table with the files of the catalog"""
         return self.fileCatalogDB.rebuildDirectoryUsage()
 
     types_repairCatalog = []
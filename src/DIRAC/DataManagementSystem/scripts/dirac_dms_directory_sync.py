@@ -74,22 +74,19 @@ def getSetOfRemoteSubDirectoriesAndFiles(path, fc, directories, files):
     """
     Recursively traverses all the subdirectories of a directory and returns a set of directories and files
     """
-    result = fc.listDirectory(path)
-    if result["OK"]:
-        if result["Value"]["Successful"]:
-            for entry in result["Value"]["Successful"][path]["Files"]:
-                size = result["Value"]["Successful"][path]["Files"][entry]["MetaData"]["Size"]
-                files.add((entry, size))
-            for entry in result["Value"]["Successful"][path]["SubDirs"]:
-                directories.add(entry)
-                res = getSetOfRemoteSubDirectoriesAndFiles(entry, fc, directories, files)
-                if not res["OK"]:
-                    return S_ERROR("Error: " + res["Message"])
-            return S_OK()
-        else:
-            return S_ERROR("Error: %s" % result["Value"])
-    else:
-        return S_ERROR("Error:" + result["Message"])
+    # Large directories are listed by batches
+    for result in fc.listDirectoryIterator(path):
+        if not result["OK"]:
+            return S_ERROR("Error:" + result["Message"])
+        for entry in result["Value"]["Files"]:
+            size = result["Value"]["Files"][entry]["MetaData"]["Size"]
+            files.add((entry, size))
+        for entry in result["Value"]["SubDirs"]:
+            directories.add(entry)
+            res = getSetOfRemoteSubDirectoriesAndFiles(entry, fc, directories, files)
+            if not res["OK"]:
+                return S_ERROR("Error: " + res["Message"])
+    return S_OK()
 
 
 def getSetOfRemoteDirectoriesAndFiles(fc, path):
@@ -114,37 +114,44 @@ def main():
 
     while len(activeDirs) > 0:
         currentDir = activeDirs.pop()
-        res = fc.listDirectory(currentDir, withMetadata, timeout=360)
-        if not res["OK"]:
-            gLogger.error("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
-        elif currentDir in res["Value"]["Failed"]:
-            gLogger.error(
-                "Error retrieving directory contents", "%s %s" % (currentDir, res["Value"]["Failed"][currentDir])
-            )
-        else:
-            dirContents = res["Value"]["Successful"][currentDir]
+        # Large directories are listed by batches
+        nbEntries = 0
+        nbSubdirs = 0
+        dirFiles = []
+        newDirs = []
+        listed = False
+        for res in fc.listDirectoryIterator(currentDir, verbose=withMetadata, timeout=360):
+            if not res["OK"]:
+                gLogger.error("Error retrieving directory contents", "%s %s" % (currentDir, res["Message"]))
+                if listed:
+                    # The listing of the directory is incomplete
+                    DIRAC.exit(2)
+                break
+            listed = True
+            dirContents = res["Value"]
             subdirs = dirContents["SubDirs"]
             files = dirContents["Files"]
-            if not subdirs and not files:
+            nbEntries += len(subdirs) + len(files)
+            nbSubdirs += len(subdirs)
+            for subdir in subdirs:
+                if (not withMetadata) or isOlderThan(subdirs[subdir]["CreationDate"], totalDays):
+                    newDirs.append(subdir)
+            for filename in files:
+                if (not withMetadata) or isOlderThan(files[filename]["MetaData"]["CreationDate"], totalDays):
+                    if wildcard is None or fnmatch.fnmatch(filename, wildcard):
+                        dirFiles.append(filename)
+        else:
+            if not nbEntries:
                 emptyDirs.append(currentDir)
                 gLogger.notice("%s: empty directory" % currentDir)
             else:
-                for subdir in sorted(subdirs, reverse=True):
-                    if (not withMetadata) or isOlderThan(subdirs[subdir]["CreationDate"], totalDays):
-                        activeDirs.append(subdir)
-                for filename in sorted(files):
-                    fileOK = False
-                    if (not withMetadata) or isOlderThan(files[filename]["MetaData"]["CreationDate"], totalDays):
-                        if wildcard is None or fnmatch.fnmatch(filename, wildcard):
-                            fileOK = True
-                    if not fileOK:
-                        files.pop(filename)
-                allFiles += sorted(files)
-
-                if len(files) or len(subdirs):
+                activeDirs += sorted(newDirs, reverse=True)
+                allFiles += sorted(dirFiles)
+
+                if len(dirFiles) or nbSubdirs:
                     gLogger.notice(
                         "%s: %d files%s, %d sub-directories"
-                        % (currentDir, len(files), " matching" if withMetadata or wildcard else "", len(subdirs))
+                        % (currentDir, len(dirFiles), " matching" if withMetadata or wildcard else "", nbSubdirs)
                     )
 
     outputFileName = "%s.lfns" % baseDir.replace("/%s" % vo, "%s" % vo).replace("/", "-")
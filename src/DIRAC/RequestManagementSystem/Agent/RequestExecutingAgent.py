@@ -36,6 +36,7 @@ __RCSID__ = "$Id$"
 import sys
 import time
 import errno
+from concurrent.futures import ThreadPoolExecutor
 
 # # from DIRAC
 from DIRAC import S_OK, S_ERROR, gConfig
@@ -44,6 +45,7 @@ from DIRAC.Core.Base.AgentModule import AgentModule
 from DIRAC.ConfigurationSystem.Client import PathFinder
 from DIRAC.Core.Utilities.ProcessPool import ProcessPool
 from DIRAC.RequestManagementSystem.Client.ReqClient import ReqClient
+from DIRAC.RequestManagementSystem.Client.Request import Request
 from DIRAC.RequestManagementSystem.private.RequestTask import RequestTask
 
 from DIRAC.MonitoringSystem.Client.MonitoringReporter import MonitoringReporter
@@ -106,6 +108,8 @@ class RequestExecutingAgent(AgentModule):
     __requestClient = None
     # # Size of the bulk if use of getRequests. If 0, use getRequest
     __bulkRequest = 0
+    # # Fetch the next bulk of requests while the current one is queued
+    __prefetchRequests = True
     # # Send the monitoring data to ES rather than the Framework/Monitoring
     __rmsMonitoring = False
 
@@ -128,6 +132,12 @@ class RequestExecutingAgent(AgentModule):
         self.log.info("ProcessPool sleep time = %d seconds" % self.__poolSleep)
         self.__bulkRequest = self.am_getOption("BulkRequest", self.__bulkRequest)
         self.log.info("Bulk request size = %d" % self.__bulkRequest)
+        self.__prefetchRequests = self.am_getOption("PrefetchRequests", self.__prefetchRequests)
+        self.log.info("Prefetch requests = %s" % self.__prefetchRequests)
+        # # thread getting the next bulk of requests
+        self.__prefetchExecutor = None
+        if self.__bulkRequest and self.__prefetchRequests:
+            self.__prefetchExecutor = ThreadPoolExecutor(max_workers=1)
         self.__rmsMonitoring = self.am_getOption("EnableRMSMonitoring", self.__rmsMonitoring)
         self.log.info("Enable ES RMS Monitoring = %s" % self.__rmsMonitoring)
 
@@ -284,6 +294,19 @@ class RequestExecutingAgent(AgentModule):
                 self.log.debug("putAllRequests: request %s has been put back with its initial state" % requestID)
         return S_OK()
 
+    def putBackRequests(self, getRequests):
+        """put back requests that were fetched but not queued
+
+        :param dict getRequests: result of getBulkRequests
+        """
+        if not getRequests["OK"] or not getRequests["Value"]:
+            return S_OK()
+        for request in getRequests["Value"]["Successful"].values():
+            reset = self.requestClient().putRequest(request, useFailoverProxy=False, retryMainService=2)
+            if not reset["OK"]:
+                self.log.error("Failed to put request", reset["Message"])
+        return S_OK()
+
     def initialize(self):
         """initialize agent"""
         return S_OK()
@@ -294,6 +317,8 @@ class RequestExecutingAgent(AgentModule):
             gMonitor.addMark("Iteration", 1)
         # # requests (and so tasks) counter
         taskCounter = 0
+        # # next bulk of requests, fetched while the current one is queued
+        prefetch = None
         while taskCounter < self.__requestsPerCycle:
             self.log.debug("execute: executing %d request in this cycle" % taskCounter)
 
@@ -310,9 +335,13 @@ class RequestExecutingAgent(AgentModule):
                     break
                 requestsToExecute = [getRequest["Value"]]
             else:
-                numberOfRequest = min(self.__bulkRequest, self.__requestsPerCycle - taskCounter)
-                self.log.info("execute: ask for requests", "%s" % numberOfRequest)
-                getRequests = self.requestClient().getBulkRequests(numberOfRequest)
+                if prefetch:
+                    getRequests = prefetch.result()
+                    prefetch = None
+                else:
+                    numberOfRequest = min(self.__bulkRequest, self.__requestsPerCycle - taskCounter)
+                    self.log.info("execute: ask for requests", "%s" % numberOfRequest)
+                    getRequests = self.requestClient().getBulkRequests(numberOfRequest)
                 if not getRequests["OK"]:
                     self.log.error("execute:", "%s" % getRequests["Message"])
                     break
@@ -324,6 +353,12 @@ class RequestExecutingAgent(AgentModule):
 
                 requestsToExecute = list(getRequests["Value"]["Successful"].values())
 
+                nextTaskCounter = taskCounter + len(requestsToExecute)
+                if self.__prefetchExecutor and nextTaskCounter < self.__requestsPerCycle:
+                    numberOfRequest = min(self.__bulkRequest, self.__requestsPerCycle - nextTaskCounter)
+                    self.log.info("execute: prefetch requests", "%s" % numberOfRequest)
+                    prefetch = self.__prefetchExecutor.submit(self.requestClient().getBulkRequests, numberOfRequest)
+
             self.log.info("execute: will execute requests ", "%s" % len(requestsToExecute))
 
             for request in requestsToExecute:
@@ -363,6 +398,8 @@ class RequestExecutingAgent(AgentModule):
                                 % (len(self.__requestCache), res["Message"]),
                             )
                             self.putAllRequests()
+                            if prefetch:
+                                self.putBackRequests(prefetch.result())
                             return res
                         # # serialize to JSON
                         result = request.toJSON()
@@ -441,6 +478,8 @@ class RequestExecutingAgent(AgentModule):
 
     def finalize(self):
         """agent finalization"""
+        if self.__prefetchExecutor:
+            self.__prefetchExecutor.shutdown()
         if self.__processPool:
             self.processPool().finalize(timeout=self.__poolTimeout)
         self.putAllRequests()
@@ -450,8 +489,10 @@ class RequestExecutingAgent(AgentModule):
         """definition of request callback function
 
         :param str taskID: Request.RequestID
-        :param dict taskResult: task result S_OK(Request)/S_ERROR(Message)
+        :param dict taskResult: task result S_OK(Request as JSON)/S_ERROR(Message)
         """
+        if taskResult["OK"]:
+            taskResult = S_OK(Request(taskResult["Value"]))
         # # clean cache
         res = self.putRequest(taskID, taskResult)
         self.log.info(
@@ -15,6 +15,10 @@
     .. moduleauthor:: Krzysztof.Ciba@NOSPAMgmail.com
 
     request processing task to be used inside ProcessTask created in RequesteExecutingAgent
+
+    The ProcessPool workers are long-lived, so the request client, the operation handlers
+    and the shifter proxies are kept in the worker process and reused by the next tasks.
+    The request is sent back serialized to JSON.
 """
 from __future__ import absolute_import
 from __future__ import division
@@ -39,6 +43,7 @@ from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationDat
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.Core.Utilities import Time, Network
+from DIRAC.Core.Utilities.DictCache import DictCache
 from DIRAC.FrameworkSystem.Client.MonitoringClient import gMonitor
 from DIRAC.FrameworkSystem.Client.ProxyManagerClient import gProxyManager
 from DIRAC.MonitoringSystem.Client.MonitoringReporter import MonitoringReporter
@@ -57,6 +62,23 @@ class RequestTask(object):
     request's processing task
     """
 
+    # # lifetime in seconds of the operation handlers kept in the worker process
+    HANDLERS_LIFETIME = 3600
+    # # lifetime in seconds of the shifter proxies, shorter than the required time left of the proxies
+    SHIFTER_PROXIES_LIFETIME = 600
+
+    # # operation handlers of the worker process {(operation type, plugin path, csPath, owner group): handler}
+    # # a handler must not keep the state of a request in the next ones
+    __handlersCache = DictCache()
+    # # shifter proxies of the worker process
+    __shifterProxiesCache = DictCache()
+    # # request client of the worker process
+    __processRequestClient = None
+    # # RMS monitoring reporter of the worker process
+    __processRMSMonitoringReporter = None
+    # # gMonitor set up in the worker process
+    __gMonitorInitialized = False
+
     def __init__(
         self, requestJSON, handlersDict, csPath, agentName, standalone=False, requestClient=None, rmsMonitoring=False
     ):
@@ -79,18 +101,18 @@ class RequestTask(object):
         self.handlers = {}
         # # own sublogger
         self.log = gLogger.getSubLogger("pid_%s/%s" % (os.getpid(), self.request.RequestName))
-        # # get shifters info
+        # # shifters info, set up by setupProxy
         self.__managersDict = {}
-        shifterProxies = self.__setupManagerProxies()
-        if not shifterProxies["OK"]:
-            self.log.error("Cannot setup shifter proxies", shifterProxies["Message"])
 
         #  This flag which is set and sent from the RequestExecutingAgent and is False by default.
         self.rmsMonitoring = rmsMonitoring
 
         if self.rmsMonitoring:
-            self.rmsMonitoringReporter = MonitoringReporter(monitoringType="RMSMonitoring")
-        else:
+            if RequestTask.__processRMSMonitoringReporter is None:
+                RequestTask.__processRMSMonitoringReporter = MonitoringReporter(monitoringType="RMSMonitoring")
+            self.rmsMonitoringReporter = RequestTask.__processRMSMonitoringReporter
+        elif not RequestTask.__gMonitorInitialized:
+            RequestTask.__gMonitorInitialized = True
             # # initialize gMonitor
             gMonitor.setComponentType(gMonitor.COMPONENT_AGENT)
             gMonitor.setComponentName(self.agentName)
@@ -108,12 +130,22 @@ class RequestTask(object):
             )
 
         if requestClient is None:
-            self.requestClient = ReqClient()
+            if RequestTask.__processRequestClient is None:
+                RequestTask.__processRequestClient = ReqClient()
+            self.requestClient = RequestTask.__processRequestClient
         else:
             self.requestClient = requestClient
 
     def __setupManagerProxies(self):
-        """setup grid proxy for all defined managers"""
+        """setup grid proxy for all defined managers
+
+        The proxies are kept in the worker process for SHIFTER_PROXIES_LIFETIME seconds
+        """
+        managersDict = self.__shifterProxiesCache.get("Shifters")
+        if managersDict is not None:
+            self.__managersDict = dict(managersDict)
+            return S_OK()
+
         oHelper = Operations()
         shifters = oHelper.getSections("Shifter")
         if not shifters["OK"]:
@@ -157,6 +189,7 @@ class RequestTask(object):
                 "Chain": chain,
                 "ProxyFile": fileName,
             }
+        self.__shifterProxiesCache.add("Shifters", self.SHIFTER_PROXIES_LIFETIME, dict(self.__managersDict))
         return S_OK()
 
     def setupProxy(self):
@@ -247,7 +280,9 @@ class RequestTask(object):
 
     def getHandler(self, operation):
         """return instance of a handler for a given operation type on demand
-            all created handlers are kept in self.handlers dict for further use
+            all created handlers are kept in self.handlers dict for further use,
+            and in the worker process for HANDLERS_LIFETIME seconds for the next requests of the same owner group
+            (the handlers hold DataManager and FileCatalog objects bound to the VO of the owner proxy)
 
         :param ~Operation.Operation operation: Operation instance
         """
@@ -255,15 +290,17 @@ class RequestTask(object):
             return S_ERROR("handler for operation '%s' not set" % operation.Type)
         handler = self.handlers.get(operation.Type, None)
         if not handler:
-            try:
-                handlerCls = self.loadHandler(self.handlersDict[operation.Type])
-                self.handlers[operation.Type] = handlerCls(
-                    csPath="%s/OperationHandlers/%s" % (self.csPath, operation.Type)
-                )
-                handler = self.handlers[operation.Type]
-            except (ImportError, TypeError) as error:
-                self.log.exception("Error getting Handler", "%s" % error, lException=error)
-                return S_ERROR(str(error))
+            handlerKey = (operation.Type, self.handlersDict[operation.Type], self.csPath, self.request.OwnerGroup)
+            handler = self.__handlersCache.get(handlerKey)
+            if not handler:
+                try:
+                    handlerCls = self.loadHandler(self.handlersDict[operation.Type])
+                    handler = handlerCls(csPath="%s/OperationHandlers/%s" % (self.csPath, operation.Type))
+                except (ImportError, TypeError) as error:
+                    self.log.exception("Error getting Handler", "%s" % error, lException=error)
+                    return S_ERROR(str(error))
+                self.__handlersCache.add(handlerKey, self.HANDLERS_LIFETIME, handler)
+            self.handlers[operation.Type] = handler
         # # set operation for this handler
         handler.setOperation(operation)
         # # and return
@@ -303,7 +340,7 @@ class RequestTask(object):
                 self.log.error("Error setting proxy: " + userSuspended, self.request.OwnerDN)
             else:
                 self.log.error("Error setting proxy", setupProxy["Message"])
-            return S_OK(self.request)
+            return self.request.toJSON()
         shifter = setupProxy["Value"]["Shifter"]
 
         error = None
@@ -542,6 +579,6 @@ class RequestTask(object):
         # Commit all the data to the ES Backend
         if self.rmsMonitoring:
             self.rmsMonitoringReporter.commit()
-        # Request will be updated by the callBack method
+        # Request will be updated by the callBack method, it is sent back as JSON which is much lighter to pickle
         self.log.verbose("RequestTasks exiting", "request %s" % self.request.Status)
-        return S_OK(self.request)
+        return self.request.toJSON()
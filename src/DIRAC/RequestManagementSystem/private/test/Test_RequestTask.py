@@ -79,6 +79,54 @@ class RequestTaskTests(unittest.TestCase):
         ret = self.task.setupProxy()
         print(ret)
 
+    def testWorkerCaches(self):
+        """the handlers, request client and shifter proxies are reused by the next tasks"""
+        rt = importlib.import_module("DIRAC.RequestManagementSystem.private.RequestTask")
+        rt.gMonitor = MagicMock()
+        rt.Operations = self.mockOps
+        rt.Registry = MagicMock()
+        rt.Registry.getDNForUsername.return_value = {"OK": True, "Value": ["/DN/of/shifter"]}
+        rt.Registry.getVOMSAttributeForGroup.return_value = None
+        rt.gProxyManager = MagicMock()
+        rt.gProxyManager.downloadProxyToFile.return_value = {"OK": True, "Value": "/tmp/proxy", "chain": None}
+        rt.gProxyManager.downloadVOMSProxyToFile.return_value = {"OK": True, "Value": "/tmp/ownerProxy"}
+        rt.ReqClient = MagicMock()
+        RequestTask._RequestTask__handlersCache.purgeAll()
+        RequestTask._RequestTask__shifterProxiesCache.purgeAll()
+        RequestTask._RequestTask__processRequestClient = None
+        handlerClass = MagicMock()
+
+        handlers = []
+        requestClients = []
+        for _ in range(2):
+            task = RequestTask(self.req.toJSON()["Value"], self.handlersDict, "csPath", "RequestExecutingAgent")
+            task.loadHandler = MagicMock(return_value=handlerClass)
+            self.assertTrue(task.setupProxy()["OK"])
+            handler = task.getHandler(task.request[0])
+            self.assertTrue(handler["OK"])
+            handlers.append(handler["Value"])
+            requestClients.append(task.requestClient)
+
+        self.assertIs(handlers[0], handlers[1])
+        self.assertIs(requestClients[0], requestClients[1])
+        handlerClass.assert_called_once_with(csPath="csPath/OperationHandlers/ForwardDISET")
+
+        # # the handlers are not shared with the requests of another group, which can be of another VO
+        handlerClass.reset_mock()
+        handlerClass.side_effect = lambda **kwargs: MagicMock()
+        self.req.OwnerGroup = "dteam_user"
+        task = RequestTask(self.req.toJSON()["Value"], self.handlersDict, "csPath", "RequestExecutingAgent")
+        task.loadHandler = MagicMock(return_value=handlerClass)
+        self.assertTrue(task.setupProxy()["OK"])
+        handler = task.getHandler(task.request[0])
+        self.assertTrue(handler["OK"])
+        self.assertIsNot(handler["Value"], handlers[0])
+        handlerClass.assert_called_once_with(csPath="csPath/OperationHandlers/ForwardDISET")
+        rt.ReqClient.assert_called_once_with()
+        # # the shifter proxies were only set up by the first task
+        self.mockObjectOps.getSections.assert_called_once_with("Shifter")
+        self.assertEqual(rt.gProxyManager.downloadProxyToFile.call_count, 2)
+
 
 # # tests execution
 if __name__ == "__main__":
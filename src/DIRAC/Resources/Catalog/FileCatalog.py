@@ -54,6 +54,7 @@ from DIRAC import gLogger, gConfig, S_OK, S_ERROR
 from DIRAC.Core.Utilities import DErrno
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Security.ProxyInfo import getVOfromProxyGroup
+from DIRAC.Core.Utilities.ReturnValues import returnSingleResult
 from DIRAC.Resources.Catalog.Utilities import checkArgumentFormat
 from DIRAC.Resources.Catalog.FileCatalogFactory import FileCatalogFactory
 from DIRAC.Resources.Catalog.FCConditionParser import FCConditionParser
@@ -322,6 +323,33 @@ class FileCatalog(object):
             return S_ERROR(DErrno.EFCERR, "Failed to perform %s from any catalog" % self.call)
         return S_OK({"Failed": failed, "Successful": successful})
 
+    def listDirectoryIterator(self, path, batchSize=1000, verbose=False, timeout=120):
+        """List a directory by batches with the first read catalog able to do it, and in one
+        batch with listDirectory otherwise.
+
+        This is a generator of S_OK( batch contents )/S_ERROR, see FileCatalogClient.listDirectoryIterator
+
+        :param str path: directory to list
+        :param int batchSize: number of subdirectories and files asked to the catalog in one call
+        :param bool verbose: if True, get the metadata of the subdirectories and the replicas of the files
+        """
+        for catalogName, oCatalog, _master in self.readCatalogs:
+            # Look at the class, the proxy client accepts any method name
+            if not hasattr(type(oCatalog), "listDirectoryIterator"):
+                continue
+            listed = False
+            for result in oCatalog.listDirectoryIterator(path, batchSize=batchSize, verbose=verbose, timeout=timeout):
+                if not result["OK"] and not listed:
+                    # The catalog service may not support it yet
+                    self.log.verbose("Failed to list directory by batches", "%s: %s" % (catalogName, result["Message"]))
+                    break
+                listed = True
+                yield result
+            if listed:
+                return
+
+        yield returnSingleResult(self.listDirectory(path, verbose=verbose, timeout=timeout))
+
     ###########################################################################################
     #
     # Below is the method for obtaining the objects instantiated for a provided catalogue configuration
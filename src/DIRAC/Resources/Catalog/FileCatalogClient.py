@@ -241,6 +241,35 @@ class FileCatalogClient(FileCatalogClientBase):
                     entryDict[lfn] = detailsDict
         return result
 
+    def listDirectoryIterator(self, path, batchSize=1000, verbose=False, timeout=120):
+        """List the given directory's contents by batches, instead of getting them all in one call
+
+        This is a generator: each item is either S_OK with the contents of a batch, indexed
+        "Files", "SubDirs", "Links" and "Datasets" like for listDirectory, or S_ERROR which ends the listing
+
+        :param str path: directory to list
+        :param int batchSize: number of subdirectories and files asked to the server in one call
+        :param bool verbose: if True, get the metadata of the subdirectories and the replicas of the files
+        """
+        rpcClient = self._getRPC(timeout=timeout)
+        token = None
+        while True:
+            result = rpcClient.listDirectoryIterator(path, batchSize, token, verbose)
+            if not result["OK"]:
+                yield result
+                return
+            batch = result["Value"]
+            token = batch.pop("Token", None)
+            # Force returned directory entries to be LFNs
+            for entryType in ["Files", "SubDirs", "Links"]:
+                entryDict = batch[entryType]
+                for fname in list(entryDict):
+                    detailsDict = entryDict.pop(fname)
+                    entryDict[os.path.join(path, os.path.basename(fname))] = detailsDict
+            yield S_OK(batch)
+            if not token:
+                return
+
     @checkCatalogArguments
     def getDirectoryMetadata(self, lfns, timeout=120):
         """Get standard directory metadata"""
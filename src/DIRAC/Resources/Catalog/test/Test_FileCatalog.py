@@ -11,6 +11,7 @@ import mock
 
 import DIRAC
 from DIRAC.Resources.Catalog.FileCatalog import FileCatalog
+from DIRAC.Resources.Catalog.FileCatalogClient import FileCatalogClient
 
 from DIRAC import S_OK, S_ERROR
 
@@ -430,9 +431,74 @@ class TestRead(unittest.TestCase):
         self.assertEqual(["c2"], sorted(res["Value"]["Failed"][lfn]))
 
 
+class FakeCatalogService(object):
+    """Catalog service listing a directory of 3 subdirectories and 4 files"""
+
+    def __init__(self, withIterator=True):
+        self.withIterator = withIterator
+        self.entries = [("SubDirs", "/d/s%s" % i) for i in range(3)] + [("Files", "f%s" % i) for i in range(4)]
+        self.calls = 0
+
+    def listDirectoryIterator(self, path, batchSize, token, verbose):
+        self.calls += 1
+        if not self.withIterator:
+            return S_ERROR("Unknown method listDirectoryIterator")
+        start = token or 0
+        batch = {"Files": {}, "SubDirs": {}, "Links": {}, "Datasets": {}, "Token": None}
+        for entryType, name in self.entries[start : start + batchSize]:
+            batch[entryType][name] = {"MetaData": {}} if entryType == "Files" else True
+        if start + batchSize < len(self.entries):
+            batch["Token"] = start + batchSize
+        return S_OK(batch)
+
+    def listDirectory(self, lfns, verbose):
+        contents = {"Files": {}, "SubDirs": {}, "Links": {}, "Datasets": {}}
+        for entryType, name in self.entries:
+            contents[entryType][name] = True
+        return S_OK({"Successful": dict((lfn, contents) for lfn in lfns), "Failed": {}})
+
+
+class TestListDirectoryIterator(unittest.TestCase):
+    def setUp(self):
+        self.service = FakeCatalogService()
+        patcher = mock.patch.object(FileCatalogClient, "_getRPC", return_value=self.service)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = FileCatalogClient(url="DataManagement/FileCatalog")
+
+    def test_01_client(self):
+        batches = list(self.client.listDirectoryIterator("/d", batchSize=2))
+        self.assertEqual(len(batches), 4)
+        self.assertTrue(all(result["OK"] for result in batches))
+        self.assertEqual(
+            sorted(lfn for result in batches for lfn in result["Value"]["Files"]), ["/d/f0", "/d/f1", "/d/f2", "/d/f3"]
+        )
+        self.assertEqual(
+            sorted(lfn for result in batches for lfn in result["Value"]["SubDirs"]), ["/d/s0", "/d/s1", "/d/s2"]
+        )
+        self.assertTrue(all("Token" not in result["Value"] for result in batches))
+
+    @mock.patch.object(FileCatalog, "__init__", return_value=None)
+    def test_02_fileCatalog(self, _init):
+        fc = FileCatalog()
+        fc.log = DIRAC.gLogger
+        fc.readCatalogs = [("DFC", self.client, True)]
+        fc.write_methods = set()
+        fc.ro_methods = set(FileCatalogClient.READ_METHODS)
+        self.assertEqual(len(list(fc.listDirectoryIterator("/d", batchSize=5))), 2)
+
+        # A service not knowing the method is asked for the whole directory
+        self.service.withIterator = False
+        batches = list(fc.listDirectoryIterator("/d", batchSize=5))
+        self.assertEqual(len(batches), 1)
+        self.assertTrue(batches[0]["OK"], batches[0])
+        self.assertEqual(len(batches[0]["Value"]["Files"]), 4)
+
+
 if __name__ == "__main__":
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestInitialization)
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestWrite))
     suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestRead))
+    suite.addTest(unittest.defaultTestLoader.loadTestsFromTestCase(TestListDirectoryIterator))
 
     unittest.TextTestRunner(verbosity=2).run(suite)
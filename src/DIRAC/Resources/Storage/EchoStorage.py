@@ -70,6 +70,9 @@ class EchoStorage(GFAL2_StorageBase):
 
     """
 
+    # The removals are throttled file by file, see _removeSingleFile
+    _BULK_OPERATIONS = False
+
     def __init__(self, storageName, parameters):
         """c'tor"""
         # # init base class
@@ -80,9 +83,7 @@ class EchoStorage(GFAL2_StorageBase):
 
         self.pluginName = "Echo"
 
-        # Because Echo considers '<host>/lhcb:prod' differently from '<host>//lhcb:prod' as it normally should be
-        # we need to disable the automatic normalization done by gfal2
-        self.ctx.set_opt_boolean("XROOTD PLUGIN", "NORMALIZE_PATH", False)
+        self._setContextOptions(self.ctx)
 
         # This is in case the protocol is xroot
         # Because some storages are configured to use krb5 auth first
@@ -94,6 +95,12 @@ class EchoStorage(GFAL2_StorageBase):
         # We don't need extended attributes for metadata
         self._defaultExtendedAttributes = None
 
+    def _setContextOptions(self, ctx):
+        """Set the Echo specific options of a gfal2 context"""
+        # Because Echo considers '<host>/lhcb:prod' differently from '<host>//lhcb:prod' as it normally should be
+        # we need to disable the automatic normalization done by gfal2
+        ctx.set_opt_boolean("XROOTD PLUGIN", "NORMALIZE_PATH", False)
+
     def putDirectory(self, path):
         """Not available on Echo
 
@@ -203,23 +203,24 @@ class FileStorage(StorageBase):
         urls = res["Value"]
         gLogger.debug("FileStorage.removeFile: Attempting to remove %s files." % len(urls))
 
-        failed = {}
-        successful = {}
+        return self._executeForEachURL(self.__removeSingleFile, urls)
 
-        for url in urls:
-            try:
-                os.unlink(url)
-                successful[url] = True
-            except OSError as ose:
-                # Removing a non existing file is a success
-                if ose.errno == errno.ENOENT:
-                    successful[url] = True
-                else:
-                    failed[url] = str(ose)
-            except Exception as e:
-                failed[url] = str(e)
+    @staticmethod
+    def __removeSingleFile(url):
+        """Remove physically a single file
 
-        return S_OK({"Failed": failed, "Successful": successful})
+        :param url: path on storage
+        :returns: S_OK(True) also if the file did not exist, S_ERROR otherwise
+        """
+        try:
+            os.unlink(url)
+        except OSError as ose:
+            # Removing a non existing file is a success
+            if ose.errno != errno.ENOENT:
+                return S_ERROR(str(ose))
+        except Exception as e:
+            return S_ERROR(str(e))
+        return S_OK(True)
 
     @staticmethod
     def __stat(path):
@@ -273,18 +274,19 @@ class FileStorage(StorageBase):
             return res
         urls = res["Value"]
 
-        failed = {}
-        successful = {}
-        for url in urls:
-            res = self.__stat(url)
-            if not res["OK"]:
-                failed[url] = res["Message"]
-            elif not res["Value"]["File"]:
-                failed[url] = os.strerror(errno.EISDIR)
-            else:
-                successful[url] = res["Value"]
+        return self._executeForEachURL(self.__getSingleFileMetadata, urls)
 
-        return S_OK({"Failed": failed, "Successful": successful})
+    @staticmethod
+    def __getSingleFileMetadata(url):
+        """Get metadata associated to a single file
+
+        :param url: path on storage
+        :returns: S_OK(metadataDict) or S_ERROR, also if the path is not a file
+        """
+        res = FileStorage.__stat(url)
+        if res["OK"] and not res["Value"]["File"]:
+            return S_ERROR(os.strerror(errno.EISDIR))
+        return res
 
     def getFileSize(self, path):
         """Get the physical size of the given file
@@ -300,22 +302,24 @@ class FileStorage(StorageBase):
             return res
         urls = res["Value"]
 
-        failed = {}
-        successful = {}
+        return self._executeForEachURL(self.__getSingleFileSize, urls)
 
-        for url in urls:
-            try:
-                # We check the filesize first because if it does not exist
-                # it raises an exception, while os.path.isfile just return False
-                filesize = os.path.getsize(url)
-                if os.path.isfile(url):
-                    successful[url] = filesize
-                else:
-                    failed[url] = os.strerror(errno.EISDIR)
-            except OSError as ose:
-                failed[url] = str(ose)
+    @staticmethod
+    def __getSingleFileSize(url):
+        """Get the physical size of a single file
 
-        return S_OK({"Failed": failed, "Successful": successful})
+        :param url: path on storage
+        :returns: S_OK(size) or S_ERROR, also if the path is not a file
+        """
+        try:
+            # We check the filesize first because if it does not exist
+            # it raises an exception, while os.path.isfile just return False
+            filesize = os.path.getsize(url)
+        except OSError as ose:
+            return S_ERROR(str(ose))
+        if not os.path.isfile(url):
+            return S_ERROR(os.strerror(errno.EISDIR))
+        return S_OK(filesize)
 
     #############################################################
     #
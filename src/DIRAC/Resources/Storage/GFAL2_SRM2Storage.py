@@ -64,13 +64,17 @@ class GFAL2_SRM2Storage(GFAL2_StorageBase):
 
     def __setSRMOptionsToDefault(self):
         """Resetting the SRM options back to default"""
-        self.ctx.set_opt_integer("SRM PLUGIN", "OPERATION_TIMEOUT", self.gfal2Timeout)
+        self._setContextOptions(self.ctx)
+
+    def _setContextOptions(self, ctx):
+        """Set the default SRM options of a gfal2 context"""
+        ctx.set_opt_integer("SRM PLUGIN", "OPERATION_TIMEOUT", self.gfal2Timeout)
         if self.spaceToken:
-            self.ctx.set_opt_string("SRM PLUGIN", "SPACETOKENDESC", self.spaceToken)
-        self.ctx.set_opt_integer("SRM PLUGIN", "REQUEST_LIFETIME", self.gfal2requestLifetime)
+            ctx.set_opt_string("SRM PLUGIN", "SPACETOKENDESC", self.spaceToken)
+        ctx.set_opt_integer("SRM PLUGIN", "REQUEST_LIFETIME", self.gfal2requestLifetime)
         # Setting the TURL protocol to gsiftp because with other protocols we have authorisation problems
-        #    self.ctx.set_opt_string_list( "SRM PLUGIN", "TURL_PROTOCOLS", self.defaultLocalProtocols )
-        self.ctx.set_opt_string_list("SRM PLUGIN", "TURL_PROTOCOLS", ["gsiftp"])
+        #    ctx.set_opt_string_list( "SRM PLUGIN", "TURL_PROTOCOLS", self.defaultLocalProtocols )
+        ctx.set_opt_string_list("SRM PLUGIN", "TURL_PROTOCOLS", ["gsiftp"])
 
     def _updateMetadataDict(self, metadataDict, attributeDict):
         """Updating the metadata dictionary with srm specific attributes
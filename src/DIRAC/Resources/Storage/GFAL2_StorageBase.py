@@ -29,6 +29,7 @@ import six
 import os
 import datetime
 import errno
+import threading
 from stat import S_ISREG, S_ISDIR, S_IXUSR, S_IRUSR, S_IWUSR, S_IRWXG, S_IRWXU, S_IRWXO
 
 import gfal2  # pylint: disable=import-error
@@ -41,6 +42,7 @@ from DIRAC.Resources.Storage.StorageBase import StorageBase
 from DIRAC.Core.Security.ProxyInfo import getProxyInfo
 from DIRAC.ConfigurationSystem.Client.Helpers.Registry import getVOForGroup
 from DIRAC.Core.Utilities.File import getSize
+from DIRAC.Core.Utilities.List import breakListIntoChunks
 from DIRAC.Core.Utilities.Pfn import pfnparse, pfnunparse
 
 
@@ -54,6 +56,12 @@ class GFAL2_StorageBase(StorageBase):
     SRM v2 interface to StorageElement using gfal2
     """
 
+    # The plugin can use the gfal2 bulk calls for the multi-URL operations supporting them,
+    # if enabled with the BulkOperations option
+    _BULK_OPERATIONS = True
+    # Number of URLs given to a single gfal2 bulk call
+    _BULK_SIZE = 100
+
     def __init__(self, storageName, parameters):
         """c'tor
 
@@ -71,6 +79,9 @@ class GFAL2_StorageBase(StorageBase):
         # file size
         self.disableTransferChecksum = True if (parameters.get("DisableChecksum") == "True") else False
 
+        # Not all the gfal2 plugins and storages behave well with the bulk calls, so they have to be enabled
+        self.bulkOperations = self._BULK_OPERATIONS and parameters.get("BulkOperations") == "True"
+
         # Different levels or verbosity:
         # gfal2.verbose_level.normal,
         # gfal2.verbose_level.verbose,
@@ -85,24 +96,14 @@ class GFAL2_StorageBase(StorageBase):
         self.isok = True
 
         # # gfal2 API
-        self.ctx = gfal2.creat_context()
-
-        # by default turn off BDII checks
-        self.ctx.set_opt_boolean("BDII", "ENABLE", False)
-
-        # session reuse should only be done on servers
-        self.ctx.set_opt_boolean(
-            "GRIDFTP PLUGIN",
-            "SESSION_REUSE",
-            os.environ.get("DIRAC_GFAL_GRIDFTP_SESSION_REUSE", "no").lower() in ["true", "yes"],
-        )
-
-        # Enable IPV6 for gsiftp
-        self.ctx.set_opt_boolean(
-            "GRIDFTP PLUGIN",
-            "IPV6",
-            os.environ.get("DIRAC_GFAL_GRIDFTP_ENABLE_IPV6", "true").lower() not in ["false", "no"],
-        )
+        # A gfal2 context can not be used by several threads at the same time, while the StorageElement
+        # objects are shared among the threads: each thread gets its own context, created on first use.
+        # The worker threads of the multi-URL operations take their context from a pool
+        self.__threadContext = threading.local()
+        self.__contextPool = []
+        self.__contextPoolLock = threading.Lock()
+        self.__threadContext.ctx = gfal2.creat_context()
+        self.__setBaseContextOptions(self.__threadContext.ctx)
 
         # spaceToken used for copying from and to the storage element
         self.spaceToken = parameters.get("SpaceToken", "")
@@ -135,6 +136,65 @@ class GFAL2_StorageBase(StorageBase):
         # If the list is empty, all of them will be queried
         self._defaultExtendedAttributes = []
 
+    @property
+    def ctx(self):
+        """The gfal2 context of the current thread"""
+        ctx = getattr(self.__threadContext, "workerCtx", None) or getattr(self.__threadContext, "ctx", None)
+        if ctx is None:
+            ctx = self.__newContext()
+            self.__threadContext.ctx = ctx
+        return ctx
+
+    def __newContext(self):
+        """Create a gfal2 context with all the options of the plugin"""
+        ctx = gfal2.creat_context()
+        self.__setBaseContextOptions(ctx)
+        self._setContextOptions(ctx)
+        return ctx
+
+    @staticmethod
+    def __setBaseContextOptions(ctx):
+        """Set the options common to all the gfal2 plugins"""
+        # by default turn off BDII checks
+        ctx.set_opt_boolean("BDII", "ENABLE", False)
+
+        # session reuse should only be done on servers
+        ctx.set_opt_boolean(
+            "GRIDFTP PLUGIN",
+            "SESSION_REUSE",
+            os.environ.get("DIRAC_GFAL_GRIDFTP_SESSION_REUSE", "no").lower() in ["true", "yes"],
+        )
+
+        # Enable IPV6 for gsiftp
+        ctx.set_opt_boolean(
+            "GRIDFTP PLUGIN",
+            "IPV6",
+            os.environ.get("DIRAC_GFAL_GRIDFTP_ENABLE_IPV6", "true").lower() not in ["false", "no"],
+        )
+
+    def _setContextOptions(self, ctx):
+        """Set the plugin specific options of a new gfal2 context
+
+        The plugins setting options on the context in their constructor must set them here too.
+
+        :param ctx: gfal2 context
+        """
+        pass
+
+    def _executeInWorker(self, singleMethod, url, *args):
+        """Execute a single URL method with a gfal2 context of the pool"""
+        with self.__contextPoolLock:
+            ctx = self.__contextPool.pop() if self.__contextPool else None
+        if ctx is None:
+            ctx = self.__newContext()
+        self.__threadContext.workerCtx = ctx
+        try:
+            return singleMethod(url, *args)
+        finally:
+            self.__threadContext.workerCtx = None
+            with self.__contextPoolLock:
+                self.__contextPool.append(ctx)
+
     def exists(self, path):
         """Check if the path exists on the storage
 
@@ -151,19 +211,7 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.exists: Checking the existence of %s path(s)" % len(urls))
 
-        successful = {}
-        failed = {}
-
-        for url in urls:
-            res = self.__singleExists(url)
-
-            if res["OK"]:
-                successful[url] = res["Value"]
-            else:  # something went wrong with the query
-                failed[url] = res["Message"]
-
-        resDict = {"Failed": failed, "Successful": successful}
-        return S_OK(resDict)
+        return self._executeForEachURL(self.__singleExists, urls)
 
     def _estimateTransferTimeout(self, fileSize):
         """Dark magic to estimate the timeout for a transfer
@@ -217,18 +265,7 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.isFile: checking whether %s path(s) are file(s)." % len(urls))
 
-        successful = {}
-        failed = {}
-
-        for url in urls:
-            res = self._isSingleFile(url)
-
-            if res["OK"]:
-                successful[url] = res["Value"]
-            else:
-                failed[url] = res["Message"]
-
-        return S_OK({"Failed": failed, "Successful": successful})
+        return self._executeForEachURL(self._isSingleFile, urls)
 
     def _isSingleFile(self, path):
         """Checking if :path: exists and is a file
@@ -538,17 +575,37 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.removeFile: Attempting to remove %s files" % len(urls))
 
-        failed = {}
-        successful = {}
+        if self.bulkOperations and len(urls) > 1:
+            res = self.__bulkRemoveFiles(list(urls))
+            if res["OK"]:
+                return res
+            self.log.debug("GFAL2_StorageBase.removeFile: Bulk removal failed", res["Message"])
 
-        for url in urls:
-            res = self._removeSingleFile(url)
+        return self._executeForEachURL(self._removeSingleFile, urls)
 
-            if res["OK"]:
-                successful[url] = res["Value"]
-            else:
-                failed[url] = res["Message"]
+    def __bulkRemoveFiles(self, urls):
+        """Physically remove files with the gfal2 bulk unlink
 
+        :param list urls: paths on storage (srm://...)
+        :returns: Successful dict {path : True}
+                  Failed dict {path : error message}
+                  S_ERROR if a bulk call failed as a whole
+        """
+        failed = {}
+        successful = {}
+        for urlChunk in breakListIntoChunks(urls, self._BULK_SIZE):
+            try:
+                errors = self.ctx.unlink([str(url) for url in urlChunk])
+            except gfal2.GError as e:
+                return S_ERROR(e.code, repr(e))
+            for url, error in zip(urlChunk, errors):
+                # A file which doesn't exist is successfully removed
+                if not error or error.code == errno.ENOENT:
+                    successful[url] = True
+                elif error.code == errno.EISDIR:
+                    failed[url] = "Path is a directory."
+                else:
+                    failed[url] = repr(error)
         return S_OK({"Failed": failed, "Successful": successful})
 
     def _removeSingleFile(self, path):
@@ -576,7 +633,8 @@ class GFAL2_StorageBase(StorageBase):
                 log.debug("File does not exist.")
                 return S_OK(True)
             elif e.code == errno.EISDIR:
-                log.debug("Path is a directory.")
+                errStr = "Path is a directory."
+                log.debug(errStr)
                 return S_ERROR(errno.EISDIR, errStr)
             else:
                 errStr = "Failed to remove file."
@@ -600,18 +658,7 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.getFileSize: Trying to determine file size of %s files" % len(urls))
 
-        failed = {}
-        successful = {}
-
-        for url in urls:
-            res = self._getSingleFileSize(url)
-
-            if not res["OK"]:
-                failed[url] = res["Message"]
-            else:
-                successful[url] = res["Value"]
-
-        return S_OK({"Failed": failed, "Successful": successful})
+        return self._executeForEachURL(self._getSingleFileSize, urls)
 
     def _getSingleFileSize(self, path):
         """Get the physical size of the given file
@@ -656,18 +703,7 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.getFileMetadata: trying to read metadata for %s paths" % len(urls))
 
-        failed = {}
-        successful = {}
-
-        for url in urls:
-            res = self._getSingleFileMetadata(url)
-
-            if not res["OK"]:
-                failed[url] = res["Message"]
-            else:
-                successful[url] = res["Value"]
-
-        return S_OK({"Failed": failed, "Successful": successful})
+        return self._executeForEachURL(self._getSingleFileMetadata, urls)
 
     def _getSingleFileMetadata(self, path):
         """Fetch the metadata associated to the file
@@ -763,15 +799,36 @@ class GFAL2_StorageBase(StorageBase):
 
         self.log.debug("GFAL2_StorageBase.prestageFile: Attempting to issue stage requests for %s file(s)." % len(urls))
 
+        if self.bulkOperations and len(urls) > 1:
+            res = self.__bulkPrestageFiles(list(urls), lifetime)
+            if res["OK"]:
+                return res
+            self.log.debug("GFAL2_StorageBase.prestageFile: Bulk prestage failed", res["Message"])
+
+        return self._executeForEachURL(self._prestageSingleFile, urls, lifetime)
+
+    def __bulkPrestageFiles(self, urls, lifetime):
+        """Issue prestage requests with the gfal2 bulk bring_online
+
+        :param list urls: paths to be prestaged
+        :param int lifetime: prestage lifetime in seconds
+
+        :return: succesful dict { url : token }
+                failed dict { url : message }
+                S_ERROR if a bulk call failed as a whole
+        """
         failed = {}
         successful = {}
-        for url in urls:
-            res = self._prestageSingleFile(url, lifetime)
-
-            if not res["OK"]:
-                failed[url] = res["Message"]
-            else:
-                successful[url] = res["Value"]
+        for urlChunk in breakListIntoChunks(urls, self._BULK_SIZE):
+            try:
+                errors, token = self.ctx.bring_online([str(url) for url in urlChunk], lifetime, self.stageTimeout, True)
+            except gfal2.GError as e:
+                return S_ERROR(e.code, repr(e))
+            for url, error in zip(urlChunk, errors):
+                if not error:
+                    successful[url] = token
+                else:
+                    failed[url] = "Error occured while prestaging file %s" % repr(error)
         return S_OK({"Failed": failed, "Successful": successful})
 
     def _prestageSingleFile(self, path, lifetime):
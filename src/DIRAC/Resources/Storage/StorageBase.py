@@ -44,6 +44,7 @@ import json
 import os
 import shutil
 import tempfile
+import concurrent.futures
 
 from DIRAC import S_OK, S_ERROR
 from DIRAC.Core.Utilities.Pfn import pfnparse, pfnunparse
@@ -97,6 +98,9 @@ class StorageBase(object):
         self.se = None
         self.isok = True
 
+        # Number of URLs a multi-URL operation may process concurrently
+        self.parallelism = max(1, int(parameterDict.get("Parallelism", 1)))
+
         # use True for backward compatibility
         self.srmSpecificParse = True
 
@@ -218,6 +222,45 @@ class StorageBase(object):
         """Get the size of the directory on the storage"""
         return S_ERROR("Storage.getDirectorySize: implement me!")
 
+    #############################################################
+    #
+    # These are the methods for executing single URL methods on many URLs
+    #
+
+    def _executeForEachURL(self, singleMethod, urls, *args):
+        """Execute a method taking a single URL for each of the given URLs
+
+        Up to `parallelism` URLs are processed concurrently by a pool of worker threads.
+
+        :param singleMethod: method taking a URL and returning S_OK/S_ERROR
+        :param urls: iterable of URLs
+        :param args: extra arguments of singleMethod
+
+        :returns: S_OK with the Successful dict {url : value} and the Failed dict {url : error message}
+        """
+        urls = list(urls)
+        if self.parallelism > 1 and len(urls) > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.parallelism, len(urls))) as executor:
+                results = list(executor.map(lambda url: self._executeInWorker(singleMethod, url, *args), urls))
+        else:
+            results = [singleMethod(url, *args) for url in urls]
+
+        successful = {}
+        failed = {}
+        for url, res in zip(urls, results):
+            if res["OK"]:
+                successful[url] = res["Value"]
+            else:
+                failed[url] = res["Message"]
+        return S_OK({"Failed": failed, "Successful": successful})
+
+    def _executeInWorker(self, singleMethod, url, *args):
+        """Execute a single URL method in a worker thread of _executeForEachURL
+
+        Plugins whose client is not thread safe prepare the worker thread here.
+        """
+        return singleMethod(url, *args)
+
     #############################################################
     #
     # These are the methods for manipulating the client
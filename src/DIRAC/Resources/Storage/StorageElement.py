@@ -48,36 +48,96 @@ sLog = gLogger.getSubLogger(__name__)
 
 
 class StorageElementCache(object):
-    def __init__(self):
+    """Cache of the StorageElementItem objects, shared among the threads.
+
+    The configuration, the plugins and the status of a StorageElement do not depend on the thread
+    using it, so a single object is kept per SE name, plugins, VO and proxy location
+    (the gfal2 contexts of the plugins being per thread).
+    The VO of the proxy is only resolved again when the credentials change,
+    and the expired objects are purged at most every ``purgeInterval`` seconds.
+    """
+
+    # Environment variables pointing to the proxy, checked in this order by getProxyLocation
+    __proxyEnvVars = ("GRID_PROXY_FILE", "X509_USER_PROXY")
+
+    def __init__(self, lifetime=1800, purgeInterval=60, credentialsCheckInterval=60):
+        """c'tor
+
+        :param int lifetime: seconds a StorageElement object is kept in the cache
+        :param int purgeInterval: minimum seconds between two purges of the expired objects
+        :param int credentialsCheckInterval: seconds after which the proxy file is checked again for changes,
+                                             if its location did not change in the meantime
+        """
         self.seCache = DictCache()
+        self.lifetime = lifetime
+        self.purgeInterval = purgeInterval
+        self.credentialsCheckInterval = credentialsCheckInterval
+        self.__lastPurge = 0
+        self.__credentialsLock = threading.Lock()
+        # (proxy environment, time of the check, proxy location, proxy modification time, vo)
+        self.__credentials = None
 
-    def __call__(self, name, plugins=None, vo=None, hideExceptions=False):
-        self.seCache.purgeExpired(expiredInSeconds=60)
-        tId = threading.current_thread().ident
+    def __getCredentials(self):
+        """Get the proxy location and the VO of its group.
 
-        if not vo:
-            result = getVOfromProxyGroup()
-            if not result["OK"]:
-                return
-            vo = result["Value"]
+        They are only looked up again when the proxy environment changed, or when the proxy file
+        was modified after ``credentialsCheckInterval`` seconds.
+
+        :returns: S_OK((proxyLocation, vo))
+        """
+        proxyEnv = tuple(os.environ.get(envVar) for envVar in self.__proxyEnvVars)
+        now = time.time()
+        with self.__credentialsLock:
+            cached = self.__credentials
+        if cached and cached[0] == proxyEnv and now - cached[1] < self.credentialsCheckInterval:
+            return S_OK((cached[2], cached[4]))
 
         # Because the gfal2 context caches the proxy location,
         # we also use the proxy location as a key.
         # In practice, there should almost always be one, except for the REA
         # If we see its memory consumtpion exploding, this might be a place to look
         proxyLoc = getProxyLocation()
+        try:
+            proxyTime = os.stat(proxyLoc).st_mtime if proxyLoc else None
+        except OSError:
+            proxyTime = None
+
+        if cached and cached[0] == proxyEnv and cached[2] == proxyLoc and cached[3] == proxyTime:
+            vo = cached[4]
+        else:
+            result = getVOfromProxyGroup()
+            if not result["OK"]:
+                return result
+            vo = result["Value"]
+
+        with self.__credentialsLock:
+            self.__credentials = (proxyEnv, now, proxyLoc, proxyTime, vo)
+        return S_OK((proxyLoc, vo))
+
+    def __call__(self, name, plugins=None, vo=None, hideExceptions=False):
+        now = time.time()
+        if now - self.__lastPurge > self.purgeInterval:
+            self.__lastPurge = now
+            self.seCache.purgeExpired(expiredInSeconds=60)
+
+        result = self.__getCredentials()
+        if not result["OK"]:
+            return
+        proxyLoc, proxyVO = result["Value"]
+        if not vo:
+            vo = proxyVO
 
         # ensure plugins is hashable! (tuple)
         if isinstance(plugins, list):
             plugins = tuple(plugins)
 
-        argTuple = (tId, name, plugins, vo, proxyLoc)
+        argTuple = (name, plugins, vo, proxyLoc)
         seObj = self.seCache.get(argTuple)
 
         if not seObj:
             seObj = StorageElementItem(name, plugins, vo, hideExceptions=hideExceptions)
             # Add the StorageElement to the cache for 1/2 hour
-            self.seCache.add(argTuple, 1800, seObj)
+            self.seCache.add(argTuple, self.lifetime, seObj)
 
         return seObj
 
@@ -173,7 +233,8 @@ class StorageElementItem(object):
 
         """
 
-        self.methodName = None
+        # The same object is shared among the threads: the method being executed is thread specific
+        self.__callContext = threading.local()
 
         if plugins is None:
             plugins = []
@@ -302,6 +363,15 @@ class StorageElementItem(object):
 
         self.__fileCatalog = None
 
+    @property
+    def methodName(self):
+        """Name of the method being executed by the current thread"""
+        return getattr(self.__callContext, "methodName", None)
+
+    @methodName.setter
+    def methodName(self, methodName):
+        self.__callContext.methodName = methodName
+
     def dump(self):
         """Dump to the logger a summary of the StorageElement items."""
         log = self.log.getLocalSubLogger("dump")
@@ -1304,9 +1374,10 @@ class StorageElementItem(object):
     def __getattr__(self, name):
         """Forwards the equivalent Storage calls to __executeMethod"""
         # We take either the equivalent name, or the name itself
-        self.methodName = StorageElementItem.__equivalentMethodNames.get(name, None)
+        methodName = StorageElementItem.__equivalentMethodNames.get(name, None)
 
-        if self.methodName:
+        if methodName:
+            self.methodName = methodName
             return self.__executeMethod
 
         raise AttributeError("StorageElement does not have a method '%s'" % name)
@@ -395,6 +395,36 @@ class TestBase(unittest.TestCase):
         self.assertEqual(res["Value"]["Successful"]["/test"], {"FilesRemoved": 1, "SizeRemoved": self.subFileSize})
         self.assertTrue(not os.path.exists(self.basePath + "/test"))
 
+    @mock.patch(
+        "DIRAC.Resources.Storage.StorageElement.StorageElementItem._StorageElementItem__isLocalSE",
+        return_value=S_OK(True),
+    )  # Pretend it's local
+    @mock.patch(
+        "DIRAC.Resources.Storage.StorageElement.StorageElementItem.addAccountingOperation", return_value=None
+    )  # Don't send accounting
+    def test_05_parallelFiles(self, mk_isLocalSE, mk_addAccounting):
+        """Testing the multi-file operations executed in parallel"""
+        self.se.storages[0].parallelism = 4
+        os.mkdir(os.path.join(self.basePath, "test"))
+        lfns = ["/test/parallel_%d.txt" % i for i in range(20)]
+        for i, lfn in enumerate(lfns):
+            with open(self.basePath + lfn, "w") as f:
+                f.write("a" * i)
+
+        res = self.se.getFileSize(lfns + [self.nonExistingFile])
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(res["Value"]["Successful"], dict((lfn, i) for i, lfn in enumerate(lfns)))
+        self.assertEqual(list(res["Value"]["Failed"]), [self.nonExistingFile])
+
+        res = self.se.getFileMetadata(lfns)
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(len(res["Value"]["Successful"]), len(lfns))
+
+        res = self.se.removeFile(lfns + [self.nonExistingFile])
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(len(res["Value"]["Successful"]), len(lfns) + 1)
+        self.assertFalse(os.listdir(os.path.join(self.basePath, "test")))
+
 
 if __name__ == "__main__":
     suite = unittest.defaultTestLoader.loadTestsFromTestCase(TestBase)
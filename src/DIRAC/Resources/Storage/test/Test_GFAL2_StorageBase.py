@@ -0,0 +1,113 @@
+""" Test the multi-URL operations and the gfal2 contexts of GFAL2_StorageBase
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import errno
+import sys
+import threading
+import unittest
+from mock import MagicMock, patch
+
+sys.modules.setdefault("gfal2", MagicMock())
+
+from DIRAC.Resources.Storage import GFAL2_StorageBase as gfal2StorageModule
+from DIRAC.Resources.Storage.GFAL2_StorageBase import GFAL2_StorageBase
+
+
+class FakeGError(Exception):
+    def __init__(self, code):
+        super(FakeGError, self).__init__(code)
+        self.code = code
+        self.message = "error %s" % code
+
+
+class GFAL2_StorageBase_TestCase(unittest.TestCase):
+    def setUp(self):
+        self.parameterDict = dict(Protocol="root", Path="/path", Host="host", Port="", Parallelism="4")
+        self.gfal2Patch = patch.object(gfal2StorageModule, "gfal2")
+        self.gfal2 = self.gfal2Patch.start()
+        self.gfal2.GError = FakeGError
+        self.gfal2.creat_context.side_effect = lambda: MagicMock()
+
+    def tearDown(self):
+        self.gfal2Patch.stop()
+
+    def test_bulkRemoval(self):
+        """The files are removed with bulk unlink calls, a non existing file being removed"""
+        storage = GFAL2_StorageBase("storageName", dict(self.parameterDict, BulkOperations="True"))
+        storage._BULK_SIZE = 2
+        storage.ctx.unlink.side_effect = lambda urls: [
+            FakeGError(errno.ENOENT) if "missing" in url else None for url in urls
+        ]
+        urls = ["root://host//path/f1", "root://host//path/missing", "root://host//path/f3"]
+        res = storage.removeFile(urls)
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(res["Value"]["Successful"], dict((url, True) for url in urls))
+        self.assertEqual(storage.ctx.unlink.call_count, 2)
+
+        # If the bulk call fails as a whole, the files are removed one by one with the contexts of the workers
+        storage.ctx.unlink.side_effect = FakeGError(errno.EOPNOTSUPP)
+        workerContext = MagicMock()
+        workerContext.unlink.side_effect = lambda url: 0
+        self.gfal2.creat_context.side_effect = lambda: workerContext
+        res = storage.removeFile(urls)
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(res["Value"]["Successful"], dict((url, True) for url in urls))
+        self.assertEqual(workerContext.unlink.call_count, 3)
+
+    def test_bulkDisabled(self):
+        """Without the BulkOperations option, the files are removed one by one"""
+        workerContext = MagicMock()
+        workerContext.unlink.side_effect = lambda url: 0
+        self.gfal2.creat_context.side_effect = lambda: workerContext
+        storage = GFAL2_StorageBase("storageName", self.parameterDict)
+        self.assertFalse(storage.bulkOperations)
+        urls = ["root://host//path/f1", "root://host//path/f2"]
+        res = storage.removeFile(urls)
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(res["Value"]["Successful"], dict((url, True) for url in urls))
+        self.assertEqual(sorted(call[0][0] for call in workerContext.unlink.call_args_list), urls)
+
+    def test_parallelExecution(self):
+        """Each worker thread uses its own gfal2 context, the contexts are reused"""
+        storage = GFAL2_StorageBase("storageName", self.parameterDict)
+        self.assertEqual(storage.parallelism, 4)
+        mainContext = storage.ctx
+        contexts = {}
+        lock = threading.Lock()
+
+        def singleMethod(url):
+            with lock:
+                contexts.setdefault(id(storage.ctx), set()).add(threading.current_thread().name)
+            return {"OK": True, "Value": url[-1]}
+
+        urls = ["root://host//path/f%d" % i for i in range(10)]
+        res = storage._executeForEachURL(singleMethod, urls)
+        self.assertTrue(res["OK"], res)
+        self.assertEqual(res["Value"]["Successful"], dict((url, url[-1]) for url in urls))
+        self.assertNotIn(id(mainContext), contexts)
+        self.assertLessEqual(len(contexts), 4)
+        # The main thread keeps using its own context
+        self.assertIs(storage.ctx, mainContext)
+
+    def test_threadContexts(self):
+        """A storage shared among threads gives each of them its own context, with the plugin options"""
+        storage = GFAL2_StorageBase("storageName", self.parameterDict)
+        mainContext = storage.ctx
+        self.assertIs(storage.ctx, mainContext)
+        threadContexts = []
+
+        def useStorage():
+            threadContexts.append(storage.ctx)
+            threadContexts.append(storage.ctx)
+
+        with patch.object(storage, "_setContextOptions") as mk_setContextOptions:
+            thread = threading.Thread(target=useStorage)
+            thread.start()
+            thread.join()
+        self.assertIs(threadContexts[0], threadContexts[1])
+        self.assertIsNot(threadContexts[0], mainContext)
+        mk_setContextOptions.assert_called_once_with(threadContexts[0])
+        self.assertIs(storage.ctx, mainContext)
@@ -9,11 +9,12 @@ import tempfile
 import mock
 import unittest
 import itertools
+import threading
 
 from diraccfg import CFG
 
 from DIRAC import S_OK
-from DIRAC.Resources.Storage.StorageElement import StorageElementItem
+from DIRAC.Resources.Storage.StorageElement import StorageElementCache, StorageElementItem
 from DIRAC.Resources.Storage.StorageBase import StorageBase
 
 
@@ -898,6 +899,69 @@ class TestSameSE(unittest.TestCase):
             self.assertFalse(se1.isSameSE(se2))
 
 
+class TestStorageElementCache(unittest.TestCase):
+    """Test the StorageElement objects cache"""
+
+    def setUp(self):
+        patchers = [
+            mock.patch(
+                "DIRAC.Resources.Storage.StorageElement.StorageElementItem", side_effect=lambda *a, **kw: object()
+            ),
+            mock.patch("DIRAC.Resources.Storage.StorageElement.getVOfromProxyGroup", return_value=S_OK("vo")),
+            mock.patch("DIRAC.Resources.Storage.StorageElement.getProxyLocation", return_value=False),
+            mock.patch.dict(os.environ, {"X509_USER_PROXY": "/proxy/one"}),
+        ]
+        self.mk_item, self.mk_getVO, self.mk_getProxyLocation, _ = [patcher.start() for patcher in patchers]
+        for patcher in patchers:
+            self.addCleanup(patcher.stop)
+
+    def test_01_sharedAmongThreads(self):
+        """The threads share the objects, the credentials are only resolved once"""
+        seCache = StorageElementCache()
+        seCache.seCache = mock.MagicMock(wraps=seCache.seCache)
+        seObjects = []
+
+        def getSEs():
+            seObjects.append(seCache("SE-A"))
+            seObjects.append(seCache("SE-A", plugins=["File"]))
+            seObjects.append(seCache("SE-A", vo="othervo"))
+
+        threads = [threading.Thread(target=getSEs) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(seObjects), 12)
+        self.assertEqual(len(set(id(seObj) for seObj in seObjects)), 3)
+        self.assertEqual(self.mk_getVO.call_count, 1)
+        self.assertEqual(self.mk_getProxyLocation.call_count, 1)
+        self.assertEqual(seCache.seCache.purgeExpired.call_count, 1)
+        self.mk_item.assert_any_call("SE-A", None, "vo", hideExceptions=False)
+        self.mk_item.assert_any_call("SE-A", ("File",), "vo", hideExceptions=False)
+        self.mk_item.assert_any_call("SE-A", None, "othervo", hideExceptions=False)
+
+    def test_02_credentialsChange(self):
+        """A change of the proxy environment resolves the credentials again"""
+        seCache = StorageElementCache()
+        seObj = seCache("SE-A")
+        self.assertIs(seCache("SE-A"), seObj)
+
+        self.mk_getVO.return_value = S_OK("othervo")
+        self.mk_getProxyLocation.return_value = "/proxy/two"
+        os.environ["X509_USER_PROXY"] = "/proxy/two"
+        otherSEObj = seCache("SE-A")
+        self.assertIsNot(otherSEObj, seObj)
+        self.assertEqual(self.mk_getVO.call_count, 2)
+        self.mk_item.assert_called_with("SE-A", None, "othervo", hideExceptions=False)
+
+        # After the check interval, the proxy file is checked again, but the VO is kept if it did not change
+        seCache.credentialsCheckInterval = 0
+        self.assertIs(seCache("SE-A"), otherSEObj)
+        self.assertEqual(self.mk_getProxyLocation.call_count, 3)
+        self.assertEqual(self.mk_getVO.call_count, 2)
+
+
 if __name__ == "__main__":
     from DIRAC import gLogger
 
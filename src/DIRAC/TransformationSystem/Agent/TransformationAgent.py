@@ -17,26 +17,73 @@ import os
 import datetime
 import pickle
 import concurrent.futures
+import calendar
+import multiprocessing
+import threading
 
-from DIRAC import S_OK, S_ERROR
+from diraccfg import CFG
+
+import DIRAC
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.Core.Base.AgentModule import AgentModule
-from DIRAC.Core.Utilities.ThreadSafe import Synchronizer
 from DIRAC.Core.Utilities.List import breakListIntoChunks, randomize
 from DIRAC.DataManagementSystem.Client.DataManager import DataManager
 from DIRAC.TransformationSystem.Client import TransformationFilesStatus
 from DIRAC.TransformationSystem.Client.TransformationClient import TransformationClient
 from DIRAC.TransformationSystem.Agent.TransformationAgentsUtilities import TransformationAgentsUtilities
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
 
 __RCSID__ = "$Id$"
 
 AGENT_NAME = "Transformation/TransformationAgent"
-gSynchro = Synchronizer()
+
+
+def initializePluginProcess(localCFG=""):
+    """Initializer of the processes running the plugins: load the configuration
+
+    The processes are spawned rather than forked: a fork of the agent could inherit locks
+    (logger, replica cache, configuration, sockets) held by its other threads, and block on them.
+    They are given the local configuration of the agent, which holds the settings of the agent
+    script and of its command line (e.g. /DIRAC/Security/UseServerCertificate) on top of the cfg files.
+
+    :param str localCFG: local configuration of the agent
+    """
+    agentCFG = CFG()
+    if localCFG:
+        agentCFG.loadFromBuffer(localCFG)
+        # Before the initialization, so that the configuration servers are contacted with the agent credentials
+        gConfigurationData.mergeWithLocal(agentCFG)
+    res = DIRAC.initialize()
+    if not res["OK"]:
+        gLogger.error("Failed to initialize the plugin process", res["Message"])
+    if localCFG:
+        # The cfg files loaded by the initialization must not override the options of the agent
+        gConfigurationData.mergeWithLocal(agentCFG)
+
+
+def runPluginInProcess(pluginLocation, plugin, transDict, dataReplicas, transFiles):
+    """Run a transformation plugin in a process of the pool, with its own clients
+
+    :returns: the result of the plugin run
+    """
+    plugModule = __import__(pluginLocation, globals(), locals(), ["TransformationPlugin"])
+    oPlugin = getattr(plugModule, "TransformationPlugin")(
+        "%s" % plugin, transClient=TransformationClient(), dataManager=DataManager()
+    )
+    oPlugin.setParameters(transDict)
+    oPlugin.setInputData(dataReplicas)
+    oPlugin.setTransformationFiles(transFiles)
+    return oPlugin.run()
 
 
 class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     """Usually subclass of AgentModule"""
 
+    # Stages of the processing of a transformation, whose time is reported at each cycle
+    STAGES = ("Files", "Replicas", "Plugin", "Tasks")
+
     def __init__(self, *args, **kwargs):
         """c'tor"""
         AgentModule.__init__(self, *args, **kwargs)
@@ -60,8 +107,8 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # Validity of the cache
         self.replicaCache = None
         self.replicaCacheValidity = None
-        self.writingCache = False
-        self.removedFromCache = 0
+        # transformations whose replica cache file of the previous versions was checked
+        self.legacyCacheChecked = set()
 
         self.noUnusedDelay = 0
         self.unusedFiles = {}
@@ -70,6 +117,17 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         self.debug = False
         self.pluginTimeout = {}
 
+        # pipelined mode and process pool of the plugins
+        self.threadPoolExecutor = None
+        self.prefetchExecutor = None
+        self.maxPrefetched = 0
+        self.processPoolExecutor = None
+        self.processPoolPlugins = []
+
+        # time spent in each stage during a cycle
+        self.stageTimes = {}
+        self.stageTimesLock = threading.Lock()
+
     def initialize(self):
         """standard initialize"""
         # few parameters
@@ -91,16 +149,16 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # clients
         self.transfClient = TransformationClient()
 
-        # for caching using a pickle file
+        # for caching using a SQLite file
         self.workDirectory = self.am_getWorkDirectory()
-        self.cacheFile = os.path.join(self.workDirectory, "ReplicaCache.pkl")
+        self.cacheFile = os.path.join(self.workDirectory, "ReplicaCache.db")
         self.controlDirectory = self.am_getControlDirectory()
 
         # remember the offset if any in TS
         self.lastFileOffset = {}
 
         # Validity of the cache
-        self.replicaCache = {}
+        self.replicaCache = ReplicaCache(self.cacheFile)
         self.replicaCacheValidity = self.am_getOption("ReplicaCacheValidity", 2)
 
         self.noUnusedDelay = self.am_getOption("NoUnusedDelay", 6)
@@ -110,18 +168,51 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         self.log.info("Multithreaded with %d threads" % maxNumberOfThreads)
         self.threadPoolExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=maxNumberOfThreads)
 
+        # In the pipelined mode, the files and replicas of the next transformations are fetched
+        # by other threads while the plugins run
+        if self.am_getOption("Pipelined", False):
+            prefetchThreads = self.am_getOption("PrefetchThreads", maxNumberOfThreads)
+            self.log.info("Pipelined mode, prefetching with %d threads" % prefetchThreads)
+            self.prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=prefetchThreads)
+            # Do not get ahead of the plugins by more than this number of transformations, as the
+            # prefetched inputs are kept in memory and their replicas get stale until the plugins run
+            self.maxPrefetched = maxNumberOfThreads + prefetchThreads
+
+        # CPU intensive plugins can be run in a pool of processes
+        self.processPoolPlugins = self.am_getOption("ProcessPoolPlugins", [])
+        maxNumberOfProcesses = self.am_getOption("MaxProcessesInPool", 4)
+        if self.processPoolPlugins:
+            self.log.info(
+                "Plugins %s run in a pool of %d processes" % (",".join(self.processPoolPlugins), maxNumberOfProcesses)
+            )
+            self.processPoolExecutor = self._createProcessPool(maxNumberOfProcesses)
+
         self.log.info("Will treat the following transformation types: %s" % str(self.transformationTypes))
 
         return S_OK()
 
+    @staticmethod
+    def _createProcessPool(maxNumberOfProcesses):
+        """Pool of spawned processes running the plugins, see initializePluginProcess"""
+        return concurrent.futures.ProcessPoolExecutor(
+            max_workers=maxNumberOfProcesses,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializePluginProcess,
+            initargs=(str(gConfigurationData.localCFG),),
+        )
+
     def finalize(self):
         """graceful finalization"""
 
         method = "finalize"
         self._logInfo("Wait for threads to get empty before terminating the agent", method=method)
+        if self.prefetchExecutor:
+            self.prefetchExecutor.shutdown()
         self.threadPoolExecutor.shutdown()
+        if self.processPoolExecutor:
+            self.processPoolExecutor.shutdown()
         self._logInfo("Threads are empty, terminating the agent...", method=method)
-        self.__writeCache()
+        self.replicaCache.close()
         return S_OK()
 
     def execute(self):
@@ -134,6 +225,9 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         # Process the transformations
         count = 0
         future_to_transID = {}
+        toPrefetch = []
+        cycleStart = time.time()
+        self.__resetStageTimes()
 
         for transDict in res["Value"]:
             transID = int(transDict["TransformationID"])
@@ -153,10 +247,15 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                         for status, val in movedFiles.items():
                             self._logInfo("\t%d files to status %s" % (val, status), transID=transID)
             count += 1
-            future = self.threadPoolExecutor.submit(self._execute, transDict)
-            future_to_transID[future] = transID
+            if self.prefetchExecutor:
+                toPrefetch.append(transDict)
+            else:
+                future_to_transID[self.threadPoolExecutor.submit(self._execute, transDict)] = transID
         self._logInfo("Out of %d transformations, %d put in thread queue" % (len(res["Value"]), count))
 
+        if self.prefetchExecutor:
+            self.__executePipelined(toPrefetch)
+
         for future in concurrent.futures.as_completed(future_to_transID):
             transID = future_to_transID[future]
             try:
@@ -166,8 +265,46 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             else:
                 self._logInfo("Processed %d" % transID)
 
+        self.__logStageTimes(time.time() - cycleStart)
         return S_OK()
 
+    def __executePipelined(self, transformations):
+        """Prefetch the input of the transformations and queue their plugin once it is prefetched
+
+        At most maxPrefetched transformations are being prefetched or waiting for their plugin to end:
+        the prefetch of the next transformation is submitted when a plugin ends.
+
+        :param list transformations: transformation dictionaries to process
+        """
+        toPrefetch = iter(transformations)
+        # future -> (is the prefetch stage, transformation ID)
+        futures = {}
+
+        def prefetchNext():
+            transDict = next(toPrefetch, None)
+            if transDict is not None:
+                future = self.prefetchExecutor.submit(self._prefetch, transDict)
+                futures[future] = (True, int(transDict["TransformationID"]))
+
+        for _ in range(max(1, self.maxPrefetched)):
+            prefetchNext()
+
+        while futures:
+            done, _ = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                isPrefetch, transID = futures.pop(future)
+                try:
+                    result = future.result()
+                except Exception as exc:
+                    self._logError("%d generated an exception: %s" % (transID, exc))
+                else:
+                    if isPrefetch and result:
+                        futures[self.threadPoolExecutor.submit(self._executePlugin, result)] = (False, transID)
+                        continue
+                    if not isPrefetch:
+                        self._logInfo("Processed %d" % transID)
+                prefetchNext()
+
     def getTransformations(self):
         """Obtain the transformations to be executed - this is executed at the start of every loop (it's really the
         only real thing in the execute()
@@ -231,21 +368,64 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
 
         self._logDebug("Exiting _execute")
 
+    def _executePlugin(self, transInput):
+        """thread - second stage of the pipelined mode: run the plugin on the prefetched input"""
+        transID = int(transInput["TransDict"]["TransformationID"])
+        startTime = time.time()
+        try:
+            res = self._runTransformationPlugin(transInput)
+            if not res["OK"]:
+                self._logInfo("Failed to process transformation:", res["Message"], transID=transID)
+        except Exception as x:  # pylint: disable=broad-except
+            self._logException("Exception in plugin", lException=x, transID=transID)
+        finally:
+            self._logInfo("Processed transformation in %.1f seconds" % (time.time() - startTime), transID=transID)
+
+    def _prefetch(self, transDict):
+        """thread - first stage of the pipelined mode: get the files and their replicas
+
+        :returns: the input of the transformation plugin (see _prepareTransformation), or None
+        """
+        transID = int(transDict["TransformationID"])
+        self._logInfo("Prefetching the input of transformation %s." % transID, transID=transID)
+        try:
+            res = self._prepareTransformation(transDict, self._getClients())
+        except Exception as x:  # pylint: disable=broad-except
+            self._logException("Exception when prefetching the transformation input", lException=x, transID=transID)
+            return None
+        if not res["OK"]:
+            self._logInfo("Failed to process transformation:", res["Message"], transID=transID)
+            return None
+        return res["Value"]
+
     def processTransformation(self, transDict, clients):
         """process a single transformation (in transDict)"""
-        method = "processTransformation"
+        res = self._prepareTransformation(transDict, clients)
+        if not res["OK"] or not res["Value"]:
+            return res
+        return self._runTransformationPlugin(res["Value"])
+
+    def _prepareTransformation(self, transDict, clients):
+        """Get the files of a transformation to process and their replicas
+
+        :returns: S_OK(None) if there is nothing to process,
+                  S_OK(dict) with the input of _runTransformationPlugin otherwise
+        """
+        method = "_prepareTransformation"
         transID = transDict["TransformationID"]
         forJobs = transDict["Type"].lower() not in ("replication", "removal")
 
         # First get the LFNs associated to the transformation
+        startTime = time.time()
         transFiles = self._getTransformationFiles(transDict, clients, replicateOrRemove=not forJobs)
+        self.__addStageTime("Files", time.time() - startTime)
         if not transFiles["OK"]:
             return transFiles
         if not transFiles["Value"]:
             return S_OK()
 
-        if transID not in self.replicaCache:
-            self.__readCache(transID)
+        if transID not in self.legacyCacheChecked:
+            self.__importLegacyCache(transID)
         transFiles = transFiles["Value"]
         unusedLfns = [f["LFN"] for f in transFiles]
         unusedFiles = len(unusedLfns)
@@ -268,24 +448,58 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             lfnsToProcess = unusedLfns
 
         # Check the data is available with replicas
+        startTime = time.time()
         res = self.__getDataReplicas(transDict, lfnsToProcess, clients, forJobs=forJobs)
+        self.__addStageTime("Replicas", time.time() - startTime)
         if not res["OK"]:
             self._logError("Failed to get data replicas:", res["Message"], method=method, transID=transID)
             return res
-        dataReplicas = res["Value"]
+
+        return S_OK(
+            {
+                "TransDict": transDict,
+                "Clients": clients,
+                "TransFiles": transFiles,
+                "LfnsToProcess": lfnsToProcess,
+                "UnusedFiles": unusedFiles,
+                "DataReplicas": res["Value"],
+            }
+        )
+
+    def _runTransformationPlugin(self, transInput):
+        """Run the plugin of a transformation and create the tasks it generated
+
+        :param dict transInput: input of the plugin, as returned by _prepareTransformation
+        """
+        method = "_runTransformationPlugin"
+        transDict = transInput["TransDict"]
+        clients = transInput["Clients"]
+        transFiles = transInput["TransFiles"]
+        lfnsToProcess = transInput["LfnsToProcess"]
+        transID = transDict["TransformationID"]
 
         # Get the plug-in type and create the plug-in object
+        plugin = transDict.get("Plugin", "Standard")
         self._logInfo("Processing transformation with '%s' plug-in." % plugin, method=method, transID=transID)
-        res = self.__generatePluginObject(plugin, clients)
-        if not res["OK"]:
-            return res
-        oPlugin = res["Value"]
-
-        # Get the plug-in and set the required params
-        oPlugin.setParameters(transDict)
-        oPlugin.setInputData(dataReplicas)
-        oPlugin.setTransformationFiles(transFiles)
-        res = oPlugin.run()
+        startTime = time.time()
+        if self.processPoolExecutor and plugin in self.processPoolPlugins:
+            # CPU intensive plugins are run in a separate process, so that they do not hold the GIL
+            future = self.processPoolExecutor.submit(
+                runPluginInProcess, self.pluginLocation, plugin, transDict, transInput["DataReplicas"], transFiles
+            )
+            res = future.result()
+        else:
+            res = self.__generatePluginObject(plugin, clients)
+            if not res["OK"]:
+                return res
+            oPlugin = res["Value"]
+
+            # Get the plug-in and set the required params
+            oPlugin.setParameters(transDict)
+            oPlugin.setInputData(transInput["DataReplicas"])
+            oPlugin.setTransformationFiles(transFiles)
+            res = oPlugin.run()
+        self.__addStageTime("Plugin", time.time() - startTime)
         if not res["OK"]:
             self._logError(
                 "Failed to generate tasks for transformation:", res["Message"], method=method, transID=transID
@@ -294,6 +508,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
         tasks = res["Value"]
         self.pluginTimeout[transID] = res.get("Timeout", False)
         # Create the tasks
+        startTime = time.time()
         allCreated = True
         created = 0
         lfnsInTasks = []
@@ -311,7 +526,7 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             self._logInfo("Successfully created %d tasks for transformation." % created, method=method, transID=transID)
         else:
             self._logInfo("No new tasks created for transformation.", method=method, transID=transID)
-        self.unusedFiles[transID] = unusedFiles - len(lfnsInTasks)
+        self.unusedFiles[transID] = transInput["UnusedFiles"] - len(lfnsInTasks)
         # If not all files were obtained, move the offset
         lastOffset = self.lastFileOffset.get(transID)
         if lastOffset:
@@ -330,8 +545,28 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
                 )
             else:
                 self._logInfo("Updated transformation status to 'Active'.", method=method, transID=transID)
+        self.__addStageTime("Tasks", time.time() - startTime)
         return S_OK()
 
+    def __resetStageTimes(self):
+        """Reset the time spent in each stage during the cycle"""
+        with self.stageTimesLock:
+            self.stageTimes = dict.fromkeys(self.STAGES, 0.0)
+
+    def __addStageTime(self, stage, elapsedTime):
+        """Add the time spent by a thread in a stage"""
+        with self.stageTimesLock:
+            self.stageTimes[stage] = self.stageTimes.get(stage, 0.0) + elapsedTime
+
+    def __logStageTimes(self, cycleTime):
+        """Report the cycle time and the time spent in each stage by all the threads"""
+        with self.stageTimesLock:
+            stageTimes = ", ".join("%s %.1f s" % (stage, self.stageTimes.get(stage, 0.0)) for stage in self.STAGES)
+        self._logInfo(
+            "Cycle executed in %.1f seconds, time spent in each stage: %s" % (cycleTime, stageTimes),
+            method="execute",
+        )
+
     ######################################################################
     #
     # Internal methods used by the agent
@@ -464,20 +699,17 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             # If the cache needs to be cleaned
             self.__cleanCache(transID)
         startTime = time.time()
-        dataReplicas = {}
         nLfns = len(lfns)
         self._logVerbose("Getting replicas for %d files" % nLfns, method=method, transID=transID)
-        cachedReplicaSets = self.replicaCache.get(transID, {})
-        cachedReplicas = {}
-        # Merge all sets of replicas
-        for replicas in cachedReplicaSets.values():
-            cachedReplicas.update(replicas)
-        self._logInfo("Number of cached replicas: %d" % len(cachedReplicas), method=method, transID=transID)
-        setCached = set(cachedReplicas)
-        setLfns = set(lfns)
-        for lfn in setLfns & setCached:
-            dataReplicas[lfn] = cachedReplicas[lfn]
-        newLFNs = setLfns - setCached
+        # Only the replicas of the files to process are read from the cache
+        res = self.replicaCache.getReplicas(transID, lfns)
+        if not res["OK"]:
+            self._logWarn("Failed to read the replica cache", res["Message"], method=method, transID=transID)
+        dataReplicas = res.get("Value", {})
+        res = self.replicaCache.getNumberOfLFNs(transID)
+        if res["OK"]:
+            self._logInfo("Number of cached replicas: %d" % res["Value"], method=method, transID=transID)
+        newLFNs = set(lfns) - set(dataReplicas)
         self._logInfo(
             "ReplicaCache hit for %d out of %d LFNs" % (len(dataReplicas), nLfns), method=method, transID=transID
         )
@@ -506,7 +738,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
             )
             dataReplicas.update(newReplicas)
             noReplicas = newLFNs - set(dataReplicas)
-            self.__writeCache(transID)
             if noReplicas:
                 self._logWarn(
                     "Found %d files without replicas (or only in Failover)" % len(noReplicas),
@@ -587,121 +818,71 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
 
     def __updateCache(self, transID, newReplicas):
         """Add replicas to the cache"""
-        self.replicaCache.setdefault(transID, {})[datetime.datetime.utcnow()] = newReplicas
+        res = self.replicaCache.addReplicas(transID, newReplicas)
+        if not res["OK"]:
+            self._logWarn(
+                "Failed to add replicas to the cache", res["Message"], method="__updateCache", transID=transID
+            )
 
     def __clearCacheForTrans(self, transID):
         """Remove all replicas for a transformation"""
-        self.replicaCache.pop(transID, None)
-
-    def __cleanReplicas(self, transID, lfns):
-        """Remove cached replicas that are not in a list"""
-        cachedReplicas = set()
-        for replicas in self.replicaCache.get(transID, {}).values():
-            cachedReplicas.update(replicas)
-        toRemove = cachedReplicas - set(lfns)
-        if toRemove:
-            self._logInfo("Remove %d files from cache" % len(toRemove), method="__cleanReplicas", transID=transID)
-            self.__removeFromCache(transID, toRemove)
+        res = self.replicaCache.clear(transID)
+        if not res["OK"]:
+            self._logWarn("Failed to clear the cache", res["Message"], method="__clearCacheForTrans", transID=transID)
 
     def __cleanCache(self, transID):
         """Cleans the cache"""
-        try:
-            if transID in self.replicaCache:
-                timeLimit = datetime.datetime.utcnow() - datetime.timedelta(days=self.replicaCacheValidity)
-                for updateTime in set(self.replicaCache[transID]):
-                    nCache = len(self.replicaCache[transID][updateTime])
-                    if updateTime < timeLimit or not nCache:
-                        self._logInfo(
-                            "Clear %s replicas for transformation %s, time %s"
-                            % ("%d cached" % nCache if nCache else "empty cache", str(transID), str(updateTime)),
-                            transID=transID,
-                            method="__cleanCache",
-                        )
-                        del self.replicaCache[transID][updateTime]
-                # Remove empty transformations
-                if not self.replicaCache[transID]:
-                    del self.replicaCache[transID]
-        except Exception as x:
-            self._logException("Exception when cleaning replica cache:", lException=x)
+        res = self.replicaCache.removeExpired(transID, self.replicaCacheValidity * 24 * 3600)
+        if not res["OK"]:
+            self._logWarn("Failed to clean the cache", res["Message"], method="__cleanCache", transID=transID)
+        elif res["Value"]:
+            self._logInfo(
+                "Clear %d cached replicas older than %s days" % (res["Value"], self.replicaCacheValidity),
+                method="__cleanCache",
+                transID=transID,
+            )
 
     def __removeFilesFromCache(self, transID, lfns):
-        removed = self.__removeFromCache(transID, lfns)
-        if removed:
-            self._logInfo("Removed %d replicas from cache" % removed, method="__removeFilesFromCache", transID=transID)
-            self.__writeCache(transID)
+        res = self.replicaCache.removeLFNs(transID, lfns)
+        if not res["OK"]:
+            self._logWarn(
+                "Failed to remove replicas from the cache",
+                res["Message"],
+                method="__removeFilesFromCache",
+                transID=transID,
+            )
+        elif res["Value"]:
+            self._logInfo(
+                "Removed %d replicas from cache" % res["Value"], method="__removeFilesFromCache", transID=transID
+            )
 
-    def __removeFromCache(self, transID, lfns):
-        if transID not in self.replicaCache:
-            return
-        removed = 0
-        if self.replicaCache[transID] and lfns:
-            for lfn in lfns:
-                for timeKey in self.replicaCache[transID]:
-                    if self.replicaCache[transID][timeKey].pop(lfn, None):
-                        removed += 1
-        return removed
-
-    def __cacheFile(self, transID):
-        return self.cacheFile.replace(".pkl", "_%s.pkl" % str(transID))
-
-    @gSynchro
-    def __readCache(self, transID):
-        """Reads from the cache"""
-        if transID in self.replicaCache:
+    def __importLegacyCache(self, transID):
+        """Move the replicas of the pickle cache file of the previous versions to the replica cache"""
+        method = "__importLegacyCache"
+        self.legacyCacheChecked.add(transID)
+        fileName = os.path.join(self.workDirectory, "ReplicaCache_%s.pkl" % str(transID))
+        if not os.path.exists(fileName):
             return
         try:
-            method = "__readCache"
-            fileName = self.__cacheFile(transID)
-            if not os.path.exists(fileName):
-                self.replicaCache[transID] = {}
-            else:
-                with open(fileName, "rb") as cacheFile:
-                    self.replicaCache[transID] = pickle.load(cacheFile)
-                self._logInfo(
-                    "Successfully loaded replica cache from file %s (%d files)"
-                    % (fileName, self.__filesInCache(transID)),
-                    method=method,
-                    transID=transID,
+            with open(fileName, "rb") as cacheFile:
+                replicaSets = pickle.load(cacheFile)
+            nFiles = 0
+            # The pickle cache is {updateTime: {lfn: replicas}}
+            for updateTime, replicas in replicaSets.items():
+                res = self.replicaCache.addReplicas(
+                    transID, replicas, updateTime=calendar.timegm(updateTime.utctimetuple())
                 )
-        except Exception as x:
-            self._logException(
-                "Failed to load replica cache from file %s" % fileName, lException=x, method=method, transID=transID
-            )
-            self.replicaCache[transID] = {}
-
-    def __filesInCache(self, transID):
-        cache = self.replicaCache.get(transID, {})
-        return sum(len(lfns) for lfns in cache.values())
-
-    @gSynchro
-    def __writeCache(self, transID=None):
-        """Writes the cache"""
-        method = "__writeCache"
-        try:
-            startTime = time.time()
-            transList = [transID] if transID else set(self.replicaCache)
-            filesInCache = 0
-            nCache = 0
-            for t_id in transList:
-                # Protect the copy of the cache
-                filesInCache += self.__filesInCache(t_id)
-                # write to a temporary file in order to avoid corrupted files
-                cacheFile = self.__cacheFile(t_id)
-                tmpFile = cacheFile + ".tmp"
-                with open(tmpFile, "wb") as fd:
-                    pickle.dump(self.replicaCache.get(t_id, {}), fd)
-                # Now rename the file as it shold
-                os.rename(tmpFile, cacheFile)
-                nCache += 1
+                if not res["OK"]:
+                    self._logWarn("Failed to import the replica cache", res["Message"], method=method, transID=transID)
+                    return
+                nFiles += len(replicas)
+            os.remove(fileName)
             self._logInfo(
-                "Successfully wrote %d replica cache file(s) (%d files) in %.1f seconds"
-                % (nCache, filesInCache, time.time() - startTime),
-                method=method,
-                transID=transID if transID else None,
+                "Imported replica cache file %s (%d files)" % (fileName, nFiles), method=method, transID=transID
             )
-        except Exception as x:
+        except Exception as x:  # pylint: disable=broad-except
             self._logException(
-                "Could not write replica cache file %s" % cacheFile, lException=x, method=method, transID=t_id
+                "Failed to import replica cache file %s" % fileName, lException=x, method=method, transID=transID
             )
 
     def __generatePluginObject(self, plugin, clients):
@@ -727,12 +908,6 @@ class TransformationAgent(AgentModule, TransformationAgentsUtilities):
     def pluginCallback(self, transID, invalidateCache=False):
         """Standard plugin callback"""
         if invalidateCache:
-            try:
-                if transID in self.replicaCache:
-                    self._logInfo(
-                        "Removed cached replicas for transformation", method="pluginCallBack", transID=transID
-                    )
-                    self.replicaCache.pop(transID)
-                    self.__writeCache(transID)
-            except Exception:
-                pass
+            res = self.replicaCache.clear(transID)
+            if res["OK"] and res["Value"]:
+                self._logInfo("Removed cached replicas for transformation", method="pluginCallBack", transID=transID)
@@ -7,16 +7,23 @@ from __future__ import print_function
 # pylint: disable=protected-access, missing-docstring, invalid-name, line-too-long
 
 # imports
+import concurrent.futures
 import datetime
+import os
+import pickle
+import threading
+import time
 
 import pytest
 from mock import MagicMock
 
+from DIRAC.ConfigurationSystem.Client.ConfigurationData import gConfigurationData
 from DIRAC.TransformationSystem.Client import TransformationFilesStatus
 
 # sut
 from DIRAC.TransformationSystem.Agent.TaskManagerAgentBase import TaskManagerAgentBase
 from DIRAC.TransformationSystem.Agent.TransformationAgent import TransformationAgent
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
 
 mockAM = MagicMock()
 
@@ -250,3 +257,152 @@ def test__getTransformationFiles(mocker, transDict, getTFiles, expected):
     tc_mock.getTransformationFiles.return_value = getTFiles
     res = TransformationAgent()._getTransformationFiles(transDict, {"TransformationClient": tc_mock})
     assert res["OK"] == expected
+
+
+def test__importLegacyCache(mocker, tmpdir):
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    ta = TransformationAgent()
+    ta.workDirectory = str(tmpdir)
+    ta.replicaCache = ReplicaCache(str(tmpdir.join("ReplicaCache.db")))
+    now = datetime.datetime.utcnow()
+    legacyCache = {now - datetime.timedelta(days=3): {"/a": ["SE1"]}, now: {"/b": ["SE1", "SE2"]}}
+    with open(str(tmpdir.join("ReplicaCache_123.pkl")), "wb") as fd:
+        pickle.dump(legacyCache, fd)
+
+    ta._TransformationAgent__importLegacyCache(123)
+    assert not tmpdir.join("ReplicaCache_123.pkl").check()
+    assert ta.replicaCache.getReplicas(123, ["/a", "/b"])["Value"] == {"/a": ["SE1"], "/b": ["SE1", "SE2"]}
+    # The update time of the replicas is kept
+    assert ta.replicaCache.removeExpired(123, 2 * 24 * 3600)["Value"] == 1
+    ta.replicaCache.close()
+
+
+def test_executePipelined(mocker):
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    ta = TransformationAgent()
+    ta.threadPoolExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    ta.prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=2)
+    transformations = [{"TransformationID": transID, "Type": "Replication"} for transID in (1, 2, 3)]
+    mocker.patch.object(ta, "getTransformations", return_value={"OK": True, "Value": transformations})
+    mocker.patch.object(ta, "_getClients", return_value=clients)
+
+    def prepare(transDict, _clients):
+        # Nothing to do for the transformation 2
+        if transDict["TransformationID"] == 2:
+            return {"OK": True, "Value": None}
+        return {"OK": True, "Value": {"TransDict": transDict, "Clients": _clients}}
+
+    mocker.patch.object(ta, "_prepareTransformation", side_effect=prepare)
+    runPlugin = mocker.patch.object(ta, "_runTransformationPlugin", return_value=sOk)
+
+    assert ta.execute()["OK"]
+    assert sorted(call[0][0]["TransDict"]["TransformationID"] for call in runPlugin.call_args_list) == [1, 3]
+    assert set(ta.stageTimes) == set(TransformationAgent.STAGES)
+    ta.prefetchExecutor.shutdown()
+    ta.threadPoolExecutor.shutdown()
+
+
+def test_executePipelinedLookahead(mocker):
+    """The prefetch does not get ahead of the plugins by more than maxPrefetched transformations"""
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    ta = TransformationAgent()
+    ta.threadPoolExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+    ta.prefetchExecutor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
+    ta.maxPrefetched = 2
+    transformations = [{"TransformationID": transID, "Type": "Replication"} for transID in range(1, 11)]
+    mocker.patch.object(ta, "getTransformations", return_value={"OK": True, "Value": transformations})
+    mocker.patch.object(ta, "_getClients", return_value=clients)
+    lock = threading.Lock()
+    outstanding = []
+    maxOutstanding = []
+
+    def prepare(transDict, _clients):
+        with lock:
+            outstanding.append(transDict["TransformationID"])
+            maxOutstanding.append(len(outstanding))
+        return {"OK": True, "Value": {"TransDict": transDict, "Clients": _clients}}
+
+    def runPlugin(transInput):
+        time.sleep(0.01)
+        with lock:
+            outstanding.remove(transInput["TransDict"]["TransformationID"])
+        return sOk
+
+    mocker.patch.object(ta, "_prepareTransformation", side_effect=prepare)
+    mocker.patch.object(ta, "_runTransformationPlugin", side_effect=runPlugin)
+
+    assert ta.execute()["OK"]
+    assert len(maxOutstanding) == 10
+    assert max(maxOutstanding) <= 2
+    assert not outstanding
+    ta.prefetchExecutor.shutdown()
+    ta.threadPoolExecutor.shutdown()
+
+
+class TransformationPlugin(object):
+    """Plugin run by test_runPluginInProcessPool, creating a task at an SE named after its process ID"""
+
+    def __init__(self, plugin, transClient=None, dataManager=None):
+        self.data = {}
+
+    def setParameters(self, params):
+        pass
+
+    def setInputData(self, data):
+        self.data = data
+
+    def setTransformationFiles(self, files):
+        pass
+
+    def run(self):
+        return {"OK": True, "Value": [(str(os.getpid()), sorted(self.data))]}
+
+
+def test_runPluginInProcessPool(mocker):
+    mocker.patch("DIRAC.TransformationSystem.Agent.TransformationAgent.AgentModule", side_effect=mockAM)
+    ta = TransformationAgent()
+    # This module, on the sys.path given to the spawned processes
+    ta.pluginLocation = __name__
+    ta.processPoolPlugins = ["CPUIntensive"]
+    ta.processPoolExecutor = TransformationAgent._createProcessPool(1)
+    ta.replicaCache = MagicMock()
+    transClient = MagicMock()
+    transClient.addTaskForTransformation.return_value = sOk
+
+    transInput = {
+        "TransDict": {"TransformationID": 1, "Plugin": "CPUIntensive", "Status": "Active"},
+        "Clients": {"TransformationClient": transClient},
+        "TransFiles": [{"LFN": "/a"}, {"LFN": "/b"}],
+        "LfnsToProcess": ["/a", "/b"],
+        "DataReplicas": {"/a": ["SE1"], "/b": ["SE1"]},
+        "UnusedFiles": 2,
+    }
+    try:
+        res = ta._runTransformationPlugin(transInput)
+    finally:
+        ta.processPoolExecutor.shutdown()
+    assert res["OK"], res
+    # The plugin ran in another process, and its tasks were created by the agent
+    transClient.addTaskForTransformation.assert_called_once()
+    transID, lfns, se = transClient.addTaskForTransformation.call_args[0]
+    assert (transID, lfns) == (1, ["/a", "/b"])
+    assert se != str(os.getpid())
+    assert ta.unusedFiles[1] == 0
+
+
+def useServerCertificate():
+    """Run by test_pluginProcessConfiguration in a process of the pool"""
+    return gConfigurationData.useServerCertificate()
+
+
+def test_pluginProcessConfiguration():
+    """The plugin processes get the settings given to the agent"""
+    gConfigurationData.setOptionInCFG("/DIRAC/Security/UseServerCertificate", "yes")
+    try:
+        processPool = TransformationAgent._createProcessPool(1)
+    finally:
+        gConfigurationData.deleteOptionInCFG("/DIRAC/Security/UseServerCertificate")
+    try:
+        assert processPool.submit(useServerCertificate).result()
+    finally:
+        processPool.shutdown()
@@ -0,0 +1,170 @@
+""" ReplicaCache: replicas of the files of the transformations, cached in a SQLite file
+
+The replicas are indexed by transformation and LFN, together with the time at which they were obtained.
+Only the replicas of the LFNs looked up are read from the file, and only the added or removed ones are written,
+so that the cost of the cache does not grow with the number of files of the transformations.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import json
+import sqlite3
+import threading
+import time
+
+from DIRAC import gLogger, S_OK, S_ERROR
+from DIRAC.Core.Utilities.List import breakListIntoChunks
+
+__RCSID__ = "$Id$"
+
+# SQLite limits the number of parameters of a statement to 999
+MAX_PARAMETERS = 500
+
+
+class ReplicaCache(object):
+    """Replica cache of the TransformationAgent
+
+    The object can be shared among the threads: the accesses to the file are serialized.
+    """
+
+    def __init__(self, fileName):
+        """c'tor
+
+        :param str fileName: path of the SQLite file, created if needed
+        """
+        self.fileName = fileName
+        self.log = gLogger.getSubLogger("ReplicaCache")
+        self.__lock = threading.Lock()
+        self.__connection = None
+
+    def __connect(self):
+        """Open the file and create the table if needed (called with the lock held)"""
+        if self.__connection is None:
+            connection = sqlite3.connect(self.fileName, timeout=60, check_same_thread=False)
+            # The cache can be rebuilt from the catalog, so durability is traded for speed
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS Replicas ("
+                "TransformationID INTEGER NOT NULL, LFN TEXT NOT NULL, SEs TEXT NOT NULL, UpdateTime REAL NOT NULL, "
+                "PRIMARY KEY (TransformationID, LFN))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS TransUpdateTime ON Replicas (TransformationID, UpdateTime)")
+            connection.commit()
+            self.__connection = connection
+        return self.__connection
+
+    def __execute(self, function, *args):
+        """Execute function(connection, *args) in a transaction
+
+        :returns: S_OK(return value of the function) or S_ERROR
+        """
+        with self.__lock:
+            try:
+                connection = self.__connect()
+                with connection:
+                    return S_OK(function(connection, *args))
+            except sqlite3.Error as e:
+                self.log.exception("Error accessing the replica cache", self.fileName, lException=e)
+                return S_ERROR("Error accessing the replica cache %s: %s" % (self.fileName, repr(e)))
+
+    def close(self):
+        """Close the file, it is opened again on the next access"""
+        with self.__lock:
+            if self.__connection is not None:
+                self.__connection.close()
+                self.__connection = None
+
+    def getReplicas(self, transID, lfns):
+        """Get the cached replicas of some LFNs
+
+        :param int transID: transformation ID
+        :param lfns: LFNs to look up
+        :returns: S_OK({lfn: replicas}) for the LFNs in the cache
+        """
+
+        def _getReplicas(connection, lfns):
+            replicas = {}
+            for chunk in breakListIntoChunks(lfns, MAX_PARAMETERS):
+                rows = connection.execute(
+                    "SELECT LFN, SEs FROM Replicas WHERE TransformationID = ? AND LFN IN (%s)"
+                    % ",".join("?" * len(chunk)),
+                    [transID] + chunk,
+                )
+                replicas.update((lfn, json.loads(ses)) for lfn, ses in rows)
+            return replicas
+
+        return self.__execute(_getReplicas, list(lfns))
+
+    def addReplicas(self, transID, replicas, updateTime=None):
+        """Add or replace the replicas of some LFNs
+
+        :param int transID: transformation ID
+        :param dict replicas: {lfn: replicas}
+        :param float updateTime: time (seconds since the epoch) the replicas were obtained, by default now
+        :returns: S_OK(number of LFNs added)
+        """
+        updateTime = time.time() if updateTime is None else updateTime
+        rows = [(transID, lfn, json.dumps(ses), updateTime) for lfn, ses in replicas.items()]
+        return self.__execute(
+            lambda connection: connection.executemany(
+                "INSERT OR REPLACE INTO Replicas (TransformationID, LFN, SEs, UpdateTime) VALUES (?, ?, ?, ?)", rows
+            ).rowcount
+        )
+
+    def removeLFNs(self, transID, lfns):
+        """Remove some LFNs from the cache
+
+        :param int transID: transformation ID
+        :param lfns: LFNs to remove
+        :returns: S_OK(number of LFNs removed)
+        """
+
+        def _removeLFNs(connection, lfns):
+            removed = 0
+            for chunk in breakListIntoChunks(lfns, MAX_PARAMETERS):
+                removed += connection.execute(
+                    "DELETE FROM Replicas WHERE TransformationID = ? AND LFN IN (%s)" % ",".join("?" * len(chunk)),
+                    [transID] + chunk,
+                ).rowcount
+            return removed
+
+        return self.__execute(_removeLFNs, list(lfns))
+
+    def removeExpired(self, transID, validity):
+        """Remove the replicas of a transformation obtained more than validity seconds ago
+
+        :param int transID: transformation ID
+        :param validity: validity of the replicas, in seconds
+        :returns: S_OK(number of LFNs removed)
+        """
+        return self.__execute(
+            lambda connection: connection.execute(
+                "DELETE FROM Replicas WHERE TransformationID = ? AND UpdateTime < ?", (transID, time.time() - validity)
+            ).rowcount
+        )
+
+    def clear(self, transID):
+        """Remove all the replicas of a transformation
+
+        :param int transID: transformation ID
+        :returns: S_OK(number of LFNs removed)
+        """
+        return self.__execute(
+            lambda connection: connection.execute(
+                "DELETE FROM Replicas WHERE TransformationID = ?", (transID,)
+            ).rowcount
+        )
+
+    def getNumberOfLFNs(self, transID):
+        """Get the number of LFNs cached for a transformation
+
+        :param int transID: transformation ID
+        :returns: S_OK(int)
+        """
+        return self.__execute(
+            lambda connection: connection.execute(
+                "SELECT COUNT(*) FROM Replicas WHERE TransformationID = ?", (transID,)
+            ).fetchone()[0]
+        )
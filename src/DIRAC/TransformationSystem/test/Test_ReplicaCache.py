@@ -0,0 +1,68 @@
+"""Test the replica cache of the TransformationAgent"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+
+import os
+import shutil
+import tempfile
+import time
+
+import pytest
+
+from DIRAC.TransformationSystem.Utilities.ReplicaCache import ReplicaCache
+
+__RCSID__ = "$Id$"
+
+
+@pytest.fixture
+def replicaCache():
+    """A replica cache in a temporary directory"""
+    tmpDir = tempfile.mkdtemp()
+    cache = ReplicaCache(os.path.join(tmpDir, "ReplicaCache.db"))
+    yield cache
+    cache.close()
+    shutil.rmtree(tmpDir)
+
+
+def test_replicas(replicaCache):
+    """Replicas are added, read and removed by LFN, per transformation"""
+    replicas = dict(("/lfn/%d" % i, ["SE-%d" % (i % 3), "SE-X"]) for i in range(1200))
+    res = replicaCache.addReplicas(1, replicas)
+    assert res["OK"], res
+    assert res["Value"] == 1200
+    assert replicaCache.addReplicas(2, {"/lfn/0": ["SE-Y"]})["OK"]
+
+    # Only the requested LFNs are returned, more than the SQLite parameter limit can be requested
+    res = replicaCache.getReplicas(1, ["/lfn/%d" % i for i in range(1500)])
+    assert res["OK"], res
+    assert res["Value"] == replicas
+    assert replicaCache.getReplicas(2, ["/lfn/0", "/lfn/1"])["Value"] == {"/lfn/0": ["SE-Y"]}
+    assert replicaCache.getNumberOfLFNs(1)["Value"] == 1200
+
+    res = replicaCache.removeLFNs(1, ["/lfn/%d" % i for i in range(1000)] + ["/lfn/unknown"])
+    assert res["OK"], res
+    assert res["Value"] == 1000
+    assert replicaCache.getNumberOfLFNs(1)["Value"] == 200
+    assert replicaCache.getNumberOfLFNs(2)["Value"] == 1
+
+    assert replicaCache.clear(1)["Value"] == 200
+    assert replicaCache.getNumberOfLFNs(1)["Value"] == 0
+    assert replicaCache.getNumberOfLFNs(2)["Value"] == 1
+
+
+def test_persistence(replicaCache):
+    """The replicas are kept in the file and expire"""
+    now = time.time()
+    assert replicaCache.addReplicas(1, {"/lfn/old": ["SE"]}, updateTime=now - 3 * 24 * 3600)["OK"]
+    assert replicaCache.addReplicas(1, {"/lfn/new": ["SE"]})["OK"]
+
+    otherCache = ReplicaCache(replicaCache.fileName)
+    assert otherCache.getNumberOfLFNs(1)["Value"] == 2
+
+    res = otherCache.removeExpired(1, 2 * 24 * 3600)
+    assert res["OK"], res
+    assert res["Value"] == 1
+    otherCache.close()
+
+    assert replicaCache.getReplicas(1, ["/lfn/old", "/lfn/new"])["Value"] == {"/lfn/new": ["SE"]}
@@ -72,6 +72,7 @@ class JobAgent(AgentModule):
         self.minimumTimeLeft = 5000
         self.stopOnApplicationFailure = True
         self.stopAfterFailedMatches = 10
+        self.maxJobsPerCycle = 1
         self.jobCount = 0
         self.matchFailedCount = 0
         self.extraOptions = ""
@@ -121,6 +122,7 @@ class JobAgent(AgentModule):
         self.minimumTimeLeft = self.am_getOption("MinimumTimeLeft", self.minimumTimeLeft)
         self.stopOnApplicationFailure = self.am_getOption("StopOnApplicationFailure", self.stopOnApplicationFailure)
         self.stopAfterFailedMatches = self.am_getOption("StopAfterFailedMatches", self.stopAfterFailedMatches)
+        self.maxJobsPerCycle = self.am_getOption("MaxJobsPerCycle", self.maxJobsPerCycle)
         self.extraOptions = gConfig.getValue("/AgentJobRequirements/ExtraOptions", self.extraOptions)
         # Utilities
         self.timeLeftUtil = TimeLeft()
@@ -157,6 +159,7 @@ class JobAgent(AgentModule):
             return self._finish(result["Message"])
         if result["OK"] and result["Value"]:
             return result
+        availableSlots = result.get("AvailableSlots", 1)
 
         # Check that we are allowed to continue and that time left is sufficient
         if self.jobCount:
@@ -177,8 +180,9 @@ class JobAgent(AgentModule):
         for ceDict in ceDictList:
             self._setCEDict(ceDict)
 
-        # Try to match a job
-        jobRequest = self._matchAJob(ceDictList)
+        # Try to match as many jobs as there are free slots (within the limit set)
+        maxJobs = min(availableSlots, self.maxJobsPerCycle)
+        jobRequest = self._matchJobs(ceDictList, maxJobs)
 
         self.stopAfterFailedMatches = self.am_getOption("StopAfterFailedMatches", self.stopAfterFailedMatches)
         if not jobRequest["OK"]:
@@ -190,9 +194,29 @@ class JobAgent(AgentModule):
         # Reset the Counter
         self.matchFailedCount = 0
 
+        matcherInfoList = jobRequest["Value"]
+        for index, matcherInfo in enumerate(matcherInfoList):
+            if index:
+                # The previous jobs may have taken the resources the Matcher was told about
+                result = self._checkCEAvailability(self.computingElement)
+                if not result["OK"] or not result.get("AvailableSlots"):
+                    self._rescheduleMatchedJobs(matcherInfoList[index:], "No free slot left in the pilot")
+                    break
+            result = self._submitMatchedJob(matcherInfo)
+            if not result["OK"]:
+                self._rescheduleMatchedJobs(matcherInfoList[index + 1 :], "Pilot stopped before running the job")
+                return result
+
+        return S_OK("Job Agent cycle complete")
+
+    def _submitMatchedJob(self, matcherInfo):
+        """Check the information returned by the Matcher for a job and submit it to the inner CE
+
+        :param dict matcherInfo: job description returned by the Matcher
+        :return: S_OK/S_ERROR, the latter meaning that the agent has to stop
+        """
         # Check matcher information returned
         matcherParams = ["JDL", "DN", "Group"]
-        matcherInfo = jobRequest["Value"]
         jobID = matcherInfo["JobID"]
         jobReport = JobReport(jobID, "JobAgent@%s" % self.siteName)
         result = self._checkMatcherInfo(matcherInfo, matcherParams, jobReport)
@@ -230,7 +254,7 @@ class JobAgent(AgentModule):
         jobID = submissionParams["jobID"]
         jobType = submissionParams["jobType"]
 
-        self.log.verbose("Job request successful: \n", jobRequest["Value"])
+        self.log.verbose("Job request successful: \n", matcherInfo)
         self.log.info("Received", "JobID=%s, JobType=%s, OwnerDN=%s, JobGroup=%s" % (jobID, jobType, ownerDN, jobGroup))
         self.jobCount += 1
         try:
@@ -319,7 +343,7 @@ class JobAgent(AgentModule):
             result = self._rescheduleFailedJob(jobID, "Job processing failed with exception", direct=True)
             return self._finish(result["Message"], self.stopOnApplicationFailure)
 
-        return S_OK("Job Agent cycle complete")
+        return S_OK()
 
     #############################################################################
     def _saveJobJDLRequest(self, jobID, jobJDL):
@@ -389,7 +413,9 @@ class JobAgent(AgentModule):
                 return S_OK("Job Agent cycle complete with %d running jobs" % runningJobs)
             self.log.info("CE is not available (and there are no running jobs)")
             return S_ERROR("CE Not Available")
-        return S_OK()
+        result = S_OK()
+        result["AvailableSlots"] = availableSlots
+        return result
 
     #############################################################################
     def _computeCPUWorkLeft(self, processors=1):
@@ -547,6 +573,40 @@ class JobAgent(AgentModule):
                 break
         return jobRequest
 
+    def _matchJobs(self, ceDictList, maxJobs=1):
+        """Get up to maxJobs jobs from the Matcher, trying each ceDict until we get some
+
+        :param list ceDictList: prioritized CE descriptions
+        :param int maxJobs: maximum number of jobs to get (free slots of the CE)
+        :return: S_OK(non empty list of job descriptions returned by the Matcher)/S_ERROR
+        """
+        if maxJobs <= 1:
+            jobRequest = self._matchAJob(ceDictList)
+            if jobRequest["OK"]:
+                jobRequest["Value"] = [jobRequest["Value"]]
+            return jobRequest
+
+        jobRequest = S_ERROR("No CE Dictionary available")
+        for ceDict in ceDictList:
+            self.log.verbose("CE dict", ceDict)
+
+            start = time.time()
+            jobRequest = MatcherClient().requestJobs(ceDict, maxJobs)
+            matchTime = time.time() - start
+
+            self.log.info("MatcherTime", "= %.2f (s) for %d job(s)" % (matchTime, len(jobRequest.get("Value", []))))
+            if jobRequest["OK"]:
+                for matcherInfo in jobRequest["Value"]:
+                    matcherInfo["matchTime"] = matchTime
+                    matcherInfo["CEDict"] = ceDict
+                break
+        return jobRequest
+
+    def _rescheduleMatchedJobs(self, matcherInfoList, message):
+        """Give back to the WMS the jobs obtained from the Matcher that will not be run here"""
+        for matcherInfo in matcherInfoList:
+            self._rescheduleFailedJob(matcherInfo["JobID"], message)
+
     def _checkMatchingIssues(self, issueMessage):
         """Check the source of the matching issue
 
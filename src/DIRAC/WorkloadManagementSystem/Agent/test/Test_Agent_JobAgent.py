@@ -219,6 +219,37 @@ def test__checkMatchingIssues(mocker, issueMessage, stopAfterFailedMatches, matc
     assert result["OK"] == expectedResult
 
 
+@pytest.mark.parametrize(
+    "maxJobs, mockMatcherReply, expectedJobIDs",
+    [
+        (1, {"OK": True, "Value": {"JobID": 1}}, [1]),
+        (1, {"OK": False, "Message": "No match found"}, None),
+        (3, {"OK": True, "Value": [{"JobID": 1}, {"JobID": 2}]}, [1, 2]),
+        (3, {"OK": False, "Message": "No match found"}, None),
+    ],
+)
+def test__matchJobs(mocker, maxJobs, mockMatcherReply, expectedJobIDs):
+    """Test JobAgent()._matchJobs()"""
+    mocker.patch("DIRAC.WorkloadManagementSystem.Agent.JobAgent.AgentModule.__init__")
+    matcherClient = mocker.patch("DIRAC.WorkloadManagementSystem.Agent.JobAgent.MatcherClient")
+    matcherClient.return_value.requestJob.return_value = mockMatcherReply
+    matcherClient.return_value.requestJobs.return_value = mockMatcherReply
+
+    jobAgent = JobAgent("Test", "Test1")
+    jobAgent.log = gLogger
+    jobAgent.log.setLevel("DEBUG")
+
+    ceDict = {"Site": "Site.A.ch"}
+    result = jobAgent._matchJobs([ceDict], maxJobs)
+    if expectedJobIDs is None:
+        assert not result["OK"]
+        return
+    assert [matcherInfo["JobID"] for matcherInfo in result["Value"]] == expectedJobIDs
+    assert all(matcherInfo["CEDict"] == ceDict for matcherInfo in result["Value"])
+    # A single job is still requested with the original call
+    assert matcherClient.return_value.requestJobs.called == (maxJobs > 1)
+
+
 @pytest.mark.parametrize(
     "matcherInfo, matcherParams, expectedResult",
     [
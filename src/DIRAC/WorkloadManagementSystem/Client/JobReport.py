@@ -1,10 +1,13 @@
 """ JobReport class encapsulates various methods of the job status reporting.
     It's an interface to JobStateUpdateClient, used when bulk submission is needed.
 """
+import errno
 from collections import defaultdict
 
 from DIRAC import S_OK, S_ERROR, gLogger
 from DIRAC.Core.Utilities import Time, DEncode
+from DIRAC.Core.Utilities.DErrno import cmpError
+from DIRAC.Core.Utilities.JEncode import strToIntDict
 from DIRAC.RequestManagementSystem.Client.Operation import Operation
 from DIRAC.WorkloadManagementSystem.Client.JobStateUpdateClient import JobStateUpdateClient
 
@@ -14,6 +17,9 @@ class JobReport:
     .. class:: JobReport
     """
 
+    # Set to False once the JobStateUpdate service is found not to know setJobsStatusBulk
+    _useSetJobsStatusBulk = True
+
     def __init__(self, jobid, source=""):
         """c'tor"""
         self.jobStatusInfo = []  # where job status updates are cumulated
@@ -91,7 +97,20 @@ class JobReport:
                 statusDict[dtime]["ApplicationStatus"] = appStatus
 
         if statusDict:
-            result = JobStateUpdateClient().setJobStatusBulk(self.jobID, dict(statusDict), False)
+            jobStateUpdateClient = JobStateUpdateClient()
+            if JobReport._useSetJobsStatusBulk:
+                result = jobStateUpdateClient.setJobsStatusBulk({self.jobID: dict(statusDict)}, False)
+                if result["OK"]:
+                    # JSON transforms the job IDs into strings
+                    failed = strToIntDict(result["Value"]["Failed"])
+                    if self.jobID in failed:
+                        result = S_ERROR(failed[self.jobID])
+                # Servers of previous versions (DISET or HTTPS) do not know setJobsStatusBulk:
+                # do not try it again for the next updates
+                elif "Unknown method" in result["Message"] or cmpError(result, errno.ENOSYS):
+                    JobReport._useSetJobsStatusBulk = False
+            if not JobReport._useSetJobsStatusBulk:
+                result = jobStateUpdateClient.setJobStatusBulk(self.jobID, dict(statusDict), False)
             if result["OK"]:
                 # Empty the internal status containers
                 self.jobStatusInfo = []
@@ -1,7 +1,19 @@
 """ Encapsulate here the logic for limiting the matching of jobs
 
     Utilities and classes here are used by the Matcher
+
+    The number of jobs occupying each site (Running, Matched or Stalled), per value of the
+    job attributes that have running limits, is kept by a RunningJobCounters object shared by
+    all the Limiter instances of the process. It is loaded from the JobDB with one query per
+    limited attribute for all the sites, then incremented for every job matched by the process,
+    so that the negative conditions are always computed from up to date numbers without querying
+    the JobDB. The counters are reconciled with the JobDB every
+    JobScheduling/RunningCountersRefresh seconds, which accounts for the jobs leaving these states
+    and for the jobs matched by other processes.
 """
+import threading
+import time
+
 from DIRAC import S_OK, S_ERROR
 from DIRAC import gLogger
 
@@ -12,12 +24,75 @@ from DIRAC.WorkloadManagementSystem.DB.JobDB import JobDB
 from DIRAC.WorkloadManagementSystem.Client import JobStatus
 
 
+class RunningJobCounters:
+    """Number of jobs occupying each site per job attribute value, shared by the Limiter instances"""
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        # attName -> { siteName -> { attValue -> number of jobs } }
+        self.__counters = {}
+        # attName -> time of the last load from the JobDB
+        self.__lastLoad = {}
+
+    def getCounters(self, jobDB, attName, siteName, refreshInterval):
+        """Get the number of jobs per value of attName at a site, loading them if too old
+
+        :return: S_OK(dict attValue -> number of jobs)/S_ERROR
+        """
+        if time.time() - self.__lastLoad.get(attName, 0) > refreshInterval:
+            with self.__lock:
+                # Another thread may have reloaded them meanwhile
+                if time.time() - self.__lastLoad.get(attName, 0) > refreshInterval:
+                    result = self.__load(jobDB, attName)
+                    if not result["OK"]:
+                        return result
+        return S_OK(self.__counters[attName].get(siteName, {}))
+
+    def __load(self, jobDB, attName):
+        """Load the counters of one attribute for all the sites, must be called with the lock held"""
+        now = time.time()
+        result = jobDB.getCounters(
+            "Jobs", ["Site", attName], {"Status": [JobStatus.RUNNING, JobStatus.MATCHED, JobStatus.STALLED]}
+        )
+        if not result["OK"]:
+            return result
+        counters = {}
+        for attDict, count in result["Value"]:
+            counters.setdefault(attDict["Site"], {})[attDict[attName]] = count
+        self.__counters[attName] = counters
+        self.__lastLoad[attName] = now
+        return S_OK()
+
+    def getCountedAttributes(self):
+        """Names of the attributes for which counters are kept"""
+        return list(self.__counters)
+
+    def addJob(self, siteName, jobAttributes):
+        """Account for a job that has just started to occupy a site
+
+        :param str siteName: site of the job
+        :param dict jobAttributes: attribute values of the job, at least the counted attributes
+        """
+        with self.__lock:
+            for attName, counters in self.__counters.items():
+                if attName in jobAttributes:
+                    siteCounters = counters.setdefault(siteName, {})
+                    attValue = jobAttributes[attName]
+                    siteCounters[attValue] = siteCounters.get(attValue, 0) + 1
+
+    def reset(self):
+        """Forget all the counters, they will be loaded again at the next access"""
+        with self.__lock:
+            self.__counters = {}
+            self.__lastLoad = {}
+
+
 class Limiter:
 
     # static variables shared between all instances of this class
     csDictCache = DictCache()
-    condCache = DictCache()
     delayMem = {}
+    runningCounters = RunningJobCounters()
 
     def __init__(self, jobDB=None, opsHelper=None, pilotRef=None):
         """Constructor"""
@@ -42,9 +117,6 @@ class Limiter:
 
     def getNegativeCond(self):
         """Get negative condition for ALL sites"""
-        orCond = self.condCache.get("GLOBAL")
-        if orCond:
-            return orCond
         negCond = {}
         # Run Limit
         result = self.__opsHelper.getSections(self.__runningLimitSection)
@@ -78,7 +150,6 @@ class Limiter:
         for siteName in negCond:
             negCond[siteName]["Site"] = siteName
             orCond.append(negCond[siteName])
-        self.condCache.add("GLOBAL", 10, orCond)
         return orCond
 
     def getNegativeCondForSite(self, siteName, gridCE=None):
@@ -178,19 +249,12 @@ class Limiter:
             if attName not in self.jobDB.jobAttributeNames:
                 self.log.error("Attribute does not exist", "(%s). Check the job limits" % attName)
                 continue
-            cK = "Running:%s:%s" % (siteName, attName)
-            data = self.condCache.get(cK)
-            if not data:
-                result = self.jobDB.getCounters(
-                    "Jobs",
-                    [attName],
-                    {"Site": siteName, "Status": [JobStatus.RUNNING, JobStatus.MATCHED, JobStatus.STALLED]},
-                )
-                if not result["OK"]:
-                    return result
-                data = result["Value"]
-                data = dict([(k[0][attName], k[1]) for k in data])
-                self.condCache.add(cK, 10, data)
+            result = self.runningCounters.getCounters(
+                self.jobDB, attName, siteName, self.__opsHelper.getValue("JobScheduling/RunningCountersRefresh", 30)
+            )
+            if not result["OK"]:
+                return result
+            data = result["Value"]
             for attValue in limitsDict[attName]:
                 limit = limitsDict[attName][attValue]
                 running = data.get(attValue, 0)
@@ -205,39 +269,80 @@ class Limiter:
         # negCond is something like : {'JobType': ['Merge']}
         return S_OK(negCond)
 
+    def registerMatchedJob(self, siteName, jid):
+        """Account for a job just matched at a site: the running job counters and the matching
+        delays are updated, so that the next negative conditions take the job into account
+
+        :param str siteName: site where the job was matched
+        :param int jid: job ID
+        """
+        attNames = set()
+        if self.__opsHelper.getValue("JobScheduling/CheckJobLimits", True):
+            attNames.update(self.runningCounters.getCountedAttributes())
+        delayDict = {}
+        if self.__opsHelper.getValue("JobScheduling/CheckMatchingDelay", True):
+            result = self.__getDelayDict(siteName)
+            if not result["OK"]:
+                return result
+            delayDict = result["Value"]
+            attNames.update(delayDict)
+        if not attNames:
+            return S_OK()
+
+        result = self.jobDB.getJobAttributes(jid, list(attNames))
+        if not result["OK"]:
+            self.log.error("Error while retrieving attributes", "of job %s: %s" % (jid, result["Message"]))
+            return result
+        atts = result["Value"]
+        self.runningCounters.addJob(siteName, atts)
+        self.__addDelays(siteName, delayDict, atts)
+        return S_OK()
+
     def updateDelayCounters(self, siteName, jid):
-        # Get the info from the CS
-        siteSection = "%s/%s" % (self.__matchingDelaySection, siteName)
-        result = self.__extractCSData(siteSection)
+        """Start the matching delays triggered by a job matched at a site"""
+        result = self.__getDelayDict(siteName)
         if not result["OK"]:
             return result
         delayDict = result["Value"]
-        # limitsDict is something like { 'JobType' : { 'Merge' : 20, 'MCGen' : 1000 } }
         if not delayDict:
             return S_OK()
-        attNames = []
-        for attName in delayDict:
+        result = self.jobDB.getJobAttributes(jid, list(delayDict))
+        if not result["OK"]:
+            self.log.error("Error while retrieving attributes", "of job %s: %s" % (jid, result["Message"]))
+            return result
+        self.__addDelays(siteName, delayDict, result["Value"])
+        return S_OK()
+
+    def __getDelayDict(self, siteName):
+        """Get the matching delays of a site from the CS
+
+        :return: S_OK(dict) like { 'JobType' : { 'Merge' : 20, 'MCGen' : 1000 } }
+        """
+        siteSection = "%s/%s" % (self.__matchingDelaySection, siteName)
+        result = self.__extractCSData(siteSection)
+        if not result["OK"]:
+            return result
+        delayDict = {}
+        for attName, attDelays in result["Value"].items():
             if attName not in self.jobDB.jobAttributeNames:
                 self.log.error("Attribute does not exist in the JobDB. Please fix it!", "(%s)" % attName)
             else:
-                attNames.append(attName)
-        result = self.jobDB.getJobAttributes(jid, attNames)
-        if not result["OK"]:
-            self.log.error("Error while retrieving attributes", "coming from %s: %s" % (siteSection, result["Message"]))
-            return result
-        atts = result["Value"]
+                delayDict[attName] = attDelays
+        return S_OK(delayDict)
+
+    def __addDelays(self, siteName, delayDict, atts):
+        """Update the delay counters of a site with the attributes of a matched job"""
         # Create the DictCache if not there
         if siteName not in self.delayMem:
             self.delayMem[siteName] = DictCache()
         # Update the counters
         delayCounter = self.delayMem[siteName]
-        for attName in atts:
-            attValue = atts[attName]
+        for attName in delayDict:
+            attValue = atts.get(attName)
             if attValue in delayDict[attName]:
                 delayTime = delayDict[attName][attValue]
                 self.log.notice("Adding delay for %s/%s=%s of %s secs" % (siteName, attName, attValue, delayTime))
                 delayCounter.add((attName, attValue), delayTime)
-        return S_OK()
 
     def __getDelayCondition(self, siteName):
         """Get extra conditions allowing matching delay"""
@@ -67,6 +67,24 @@ class Matcher:
 
     def selectJob(self, resourceDescription, credDict):
         """Main job selection function to find the highest priority job matching the resource capacity"""
+        jobs = self.selectJobs(resourceDescription, credDict, maxJobs=1)
+        if not jobs:
+            return {}
+        return jobs[0]
+
+    def selectJobs(self, resourceDescription, credDict, maxJobs=1):
+        """Select up to maxJobs jobs matching the resource capacity, in priority order
+
+        The resource description is processed and the negative conditions are computed once for
+        all the jobs, and the status of the matched jobs is reported with bulk DB operations.
+
+        :param dict resourceDescription: description of the resource (ceDict of the JobAgent)
+        :param dict credDict: credentials of the requester
+        :param int maxJobs: maximum number of jobs to select
+
+        :return: list of dictionaries (JDL, JobID, DN, Group...) describing the selected jobs,
+                 empty if no job matched
+        """
 
         startTime = time.time()
 
@@ -88,14 +106,75 @@ class Matcher:
         self.log.info("Resource description for matching", printDict(toPrintDict))
 
         negativeCond = self.limiter.getNegativeCondForSite(resourceDict["Site"], resourceDict.get("GridCE"))
+
+        matchedJobs = {}
+        while len(matchedJobs) < maxJobs:
+            try:
+                jobID, owner = self._matchJob(resourceDict, negativeCond)
+            except RuntimeError as rte:
+                # Do not lose the jobs already extracted from the task queues
+                if not matchedJobs:
+                    raise
+                self.log.warn("Stop matching more jobs", str(rte))
+                break
+            if not jobID:
+                break
+            matchedJobs[jobID] = owner
+            # Running limits and matching delays take the job into account right away
+            self.limiter.registerMatchedJob(resourceDict["Site"], jobID)
+            if len(matchedJobs) < maxJobs:
+                negativeCond = self.limiter.getNegativeCondForSite(resourceDict["Site"], resourceDict.get("GridCE"))
+
+        if not matchedJobs:
+            self.log.info("No match found")
+            return []
+        jobIDs = list(matchedJobs)
+
+        self._reportStatus(resourceDict, jobIDs)
+
+        jobs = []
+        for jobID in jobIDs:
+            result = self.jobDB.getJobJDL(jobID)
+            if not result["OK"]:
+                raise RuntimeError("Failed to get the job JDL")
+
+            resultDict = {}
+            resultDict["JDL"] = result["Value"]
+            resultDict["JobID"] = jobID
+
+            # Get some extra stuff into the response returned
+            resOpt = self.jobDB.getJobOptParameters(jobID)
+            if resOpt["OK"]:
+                for key, value in resOpt["Value"].items():
+                    resultDict[key] = value
+
+            resultDict["DN"], resultDict["Group"] = matchedJobs[jobID]
+            resultDict["PilotInfoReportedFlag"] = True
+            jobs.append(resultDict)
+
+        matchTime = time.time() - startTime
+        self.log.verbose("Match time", "[%s] for %d job(s)" % (str(matchTime), len(jobs)))
+        gMonitor.addMark("matchTime", matchTime)
+
+        pilotInfoReportedFlag = resourceDict.get("PilotInfoReportedFlag", False)
+        if not pilotInfoReportedFlag:
+            self._updatePilotInfo(resourceDict)
+        self._updatePilotJobMapping(resourceDict, jobIDs)
+
+        return jobs
+
+    def _matchJob(self, resourceDict, negativeCond):
+        """Extract from the task queues the next job matching the resource
+
+        :return: (jobID, (OwnerDN, OwnerGroup)) tuple, jobID being None if no job matched
+        """
         result = self.tqDB.matchAndGetJob(resourceDict, negativeCond=negativeCond)
 
         if not result["OK"]:
             raise RuntimeError(result["Message"])
         result = result["Value"]
         if not result["matchFound"]:
-            self.log.info("No match found")
-            return {}
+            return None, None
 
         jobID = result["jobId"]
         resAtt = self.jobDB.getJobAttributes(jobID, ["OwnerDN", "OwnerGroup", "Status"])
@@ -110,44 +189,7 @@ class Matcher:
                 raise RuntimeError(result["Message"])
             raise RuntimeError("Job %s is not in Waiting state" % str(jobID))
 
-        self._reportStatus(resourceDict, jobID)
-
-        result = self.jobDB.getJobJDL(jobID)
-        if not result["OK"]:
-            raise RuntimeError("Failed to get the job JDL")
-
-        resultDict = {}
-        resultDict["JDL"] = result["Value"]
-        resultDict["JobID"] = jobID
-
-        matchTime = time.time() - startTime
-        self.log.verbose("Match time", "[%s]" % str(matchTime))
-        gMonitor.addMark("matchTime", matchTime)
-
-        # Get some extra stuff into the response returned
-        resOpt = self.jobDB.getJobOptParameters(jobID)
-        if resOpt["OK"]:
-            for key, value in resOpt["Value"].items():
-                resultDict[key] = value
-        resAtt = self.jobDB.getJobAttributes(jobID, ["OwnerDN", "OwnerGroup"])
-        if not resAtt["OK"]:
-            raise RuntimeError("Could not retrieve job attributes")
-        if not resAtt["Value"]:
-            raise RuntimeError("No attributes returned for job")
-
-        if self.opsHelper.getValue("JobScheduling/CheckMatchingDelay", True):
-            self.limiter.updateDelayCounters(resourceDict["Site"], jobID)
-
-        pilotInfoReportedFlag = resourceDict.get("PilotInfoReportedFlag", False)
-        if not pilotInfoReportedFlag:
-            self._updatePilotInfo(resourceDict)
-        self._updatePilotJobMapping(resourceDict, jobID)
-
-        resultDict["DN"] = resAtt["Value"]["OwnerDN"]
-        resultDict["Group"] = resAtt["Value"]["OwnerGroup"]
-        resultDict["PilotInfoReportedFlag"] = True
-
-        return resultDict
+        return jobID, (resAtt["Value"]["OwnerDN"], resAtt["Value"]["OwnerGroup"])
 
     def _getResourceDict(self, resourceDescription, credDict):
         """from resourceDescription to resourceDict (just various mods)"""
@@ -244,28 +286,34 @@ class Matcher:
 
         return resourceDict
 
-    def _reportStatus(self, resourceDict, jobID):
-        """Reports the status of the matched job in jobDB and jobLoggingDB
+    def _reportStatus(self, resourceDict, jobIDs):
+        """Reports the status of the matched job(s) in jobDB and jobLoggingDB,
+        with one bulk operation in each DB
 
         Do not fail if errors happen here
+
+        :param dict resourceDict: resource description
+        :param jobIDs: job ID or list of job IDs
         """
+        if not isinstance(jobIDs, (list, tuple)):
+            jobIDs = [jobIDs]
         attNames = ["Status", "MinorStatus", "ApplicationStatus", "Site"]
         attValues = ["Matched", "Assigned", "Unknown", resourceDict["Site"]]
-        result = self.jobDB.setJobAttributes(jobID, attNames, attValues)
+        result = self.jobDB.setJobAttributes(jobIDs, attNames, attValues)
         if not result["OK"]:
             self.log.error(
-                "Problem reporting job status", "setJobAttributes, jobID = %s: %s" % (jobID, result["Message"])
+                "Problem reporting job status", "setJobAttributes, jobIDs = %s: %s" % (jobIDs, result["Message"])
             )
         else:
-            self.log.verbose("Set job attributes for jobID", jobID)
+            self.log.verbose("Set job attributes for jobIDs", jobIDs)
 
-        result = self.jlDB.addLoggingRecord(jobID, status=JobStatus.MATCHED, minorStatus="Assigned", source="Matcher")
+        result = self.jlDB.addLoggingRecord(jobIDs, status=JobStatus.MATCHED, minorStatus="Assigned", source="Matcher")
         if not result["OK"]:
             self.log.error(
-                "Problem reporting job status", "addLoggingRecord, jobID = %s: %s" % (jobID, result["Message"])
+                "Problem reporting job status", "addLoggingRecord, jobIDs = %s: %s" % (jobIDs, result["Message"])
             )
         else:
-            self.log.verbose("Added logging record for jobID", jobID)
+            self.log.verbose("Added logging record for jobIDs", jobIDs)
 
     def _checkMask(self, resourceDict):
         """Check the mask: are we allowed to run normal jobs?
@@ -308,17 +356,23 @@ class Matcher:
                     "; setPilotStatus. pilotReference: %s; %s" % (pilotReference, result["Message"]),
                 )
 
-    def _updatePilotJobMapping(self, resourceDict, jobID):
-        """Update pilot to job mapping information"""
+    def _updatePilotJobMapping(self, resourceDict, jobIDs):
+        """Update pilot to job mapping information
+
+        :param dict resourceDict: resource description
+        :param jobIDs: job ID or list of job IDs given to the pilot
+        """
+        if not isinstance(jobIDs, (list, tuple)):
+            jobIDs = [jobIDs]
         pilotReference = resourceDict.get("PilotReference", "")
         if pilotReference and pilotReference != "Unknown":
-            result = self.pilotAgentsDB.setCurrentJobID(pilotReference, jobID)
+            result = self.pilotAgentsDB.setCurrentJobID(pilotReference, jobIDs[-1])
             if not result["OK"]:
                 self.log.error(
                     "Problem updating pilot information",
                     ";setCurrentJobID. pilotReference: %s; %s" % (pilotReference, result["Message"]),
                 )
-            result = self.pilotAgentsDB.setJobForPilot(jobID, pilotReference, updateStatus=False)
+            result = self.pilotAgentsDB.setJobForPilot(jobIDs, pilotReference, updateStatus=False)
             if not result["OK"]:
                 self.log.error(
                     "Problem updating pilot information",
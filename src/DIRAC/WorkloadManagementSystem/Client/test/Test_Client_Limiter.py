@@ -0,0 +1,63 @@
+""" Test of the Limiter, which computes the negative conditions of the matching
+"""
+# pylint: disable=protected-access
+
+import pytest
+from mock import MagicMock
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.Client.Limiter import Limiter, RunningJobCounters
+
+
+CS = {
+    "JobScheduling/RunningLimit": ["Site.A.ch"],
+    "JobScheduling/RunningLimit/Site.A.ch": ["JobType"],
+    "JobScheduling/RunningLimit/Site.A.ch/JobType": {"MCSimulation": 3, "User": 10},
+    "JobScheduling/MatchingDelay/Site.A.ch": ["JobType"],
+    "JobScheduling/MatchingDelay/Site.A.ch/JobType": {"Merge": 60},
+}
+
+
+@pytest.fixture
+def limiter(mocker):
+    mocker.patch.object(Limiter, "runningCounters", RunningJobCounters())
+    mocker.patch.object(Limiter, "delayMem", {})
+    mocker.patch.object(Limiter, "csDictCache", MagicMock(get=MagicMock(return_value=None)))
+
+    opsHelper = MagicMock()
+    opsHelper.getValue.side_effect = lambda option, default: default
+    opsHelper.getSections.side_effect = lambda section: S_OK(CS.get(section, []))
+    opsHelper.getOptionsDict.side_effect = lambda section: S_OK(CS[section])
+
+    jobDB = MagicMock()
+    jobDB.jobAttributeNames = ["JobType", "Site", "Status"]
+    jobDB.getCounters.return_value = S_OK(
+        [({"Site": "Site.A.ch", "JobType": "MCSimulation"}, 2), ({"Site": "Site.B.ch", "JobType": "MCSimulation"}, 5)]
+    )
+    jobDB.getJobAttributes.return_value = S_OK({"JobType": "MCSimulation"})
+    return Limiter(jobDB=jobDB, opsHelper=opsHelper)
+
+
+def test_runningLimits(limiter):
+    assert limiter.getNegativeCondForSite("Site.A.ch") == {}
+    assert limiter.getNegativeCondForSite("Site.B.ch") == {}
+    # One query for all the sites
+    assert limiter.jobDB.getCounters.call_count == 1
+
+    # The matched job reaches the limit, which applies without querying the JobDB again
+    assert limiter.registerMatchedJob("Site.A.ch", 1)["OK"]
+    assert limiter.getNegativeCondForSite("Site.A.ch") == {"JobType": ["MCSimulation"]}
+    assert limiter.getNegativeCond() == [{"JobType": ["MCSimulation"], "Site": "Site.A.ch"}]
+    assert limiter.jobDB.getCounters.call_count == 1
+
+    # Jobs leaving the site are seen when the counters are loaded again
+    limiter.runningCounters.reset()
+    assert limiter.getNegativeCondForSite("Site.A.ch") == {}
+    assert limiter.jobDB.getCounters.call_count == 2
+
+
+def test_matchingDelay(limiter):
+    limiter.jobDB.getJobAttributes.return_value = S_OK({"JobType": "Merge"})
+    assert limiter.registerMatchedJob("Site.A.ch", 1)["OK"]
+    assert limiter.getNegativeCondForSite("Site.A.ch") == {"JobType": ["Merge"]}
+    assert limiter.getNegativeCondForSite("Site.B.ch") == {}
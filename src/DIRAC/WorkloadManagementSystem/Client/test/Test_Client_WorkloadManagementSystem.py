@@ -90,3 +90,55 @@ def test_uploadFilesAsSandbox(mocker, setUp):
     fileList = [BytesIO(b"try")]
     res = ssc.uploadFilesAsSandbox(fileList)
     print(res)
+
+
+def test_selectJobs():
+    """Several jobs are matched in one call, with bulk status reporting"""
+    jobs = {1: "Waiting", 2: "Waiting", 3: "Waiting"}
+    queue = list(jobs)
+    tqDB = MagicMock()
+    tqDB.matchAndGetJob.side_effect = lambda _resourceDict, negativeCond: {
+        "OK": True,
+        "Value": {"matchFound": True, "jobId": queue.pop(0)} if queue else {"matchFound": False},
+    }
+    jobDB = MagicMock()
+    jobDB.getJobAttributes.side_effect = lambda jobID, _attrs: {
+        "OK": True,
+        "Value": {"OwnerDN": "/DN/user", "OwnerGroup": "user", "Status": jobs[jobID]},
+    }
+    jobDB.getJobJDL.side_effect = lambda jobID: {"OK": True, "Value": "[JobID = %d]" % jobID}
+    jobDB.getJobOptParameters.return_value = {"OK": True, "Value": {}}
+    jobDB.setJobAttributes.return_value = {"OK": True, "Value": None}
+    jlDB = MagicMock()
+    jlDB.addLoggingRecord.return_value = {"OK": True, "Value": None}
+    pilotAgentsDB = MagicMock()
+    pilotAgentsDB.setCurrentJobID.return_value = {"OK": True, "Value": None}
+    pilotAgentsDB.setJobForPilot.return_value = {"OK": True, "Value": None}
+    opsHelper = MagicMock()
+    opsHelper.getValue.return_value = False
+
+    batchMatcher = Matcher(pilotAgentsDB=pilotAgentsDB, jobDB=jobDB, tqDB=tqDB, jlDB=jlDB, opsHelper=opsHelper)
+    batchMatcher.limiter = MagicMock()
+    batchMatcher._getResourceDict = MagicMock(
+        return_value={"Site": "Site.A.ch", "PilotReference": "pilotRef", "PilotInfoReportedFlag": True}
+    )
+
+    res = batchMatcher.selectJobs({}, {}, maxJobs=2)
+    assert [job["JobID"] for job in res] == [1, 2]
+    assert res[0]["JDL"] == "[JobID = 1]"
+    assert res[1]["DN"] == "/DN/user"
+    assert res[1]["Group"] == "user"
+    # One call per DB for all the matched jobs
+    assert batchMatcher.limiter.getNegativeCondForSite.call_count == 2
+    assert batchMatcher.limiter.registerMatchedJob.call_count == 2
+    jobDB.setJobAttributes.assert_called_once_with(
+        [1, 2], ["Status", "MinorStatus", "ApplicationStatus", "Site"], ["Matched", "Assigned", "Unknown", "Site.A.ch"]
+    )
+    assert jlDB.addLoggingRecord.call_count == 1
+    pilotAgentsDB.setCurrentJobID.assert_called_once_with("pilotRef", 2)
+    pilotAgentsDB.setJobForPilot.assert_called_once_with([1, 2], "pilotRef", updateStatus=False)
+
+    # Fewer jobs than requested are available
+    res = batchMatcher.selectJobs({}, {}, maxJobs=5)
+    assert [job["JobID"] for job in res] == [3]
+    assert batchMatcher.selectJobs({}, {}, maxJobs=5) == []
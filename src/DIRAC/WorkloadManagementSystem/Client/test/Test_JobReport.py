@@ -1,6 +1,8 @@
 """Test for JobReport"""
 # pylint: disable=protected-access, missing-docstring, invalid-name
 
+import errno
+
 from mock import MagicMock
 
 # sut
@@ -22,3 +24,47 @@ def test_jobReport(mocker):
     res = jr.setJobParameters([("par_3", "value_3"), ("par_4", "value_4")], sendFlag=False)
     print(jr.jobParameters)
     jr.dump()
+
+
+def test_sendStoredStatusInfo(mocker):
+    jsuClient = MagicMock()
+    mocker.patch("DIRAC.WorkloadManagementSystem.Client.JobReport.JobStateUpdateClient", return_value=jsuClient)
+    mocker.patch.object(JobReport, "_useSetJobsStatusBulk", True)
+    jsuClient.setJobsStatusBulk.return_value = {
+        "OK": True,
+        "Value": {"Successful": {}, "Failed": {"123": "No Matching Job"}},
+    }
+
+    jr = JobReport(123)
+    res = jr.setJobStatus("Running", "minor_running", sendFlag=True)
+    assert not res["OK"]
+    assert res["Message"] == "No Matching Job"
+    assert jr.jobStatusInfo
+    jobsStatusDict, force = jsuClient.setJobsStatusBulk.call_args[0]
+    assert list(jobsStatusDict) == [123]
+    assert not force
+
+    jsuClient.setJobsStatusBulk.return_value = {"OK": True, "Value": {"Successful": {123: ([], [])}, "Failed": {}}}
+    assert jr.sendStoredStatusInfo()["OK"]
+    assert not jr.jobStatusInfo
+
+    # The status is sent job by job to the DISET and HTTPS servers without setJobsStatusBulk
+    unknownMethodErrors = [
+        {"OK": False, "Message": "Unknown method setJobsStatusBulk"},
+        {"OK": False, "Errno": errno.ENOSYS, "Message": "setJobsStatusBulk is not implemented"},
+    ]
+    for error in unknownMethodErrors:
+        JobReport._useSetJobsStatusBulk = True
+        jsuClient.setJobsStatusBulk.reset_mock()
+        jsuClient.setJobsStatusBulk.return_value = error
+        jsuClient.setJobStatusBulk.reset_mock()
+        jsuClient.setJobStatusBulk.return_value = {"OK": True, "Value": ([], [])}
+        assert jr.setJobStatus("Done", "minor_done")["OK"]
+        assert not jr.jobStatusInfo
+        jobID, statusDict, force = jsuClient.setJobStatusBulk.call_args[0]
+        assert (jobID, list(statusDict.values())[0]["Status"], force) == (123, "Done", False)
+
+        # The next updates, also of other jobs, are sent directly with setJobStatusBulk
+        assert JobReport(456).setJobStatus("Completed", "minor_completed")["OK"]
+        assert jsuClient.setJobsStatusBulk.call_count == 1
+        assert jsuClient.setJobStatusBulk.call_count == 2
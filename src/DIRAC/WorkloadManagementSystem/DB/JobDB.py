@@ -26,6 +26,7 @@ from DIRAC.Core.Utilities.ClassAd.ClassAdLight import ClassAd
 from DIRAC.Core.Utilities.ReturnValues import S_OK, S_ERROR
 from DIRAC.Core.Utilities import Time
 from DIRAC.Core.Utilities.DErrno import EWMSSUBM, EWMSJMAN
+from DIRAC.Core.Utilities.List import breakListIntoChunks
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
 from DIRAC.ResourceStatusSystem.Client.SiteStatus import SiteStatus
 from DIRAC.WorkloadManagementSystem.Client.JobState.JobManifest import JobManifest
@@ -683,12 +684,16 @@ class JobDB(DB):
 
     #############################################################################
     def setEndExecTime(self, jobID, endDate=None):
-        """Set EndExecTime time stamp"""
+        """Set EndExecTime time stamp
 
-        ret = self._escapeString(jobID)
+        :param jobID: one or more job IDs
+        :type jobID: int or str or list
+        """
+
+        ret = self.__escapeJobIDs(jobID)
         if not ret["OK"]:
             return ret
-        jobID = ret["Value"]
+        jobIDs = ret["Value"]
 
         if endDate:
             ret = self._escapeString(endDate)
@@ -697,17 +702,21 @@ class JobDB(DB):
             endDate = ret["Value"]
         else:
             endDate = "UTC_TIMESTAMP()"
-        req = "UPDATE Jobs SET EndExecTime=%s WHERE JobID=%s AND EndExecTime IS NULL" % (endDate, jobID)
+        req = "UPDATE Jobs SET EndExecTime=%s WHERE JobID IN (%s) AND EndExecTime IS NULL" % (endDate, jobIDs)
         return self._update(req)
 
     #############################################################################
     def setStartExecTime(self, jobID, startDate=None):
-        """Set StartExecTime time stamp and HeartBeatTime if not already set"""
+        """Set StartExecTime time stamp and HeartBeatTime if not already set
 
-        ret = self._escapeString(jobID)
+        :param jobID: one or more job IDs
+        :type jobID: int or str or list
+        """
+
+        ret = self.__escapeJobIDs(jobID)
         if not ret["OK"]:
             return ret
-        jobID = ret["Value"]
+        jobIDs = ret["Value"]
 
         if startDate:
             ret = self._escapeString(startDate)
@@ -717,13 +726,26 @@ class JobDB(DB):
         else:
             startDate = "UTC_TIMESTAMP()"
         # Set also the HeartBeatTime in case the job gets stuck before sending the first HeartBeat
-        req = "UPDATE Jobs SET HeartBeatTime=%s WHERE JobID=%s AND HeartBeatTime IS NULL" % (startDate, jobID)
+        req = "UPDATE Jobs SET HeartBeatTime=%s WHERE JobID IN (%s) AND HeartBeatTime IS NULL" % (startDate, jobIDs)
         ret = self._update(req)
         if not ret["OK"]:
             return ret
-        req = "UPDATE Jobs SET StartExecTime=%s WHERE JobID=%s AND StartExecTime IS NULL" % (startDate, jobID)
+        req = "UPDATE Jobs SET StartExecTime=%s WHERE JobID IN (%s) AND StartExecTime IS NULL" % (startDate, jobIDs)
         return self._update(req)
 
+    def __escapeJobIDs(self, jobID):
+        """Escape one or more job IDs
+
+        :returns: S_OK(str) with the comma separated escaped job IDs
+        """
+        jobIDs = []
+        for jID in jobID if isinstance(jobID, (list, tuple)) else [jobID]:
+            ret = self._escapeString(jID)
+            if not ret["OK"]:
+                return ret
+            jobIDs.append(ret["Value"])
+        return S_OK(",".join(jobIDs))
+
     #############################################################################
     def setJobParameter(self, jobID, key, value):
         """Set a parameter specified by name,value pair for the job JobID"""
@@ -1940,6 +1962,89 @@ class JobDB(DB):
             return S_OK()
         return S_ERROR("Failed to store some or all the parameters")
 
+    #####################################################################################
+    def setHeartBeatDataBulk(self, heartBeats):
+        """Add the heart beat data of several jobs to the database at once
+
+        The HeartBeatTime of all the jobs is updated with one statement and the dynamic data
+        is upserted with multi-row inserts. Unlike setHeartBeatData, the job status is not changed.
+        The jobs that are not in the Jobs table are ignored. If a multi-row insert fails,
+        its rows are inserted again job by job, so that only the faulty jobs fail.
+
+        :param dict heartBeats: {jobID: (heartBeatTime, dynamicDataDict)}, the time being a UTC datetime
+        :returns: S_OK({"Failed": [jobIDs whose data could not be stored], "Unknown": [jobIDs not in the DB]})
+                  or S_ERROR if the time of the heart beats could not be set
+        """
+        if not heartBeats:
+            return S_OK({"Failed": [], "Unknown": []})
+
+        heartBeats = dict((int(jobID), heartBeat) for jobID, heartBeat in heartBeats.items())
+        result = self._query(
+            "SELECT JobID FROM Jobs WHERE JobID IN (%s)" % ",".join(str(jobID) for jobID in heartBeats)
+        )
+        if not result["OK"]:
+            return S_ERROR("Failed to get the jobs: " + result["Message"])
+        knownJobIDs = set(row[0] for row in result["Value"])
+        unknownJobIDs = sorted(set(heartBeats) - knownJobIDs)
+        if unknownJobIDs:
+            self.log.warn("Ignoring the heart beats of unknown jobs", str(unknownJobIDs))
+        if not knownJobIDs:
+            return S_OK({"Failed": [], "Unknown": unknownJobIDs})
+
+        jobIDs = []
+        timeCases = []
+        valueList = []
+        for jobID in sorted(knownJobIDs):
+            heartBeatTime, dynamicDataDict = heartBeats[jobID]
+            ret = self._escapeString(str(heartBeatTime))
+            if not ret["OK"]:
+                return ret
+            e_heartBeatTime = ret["Value"]
+            jobIDs.append(str(jobID))
+            timeCases.append("WHEN %d THEN %s" % (jobID, e_heartBeatTime))
+            for key, value in dynamicDataDict.items():
+                result = self._escapeString(key)
+                if not result["OK"]:
+                    self.log.warn("Failed to escape string ", key)
+                    continue
+                e_key = result["Value"]
+                result = self._escapeString(value)
+                if not result["OK"]:
+                    self.log.warn("Failed to escape string ", value)
+                    continue
+                e_value = result["Value"]
+                valueList.append((jobID, "(%d,%s,%s,%s)" % (jobID, e_key, e_value, e_heartBeatTime)))
+
+        req = "UPDATE Jobs SET HeartBeatTime = CASE JobID %s END WHERE JobID IN (%s)" % (
+            " ".join(timeCases),
+            ",".join(jobIDs),
+        )
+        result = self._update(req)
+        if not result["OK"]:
+            return S_ERROR("Failed to set the heart beat time: " + result["Message"])
+
+        failedJobIDs = set()
+        for chunk in breakListIntoChunks(valueList, 1000):
+            result = self.__insertHeartBeatLogging([values for _jobID, values in chunk])
+            if result["OK"]:
+                continue
+            self.log.warn("Failed to store the heart beat data, retrying job by job", result["Message"])
+            valuesByJob = {}
+            for jobID, values in chunk:
+                valuesByJob.setdefault(jobID, []).append(values)
+            for jobID, jobValues in valuesByJob.items():
+                result = self.__insertHeartBeatLogging(jobValues)
+                if not result["OK"]:
+                    self.log.warn("Failed to store the heart beat data", "of job %d: %s" % (jobID, result["Message"]))
+                    failedJobIDs.add(jobID)
+        return S_OK({"Failed": sorted(failedJobIDs), "Unknown": unknownJobIDs})
+
+    def __insertHeartBeatLogging(self, values):
+        """Upsert rows "(JobID,Name,Value,HeartBeatTime)" into HeartBeatLoggingInfo"""
+        req = "INSERT INTO HeartBeatLoggingInfo (JobID,Name,Value,HeartBeatTime) VALUES %s" % ",".join(values)
+        req += " ON DUPLICATE KEY UPDATE Value=VALUES(Value)"
+        return self._update(req)
+
     #####################################################################################
     def getHeartBeatData(self, jobID):
         """Retrieve the job's heart beat data"""
@@ -2,9 +2,11 @@
     The following methods are provided
 
     addLoggingRecord()
+    addLoggingRecords()
     getJobLoggingInfo()
     deleteJob()
     getWMSTimeStamps()
+    getWMSTimeStampsBulk()
 """
 import time
 
@@ -43,6 +45,9 @@ class JobLoggingDB(DB):
         be provided in a form of a string in a format '%Y-%m-%d %H:%M:%S' or
         as datetime.datetime object. If the time stamp is not provided the current
         UTC time is used.
+
+        jobID can also be a list of job IDs, in which case the same record is added for all
+        the jobs with a single multi-row INSERT.
         """
 
         # Backward compatibility
@@ -52,33 +57,59 @@ class JobLoggingDB(DB):
         if application:
             applicationStatus = application
 
+        jobIDs = jobID if isinstance(jobID, (list, tuple)) else [jobID]
+        if not jobIDs:
+            return S_OK()
+
         event = "status/minor/app=%s/%s/%s" % (status, minorStatus, applicationStatus)
-        self.log.info("Adding record for job ", str(jobID) + ": '" + event + "' from " + source)
+        jobIDsStr = ",".join(str(jID) for jID in jobIDs)
+        self.log.info("Adding record for job ", jobIDsStr + ": '" + event + "' from " + source)
+
+        return self.addLoggingRecords(
+            [(jID, status, minorStatus, applicationStatus, date, source) for jID in jobIDs], verbose=False
+        )
 
+    #############################################################################
+    def addLoggingRecords(self, records, verbose=True):
+        """Add several entries to the LoggingInfo table with a single multi-row INSERT
+
+        :param list records: (jobID, status, minorStatus, applicationStatus, date, source) tuples,
+                             with the same meaning as the arguments of addLoggingRecord
+        :param bool verbose: log the number of records added
+        """
+        if not records:
+            return S_OK()
+        if verbose:
+            self.log.info("Adding logging records", "for %d jobs" % len(set(int(record[0]) for record in records)))
+
+        args = []
+        for jobID, status, minorStatus, applicationStatus, date, source in records:
+            _date = self.__getDate(date)
+            epoc = time.mktime(_date.timetuple()) + _date.microsecond / 1000000.0 - MAGIC_EPOC_NUMBER
+            args.extend([int(jobID), status, minorStatus, applicationStatus[:255], str(_date), epoc, source[:32]])
+
+        cmd = (
+            "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, "
+            + "StatusTime, StatusTimeOrder, StatusSource) VALUES "
+            + ",".join(["(%s,%s,%s,%s,%s,%s,%s)"] * len(records))
+        )
+        return self._update(cmd, args=args)
+
+    def __getDate(self, date):
+        """Get the datetime of a logging record, the current UTC time if not provided or invalid"""
         try:
             if not date:
                 # Make the UTC datetime string and float
-                _date = Time.dateTime()
-            elif isinstance(date, str):
+                return Time.dateTime()
+            if isinstance(date, str):
                 # The date is provided as a string in UTC
-                _date = Time.fromString(date)
-            elif isinstance(date, Time._dateTimeType):
-                _date = date
-            else:
-                self.log.error("Incorrect date for the logging record")
-                _date = Time.dateTime()
+                return Time.fromString(date)
+            if isinstance(date, Time._dateTimeType):
+                return date
+            self.log.error("Incorrect date for the logging record")
         except Exception:
             self.log.exception("Exception while date evaluation")
-            _date = Time.dateTime()
-        epoc = time.mktime(_date.timetuple()) + _date.microsecond / 1000000.0 - MAGIC_EPOC_NUMBER
-
-        cmd = (
-            "INSERT INTO LoggingInfo (JobId, Status, MinorStatus, ApplicationStatus, "
-            + "StatusTime, StatusTimeOrder, StatusSource) VALUES (%d,'%s','%s','%s','%s',%f,'%s')"
-            % (int(jobID), status, minorStatus, applicationStatus[:255], str(_date), epoc, source[:32])
-        )
-
-        return self._update(cmd)
+        return Time.dateTime()
 
     #############################################################################
     def getJobLoggingInfo(self, jobID):
@@ -158,3 +189,33 @@ class JobLoggingDB(DB):
             result["LastTime"] = "Unknown"
 
         return S_OK(result)
+
+    #############################################################################
+    def getWMSTimeStampsBulk(self, jobIDs):
+        """Get TimeStamps for the MajorState transitions of several jobs with a single query
+
+        :param list jobIDs: job IDs
+        :returns: S_OK({jobID: {State: timestamp}}) as getWMSTimeStamps, for the jobs with logging records
+        """
+        if not jobIDs:
+            return S_OK({})
+
+        cmd = (
+            "SELECT JobID,Status,StatusTimeOrder,StatusTime FROM LoggingInfo WHERE JobID IN (%s) "
+            "ORDER BY StatusTimeOrder" % ",".join(str(int(jobID)) for jobID in jobIDs)
+        )
+        resCmd = self._query(cmd)
+        if not resCmd["OK"]:
+            return resCmd
+
+        result = {}
+        lastTimes = {}
+        for jobID, event, etime, statusTime in resCmd["Value"]:
+            jobID = int(jobID)
+            result.setdefault(jobID, {})[event] = str(etime + MAGIC_EPOC_NUMBER)
+            if statusTime is not None and (jobID not in lastTimes or statusTime > lastTimes[jobID]):
+                lastTimes[jobID] = statusTime
+        for jobID, timeStamps in result.items():
+            timeStamps["LastTime"] = str(lastTimes[jobID]) if jobID in lastTimes else "Unknown"
+
+        return S_OK(result)
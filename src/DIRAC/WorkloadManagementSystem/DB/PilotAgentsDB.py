@@ -450,18 +450,21 @@ AND SubmissionTime < DATE_SUB(UTC_TIMESTAMP(),INTERVAL %d DAY)"
 
     ##########################################################################################
     def setJobForPilot(self, jobID, pilotRef, site=None, updateStatus=True):
-        """Store the jobID of the job executed by the pilot with reference pilotRef"""
+        """Store the jobID of the job executed by the pilot with reference pilotRef
 
+        :param jobID: job ID, or list of job IDs given to the pilot at once
+        """
+
+        jobIDs = jobID if isinstance(jobID, (list, tuple)) else [jobID]
         pilotID = self.__getPilotID(pilotRef)
         if pilotID:
             if updateStatus:
-                reason = "Report from job %d" % int(jobID)
+                reason = "Report from job %d" % int(jobIDs[0])
                 result = self.setPilotStatus(pilotRef, status=PilotStatus.RUNNING, statusReason=reason, gridSite=site)
                 if not result["OK"]:
                     return result
-            req = "INSERT INTO JobToPilotMapping (PilotID,JobID,StartTime) VALUES (%d,%d,UTC_TIMESTAMP())" % (
-                pilotID,
-                jobID,
+            req = "INSERT INTO JobToPilotMapping (PilotID,JobID,StartTime) VALUES %s" % ",".join(
+                "(%d,%d,UTC_TIMESTAMP())" % (pilotID, int(jID)) for jID in jobIDs
             )
             return self._update(req)
         else:
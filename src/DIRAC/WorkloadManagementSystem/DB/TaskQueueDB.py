@@ -12,9 +12,12 @@ from DIRAC.Core.Security import Properties
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.ConfigurationSystem.Client.Helpers import Registry
 from DIRAC.WorkloadManagementSystem.private.SharesCorrector import SharesCorrector
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
 
 DEFAULT_GROUP_SHARE = 1000
 TQ_MIN_SHARE = 0.001
+# Maximum number of negative conditions whose SQL is kept
+NOT_SQL_CACHE_SIZE = 1000
 
 # For checks at insertion time, and not only
 singleValueDefFields = ("OwnerDN", "OwnerGroup", "Setup", "CPUTime")
@@ -60,9 +63,20 @@ class TaskQueueDB(DB):
         self.__opsHelper = Operations()
         self.__ensureInsertionIsSingle = False
         self.__sharesCorrector = SharesCorrector(self.__opsHelper)
+        # SQL of the negative conditions already generated, the same few conditions are used by all the pilots
+        self.__notSQLCache = {}
         result = self.__initializeDB()
         if not result["OK"]:
             raise Exception("Can't create tables: %s" % result["Message"])
+        # Optional in-memory index of the task queues used for matching
+        self.__tqIndex = None
+        if self.__getCSOption("UseTaskQueueIndex", False):
+            self.__tqIndex = TaskQueueIndex(
+                self,
+                singleValueDefFields,
+                multiValueDefFields,
+                refreshInterval=self.__getCSOption("TaskQueueIndexRefresh", 10),
+            )
 
     def enableAllTaskQueues(self):
         """Enable all Task queues"""
@@ -316,6 +330,9 @@ class TaskQueueDB(DB):
         result = self._update("DELETE FROM `tq_TaskQueues` WHERE TQId in ( %s )" % ",".join(orphanedTQs), conn=connObj)
         if not result["OK"]:
             return result
+        if self.__tqIndex:
+            for tqId in orphanedTQs:
+                self.__tqIndex.removeTaskQueue(int(tqId))
         return S_OK()
 
     def __setTaskQueueEnabled(self, tqId, enabled=True, connObj=False):
@@ -391,6 +408,8 @@ class TaskQueueDB(DB):
                 self.recalculateTQSharesForEntity(tqDefDict["OwnerDN"], tqDefDict["OwnerGroup"], connObj=connObj)
         finally:
             self.__setTaskQueueEnabled(tqId, True)
+            if newTQ and self.__tqIndex:
+                self.__tqIndex.invalidate()
         return S_OK()
 
     def __insertJobInTaskQueue(self, jobId, tqId, jobPriority, checkTQExists=True, connObj=False):
@@ -524,6 +543,7 @@ ORDER BY COUNT( `tq_Jobs`.JobID ) ASC"
         if negativeCond is None:
             negativeCond = {}
         # Make a copy to avoid modification of original if escaping needs to be done
+        rawMatchDict = tqMatchDict
         tqMatchDict = dict(tqMatchDict)
         retVal = self._checkMatchDefinition(tqMatchDict)
         if not retVal["OK"]:
@@ -542,10 +562,15 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
             noJobsFound = False
             if "JobID" in tqMatchDict:
                 # A certain JobID is required by the resource, so all TQ are to be considered
-                retVal = self.matchAndGetTaskQueue(
-                    tqMatchDict, numQueuesToGet=0, skipMatchDictDef=True, connObj=connObj
-                )
+                if self.__tqIndex:
+                    retVal = self.__tqIndex.match(rawMatchDict, numQueuesToGet=0)
+                else:
+                    retVal = self.matchAndGetTaskQueue(
+                        tqMatchDict, numQueuesToGet=0, skipMatchDictDef=True, connObj=connObj
+                    )
                 preJobSQL = "%s AND `tq_Jobs`.JobId = %s " % (preJobSQL, tqMatchDict["JobID"])
+            elif self.__tqIndex:
+                retVal = self.__tqIndex.match(rawMatchDict, numQueuesToGet=numQueuesPerTry, negativeCond=negativeCond)
             else:
                 retVal = self.matchAndGetTaskQueue(
                     tqMatchDict,
@@ -602,11 +627,15 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
         if negativeCond is None:
             negativeCond = {}
         # Make a copy to avoid modification of original if escaping needs to be done
+        rawMatchDict = tqMatchDict
         tqMatchDict = dict(tqMatchDict)
         if not skipMatchDictDef:
             retVal = self._checkMatchDefinition(tqMatchDict)
             if not retVal["OK"]:
                 return retVal
+            if self.__tqIndex:
+                # The index works on the non escaped values
+                return self.__tqIndex.match(rawMatchDict, numQueuesToGet=numQueuesToGet, negativeCond=negativeCond)
         retVal = self.__generateTQMatchSQL(tqMatchDict, numQueuesToGet=numQueuesToGet, negativeCond=negativeCond)
         if not retVal["OK"]:
             return retVal
@@ -625,12 +654,44 @@ WHERE `tq_Jobs`.TQId = %s ORDER BY RAND() / `tq_Jobs`.RealPriority ASC LIMIT 1"
             sqlORList.append(sqlString % str(v).strip())
         return "( %s )" % (" %s " % boolOp).join(sqlORList)
 
+    @staticmethod
+    def __negativeCondKey(negativeCond):
+        """Hashable version of a negative condition (dict or list of dicts)"""
+        if isinstance(negativeCond, dict):
+            return tuple(
+                sorted(
+                    (field, tuple(values) if isinstance(values, (list, tuple)) else values)
+                    for field, values in negativeCond.items()
+                )
+            )
+        return tuple(TaskQueueDB.__negativeCondKey(condDict) for condDict in negativeCond)
+
     def __generateNotSQL(self, negativeCond):
         """Generate negative conditions
         Can be a list of dicts or a dict:
          - list of dicts will be  OR of conditional dicts
          - dicts will be normal conditional dict ( kay1 in ( v1, v2, ... ) AND key2 in ( v3, v4, ... ) )
+
+        The generated SQL is cached, as the conditions only change when a limit is reached
         """
+        if not isinstance(negativeCond, (list, tuple, dict)):
+            raise RuntimeError(
+                "negativeCond has to be either a list or a dict or a tuple, and it's %s" % type(negativeCond)
+            )
+        try:
+            condKey = self.__negativeCondKey(negativeCond)
+        except (TypeError, AttributeError):
+            return self.__buildNotSQL(negativeCond)
+        sqlCond = self.__notSQLCache.get(condKey)
+        if sqlCond is None:
+            sqlCond = self.__buildNotSQL(negativeCond)
+            if len(self.__notSQLCache) >= NOT_SQL_CACHE_SIZE:
+                self.__notSQLCache = {}
+            self.__notSQLCache[condKey] = sqlCond
+        return sqlCond
+
+    def __buildNotSQL(self, negativeCond):
+        """Generate the SQL of negative conditions, see __generateNotSQL"""
         if isinstance(negativeCond, (list, tuple)):
             sqlCond = []
             for cD in negativeCond:
@@ -1032,6 +1093,8 @@ WHERE j.JobId = %s AND t.TQId = j.TQId"
             retVal = self._update("DELETE FROM `tq_TaskQueues` WHERE TQId = %s" % tqId, conn=connObj)
             if not retVal["OK"]:
                 return retVal
+            if self.__tqIndex:
+                self.__tqIndex.removeTaskQueue(tqId)
             self.recalculateTQSharesForEntity(tqOwnerDN, tqOwnerGroup, connObj=connObj)
             self.log.info("Deleted empty and enabled TQ", tqId)
             return S_OK()
@@ -1060,6 +1123,8 @@ WHERE j.JobId = %s AND t.TQId = j.TQId"
         if not retVal["OK"]:
             return S_ERROR("Could not delete task queue %s: %s" % (tqId, retVal["Message"]))
         delTQ = retVal["Value"]
+        if self.__tqIndex:
+            self.__tqIndex.removeTaskQueue(tqId)
         sqlCmd = "DELETE FROM `tq_Jobs` WHERE `tq_Jobs`.TQId = %s" % tqId
         retVal = self._update(sqlCmd, conn=connObj)
         if not retVal["OK"]:
@@ -5,19 +5,36 @@
 
     setJobStatus()
 
+    The heart beats of the jobs are buffered and written to the JobDB in bulk
+    every HeartBeatFlushInterval seconds (0 to write them synchronously).
+    At most MaxHeartBeatBuffer jobs are buffered, the heart beats of other jobs are written directly.
+
 """
+import threading
 import time
 
 from DIRAC import S_OK, S_ERROR
-from DIRAC.Core.DISET.RequestHandler import RequestHandler
+from DIRAC.Core.DISET.RequestHandler import RequestHandler, getServiceOption
 from DIRAC.Core.Utilities import Time
 from DIRAC.Core.Utilities.DEncode import ignoreEncodeWarning
 from DIRAC.Core.Utilities.ObjectLoader import ObjectLoader
 from DIRAC.ConfigurationSystem.Client.Helpers.Operations import Operations
 from DIRAC.WorkloadManagementSystem.Client import JobStatus
 
+# Number of flushes a heart beat can fail before being dropped
+MAX_HEARTBEAT_RETRIES = 3
+
 
 class JobStateUpdateHandlerMixin:
+    # Heart beats not yet written to the JobDB: {jobID: (heartBeatTime, dynamicData)}
+    heartBeatBuffer = {}
+    # Number of failed flushes of the buffered heart beats: {jobID: retries}
+    heartBeatRetries = {}
+    heartBeatLock = threading.Lock()
+    heartBeatFlushInterval = 0
+    maxHeartBeatBuffer = 10000
+    heartBeatFlusher = None
+
     @classmethod
     def initializeHandler(cls, svcInfoDict):
         """
@@ -49,8 +66,87 @@ class JobStateUpdateHandlerMixin:
                 cls.elasticJobParametersDB = result["Value"]()
             except RuntimeError as excp:
                 return S_ERROR("Can't connect to DB: %s" % excp)
+
+        cls.heartBeatFlushInterval = getServiceOption(svcInfoDict, "HeartBeatFlushInterval", 10)
+        cls.maxHeartBeatBuffer = getServiceOption(svcInfoDict, "MaxHeartBeatBuffer", 10000)
+        if cls.heartBeatFlushInterval > 0 and cls.heartBeatFlusher is None:
+            cls.heartBeatFlusher = threading.Thread(target=cls.__flushHeartBeatsLoop, name="HeartBeatFlusher")
+            cls.heartBeatFlusher.daemon = True
+            cls.heartBeatFlusher.start()
         return S_OK()
 
+    @classmethod
+    def __flushHeartBeatsLoop(cls):
+        """Write the buffered heart beats every HeartBeatFlushInterval seconds"""
+        while True:
+            time.sleep(cls.heartBeatFlushInterval)
+            try:
+                cls._flushHeartBeats()
+            except Exception as e:  # pylint: disable=broad-except
+                cls.log.exception("Failed to flush the heart beats", lException=e)
+
+    @classmethod
+    def _bufferHeartBeat(cls, jobID, dynamicData):
+        """Keep the heart beat of a job until the next flush
+
+        Successive heart beats of a job are coalesced: only the time of the latest one is kept,
+        together with the latest value of each dynamic data.
+        If the buffer is full, the heart beat of a job not yet buffered is written directly.
+
+        :returns: S_OK/S_ERROR
+        """
+        heartBeatTime = Time.dateTime().replace(microsecond=0)
+        with cls.heartBeatLock:
+            if jobID in cls.heartBeatBuffer or len(cls.heartBeatBuffer) < cls.maxHeartBeatBuffer:
+                bufferedData = cls.heartBeatBuffer.get(jobID, (None, {}))[1]
+                bufferedData.update(dynamicData)
+                cls.heartBeatBuffer[jobID] = (heartBeatTime, bufferedData)
+                return S_OK()
+        result = cls.jobDB.setHeartBeatDataBulk({jobID: (heartBeatTime, dynamicData)})
+        if result["OK"] and result["Value"]["Failed"]:
+            result = S_ERROR("Failed to store the heart beat data")
+        return result
+
+    @classmethod
+    def _flushHeartBeats(cls):
+        """Write the buffered heart beats to the JobDB
+
+        The heart beats of the jobs that could not be written are put back in the buffer for the next flush,
+        up to MAX_HEARTBEAT_RETRIES times. The heart beats of the jobs unknown to the JobDB are dropped.
+        """
+        with cls.heartBeatLock:
+            heartBeats, cls.heartBeatBuffer = cls.heartBeatBuffer, {}
+        if not heartBeats:
+            return S_OK()
+
+        result = cls.jobDB.setHeartBeatDataBulk(heartBeats)
+        if not result["OK"]:
+            cls.log.warn("Failed to set the heart beat data", "for %d jobs: %s" % (len(heartBeats), result["Message"]))
+            failedJobIDs = list(heartBeats)
+        else:
+            failedJobIDs = result["Value"]["Failed"]
+            if failedJobIDs:
+                cls.log.warn("Failed to set the heart beat data", "for jobs %s" % failedJobIDs)
+                result = S_ERROR("Failed to set the heart beat data for %d jobs" % len(failedJobIDs))
+
+        with cls.heartBeatLock:
+            for jobID in set(heartBeats) - set(failedJobIDs):
+                cls.heartBeatRetries.pop(jobID, None)
+            for jobID in failedJobIDs:
+                retries = cls.heartBeatRetries.get(jobID, 0) + 1
+                if retries > MAX_HEARTBEAT_RETRIES:
+                    cls.log.error("Dropping the heart beat data", "of job %s after %d retries" % (jobID, retries - 1))
+                    cls.heartBeatRetries.pop(jobID, None)
+                    continue
+                cls.heartBeatRetries[jobID] = retries
+                heartBeatTime, dynamicData = heartBeats[jobID]
+                if jobID in cls.heartBeatBuffer:
+                    # Keep the time and values of the heart beats received in the meantime
+                    heartBeatTime, newData = cls.heartBeatBuffer[jobID]
+                    dynamicData.update(newData)
+                cls.heartBeatBuffer[jobID] = (heartBeatTime, dynamicData)
+        return result
+
     ###########################################################################
     types_updateJobFromStager = [[str, int], str]
 
@@ -143,7 +239,6 @@ class JobStateUpdateHandlerMixin:
         as a key and status information dictionary as values
         """
         jobID = int(jobID)
-        log = cls.log.getLocalSubLogger("JobStatusBulk/Job-%d" % jobID)
 
         result = cls.jobDB.getJobAttributes(jobID, ["Status", "StartExecTime", "EndExecTime"])
         if not result["OK"]:
@@ -151,18 +246,118 @@ class JobStateUpdateHandlerMixin:
         if not result["Value"]:
             # if there is no matching Job it returns an empty dictionary
             return S_ERROR("No Matching Job")
+        attributes = result["Value"]
+
+        # Get the latest time stamps of major status updates
+        result = cls.jobLoggingDB.getWMSTimeStamps(int(jobID))
+        if not result["OK"]:
+            return result
+        if not result["Value"]:
+            return S_ERROR("No registered WMS timeStamps")
+
+        result = cls.__getJobStatusUpdate(jobID, statusDict, attributes, result["Value"], force)
+        if not result["OK"]:
+            return result
+        update = result["Value"]
+
+        result = cls.__applyJobStatusUpdates({jobID: update})
+        if not result["OK"]:
+            return result
+        if jobID in result["Value"]:
+            return result["Value"][jobID]
+        return S_OK((update["AttrNames"], update["AttrValues"]))
+
+    ###########################################################################
+    types_setJobsStatusBulk = [dict]
+
+    @classmethod
+    def export_setJobsStatusBulk(cls, jobsStatusDict, force=False):
+        """Set various job status fields with a time stamp and a source for several jobs
+
+        :param dict jobsStatusDict: {jobID: statusDict}, with the statusDict of setJobStatusBulk
+        :returns: S_OK({"Successful": {jobID: (attrNames, attrValues)}, "Failed": {jobID: reason}})
+        """
+        return cls._setJobsStatusBulk(jobsStatusDict, force=force)
+
+    @classmethod
+    def _setJobsStatusBulk(cls, jobsStatusDict, force=False):
+        """Set various status fields for several jobs, as _setJobStatusBulk does for one job.
+        The current attributes and time stamps of all the jobs are obtained with one query each,
+        the attributes set to the same values are updated together and the logging records
+        are inserted with a single query.
+        """
+        jobsStatusDict = dict((int(jobID), statusDict) for jobID, statusDict in jobsStatusDict.items())
+        jobIDs = sorted(jobsStatusDict)
+        failed = {}
+
+        result = cls.jobDB.getJobsAttributes(jobIDs, ["Status", "StartExecTime", "EndExecTime"])
+        if not result["OK"]:
+            return result
+        jobsAttributes = result["Value"]
+
+        result = cls.jobLoggingDB.getWMSTimeStampsBulk(jobIDs)
+        if not result["OK"]:
+            return result
+        jobsTimeStamps = result["Value"]
+
+        updates = {}
+        for jobID in jobIDs:
+            if not jobsAttributes.get(jobID):
+                failed[jobID] = "No Matching Job"
+                continue
+            if not jobsTimeStamps.get(jobID):
+                failed[jobID] = "No registered WMS timeStamps"
+                continue
+            result = cls.__getJobStatusUpdate(
+                jobID, jobsStatusDict[jobID], jobsAttributes[jobID], jobsTimeStamps[jobID], force
+            )
+            if not result["OK"]:
+                failed[jobID] = result["Message"]
+                continue
+            updates[jobID] = result["Value"]
+
+        result = cls.__applyJobStatusUpdates(updates)
+        if not result["OK"]:
+            return result
+        failed.update((jobID, error["Message"]) for jobID, error in result["Value"].items())
+        successful = dict(
+            (jobID, (update["AttrNames"], update["AttrValues"]))
+            for jobID, update in updates.items()
+            if jobID not in failed
+        )
+        if failed:
+            cls.log.warn("Failed to set the status of some jobs", "%d out of %d" % (len(failed), len(jobIDs)))
+        return S_OK({"Successful": successful, "Failed": failed})
+
+    @classmethod
+    def __getJobStatusUpdate(cls, jobID, statusDict, attributes, wmsTimeStamps, force):
+        """Evaluate the changes of a job from its new statuses
+
+        :param int jobID: job ID
+        :param dict statusDict: new statuses, with datetime as a key and status information dictionary as values
+        :param dict attributes: current Status, StartExecTime and EndExecTime of the job
+        :param dict wmsTimeStamps: time stamps of the major status updates, as returned by getWMSTimeStamps
+        :param bool force: override the WMS state machine decision
+
+        :returns: S_OK(dict) with the attributes to set (AttrNames, AttrValues), the StartExecTime and EndExecTime
+                  to set, if any, (StartTime, EndTime) and the logging records to add (LoggingRecords)
+        """
+        log = cls.log.getLocalSubLogger("JobStatusBulk/Job-%d" % jobID)
 
         # If the current status is Stalled and we get an update, it should probably be "Running"
-        currentStatus = result["Value"]["Status"]
+        currentStatus = attributes["Status"]
         if currentStatus == JobStatus.STALLED:
             currentStatus = JobStatus.RUNNING
-        startTime = result["Value"].get("StartExecTime")
-        endTime = result["Value"].get("EndExecTime")
+        startTime = attributes.get("StartExecTime")
+        endTime = attributes.get("EndExecTime")
         # getJobAttributes only returns strings :(
         if startTime == "None":
             startTime = None
         if endTime == "None":
             endTime = None
+        # Only the time stamps not set yet are updated
+        knownStartTime = startTime
+        knownEndTime = endTime
 
         # Remove useless items in order to make it simpler later, although there should not be any
         for sDict in statusDict.values():
@@ -170,14 +365,8 @@ class JobStateUpdateHandlerMixin:
                 if not sDict[item]:
                     sDict.pop(item, None)
 
-        # Get the latest time stamps of major status updates
-        result = cls.jobLoggingDB.getWMSTimeStamps(int(jobID))
-        if not result["OK"]:
-            return result
-        if not result["Value"]:
-            return S_ERROR("No registered WMS timeStamps")
         # This is more precise than "LastTime". timeStamps is a sorted list of tuples...
-        timeStamps = sorted((float(t), s) for s, t in result["Value"].items() if s != "LastTime")
+        timeStamps = sorted((float(t), s) for s, t in wmsTimeStamps.items() if s != "LastTime")
         lastTime = Time.toString(Time.fromEpoch(timeStamps[-1][0]))
 
         # Get chronological order of new updates
@@ -248,35 +437,81 @@ class JobStateUpdateHandlerMixin:
             if application:
                 attrNames.append("ApplicationStatus")
                 attrValues.append(application)
-            # Here we are forcing the update as it's always updating to the last status
-            result = cls.jobDB.setJobAttributes(jobID, attrNames, attrValues, update=True, force=True)
-            if not result["OK"]:
-                return result
-
-        # Update start and end time if needed
-        if endTime:
-            result = cls.jobDB.setEndExecTime(jobID, endTime)
-            if not result["OK"]:
-                return result
-        if startTime:
-            result = cls.jobDB.setStartExecTime(jobID, startTime)
-            if not result["OK"]:
-                return result
 
-        # Update the JobLoggingDB records
+        # The JobLoggingDB records
+        loggingRecords = []
         for updTime in updateTimes:
             sDict = statusDict[updTime]
-            status = sDict.get("Status", "idem")
-            minor = sDict.get("MinorStatus", "idem")
-            application = sDict.get("ApplicationStatus", "idem")
-            source = sDict.get("Source", "Unknown")
-            result = cls.jobLoggingDB.addLoggingRecord(
-                jobID, status=status, minorStatus=minor, applicationStatus=application, date=updTime, source=source
+            loggingRecords.append(
+                (
+                    jobID,
+                    sDict.get("Status", "idem"),
+                    sDict.get("MinorStatus", "idem"),
+                    sDict.get("ApplicationStatus", "idem"),
+                    updTime,
+                    sDict.get("Source", "Unknown"),
+                )
             )
-            if not result["OK"]:
-                return result
 
-        return S_OK((attrNames, attrValues))
+        return S_OK(
+            {
+                "AttrNames": attrNames,
+                "AttrValues": attrValues,
+                "StartTime": startTime if startTime != knownStartTime else None,
+                "EndTime": endTime if endTime != knownEndTime else None,
+                "LoggingRecords": loggingRecords,
+            }
+        )
+
+    @classmethod
+    def __applyJobStatusUpdates(cls, updates):
+        """Apply the changes evaluated by __getJobStatusUpdate to the JobDB and JobLoggingDB.
+        The jobs whose attributes or time stamps are set to the same values are updated together.
+
+        :param dict updates: {jobID: update}
+        :returns: S_OK({jobID: S_ERROR}) for the jobs that could not be updated
+        """
+        failed = {}
+
+        def _setForGroups(groups, setFunction):
+            """Call setFunction(jobIDs, value) for each group of jobs, the jobs of the failed calls are failed"""
+            for value, jobIDs in groups.items():
+                result = setFunction(jobIDs, value)
+                if not result["OK"]:
+                    failed.update(dict.fromkeys(jobIDs, result))
+
+        attributeGroups = {}
+        startTimeGroups = {}
+        endTimeGroups = {}
+        for jobID, update in updates.items():
+            if update["AttrNames"]:
+                attributeGroups.setdefault(tuple(zip(update["AttrNames"], update["AttrValues"])), []).append(jobID)
+            if update["EndTime"]:
+                endTimeGroups.setdefault(update["EndTime"], []).append(jobID)
+            if update["StartTime"]:
+                startTimeGroups.setdefault(update["StartTime"], []).append(jobID)
+
+        # Here we are forcing the update as it's always updating to the last status
+        _setForGroups(
+            attributeGroups,
+            lambda jobIDs, attributes: cls.jobDB.setJobAttributes(
+                jobIDs, [name for name, _ in attributes], [value for _, value in attributes], update=True, force=True
+            ),
+        )
+        # Update start and end time if needed
+        _setForGroups(endTimeGroups, cls.jobDB.setEndExecTime)
+        _setForGroups(startTimeGroups, cls.jobDB.setStartExecTime)
+
+        # Update the JobLoggingDB records
+        loggingRecords = []
+        for jobID, update in updates.items():
+            if jobID not in failed:
+                loggingRecords.extend(update["LoggingRecords"])
+        result = cls.jobLoggingDB.addLoggingRecords(loggingRecords)
+        if not result["OK"]:
+            failed.update(dict.fromkeys((record[0] for record in loggingRecords), result))
+
+        return S_OK(failed)
 
     ###########################################################################
     types_setJobAttribute = [[str, int], str, str]
@@ -396,9 +631,10 @@ class JobStateUpdateHandlerMixin:
     def export_sendHeartBeat(cls, jobID, dynamicData, staticData):
         """Send a heart beat sign of life for a job jobID"""
 
-        result = cls.jobDB.setHeartBeatData(int(jobID), dynamicData)
-        if not result["OK"]:
-            cls.log.warn("Failed to set the heart beat data", "for job %d " % int(jobID))
+        if cls.heartBeatFlushInterval <= 0:
+            result = cls.jobDB.setHeartBeatData(int(jobID), dynamicData)
+            if not result["OK"]:
+                cls.log.warn("Failed to set the heart beat data", "for job %d " % int(jobID))
 
         if cls.elasticJobParametersDB:
             for key, value in staticData.items():
@@ -419,6 +655,13 @@ class JobStateUpdateHandlerMixin:
             return S_ERROR("Job %d not found" % jobID)
 
         status = result["Value"]["Status"]
+
+        # Only the heart beats of existing jobs are buffered
+        if cls.heartBeatFlushInterval > 0:
+            result = cls._bufferHeartBeat(int(jobID), dynamicData)
+            if not result["OK"]:
+                cls.log.warn("Failed to set the heart beat data", "for job %d " % int(jobID))
+
         if status in (JobStatus.STALLED, JobStatus.MATCHED):
             result = cls.jobDB.setJobAttribute(jobID=jobID, attrName="Status", attrValue=JobStatus.RUNNING, update=True)
             if not result["OK"]:
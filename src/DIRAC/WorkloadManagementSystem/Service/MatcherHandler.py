@@ -59,7 +59,28 @@ class MatcherHandlerMixin:
         """Serve a job to the request of an agent which is the highest priority
         one matching the agent's site capacity
         """
+        result = self.__selectJobs(resourceDescription, 1)
+        if not result["OK"]:
+            return result
+        return S_OK(result["Value"][0])
 
+    ##############################################################################
+    types_requestJobs = [[str, dict], int]
+
+    def export_requestJobs(self, resourceDescription, maxJobs):
+        """Serve up to maxJobs jobs in one call, for agents having several free slots.
+        The jobs are the highest priority ones matching the agent's site capacity
+
+        :return: S_OK(list of job dictionaries, as returned by requestJob)
+        """
+        maxJobs = min(max(maxJobs, 1), self.srv_getCSOption("MaxJobsPerRequest", 10))
+        return self.__selectJobs(resourceDescription, maxJobs)
+
+    def __selectJobs(self, resourceDescription, maxJobs):
+        """Run the Matcher for the request of an agent
+
+        :return: S_OK(non empty list of job dictionaries)/S_ERROR
+        """
         resourceDescription["Setup"] = self.serviceInfoDict["clientSetup"]
         credDict = self.getRemoteCredentials()
         pilotRef = resourceDescription.get("PilotReference", "Unknown")
@@ -74,7 +95,7 @@ class MatcherHandlerMixin:
                 opsHelper=opsHelper,
                 pilotRef=pilotRef,
             )
-            result = matcher.selectJob(resourceDescription, credDict)
+            result = matcher.selectJobs(resourceDescription, credDict, maxJobs=maxJobs)
         except RuntimeError as rte:
             self.log.error("Error requesting job for pilot", "[%s] %s" % (pilotRef, rte))
             return S_ERROR("Error requesting job")
@@ -85,7 +106,7 @@ class MatcherHandlerMixin:
         # result can be empty, meaning that no job matched
         if result:
             gMonitor.addMark("matchesDone")
-            gMonitor.addMark("matchesOK")
+            gMonitor.addMark("matchesOK", len(result))
             return S_OK(result)
         # FIXME: This is correctly interpreted by the JobAgent, but DErrno should be used instead
         return S_ERROR("No match found")
@@ -228,3 +228,132 @@ def test__setJobStatusBulk(
     assert res["OK"] is resExpected
     if res["OK"]:
         assert res["Value"] == resExpected_value
+
+
+def test__setJobsStatusBulk():
+    jobDB = MagicMock()
+    jobLoggingDB = MagicMock()
+    JobStateUpdateHandlerMixin.jobDB = jobDB
+    JobStateUpdateHandlerMixin.jobLoggingDB = jobLoggingDB
+    JobStateUpdateHandlerMixin.log = gLogger
+
+    timeStamps = {
+        JobStatus.RECEIVED: "1000000001.001",
+        JobStatus.CHECKING: "1000000002.002",
+        JobStatus.WAITING: "1000000003.003",
+        "LastTime": "2001-09-09 03:46:43",
+    }
+    jobDB.getJobsAttributes.return_value = {
+        "OK": True,
+        "Value": {
+            1: {"Status": JobStatus.WAITING, "StartExecTime": None, "EndExecTime": None},
+            2: {"Status": JobStatus.WAITING, "StartExecTime": None, "EndExecTime": None},
+            3: {"Status": JobStatus.WAITING, "StartExecTime": None, "EndExecTime": None},
+        },
+    }
+    jobLoggingDB.getWMSTimeStampsBulk.return_value = {"OK": True, "Value": {1: timeStamps, 2: timeStamps, 3: {}}}
+    jobDB.setJobAttributes.return_value = {"OK": True}
+    jobDB.setStartExecTime.return_value = {"OK": True}
+    jobLoggingDB.addLoggingRecords.return_value = {"OK": True}
+
+    jobsStatusDict = {
+        "1": {"2002-01-01 00:00:00": {"Status": JobStatus.MATCHED, "Source": "JobAgent"}},
+        2: {"2002-01-01 00:00:00": {"Status": JobStatus.MATCHED, "Source": "JobAgent"}},
+        3: {"2002-01-01 00:00:00": {"Status": JobStatus.MATCHED}},
+        4: {"2002-01-01 00:00:00": {"Status": JobStatus.MATCHED}},
+    }
+    res = JobStateUpdateHandlerMixin._setJobsStatusBulk(jobsStatusDict)
+    assert res["OK"], res
+    assert res["Value"]["Successful"] == {1: (["Status"], [JobStatus.MATCHED]), 2: (["Status"], [JobStatus.MATCHED])}
+    assert res["Value"]["Failed"] == {3: "No registered WMS timeStamps", 4: "No Matching Job"}
+
+    # One query to get the attributes and time stamps of all the jobs
+    jobDB.getJobsAttributes.assert_called_once_with([1, 2, 3, 4], ["Status", "StartExecTime", "EndExecTime"])
+    jobLoggingDB.getWMSTimeStampsBulk.assert_called_once_with([1, 2, 3, 4])
+    # The jobs set to the same status are updated together
+    jobDB.setJobAttributes.assert_called_once_with([1, 2], ["Status"], [JobStatus.MATCHED], update=True, force=True)
+    jobDB.setStartExecTime.assert_not_called()
+    # All the logging records are inserted at once
+    jobLoggingDB.addLoggingRecords.assert_called_once_with(
+        [
+            (1, JobStatus.MATCHED, "idem", "idem", "2002-01-01 00:00:00", "JobAgent"),
+            (2, JobStatus.MATCHED, "idem", "idem", "2002-01-01 00:00:00", "JobAgent"),
+        ]
+    )
+
+
+def test_sendHeartBeat(monkeypatch):
+    jobDB = MagicMock()
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "jobDB", jobDB, raising=False)
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "elasticJobParametersDB", None, raising=False)
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "log", gLogger, raising=False)
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "heartBeatFlushInterval", 10)
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "heartBeatBuffer", {})
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "heartBeatRetries", {})
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "maxHeartBeatBuffer", 2)
+    jobDB.setJobParameters.return_value = {"OK": True}
+    jobDB.getJobAttributes.return_value = {"OK": True, "Value": {"Status": JobStatus.RUNNING}}
+    jobDB.getJobCommand.return_value = {"OK": True, "Value": {}}
+
+    # The heart beats are only buffered, coalesced per job
+    heartBeats = [(1, {"CPUConsumed": 10, "Memory": 5}), ("2", {"CPUConsumed": 3}), (1, {"CPUConsumed": 20})]
+    for jobID, dynamicData in heartBeats:
+        res = JobStateUpdateHandlerMixin.export_sendHeartBeat(jobID, dynamicData, {})
+        assert res["OK"], res
+    jobDB.setHeartBeatData.assert_not_called()
+    jobDB.setHeartBeatDataBulk.assert_not_called()
+    assert sorted(JobStateUpdateHandlerMixin.heartBeatBuffer) == [1, 2]
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer[1][1] == {"CPUConsumed": 20, "Memory": 5}
+
+    # A failed flush keeps the heart beats, merged with the ones received in the meantime
+    def failedFlush(_heartBeats):
+        JobStateUpdateHandlerMixin._bufferHeartBeat(2, {"Memory": 1})
+        return {"OK": False, "Message": "Database unavailable"}
+
+    jobDB.setHeartBeatDataBulk.side_effect = failedFlush
+    res = JobStateUpdateHandlerMixin._flushHeartBeats()
+    assert not res["OK"]
+    assert jobDB.setHeartBeatDataBulk.call_count == 1
+    assert sorted(JobStateUpdateHandlerMixin.heartBeatBuffer) == [1, 2]
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer[2][1] == {"CPUConsumed": 3, "Memory": 1}
+
+    # All the jobs are written at once, only the ones that failed are kept
+    jobDB.setHeartBeatDataBulk.reset_mock(side_effect=True)
+    jobDB.setHeartBeatDataBulk.return_value = {"OK": True, "Value": {"Failed": [2], "Unknown": []}}
+    res = JobStateUpdateHandlerMixin._flushHeartBeats()
+    assert not res["OK"]
+    assert jobDB.setHeartBeatDataBulk.call_count == 1
+    assert sorted(jobDB.setHeartBeatDataBulk.call_args[0][0]) == [1, 2]
+    assert sorted(JobStateUpdateHandlerMixin.heartBeatBuffer) == [2]
+    assert JobStateUpdateHandlerMixin.heartBeatRetries == {2: 2}
+
+    # A job that keeps failing is eventually dropped
+    for _ in range(2):
+        JobStateUpdateHandlerMixin._flushHeartBeats()
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer == {}
+    assert JobStateUpdateHandlerMixin.heartBeatRetries == {}
+    jobDB.setHeartBeatDataBulk.reset_mock()
+    assert JobStateUpdateHandlerMixin._flushHeartBeats()["OK"]
+    jobDB.setHeartBeatDataBulk.assert_not_called()
+
+    # The heart beats of unknown jobs are not buffered
+    jobDB.getJobAttributes.return_value = {"OK": True, "Value": {}}
+    assert not JobStateUpdateHandlerMixin.export_sendHeartBeat(4, {"CPUConsumed": 1}, {})["OK"]
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer == {}
+
+    # When the buffer is full, the heart beats of other jobs are written directly
+    jobDB.getJobAttributes.return_value = {"OK": True, "Value": {"Status": JobStatus.RUNNING}}
+    jobDB.setHeartBeatDataBulk.return_value = {"OK": True, "Value": {"Failed": [], "Unknown": []}}
+    for jobID in (5, 6, 7):
+        assert JobStateUpdateHandlerMixin.export_sendHeartBeat(jobID, {"CPUConsumed": 1}, {})["OK"]
+    assert sorted(JobStateUpdateHandlerMixin.heartBeatBuffer) == [5, 6]
+    assert list(jobDB.setHeartBeatDataBulk.call_args[0][0]) == [7]
+    assert JobStateUpdateHandlerMixin._flushHeartBeats()["OK"]
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer == {}
+
+    # Without a flush interval, the heart beats are written synchronously
+    monkeypatch.setattr(JobStateUpdateHandlerMixin, "heartBeatFlushInterval", 0)
+    jobDB.setHeartBeatData.return_value = {"OK": True}
+    assert JobStateUpdateHandlerMixin.export_sendHeartBeat(3, {"CPUConsumed": 1}, {})["OK"]
+    jobDB.setHeartBeatData.assert_called_once_with(3, {"CPUConsumed": 1})
+    assert JobStateUpdateHandlerMixin.heartBeatBuffer == {}
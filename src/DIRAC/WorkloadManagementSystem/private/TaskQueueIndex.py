@@ -0,0 +1,277 @@
+""" In-memory index of the task queues of the TaskQueueDB
+
+    It keeps the definition (owner, setup, CPU segment, priority and the multi value
+    requirements) of every task queue, so that the TaskQueueDB can select the task queues
+    matching a resource without running the large match query on MySQL for every pilot.
+    Only the job extraction from the selected task queues goes to the DB.
+
+    The index is kept in sync by:
+
+    - a periodic scan of the tq_TaskQueues table (one light query), loading the multi value
+      requirements only for the task queues that were not known yet. Task queues are only
+      indexed once enabled, i.e. when their definition is complete
+    - explicit invalidations and removals by the TaskQueueDB of the same process when it
+      creates or deletes task queues
+
+    Task queues created by another process are thus seen at most after the refresh interval.
+    The matching reproduces the SQL conditions generated by the TaskQueueDB, including the
+    case insensitive comparison of the values done by MySQL.
+"""
+import random
+import string
+import threading
+import time
+
+from DIRAC import S_OK, S_ERROR, gLogger
+from DIRAC.Core.Security import Properties
+from DIRAC.ConfigurationSystem.Client.Helpers import Registry
+
+
+def _normalize(value):
+    """Values are compared like MySQL does with the default collation: case and trailing spaces ignored"""
+    return str(value).strip().lower()
+
+
+def _isAny(value):
+    """Check if a match value is the "any" wildcard"""
+    return value.lower().translate(str.maketrans("", "", string.punctuation)) == "any"
+
+
+def _toList(value):
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+class TaskQueueIndex(object):
+    """Index of the task queue definitions, used by the TaskQueueDB for matching"""
+
+    def __init__(self, db, singleValueFields, multiValueFields, refreshInterval=10):
+        """
+        :param db: TaskQueueDB instance, used to query the task queue tables
+        :param tuple singleValueFields: names of the task queue single value fields
+        :param tuple multiValueFields: names of the task queue multi value fields
+        :param int refreshInterval: maximum age of the index in seconds
+        """
+        self.__db = db
+        self.__singleValueFields = singleValueFields
+        self.__multiValueFields = multiValueFields
+        self.refreshInterval = refreshInterval
+        self.log = gLogger.getSubLogger("TaskQueueIndex")
+        self.__lock = threading.Lock()
+        # tqId -> definition dictionary. Replaced as a whole on refresh, so that readers need no lock
+        self.__taskQueues = {}
+        self.__lastRefresh = 0
+
+    def invalidate(self):
+        """Force a refresh at the next access, e.g. after the creation of a task queue"""
+        self.__lastRefresh = 0
+
+    def removeTaskQueue(self, tqId):
+        """Remove a deleted task queue from the index"""
+        tqId = int(tqId)
+        with self.__lock:
+            if tqId in self.__taskQueues:
+                taskQueues = dict(self.__taskQueues)
+                taskQueues.pop(tqId)
+                self.__taskQueues = taskQueues
+
+    def getTaskQueues(self):
+        """Get the index content, refreshing it if too old
+
+        :return: S_OK(dict) with the definition of each task queue keyed by task queue ID
+        """
+        if time.time() - self.__lastRefresh > self.refreshInterval:
+            with self.__lock:
+                # Another thread may have refreshed meanwhile
+                if time.time() - self.__lastRefresh > self.refreshInterval:
+                    result = self.__refresh()
+                    if not result["OK"]:
+                        return result
+        return S_OK(self.__taskQueues)
+
+    def __refresh(self):
+        """Synchronize the index with the DB, must be called with the lock held"""
+        now = time.time()
+        fields = ", ".join(["TQId", "Enabled", "Priority"] + list(self.__singleValueFields))
+        result = self.__db._query("SELECT %s FROM `tq_TaskQueues`" % fields)
+        if not result["OK"]:
+            self.log.error("Cannot refresh the task queue index", result["Message"])
+            return result
+
+        taskQueues = {}
+        newTQs = []
+        for record in result["Value"]:
+            tqId = record[0]
+            tqDef = self.__taskQueues.get(tqId)
+            if tqDef is None:
+                if record[1] < 1:
+                    # Task queues are created disabled and enabled once fully defined:
+                    # wait until then to load their requirements
+                    continue
+                tqDef = dict((field, set()) for field in self.__multiValueFields)
+                newTQs.append(tqId)
+            else:
+                tqDef = dict(tqDef)
+            tqDef["Priority"] = record[2]
+            for field, value in zip(self.__singleValueFields, record[3:]):
+                tqDef[field] = value
+            taskQueues[tqId] = tqDef
+
+        if newTQs:
+            tqIds = ", ".join(str(tqId) for tqId in newTQs)
+            for field in self.__multiValueFields:
+                result = self.__db._query("SELECT TQId, Value FROM `tq_TQTo%s` WHERE TQId IN ( %s )" % (field, tqIds))
+                if not result["OK"]:
+                    self.log.error("Cannot refresh the task queue index", result["Message"])
+                    return result
+                for tqId, value in result["Value"]:
+                    if tqId in taskQueues:
+                        taskQueues[tqId][field].add(_normalize(value))
+
+        self.log.debug("Task queue index refreshed", "%d TQs, %d new" % (len(taskQueues), len(newTQs)))
+        self.__taskQueues = taskQueues
+        self.__lastRefresh = now
+        return S_OK()
+
+    def match(self, tqMatchDict, numQueuesToGet=1, negativeCond=None):
+        """Select the task queues matching a resource, ordered like the SQL match: randomly
+        weighted by the task queue priority
+
+        :param dict tqMatchDict: resource description, with non escaped values
+        :param int numQueuesToGet: maximum number of task queues to return (0 for all)
+        :param negativeCond: dict or list of dicts of conditions the task queues must not fulfill
+
+        :return: S_OK(list of (tqId, OwnerDN, OwnerGroup) tuples)/S_ERROR
+        """
+        result = self.getTaskQueues()
+        if not result["OK"]:
+            return result
+        taskQueues = result["Value"]
+
+        result = self.__buildMatchConditions(tqMatchDict, negativeCond)
+        if not result["OK"]:
+            return result
+        conditions = result["Value"]
+
+        matching = []
+        for tqId, tqDef in taskQueues.items():
+            if all(condition(tqDef) for condition in conditions):
+                priority = tqDef["Priority"]
+                weight = random.random() / priority if priority > 0 else float("inf")
+                matching.append((weight, tqId, tqDef["OwnerDN"], tqDef["OwnerGroup"]))
+        matching.sort()
+        if numQueuesToGet:
+            matching = matching[:numQueuesToGet]
+        return S_OK([(tqId, ownerDN, ownerGroup) for _weight, tqId, ownerDN, ownerGroup in matching])
+
+    def __buildMatchConditions(self, tqMatchDict, negativeCond):
+        """Translate the resource description into a list of predicates on a task queue definition
+
+        :return: S_OK(list of functions)/S_ERROR
+        """
+        conditions = []
+
+        # Owner conditions
+        if "OwnerDN" in tqMatchDict and "OwnerGroup" in tqMatchDict:
+            sharingGroups = set()
+            owners = set()
+            dns = [_normalize(dn) for dn in _toList(tqMatchDict["OwnerDN"])]
+            for group in _toList(tqMatchDict["OwnerGroup"]):
+                if Properties.JOB_SHARING in Registry.getPropertiesForGroup(group):
+                    sharingGroups.add(_normalize(group))
+                else:
+                    owners.update((dn, _normalize(group)) for dn in dns)
+            conditions.append(
+                lambda tq: _normalize(tq["OwnerGroup"]) in sharingGroups
+                or (_normalize(tq["OwnerDN"]), _normalize(tq["OwnerGroup"])) in owners
+            )
+        else:
+            for field in ("OwnerGroup", "OwnerDN"):
+                if field in tqMatchDict:
+                    values = set(_normalize(value) for value in _toList(tqMatchDict[field]))
+                    conditions.append(lambda tq, field=field, values=values: _normalize(tq[field]) in values)
+
+        if "CPUTime" in tqMatchDict:
+            maxCPUTime = max(int(value) for value in _toList(tqMatchDict["CPUTime"]))
+            conditions.append(lambda tq: tq["CPUTime"] <= maxCPUTime)
+        if "Setup" in tqMatchDict:
+            setups = set(_normalize(value) for value in _toList(tqMatchDict["Setup"]))
+            conditions.append(lambda tq: _normalize(tq["Setup"]) in setups)
+
+        # Multi value fields: the resource must provide what the task queue asks for
+        tags = []
+        if "Tag" not in tqMatchDict and "RequiredTag" not in tqMatchDict:
+            tqMatchDict = dict(tqMatchDict, Tag=[])
+        for field in ("GridCE", "Site", "Platform", "SubmitPool", "JobType", "Tag"):
+            if field not in tqMatchDict:
+                continue
+            tqField = "%ss" % field
+            if field == "Tag":
+                tags = _toList(tqMatchDict["Tag"])
+                if any(_isAny(tag) for tag in tags):
+                    continue
+                # All the tags of the task queue must be provided by the resource
+                resourceTags = set(_normalize(tag) for tag in tags)
+                conditions.append(lambda tq: tq["Tags"] <= resourceTags)
+                continue
+            value = tqMatchDict[field]
+            if not value:
+                continue
+            values = _toList(value)
+            if any(_isAny(val) for val in values):
+                continue
+            values = set(_normalize(val) for val in values)
+            # Either no requirement on that field or one of the values is accepted
+            conditions.append(lambda tq, tqField=tqField, values=values: not tq[tqField] or bool(tq[tqField] & values))
+            if field == "Site":
+                # The site must not be banned by the task queue
+                conditions.append(lambda tq, values=values: not values <= tq["BannedSites"])
+
+        # Tags required by the resource
+        requiredTags = _toList(tqMatchDict.get("RequiredTag", []))
+        if requiredTags and not any(_isAny(tag) for tag in requiredTags):
+            if not set(requiredTags) <= set(tags):
+                return S_ERROR("Wrong conditions")
+            requiredTags = set(_normalize(tag) for tag in requiredTags)
+            conditions.append(lambda tq: requiredTags <= tq["Tags"])
+
+        # Resources banned by the resource description
+        for field in ("GridCE", "Site", "Platform", "SubmitPool", "JobType", "Tag"):
+            bannedValues = tqMatchDict.get("Banned%s" % field)
+            if not bannedValues:
+                continue
+            bannedValues = _toList(bannedValues)
+            if any(_isAny(val) for val in bannedValues):
+                continue
+            bannedValues = set(_normalize(val) for val in bannedValues)
+            conditions.append(
+                lambda tq, tqField="%ss" % field, bannedValues=bannedValues: not bannedValues <= tq[tqField]
+            )
+
+        if negativeCond:
+            if isinstance(negativeCond, dict):
+                negativeCond = [negativeCond]
+            elif not isinstance(negativeCond, (list, tuple)):
+                return S_ERROR(
+                    "negativeCond has to be either a list or a dict or a tuple, and it's %s" % type(negativeCond)
+                )
+            negativeMatchers = [self.__buildNegativeCondition(condDict) for condDict in negativeCond]
+            conditions.append(lambda tq: any(negativeMatcher(tq) for negativeMatcher in negativeMatchers))
+
+        return S_OK(conditions)
+
+    def __buildNegativeCondition(self, condDict):
+        """Build the predicate for one negative condition dictionary: the task queue is eligible
+        if it does not fulfill at least one of the conditions
+        """
+        checks = []
+        for field, values in condDict.items():
+            tqField = "%ss" % field
+            if tqField in self.__multiValueFields:
+                values = set(_normalize(value) for value in _toList(values))
+                checks.append(lambda tq, tqField=tqField, values=values: not values & tq[tqField])
+            elif field in self.__singleValueFields:
+                for value in _toList(values):
+                    checks.append(lambda tq, field=field, value=_normalize(value): _normalize(tq[field]) != value)
+        return lambda tq: any(check(tq) for check in checks)
@@ -0,0 +1,123 @@
+""" Test of the in-memory task queue index
+"""
+import pytest
+
+from DIRAC import S_OK
+from DIRAC.WorkloadManagementSystem.private.TaskQueueIndex import TaskQueueIndex
+
+singleValueFields = ("OwnerDN", "OwnerGroup", "Setup", "CPUTime")
+multiValueFields = ("Sites", "GridCEs", "BannedSites", "Platforms", "SubmitPools", "JobTypes", "Tags")
+
+
+class FakeTaskQueueDB(object):
+    """Answers the queries of the index from a dictionary of task queue definitions"""
+
+    def __init__(self, taskQueues):
+        self.taskQueues = taskQueues
+        self.queries = []
+
+    def _query(self, cmd):
+        self.queries.append(cmd)
+        if "FROM `tq_TaskQueues`" in cmd:
+            return S_OK(
+                [
+                    (tqId, tq.get("Enabled", 1), tq.get("Priority", 1.0))
+                    + tuple(tq[field] for field in singleValueFields)
+                    for tqId, tq in self.taskQueues.items()
+                ]
+            )
+        field = cmd.split("`tq_TQTo")[1].split("`")[0]
+        tqIds = [int(tqId) for tqId in cmd.split("IN (")[1].split(")")[0].split(",")]
+        return S_OK([(tqId, value) for tqId in tqIds for value in self.taskQueues[tqId].get(field, [])])
+
+
+def _tq(**kwargs):
+    tqDef = {"OwnerDN": "/DN/user", "OwnerGroup": "user", "Setup": "DIRAC-Test", "CPUTime": 3600}
+    tqDef.update(kwargs)
+    return tqDef
+
+
+@pytest.fixture
+def index(mocker):
+    mocker.patch(
+        "DIRAC.WorkloadManagementSystem.private.TaskQueueIndex.Registry.getPropertiesForGroup",
+        side_effect=lambda group: ["JobSharing"] if group == "prod" else [],
+    )
+    db = FakeTaskQueueDB(
+        {
+            1: _tq(),
+            2: _tq(Sites=["Site.A.ch"], Tags=["MultiProcessor"]),
+            3: _tq(BannedSites=["Site.B.ch"], CPUTime=86400),
+            4: _tq(OwnerDN="/DN/prod", OwnerGroup="prod", JobTypes=["MCSimulation"], Platforms=["x86_64-el9"]),
+        }
+    )
+    return TaskQueueIndex(db, singleValueFields, multiValueFields, refreshInterval=3600)
+
+
+def _match(index, matchDict, negativeCond=None):
+    matchDict = dict({"Setup": "DIRAC-Test", "CPUTime": 100000}, **matchDict)
+    result = index.match(matchDict, numQueuesToGet=0, negativeCond=negativeCond)
+    assert result["OK"], result["Message"]
+    return sorted(tqId for tqId, _dn, _group in result["Value"])
+
+
+@pytest.mark.parametrize(
+    "matchDict, expected",
+    [
+        ({}, [1, 3, 4]),
+        ({"CPUTime": 3600}, [1, 4]),
+        ({"Setup": "Other"}, []),
+        ({"Site": "Site.A.ch"}, [1, 3, 4]),
+        ({"Site": "site.a.ch", "Tag": ["MultiProcessor"]}, [1, 2, 3, 4]),
+        ({"Site": "Site.B.ch", "Tag": "MultiProcessor"}, [1, 4]),
+        ({"Site": "Site.B.ch", "Tag": "any"}, [1, 4]),
+        ({"Tag": "any"}, [1, 2, 3, 4]),
+        ({"Tag": "MultiProcessor", "RequiredTag": "MultiProcessor"}, [2]),
+        ({"BannedSite": ["Site.A.ch"], "Tag": "MultiProcessor"}, [1, 3, 4]),
+        ({"JobType": "User"}, [1, 3]),
+        ({"Platform": ["x86_64-el9", "x86_64-el8"]}, [1, 3, 4]),
+        ({"Platform": "x86_64-el7"}, [1, 3]),
+        ({"OwnerGroup": "user"}, [1, 3]),
+        ({"OwnerDN": "/DN/user", "OwnerGroup": ["user", "prod"]}, [1, 3, 4]),
+        ({"OwnerDN": "/DN/other", "OwnerGroup": ["user", "prod"]}, [4]),
+    ],
+)
+def test_match(index, matchDict, expected):
+    assert _match(index, matchDict) == expected
+
+
+def test_matchWrongRequiredTag(index):
+    result = index.match({"Setup": "DIRAC-Test", "CPUTime": 100, "Tag": [], "RequiredTag": "GPU"})
+    assert not result["OK"]
+
+
+def test_negativeConditions(index):
+    # Like in the SQL conditions, a task queue is excluded only if it explicitly requires all the values
+    negativeCond = [{"Site": "Site.A.ch", "JobType": ["MCSimulation"]}]
+    assert _match(index, {"Site": "Site.A.ch"}, negativeCond) == [1, 3, 4]
+    assert _match(index, {"Site": "Site.A.ch"}, [{"JobType": ["MCSimulation"]}]) == [1, 3]
+    negativeCond = [{"Site": "Site.A.ch", "Tag": "MultiProcessor"}, {"JobType": "MCSimulation"}]
+    assert _match(index, {"Site": "Site.A.ch", "Tag": "MultiProcessor"}, negativeCond) == [1, 2, 3, 4]
+    assert _match(index, {"Site": "Site.A.ch"}, {"OwnerGroup": ["user"]}) == [4]
+
+
+def test_refresh(index):
+    db = index._TaskQueueIndex__db
+    assert _match(index, {}) == [1, 3, 4]
+    numQueries = len(db.queries)
+    # No query while the index is fresh
+    _match(index, {})
+    assert len(db.queries) == numQueries
+
+    # A task queue being created is only indexed once enabled
+    db.taskQueues[5] = _tq(Enabled=0, Sites=["Site.C.ch"])
+    index.invalidate()
+    assert _match(index, {"Site": "Site.A.ch"}) == [1, 3, 4]
+    db.taskQueues[5]["Enabled"] = 1
+    index.invalidate()
+    assert _match(index, {"Site": "Site.C.ch"}) == [1, 3, 4, 5]
+    # Only the requirements of the new task queue were loaded
+    assert all("IN ( 5 )" in query for query in db.queries[-len(multiValueFields) :])
+
+    index.removeTaskQueue(5)
+    assert _match(index, {"Site": "Site.C.ch"}) == [1, 3, 4]
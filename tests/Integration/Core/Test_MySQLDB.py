@@ -5,13 +5,14 @@ from __future__ import absolute_import
 from __future__ import division
 from __future__ import print_function
 
+import threading
 import time
 import pytest
 
 import DIRAC
 from DIRAC import gLogger, gConfig
 from DIRAC.Core.Utilities import Time
-from DIRAC.Core.Utilities.MySQL import MySQL
+from DIRAC.Core.Utilities.MySQL import MySQL, ConnectionPool
 
 
 # Useful methods
@@ -298,3 +299,91 @@ def test_deleteEntries(name, fields, requiredFields, values, table, cond, expect
     result = mysqlDB.getCounters(name, fields, {})
     assert result["OK"], result["Message"]
     assert result["Value"] == []
+
+
+def test_connectionPool(monkeypatch):
+    """Check the ping, sweep and connection limit settings of the connection pool"""
+    monkeypatch.setattr(DIRAC.Core.Utilities.MySQL, "RETRY_SLEEP_DURATION", 0.5)
+
+    result = gConfig.getOption("/Systems/Databases/Host")
+    host = result["Value"] if result["OK"] else "mysql"
+    pool = ConnectionPool(
+        host, "Dirac", "Dirac", 3306, pingInterval=60, cleanInterval=60, maxConnections=1, maxWaitTime=1
+    )
+
+    def getConnection(results, calls=1):
+        for _ in range(calls):
+            results.append(pool.get("AccountingDB", retries=0))
+
+    # The first thread opens the only connection allowed and keeps it while it is alive
+    results = []
+    holderDone = threading.Event()
+    holder = threading.Thread(target=lambda: (getConnection(results, 3), holderDone.wait()))
+    holder.start()
+    while len(results) < 3:
+        time.sleep(0.1)
+    assert all(result["OK"] for result in results)
+    stats = pool.getStats()
+    assert stats["NewConnections"] == 1
+    assert stats["Hits"] == 2
+    # A fresh connection used right away does not need to be pinged
+    assert stats["Pings"] == 0
+    # Only the first call sweeps the pool
+    assert stats["Cleans"] == 1
+
+    # No other thread can get a connection meanwhile
+    results = []
+    thread = threading.Thread(target=getConnection, args=(results,))
+    thread.start()
+    thread.join()
+    assert not results[0]["OK"]
+    assert pool.getStats()["Waits"] == 1
+
+    # Once the holder is gone its connection is recycled
+    holderDone.set()
+    holder.join()
+    results = []
+    thread = threading.Thread(target=getConnection, args=(results,))
+    thread.start()
+    thread.join()
+    assert results[0]["OK"], results[0]["Message"]
+    stats = pool.getStats()
+    assert stats["NewConnections"] == 1
+    assert stats["Assigned"] == 1
+
+    mysqlDB = setupDB()
+    result = mysqlDB.getConnectionPoolStats()
+    assert result["OK"], result["Message"]
+    assert result["Value"]["NewConnections"] >= 1
+
+
+@pytest.mark.parametrize(
+    "name, fields, requiredFields, values, table",
+    [(name, fields, reqFields, genVal1(), table)],
+)
+def test_parameterisedStatements(name, fields, requiredFields, values, table):
+    """Insert with _executemany and read back with bound parameters"""
+    mysqlDB = setupDB()
+
+    result = mysqlDB._createTables(table, force=True)
+    assert result["OK"], result["Message"]
+
+    cmd = "INSERT INTO `%s` (`Name`, `Surname`, `Count`, `Time`) VALUES (%%s, %%s, %%s, UTC_TIMESTAMP())" % name
+    result = mysqlDB._executemany(cmd, [tuple(value[:3]) for value in values])
+    assert result["OK"], result["Message"]
+    assert result["Value"] == len(values)
+
+    result = mysqlDB._query("SELECT COUNT(*) FROM `%s` WHERE `Count` < %%s" % name, args=(10,))
+    assert result["OK"], result["Message"]
+    assert result["Value"][0][0] == 10
+
+    # Values are bound, not interpreted
+    result = mysqlDB.insertFields(name, requiredFields, ["it's", '100% "quoted"', 1000, "UTC_TIMESTAMP()"])
+    assert result["OK"], result["Message"]
+    result = mysqlDB.getFields(name, ["Surname"], {"Name": "it's"})
+    assert result["OK"], result["Message"]
+    assert result["Value"] == (('100% "quoted"',),)
+
+    condition, args = mysqlDB.buildConditionWithArgs({"Name": "it's", "Count": [1000, 1001]})
+    assert args == ["it's", "1000", "1001"]
+    assert mysqlDB.buildCondition({"Name": "it's"}).strip() == 'WHERE `Name` = "it\\\'s"'
@@ -447,6 +447,53 @@ class TestClientFTS3(unittest.TestCase):
         self.assertTrue(op.ftsFiles[2].status == "New")
         self.assertTrue(op.ftsFiles[3].status == "New")
 
+    def test_06_bulkUpdateFileStatus(self):
+        """The files of a job are updated together, whatever their new values"""
+
+        op = self.generateOperation("Transfer", 6, ["Target1"])
+        jobGUID = "06-bulk-job"
+        for ftsFile in op.ftsFiles:
+            ftsFile.ftsGUID = jobGUID
+        res = self.db.persistOperation(op)
+        self.assertTrue(res["OK"], res)
+        opID = res["Value"]
+
+        res = self.db.getOperation(opID)
+        fileIDs = sorted(ftsFile.fileID for ftsFile in res["Value"].ftsFiles)
+
+        # Some files do not change, some share the same new values, one is final and cannot change
+        fileStatusDict = {
+            fileIDs[0]: {"status": "New"},
+            fileIDs[1]: {"status": "Active", "error": ""},
+            fileIDs[2]: {"status": "Active", "error": ""},
+            fileIDs[3]: {"status": "Failed", "error": "Tough luck", "ftsGUID": None},
+            fileIDs[4]: {"status": "Finished", "ftsGUID": None},
+        }
+        res = self.db.updateFileStatus(fileStatusDict, ftsGUID=jobGUID)
+        self.assertTrue(res["OK"], res)
+
+        # Updating again with the same values does nothing, and the final file is not brought back to life
+        fileStatusDict[fileIDs[4]] = {"status": "Active"}
+        res = self.db.updateFileStatus(fileStatusDict)
+        self.assertTrue(res["OK"], res)
+
+        res = self.db.getOperation(opID)
+        self.assertTrue(res["OK"], res)
+        newValues = dict(
+            (ftsFile.fileID, (ftsFile.status, ftsFile.error, ftsFile.ftsGUID)) for ftsFile in res["Value"].ftsFiles
+        )
+        self.assertEqual(
+            newValues,
+            {
+                fileIDs[0]: ("New", None, jobGUID),
+                fileIDs[1]: ("Active", None, jobGUID),
+                fileIDs[2]: ("Active", None, jobGUID),
+                fileIDs[3]: ("Failed", "Tough luck", None),
+                fileIDs[4]: ("Finished", None, None),
+                fileIDs[5]: ("New", None, jobGUID),
+            },
+        )
+
     def _perf(self):
 
         listOfIds = []
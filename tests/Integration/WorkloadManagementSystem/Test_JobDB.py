@@ -176,6 +176,27 @@ def test_heartBeatLogging(putAndDelete):
         else:
             assert False, "Unknown entry: %s: %s" % (name, value)
 
+    heartBeatTime = datetime.utcnow().replace(microsecond=0) + timedelta(minutes=1)
+    res = jobDB.setHeartBeatDataBulk({jobID: (heartBeatTime, {"CPU": 3456})})
+    assert res["OK"] is True, res["Message"]
+    # Writing the same heart beat again updates it
+    res = jobDB.setHeartBeatDataBulk({jobID: (heartBeatTime, {"CPU": 4567})})
+    assert res["OK"] is True, res["Message"]
+    res = jobDB.getHeartBeatData(jobID)
+    assert res["OK"] is True, res["Message"]
+    assert len(res["Value"]) == 3, str(res)
+    assert ("CPU", "4567.0", str(heartBeatTime)) in res["Value"]
+    res = jobDB.getJobAttributes(jobID, ["HeartBeatTime", "Status"])
+    assert res["OK"] is True, res["Message"]
+    assert res["Value"] == {"HeartBeatTime": str(heartBeatTime), "Status": JobStatus.RUNNING}
+
+    # The heart beats of unknown jobs do not prevent the others from being stored
+    res = jobDB.setHeartBeatDataBulk({jobID: (heartBeatTime, {"CPU": 5678}), 123456789: (heartBeatTime, {"CPU": 1})})
+    assert res["OK"] is True, res["Message"]
+    assert res["Value"] == {"Failed": [], "Unknown": [123456789]}
+    res = jobDB.getHeartBeatData(jobID)
+    assert ("CPU", "5678.0", str(heartBeatTime)) in res["Value"]
+
     res = jobDB.setJobStatus(jobID, status=JobStatus.DONE)
     assert res["OK"] is True, res["Message"]
 